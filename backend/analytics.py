@@ -0,0 +1,248 @@
+"""
+Invoice analytics: revenue time series, receivables aging and customer totals.
+
+Revenue charts read ``invoice_daily_stats``, one pre-aggregated document
+per user, issue day and currency (``day`` and ``month`` as ISO strings)
+that invoice writes keep current with ``$inc`` deltas, so a multi-year
+chart scans at most one small document per day and currency regardless
+of invoice volume. Aging and per-customer totals
+run as aggregation pipelines on the ``(user_id, status, due_date)`` and
+``(user_id, issue_date)`` indexes. Invoice dates are stored as ISO
+strings, so date ranges are plain string comparisons.
+
+Every query groups by currency as well; the per-currency rows are then
+converted to the requested currency with one vectorized pass per amount
+field (see currency.RateTable.convert_amounts) at the current rates.
+
+Buckets that drifted (or predate this module) are rebuilt with
+``python migrations.py rebuild-analytics``.
+"""
+
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from currency import DEFAULT_CURRENCY, rate_tables
+from database import db, NOT_DELETED
+
+logger = logging.getLogger(__name__)
+
+# Receivables aging buckets: (label, max days past due); "current" is not yet due
+AGING_BUCKETS = [("0-30", 30), ("31-60", 60), ("61-90", 90), ("90+", None)]
+# Invoices that are not (or no longer) owed
+NOT_RECEIVABLE_STATUSES = ["paid", "draft"]
+DEFAULT_RANGE_DAYS = 365
+TOP_CUSTOMERS_LIMIT = 10
+
+# Invoice fields the daily buckets depend on
+STATS_FIELDS = {"_id": 0, "issue_date": 1, "total_amount": 1, "status": 1, "currency": 1}
+# Invoices written before currencies existed have none
+INVOICE_CURRENCY = {"$ifNull": ["$currency", DEFAULT_CURRENCY]}
+
+
+def _contribution(invoice: Dict[str, Any], sign: int) -> Dict[str, float]:
+    total = invoice.get("total_amount") or 0
+    paid = invoice.get("status") == "paid"
+    return {
+        "invoice_count": sign,
+        "invoiced_total": sign * total,
+        "paid_count": sign if paid else 0,
+        "paid_total": sign * total if paid else 0,
+    }
+
+
+async def record_invoice_change(user_id: str, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+    """Apply an invoice write to the daily buckets.
+
+    `before`/`after` are the invoice's stats fields (see STATS_FIELDS) before
+    and after the write; None for a create or delete. Failures are logged,
+    not raised: the invoice write already happened and the buckets can be
+    rebuilt.
+    """
+    await record_invoice_changes(user_id, [(before, after)])
+
+
+async def record_invoice_changes(user_id: str, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+    """Apply several (before, after) invoice writes with one bulk update"""
+    deltas: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for before, after in changes:
+        for invoice, sign in ((before, -1), (after, 1)):
+            if invoice is None:
+                continue
+            key = (str(invoice["issue_date"])[:10], invoice.get("currency") or DEFAULT_CURRENCY)
+            bucket = deltas.setdefault(key, {})
+            for field, value in _contribution(invoice, sign).items():
+                bucket[field] = bucket.get(field, 0) + value
+
+    ops = [
+        UpdateOne(
+            {"user_id": user_id, "day": day, "currency": currency},
+            {"$inc": changes, "$setOnInsert": {"month": day[:7]}},
+            upsert=True
+        )
+        for (day, currency), changes in deltas.items()
+        if any(changes.values())
+    ]
+    if not ops:
+        return
+    try:
+        try:
+            await db.invoice_daily_stats.bulk_write(ops, ordered=False)
+        except DuplicateKeyError:
+            # Two first writes for the same day raced on the upsert; the retry updates
+            await db.invoice_daily_stats.bulk_write(ops, ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to update invoice analytics for user {user_id}: {e}")
+
+
+def _convert_grouped(
+    rows: List[Dict[str, Any]],
+    currency: str,
+    amount_fields: Tuple[str, ...],
+    count_fields: Tuple[str, ...] = ("invoice_count",),
+) -> Dict[str, Dict[str, float]]:
+    """Merge rows grouped by (`_id.key`, `_id.currency`) into totals per key in `currency`.
+
+    Each amount field is converted for all rows in one vectorized call and
+    summed per key with a bincount, so the cost does not grow with the
+    number of currencies.
+    """
+    if not rows:
+        return {}
+    import numpy as np
+
+    keys, inverse = np.unique(np.asarray([str(row["_id"]["key"]) for row in rows]), return_inverse=True)
+    currencies = [row["_id"]["currency"] for row in rows]
+    table = rate_tables.get()
+    totals = {}
+    for field in amount_fields:
+        converted = table.convert_amounts([row[field] for row in rows], currencies, currency)
+        totals[field] = np.bincount(inverse, weights=converted, minlength=len(keys))
+    for field in count_fields:
+        totals[field] = np.bincount(inverse, weights=[row[field] for row in rows], minlength=len(keys))
+    return {
+        str(key): {
+            **{field: round(float(totals[field][i]), 2) for field in amount_fields},
+            **{field: int(totals[field][i]) for field in count_fields},
+        }
+        for i, key in enumerate(keys)
+    }
+
+
+async def monthly_revenue(user_id: str, start: date, end: date, currency: str = DEFAULT_CURRENCY) -> List[Dict[str, Any]]:
+    """Invoiced and paid totals per issue month, from the daily buckets"""
+    rows = await db.invoice_daily_stats.aggregate([
+        {"$match": {"user_id": user_id, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}},
+        {"$group": {
+            "_id": {"key": "$month", "currency": INVOICE_CURRENCY},
+            "invoice_count": {"$sum": "$invoice_count"},
+            "invoiced_total": {"$sum": "$invoiced_total"},
+            "paid_count": {"$sum": "$paid_count"},
+            "paid_total": {"$sum": "$paid_total"},
+        }},
+    ]).to_list(None)
+    months = _convert_grouped(rows, currency, ("invoiced_total", "paid_total"), ("invoice_count", "paid_count"))
+    return [
+        {
+            "month": month,
+            "invoice_count": totals["invoice_count"],
+            "invoiced_total": totals["invoiced_total"],
+            "paid_count": totals["paid_count"],
+            "paid_total": totals["paid_total"],
+        }
+        for month, totals in sorted(months.items())
+    ]
+
+
+async def receivables_aging(user_id: str, as_of: date, currency: str = DEFAULT_CURRENCY) -> List[Dict[str, Any]]:
+    """Outstanding totals by days past due_date as of `as_of`"""
+    branches = [{"case": {"$gt": ["$due_date", as_of.isoformat()]}, "then": "current"}]
+    # The first (most recent) cutoff the due date reaches wins
+    for label, max_days in AGING_BUCKETS[:-1]:
+        branches.append({
+            "case": {"$gte": ["$due_date", (as_of - timedelta(days=max_days)).isoformat()]},
+            "then": label,
+        })
+    rows = await db.invoices.aggregate([
+        {"$match": {"user_id": user_id, **NOT_DELETED, "status": {"$nin": NOT_RECEIVABLE_STATUSES}}},
+        {"$group": {
+            "_id": {
+                "key": {"$switch": {"branches": branches, "default": AGING_BUCKETS[-1][0]}},
+                "currency": INVOICE_CURRENCY,
+            },
+            "invoice_count": {"$sum": 1},
+            "outstanding_total": {"$sum": "$total_amount"},
+        }},
+    ]).to_list(None)
+    totals = _convert_grouped(rows, currency, ("outstanding_total",))
+    return [
+        {
+            "bucket": label,
+            "invoice_count": totals.get(label, {}).get("invoice_count", 0),
+            "outstanding_total": totals.get(label, {}).get("outstanding_total", 0),
+        }
+        for label in ["current"] + [label for label, _ in AGING_BUCKETS]
+    ]
+
+
+async def customer_totals(
+    user_id: str, start: date, end: date, limit: int = TOP_CUSTOMERS_LIMIT, currency: str = DEFAULT_CURRENCY
+) -> List[Dict[str, Any]]:
+    """Top customers by invoiced total for invoices issued in [start, end]"""
+    # Ranked after conversion, so every customer's per-currency totals are needed
+    rows = await db.invoices.aggregate([
+        {"$match": {
+            "user_id": user_id, **NOT_DELETED,
+            "issue_date": {"$gte": start.isoformat(), "$lte": end.isoformat()}
+        }},
+        {"$group": {
+            "_id": {"key": "$customer_id", "currency": INVOICE_CURRENCY},
+            "invoice_count": {"$sum": 1},
+            "invoiced_total": {"$sum": "$total_amount"},
+            "paid_total": {"$sum": {"$cond": [{"$eq": ["$status", "paid"]}, "$total_amount", 0]}},
+        }},
+    ]).to_list(None)
+    totals = _convert_grouped(rows, currency, ("invoiced_total", "paid_total"))
+    top = sorted(totals.items(), key=lambda entry: -entry[1]["invoiced_total"])[:limit]
+
+    names = {}
+    if top:
+        customers = db.customers.find(
+            {"user_id": user_id, "id": {"$in": [customer_id for customer_id, _ in top]}},
+            {"_id": 0, "id": 1, "name": 1}
+        )
+        names = {customer["id"]: customer["name"] async for customer in customers}
+    return [
+        {
+            "customer_id": customer_id,
+            "customer_name": names.get(customer_id),
+            "invoice_count": customer["invoice_count"],
+            "invoiced_total": customer["invoiced_total"],
+            "paid_total": customer["paid_total"],
+        }
+        for customer_id, customer in top
+    ]
+
+
+async def invoice_analytics(
+    user_id: str, start: date, end: date, as_of: date, top_customers: int, currency: str = DEFAULT_CURRENCY
+) -> Dict[str, Any]:
+    revenue, aging, customers = await asyncio.gather(
+        monthly_revenue(user_id, start, end, currency),
+        receivables_aging(user_id, as_of, currency),
+        customer_totals(user_id, start, end, top_customers, currency),
+    )
+    return {
+        "start": start,
+        "end": end,
+        "as_of": as_of,
+        "currency": currency,
+        "rates_as_of": rate_tables.get().as_of,
+        "monthly_revenue": revenue,
+        "aging": aging,
+        "top_customers": customers,
+    }
@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark for the InvoiceForge API.
+
+Imports ``server`` in fresh interpreters and reports the import time, and
+checks that heavy optional dependencies stay out of the startup path.
+
+Run from the backend directory:
+
+    python benchmarks/startup_benchmark.py [--runs 10] [--max-ms 800]
+
+Exits non-zero when the median import time exceeds --max-ms or a lazily
+loaded module was imported at startup, so it can gate CI.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ["speech_recognition", "pydub", "bcrypt", "jwt", "pandas", "numpy"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure InvoiceForge API import time")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters to sample")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median exceeds this")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    timings = sorted(sample["import_ms"] for sample in samples)
+    loaded = sorted({name for sample in samples for name in sample["loaded"]})
+
+    print(f"import server: median {statistics.median(timings):.1f} ms, "
+          f"min {timings[0]:.1f} ms, max {timings[-1]:.1f} ms over {args.runs} runs")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: loaded at startup but should be lazy: {', '.join(loaded)}")
+        failed = True
+    if args.max_ms is not None and statistics.median(timings) > args.max_ms:
+        print(f"FAIL: median import time exceeds {args.max_ms:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Storage backend benchmark for InvoiceForge.
+
+Loads the same synthetic invoices into each backend with the app's tenant
+indexes and times the queries the API runs most: the invoice list page,
+lookups by id, guarded updates, the change feed, counts and the dashboard
+revenue aggregation.
+
+Run from the backend directory:
+
+    python benchmarks/storage_benchmark.py [--invoices 20000] [--users 20] [--rounds 200]
+
+SQLite is measured in memory and on a file. MongoDB is included when
+MONGO_URL points at a reachable server; the benchmark uses (and drops) a
+separate `<DB_NAME>_benchmark` database.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from dotenv import load_dotenv  # noqa: E402
+from pymongo import ReturnDocument  # noqa: E402
+
+from database import DELETED_INVOICE_RETENTION_SECONDS, NOT_DELETED, TENANT_INDEXES  # noqa: E402
+from embedded_store import EmbeddedDatabase  # noqa: E402
+
+load_dotenv(BACKEND_DIR / '.env')
+
+STATUSES = ["draft", "sent", "viewed", "paid", "overdue"]
+
+
+def make_invoices(count: int, users: int):
+    start = datetime(2025, 1, 1)
+    invoices = []
+    for seq in range(count):
+        created_at = start + timedelta(minutes=seq)
+        invoices.append({
+            "id": str(uuid.uuid4()),
+            "user_id": f"user-{seq % users}",
+            "customer_id": f"customer-{seq % (users * 10)}",
+            "invoice_number": f"INV-{seq:06d}",
+            "status": random.choice(STATUSES),
+            "currency": "USD",
+            "issue_date": created_at.date().isoformat(),
+            "due_date": (created_at + timedelta(days=30)).date().isoformat(),
+            "items": [{"description": "Service", "quantity": 1, "unit_price": 100.0, "total": 100.0}],
+            "subtotal": 100.0,
+            "tax_amount": 10.0,
+            "total_amount": 110.0,
+            "version": 1,
+            "updated_seq": seq,
+            "deleted_at": None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return invoices
+
+
+async def load(db, invoices):
+    for keys in TENANT_INDEXES["invoices"]:
+        await db.invoices.create_index(keys)
+    await db.invoices.create_index("deleted_at", expireAfterSeconds=DELETED_INVOICE_RETENTION_SECONDS)
+    started = time.perf_counter()
+    for start in range(0, len(invoices), 1000):
+        await db.invoices.insert_many([dict(invoice) for invoice in invoices[start:start + 1000]])
+    return time.perf_counter() - started
+
+
+async def run_workload(db, invoices, users: int, rounds: int):
+    ids = [invoice["id"] for invoice in invoices]
+    versions = {}
+
+    async def list_page():
+        user_id = f"user-{random.randrange(users)}"
+        await db.invoices.find({"user_id": user_id, **NOT_DELETED}).sort("created_at", -1).to_list(50)
+
+    async def get_by_id():
+        invoice = random.choice(invoices)
+        await db.invoices.find_one({"id": invoice["id"], "user_id": invoice["user_id"], **NOT_DELETED}, {"_id": 0})
+
+    async def guarded_update():
+        invoice_id = random.choice(ids)
+        version = versions.get(invoice_id, 1)
+        updated = await db.invoices.find_one_and_update(
+            {"id": invoice_id, "version": version, **NOT_DELETED},
+            {"$set": {"status": random.choice(STATUSES), "version": version + 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        versions[invoice_id] = updated["version"]
+
+    async def change_feed():
+        user_id = f"user-{random.randrange(users)}"
+        since = random.randrange(len(invoices))
+        await db.invoices.find({"user_id": user_id, "updated_seq": {"$gt": since}}).sort("updated_seq", 1).to_list(100)
+
+    async def count_open():
+        user_id = f"user-{random.randrange(users)}"
+        await db.invoices.count_documents({"user_id": user_id, "status": "sent", **NOT_DELETED})
+
+    async def revenue():
+        user_id = f"user-{random.randrange(users)}"
+        await db.invoices.aggregate([
+            {"$match": {"user_id": user_id, **NOT_DELETED, "status": "paid"}},
+            {"$group": {"_id": "$currency", "total": {"$sum": "$total_amount"}}},
+        ]).to_list(None)
+
+    results = {}
+    for name, operation in [
+        ("list page (50)", list_page),
+        ("get by id", get_by_id),
+        ("guarded update", guarded_update),
+        ("change feed (100)", change_feed),
+        ("count by status", count_open),
+        ("revenue aggregate", revenue),
+    ]:
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await operation()
+            timings.append(time.perf_counter() - started)
+        results[name] = statistics.median(timings) * 1e6
+    return results
+
+
+async def mongo_database():
+    """A scratch database on the configured MongoDB server, or None when there is none"""
+    mongo_url = os.environ.get("MONGO_URL")
+    if not mongo_url:
+        return None, None
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        print(f"Skipping MongoDB ({mongo_url}): {e.__class__.__name__}")
+        client.close()
+        return None, None
+    name = f"{os.environ.get('DB_NAME', 'invoiceforge_db')}_benchmark"
+    await client.drop_database(name)
+    return client, client[name]
+
+
+async def main_async(args):
+    random.seed(0)
+    invoices = make_invoices(args.invoices, args.users)
+    backends = []
+    with tempfile.TemporaryDirectory() as tmp:
+        backends.append(("sqlite :memory:", EmbeddedDatabase(":memory:")))
+        backends.append(("sqlite file", EmbeddedDatabase(os.path.join(tmp, "benchmark.db"))))
+        client, mongo = await mongo_database()
+        if mongo is not None:
+            backends.append(("mongodb", mongo))
+
+        table = {}
+        for name, db in backends:
+            load_seconds = await load(db, invoices)
+            print(f"{name}: loaded {len(invoices)} invoices in {load_seconds:.2f}s")
+            table[name] = await run_workload(db, invoices, args.users, args.rounds)
+            if isinstance(db, EmbeddedDatabase):
+                db.close()
+
+        if client is not None:
+            await client.drop_database(mongo.name)
+            client.close()
+
+    names = [name for name, _ in backends]
+    print()
+    print(f"median µs over {args.rounds} rounds".ljust(22) + "".join(name.rjust(18) for name in names))
+    for operation in table[names[0]]:
+        print(operation.ljust(22) + "".join(f"{table[name][operation]:18.1f}" for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare InvoiceForge storage backends")
+    parser.add_argument("--invoices", type=int, default=20000, help="Invoices to load")
+    parser.add_argument("--users", type=int, default=20, help="Tenants the invoices are spread over")
+    parser.add_argument("--rounds", type=int, default=200, help="Timed calls per operation")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
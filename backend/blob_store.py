@@ -0,0 +1,181 @@
+"""
+Content-addressed file store for business logos and signatures.
+
+Images are stored once under their SHA-256 (``<BLOB_STORE_DIR>/ab/abcd...``)
+together with PNG thumbnails pre-sized to fit ``THUMBNAIL_SIZES``.
+Profiles and templates keep only the hash (``logo_hash``,
+``signature_hash``); clients load the image from ``GET /api/blobs/{hash}``,
+which never changes for a given hash and is served with a one-year
+immutable cache header.
+
+Thumbnails need Pillow; without it images are stored and served at their
+original size.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_DIR = Path(os.environ.get("BLOB_STORE_DIR", Path(__file__).parent / "blobs"))
+BLOB_MAX_BYTES = 5 * 1024 * 1024
+THUMBNAIL_SIZES = (64, 256)
+# Thumbnail used for the *_url fields returned to clients
+DISPLAY_SIZE = 256
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Profile image fields stored as blobs: "<kind>_url" in requests, "<kind>_hash" in MongoDB
+IMAGE_KINDS = ("logo", "signature")
+
+# Magic bytes -> content type; SVG is not accepted since it can carry script
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URL = re.compile(r"^data:[\w.+-]+/[\w.+-]+;base64,", re.IGNORECASE)
+# A URL previously returned by blob_url, sent back unchanged with a profile
+_BLOB_URL = re.compile(r"/blobs/([0-9a-f]{64})(?:\?|$)")
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_blob_hash(value: str) -> bool:
+    return bool(_HASH.match(value))
+
+
+def blob_path(blob_hash: str, size: Optional[int] = None) -> Path:
+    name = blob_hash if size is None else f"{blob_hash}.{size}.png"
+    return BLOB_STORE_DIR / blob_hash[:2] / name
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_thumbnails(blob_hash: str, data: bytes):
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow is not installed; storing images without thumbnails")
+        return
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image = image.convert("RGBA")
+            for size in THUMBNAIL_SIZES:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size))
+                out = BytesIO()
+                thumbnail.save(out, format="PNG", optimize=True)
+                _write_atomic(blob_path(blob_hash, size), out.getvalue())
+    except Exception as e:
+        # The original is still served when a thumbnail is missing
+        logger.warning(f"Could not create thumbnails for blob {blob_hash}: {e}")
+
+
+def _store(data: bytes) -> str:
+    blob_hash = hashlib.sha256(data).hexdigest()
+    path = blob_path(blob_hash)
+    if not path.exists():
+        # Thumbnails first: once the original exists the blob counts as stored
+        _write_thumbnails(blob_hash, data)
+        _write_atomic(path, data)
+    return blob_hash
+
+
+async def store_image(data: bytes) -> str:
+    """Store an image (deduplicated by content) and return its hash"""
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is empty")
+    if len(data) > BLOB_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {BLOB_MAX_BYTES // (1024 * 1024)} MB"
+        )
+    if sniff_content_type(data) is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Only PNG, JPEG, GIF and WebP images are supported"
+        )
+    return await asyncio.to_thread(_store, data)
+
+
+async def store_image_value(value: Optional[str], current_hash: Optional[str]) -> Optional[str]:
+    """Blob hash for an image field sent by a client.
+
+    Accepts a base64 data URL (stored), a blob URL or hash (kept) and an
+    empty value (image removed); anything else keeps the current image.
+    """
+    if not value:
+        return None
+    if _DATA_URL.match(value):
+        try:
+            data = base64.b64decode(value.split(",", 1)[1], validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image data URL")
+        return await store_image(data)
+    if is_blob_hash(value):
+        return value
+    match = _BLOB_URL.search(value)
+    if match:
+        return match.group(1)
+    return current_hash
+
+
+def blob_url(request: Request, blob_hash: str, size: Optional[int] = DISPLAY_SIZE) -> str:
+    url = str(request.url_for("get_blob", blob_hash=blob_hash))
+    return url if size is None else f"{url}?size={size}"
+
+
+def with_image_urls(doc: Dict, request: Request) -> Dict:
+    """Add `<kind>_url` fields for the image hashes a profile or template references"""
+    for kind in IMAGE_KINDS:
+        blob_hash = doc.get(f"{kind}_hash")
+        if blob_hash:
+            doc[f"{kind}_url"] = blob_url(request, blob_hash)
+    return doc
+
+
+async def store_profile_images(data: Dict, existing: Dict):
+    """Replace the image URLs in a profile or template write with blob hashes.
+
+    `data` is the document being written and `existing` the stored one; an
+    inline data URL left in `existing` (written before the blob store) is
+    moved to the store too, since the write drops the URL fields.
+    """
+    for kind in IMAGE_KINDS:
+        url_field, hash_field = f"{kind}_url", f"{kind}_hash"
+        if url_field in data or existing.get(url_field):
+            value = data.pop(url_field) if url_field in data else existing[url_field]
+            data[hash_field] = await store_image_value(value, existing.get(hash_field))
+        elif data.get(hash_field) and not is_blob_hash(str(data[hash_field])):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {hash_field}")
@@ -0,0 +1,97 @@
+"""
+Bulk invoice deletion.
+
+Deleting is a soft delete: invoices get ``deleted_at`` (every read path
+filters them out), a change feed tombstone and an analytics adjustment,
+and the TTL index on ``deleted_at`` purges them after
+``DELETED_INVOICE_RETENTION_SECONDS``. Work is done in chunks of
+``BULK_DELETE_CHUNK_SIZE`` invoices so no single write is unbounded; bulk
+deletes larger than one chunk run as a ``bulk_delete`` background job that
+pauses between chunks to leave room for foreground traffic.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from analytics import STATS_FIELDS, record_invoice_changes
+from change_feed import change_seq_scope, next_change_seq
+from database import db, invoice_cache, NOT_DELETED
+from jobs import job_queue
+from line_items import mark_lines_deleted
+
+BULK_DELETE_CHUNK_SIZE = 500
+BULK_DELETE_PAUSE_SECONDS = 0.2  # between chunks, to throttle the write rate
+
+
+def _bulk_delete_query(user_id: str, cutoff: datetime) -> Dict[str, Any]:
+    # Invoices created after the request are not part of the bulk delete
+    return {"user_id": user_id, **NOT_DELETED, "created_at": {"$lte": cutoff}}
+
+
+@change_seq_scope()
+async def soft_delete_chunk(user_id: str, cutoff: datetime) -> Tuple[int, int]:
+    """Soft-delete up to one chunk of the user's invoices; returns (found, deleted)"""
+    docs = await db.invoices.find(
+        _bulk_delete_query(user_id, cutoff), {**STATS_FIELDS, "id": 1, "items_external": 1}
+    ).limit(BULK_DELETE_CHUNK_SIZE).to_list(BULK_DELETE_CHUNK_SIZE)
+    if not docs:
+        return 0, 0
+    invoice_ids = [doc["id"] for doc in docs]
+
+    # Tombstones first: if we die before the update, a retry re-selects these
+    # invoices and a duplicate tombstone is harmless; the reverse would hide
+    # the deletion from change feed clients
+    last_seq = await next_change_seq(user_id, len(invoice_ids))
+    first_seq = last_seq - len(invoice_ids) + 1
+    # At the millisecond precision MongoDB stores, so it can be matched below
+    now = datetime.utcnow()
+    deleted_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    await db.invoice_tombstones.insert_many([
+        {"id": invoice_id, "user_id": user_id, "updated_seq": first_seq + i, "deleted_at": deleted_at}
+        for i, invoice_id in enumerate(invoice_ids)
+    ])
+    result = await db.invoices.update_many(
+        {"user_id": user_id, "id": {"$in": invoice_ids}, **NOT_DELETED},
+        {"$set": {"deleted_at": deleted_at, "updated_at": deleted_at}, "$inc": {"version": 1}}
+    )
+    if result.modified_count < len(docs):
+        # Some were deleted (e.g. one by one) since the find: only count the
+        # ones this chunk stamped, or analytics would subtract them twice
+        stamped = {
+            doc["id"] async for doc in db.invoices.find(
+                {"user_id": user_id, "id": {"$in": invoice_ids}, "deleted_at": deleted_at}, {"_id": 0, "id": 1}
+            )
+        }
+        docs = [doc for doc in docs if doc["id"] in stamped]
+    await mark_lines_deleted(user_id, [doc["id"] for doc in docs if doc.get("items_external")], deleted_at)
+    await record_invoice_changes(user_id, [(doc, None) for doc in docs])
+    for invoice_id in invoice_ids:
+        await invoice_cache.invalidate(user_id, invoice_id)
+    return len(docs), result.modified_count
+
+
+async def count_bulk_delete(user_id: str, cutoff: datetime) -> int:
+    return await db.invoices.count_documents(_bulk_delete_query(user_id, cutoff))
+
+
+async def enqueue_bulk_delete(user_id: str, cutoff: datetime, total: int) -> Dict[str, Any]:
+    return await job_queue.enqueue("bulk_delete", user_id, {"cutoff": cutoff, "total": total})
+
+
+async def run_bulk_delete_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    user_id = job["user_id"]
+    payload = job["payload"]
+    # A retried job continues the count from its last progress report
+    deleted = (job.get("progress") or {}).get("deleted", 0)
+    while True:
+        found, chunk_deleted = await soft_delete_chunk(user_id, payload["cutoff"])
+        if not found:
+            break
+        deleted += chunk_deleted
+        await report_progress({"deleted": deleted, "total": payload["total"]})
+        await asyncio.sleep(BULK_DELETE_PAUSE_SECONDS)
+    return {"deleted_count": deleted}
+
+
+job_queue.register("bulk_delete", run_bulk_delete_job)
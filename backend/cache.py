@@ -0,0 +1,275 @@
+"""
+Read-through entity cache for InvoiceForge.
+
+Lookups go to the cache first and fall back to MongoDB on a miss; write
+paths push the new state (or an invalidation) so readers never see stale
+data from this process. The in-process backend is the default. Set
+``CACHE_BACKEND=redis`` (and ``CACHE_REDIS_URL``) to share entries and
+invalidations between workers.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Per-entity TTL (seconds) and in-process size limit (entries)
+CACHE_SETTINGS = {
+    "business": {"ttl": 600, "max_entries": 1000},
+    "customer": {"ttl": 300, "max_entries": 10000},
+    "invoice": {"ttl": 120, "max_entries": 10000},
+}
+
+
+class CacheBackend:
+    """Storage interface for cached entities (JSON-compatible dicts)"""
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        raise NotImplementedError
+
+    async def set_many(self, values: Dict[str, Dict[str, Any]], ttl: int):
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+    async def close(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Bounded in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared backend for multi-worker deployments (requires the redis package)"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        if not keys:
+            return []
+        return [json.loads(raw) if raw is not None else None for raw in await self._redis.mget(keys)]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        await self._redis.set(key, json.dumps(value), ex=ttl)
+
+    async def set_many(self, values: Dict[str, Dict[str, Any]], ttl: int):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, json.dumps(value), ex=ttl)
+            await pipe.execute()
+
+    async def delete(self, key: str):
+        await self._redis.delete(key)
+
+    async def delete_prefix(self, prefix: str):
+        batch = []
+        async for key in self._redis.scan_iter(match=f"{prefix}*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await self._redis.delete(*batch)
+                batch = []
+        if batch:
+            await self._redis.delete(*batch)
+
+    async def close(self):
+        await self._redis.close()
+
+
+_shared_backend: Optional[CacheBackend] = None
+
+
+def create_cache_backend(max_entries: int) -> CacheBackend:
+    """Build the configured backend; the shared backend is created once and reused"""
+    global _shared_backend
+    backend_name = os.environ.get("CACHE_BACKEND", "memory").lower()
+    if backend_name == "memory":
+        return MemoryCacheBackend(max_entries)
+    if backend_name == "redis":
+        if _shared_backend is None:
+            _shared_backend = RedisCacheBackend(os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        return _shared_backend
+    raise RuntimeError(f"Unknown CACHE_BACKEND: {backend_name}")
+
+
+class EntityCache:
+    """Read-through cache for one entity type, keyed by owner and entity id"""
+
+    def __init__(self, name: str, model: Type[BaseModel], backend: CacheBackend, ttl: int):
+        self.name = name
+        self.model = model
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, user_id: str, entity_id: str) -> str:
+        return f"{self.name}:{user_id}:{entity_id}"
+
+    async def get(self, user_id: str, entity_id: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[BaseModel]:
+        """Return the cached entity, loading and caching it on a miss"""
+        key = self._key(user_id, entity_id)
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache read failed for {key}: {e}")
+            cached = None
+        if cached is not None:
+            self.hits += 1
+            return self.model(**cached)
+
+        self.misses += 1
+        document = await loader()
+        if document is None:
+            return None
+        entity = self.model(**document)
+        await self._store(key, entity)
+        return entity
+
+    async def get_many(
+        self, user_id: str, entity_ids: List[str], loader: Callable[[List[str]], Awaitable[List[dict]]]
+    ) -> Dict[str, BaseModel]:
+        """Cached entities by id; the misses are loaded with one loader call and cached"""
+        keys = [self._key(user_id, entity_id) for entity_id in entity_ids]
+        try:
+            cached = await self.backend.get_many(keys)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache read failed for {len(keys)} {self.name} entries: {e}")
+            cached = [None] * len(keys)
+
+        found = {}
+        missing = []
+        for entity_id, value in zip(entity_ids, cached):
+            if value is not None:
+                found[entity_id] = self.model(**value)
+            else:
+                missing.append(entity_id)
+        self.hits += len(found)
+        self.misses += len(missing)
+        if not missing:
+            return found
+
+        loaded = {document["id"]: self.model(**document) for document in await loader(missing)}
+        try:
+            await self.backend.set_many(
+                {self._key(user_id, entity_id): entity.model_dump(mode="json") for entity_id, entity in loaded.items()},
+                self.ttl
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache write failed for {len(loaded)} {self.name} entries: {e}")
+        found.update(loaded)
+        return found
+
+    async def put(self, user_id: str, entity: BaseModel):
+        """Write-through: cache the entity state just written to the database"""
+        await self._store(self._key(user_id, entity.id), entity)
+
+    async def invalidate(self, user_id: str, entity_id: str):
+        try:
+            await self.backend.delete(self._key(user_id, entity_id))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache invalidation failed for {self.name} {entity_id}: {e}")
+
+    async def invalidate_user(self, user_id: str):
+        """Drop every cached entity of this type owned by the user"""
+        try:
+            await self.backend.delete_prefix(f"{self.name}:{user_id}:")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache invalidation failed for {self.name} of user {user_id}: {e}")
+
+    async def _store(self, key: str, entity: BaseModel):
+        try:
+            await self.backend.set(key, entity.model_dump(mode="json"), self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": self.backend.size(),
+            "ttl": self.ttl,
+        }
+
+
+def create_entity_cache(name: str, model: Type[BaseModel]) -> EntityCache:
+    settings = CACHE_SETTINGS[name]
+    return EntityCache(name, model, create_cache_backend(settings["max_entries"]), settings["ttl"])
+
+
+async def close_cache_backends(*caches: EntityCache):
+    closed = set()
+    for cache in caches:
+        if id(cache.backend) not in closed:
+            closed.add(id(cache.backend))
+            await cache.backend.close()
@@ -0,0 +1,156 @@
+"""
+Per-user invoice change feed positions and tokens.
+
+Every invoice write takes a position from the user's counter
+(next_change_seq) before it commits, so positions can commit out of
+order. The counter also lists the positions whose writes are still in
+flight, from allocation until the change_seq_scope around the write exits,
+and tokens never pass the lowest of them (settled_change_seq). This does
+not rely on clocks, except to expire the positions of a worker that died
+mid-write after CHANGES_PENDING_SECONDS.
+"""
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+CHANGES_PAGE_LIMIT = 500
+# A position still pending after this long belongs to a worker that died
+# before releasing it. Compared against the allocating worker's clock, so
+# skew between workers only matters for positions of dead workers
+CHANGES_PENDING_SECONDS = 300
+
+
+class _Allocations(list):
+    """(user_id, first position) of each allocation made in one change_seq_scope"""
+
+    closed = False
+
+    async def release(self):
+        while self:
+            user_id, first = self.pop()
+            await db.counters.update_one(
+                {"_id": _counter_id(user_id)},
+                {"$pull": {"pending": {"first": first}}, "$inc": {"rev": 1}}
+            )
+
+
+_scope: ContextVar[Optional[_Allocations]] = ContextVar("change_seq_scope", default=None)
+
+
+def _counter_id(user_id: str) -> str:
+    return f"invoice_changes:{user_id}"
+
+
+@asynccontextmanager
+async def change_seq_scope():
+    """Positions allocated inside the block stay pending until it exits.
+
+    Wrap the writes that use them, so that by the time the block exits
+    they have committed (or failed). Requests run in one scope
+    (ChangeSeqScopeMiddleware); background work opens its own.
+    """
+    allocations = _Allocations()
+    token = _scope.set(allocations)
+    try:
+        yield allocations
+    finally:
+        allocations.closed = True
+        _scope.reset(token)
+        await allocations.release()
+
+
+async def next_change_seq(user_id: str, count: int = 1) -> int:
+    """Allocate `count` change feed positions for a user and return the last one.
+
+    The positions are recorded as pending on the counter in the same
+    write, and released when the enclosing change_seq_scope exits.
+    """
+    allocations = _scope.get()
+    if allocations is None or allocations.closed:
+        raise RuntimeError("next_change_seq needs an open change_seq_scope")
+    counter_id = _counter_id(user_id)
+    while True:
+        counter = await db.counters.find_one({"_id": counter_id}) or {}
+        now = datetime.utcnow()
+        seq = counter.get("seq", 0)
+        pending = [entry for entry in counter.get("pending") or [] if entry["until"] > now]
+        pending.append({"first": seq + 1, "until": now + timedelta(seconds=CHANGES_PENDING_SECONDS)})
+        try:
+            # Compare-and-set on rev, which every change to the counter bumps
+            updated = await db.counters.find_one_and_update(
+                {"_id": counter_id, "rev": counter.get("rev")},
+                {"$set": {"seq": seq + count, "pending": pending, "rev": (counter.get("rev") or 0) + 1}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Changed since we read it (the upsert could not match): retry
+            continue
+        if updated is not None or not counter:
+            allocations.append((user_id, seq + 1))
+            return seq + count
+
+
+async def current_change_seq(user_id: str) -> int:
+    """Latest change feed position allocated for a user"""
+    counter = await db.counters.find_one({"_id": _counter_id(user_id)})
+    return counter["seq"] if counter else 0
+
+
+async def settled_change_seq(user_id: str) -> int:
+    """Feed position up to which every write has committed.
+
+    Positions are allocated before the write that uses them commits, so a
+    slower write can still land below the latest allocated position. The
+    counter lists the positions whose writes are still in flight; every
+    position below the lowest of them is settled.
+    """
+    counter = await db.counters.find_one({"_id": _counter_id(user_id)})
+    if not counter:
+        return 0
+    now = datetime.utcnow()
+    in_flight = [entry["first"] for entry in counter.get("pending") or [] if entry["until"] > now]
+    return min(in_flight) - 1 if in_flight else counter["seq"]
+
+
+class ChangeSeqScopeMiddleware:
+    """ASGI middleware running each request in a change_seq_scope.
+
+    The request's positions are released before its response starts, so
+    a client that reads the feed after a write sees it as settled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with change_seq_scope() as allocations:
+            async def send_after_release(message):
+                if message["type"] == "http.response.start":
+                    await allocations.release()
+                await send(message)
+            await self.app(scope, receive, send_after_release)
+
+
+def encode_change_token(seq: int) -> str:
+    return f"{seq}.{int(datetime.utcnow().timestamp())}"
+
+def decode_change_token(token: str) -> tuple:
+    """Split a change token into (seq, issued_at timestamp)"""
+    try:
+        seq, issued_at = token.split(".")
+        return int(seq), int(issued_at)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid change token"
+        )
@@ -0,0 +1,120 @@
+"""
+Currencies and exchange rates.
+
+Rates come from a local JSON table (``EXCHANGE_RATES_FILE``, by default
+``data/exchange_rates.json``) giving units of each currency per one unit
+of its ``base``. The table is parsed once and kept in memory; the file's
+modification time is checked at most every ``RATE_TABLE_CHECK_SECONDS``
+and the table reloaded when it changed. ``RateTable.convert_amounts``
+converts whole arrays at once (one rate lookup per distinct currency)
+for report totals.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY = os.environ.get("DEFAULT_CURRENCY", "USD").upper()
+EXCHANGE_RATES_FILE = Path(
+    os.environ.get("EXCHANGE_RATES_FILE", Path(__file__).parent / "data" / "exchange_rates.json")
+)
+RATE_TABLE_CHECK_SECONDS = 60
+
+CURRENCY_SYMBOLS = {"USD": "$", "INR": "₹", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+
+class UnknownCurrencyError(ValueError):
+    pass
+
+
+class RateTable:
+    """Exchange rates relative to one base currency"""
+
+    def __init__(self, base: str, rates: Dict[str, float], as_of: Optional[str] = None):
+        self.base = base
+        self.rates = {code.upper(): float(rate) for code, rate in rates.items()}
+        self.rates.setdefault(base, 1.0)
+        self.as_of = as_of
+        # Changes whenever the rates do; keys anything computed from them
+        self.version = hashlib.sha1(
+            json.dumps([base, self.rates, as_of], sort_keys=True).encode()
+        ).hexdigest()[:12]
+
+    def __contains__(self, currency: str) -> bool:
+        return currency in self.rates
+
+    def rate(self, currency: str) -> float:
+        try:
+            return self.rates[currency]
+        except KeyError:
+            raise UnknownCurrencyError(f"No exchange rate for {currency}") from None
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        if from_currency == to_currency:
+            return amount
+        return amount * self.rate(to_currency) / self.rate(from_currency)
+
+    def convert_amounts(self, amounts: Sequence[float], currencies: Sequence[str], to_currency: str):
+        """Convert `amounts[i]` from `currencies[i]` to `to_currency`; returns a numpy array"""
+        import numpy as np
+
+        amounts = np.asarray(amounts, dtype=float)
+        if len(amounts) == 0:
+            return amounts
+        codes, inverse = np.unique(np.asarray(currencies, dtype=str), return_inverse=True)
+        target = self.rate(to_currency)
+        factors = np.array([target / self.rate(code) for code in codes])
+        return amounts * factors[inverse]
+
+
+class RateTableStore:
+    """The rate table file, cached in memory and reloaded when it changes"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._table: Optional[RateTable] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def get(self) -> RateTable:
+        now = time.monotonic()
+        if self._table is not None and now - self._checked_at < RATE_TABLE_CHECK_SECONDS:
+            return self._table
+        self._checked_at = now
+        try:
+            mtime = self.path.stat().st_mtime
+            if mtime != self._mtime:
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                self._table = RateTable(data.get("base", DEFAULT_CURRENCY).upper(), data["rates"], data.get("as_of"))
+                self._mtime = mtime
+        except (OSError, ValueError, KeyError) as e:
+            if self._table is None:
+                raise
+            # Keep serving the last good table
+            logger.error(f"Could not reload exchange rates from {self.path}: {e}")
+        return self._table
+
+
+rate_tables = RateTableStore(EXCHANGE_RATES_FILE)
+
+
+def validate_currency(currency: str) -> str:
+    """Normalized currency code, or 400 if there is no rate for it"""
+    code = currency.strip().upper()
+    if code not in rate_tables.get():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported currency: {currency}")
+    return code
+
+
+def format_money(amount: float, currency: str) -> str:
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount:,.2f}" if symbol else f"{currency} {amount:,.2f}"
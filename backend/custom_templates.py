@@ -0,0 +1,141 @@
+"""
+Custom invoice templates generated from a user's business profile.
+
+A generated template is keyed by a hash of the profile fields it uses, so
+regenerating from an unchanged profile upserts the existing template
+instead of adding a copy. A new hash (the profile changed) gets the next
+per-user ``version``. Each user keeps at most ``CUSTOM_TEMPLATE_LIMIT``
+templates; the least recently generated ones are pruned. Logos and
+signatures live in the blob store (see blob_store.py) and templates only
+reference them by hash; listings also leave out the inline data URLs of
+templates generated before that.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+CUSTOM_TEMPLATE_LIMIT = int(os.environ.get("CUSTOM_TEMPLATE_LIMIT", "10"))
+
+# Profile fields copied into a generated template's business_data
+TEMPLATE_BUSINESS_FIELDS = [
+    "company_name", "email", "phone", "address", "city", "state",
+    "zip_code", "country", "website", "tax_id",
+]
+# Template fields derived from the profile; their hash identifies the template
+TEMPLATE_CONTENT_FIELDS = [
+    "name", "description", "color", "brand_color", "logo_hash", "signature_hash", "business_data", "features",
+]
+# Inline logo/signature data URLs on templates generated before the blob store
+TEMPLATE_LIST_PROJECTION = {"_id": 0, "logo_url": 0, "signature_url": 0}
+
+# Convert hex to color name for template system
+COLOR_NAMES = {
+    "#3B82F6": "blue",
+    "#8B5CF6": "purple",
+    "#10B981": "green",
+    "#EF4444": "red",
+    "#F59E0B": "orange",
+    "#6366F1": "indigo",
+    "#EC4899": "pink",
+    "#14B8A6": "teal"
+}
+
+
+def content_hash(template: Dict[str, Any]) -> str:
+    content = {field: template.get(field) for field in TEMPLATE_CONTENT_FIELDS}
+    payload = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def build_custom_template(profile: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Template document for a business profile (not yet saved)"""
+    brand_color = profile.get("brand_color", "#3B82F6")
+    company_name = profile.get("company_name")
+    features = ["Custom Branding", "Your Logo Included", "Brand Colors", "Business Information"]
+    if profile.get("signature_hash"):
+        features.append("Digital Signature")
+
+    template = {
+        "name": f"{company_name or 'Custom'} Business Template",
+        "category": "custom",
+        "description": f"Custom template generated for {company_name or 'your business'} with your branding",
+        "color": COLOR_NAMES.get(brand_color, "blue"),
+        "brand_color": brand_color,
+        "logo_hash": profile.get("logo_hash"),
+        "signature_hash": profile.get("signature_hash"),
+        "business_data": {field: profile.get(field, "") for field in TEMPLATE_BUSINESS_FIELDS},
+        "features": features,
+        "premium": False,
+        "corners": "minimal",
+        "style": "business",
+        "user_id": user_id,
+        "is_generated": True
+    }
+    template["content_hash"] = content_hash(template)
+    # Stable id: the same profile always maps to the same template
+    template["id"] = f"custom_{user_id}_{template['content_hash'][:16]}"
+    return template
+
+
+async def _next_template_version(user_id: str) -> int:
+    counter = await db.counters.find_one_and_update(
+        {"_id": f"custom_templates:{user_id}"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+
+async def save_custom_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """Upsert a generated template by content hash and return the stored document"""
+    user_id = template["user_id"]
+    key = {"user_id": user_id, "content_hash": template["content_hash"]}
+    now = datetime.utcnow().isoformat()
+
+    stored = await db.custom_templates.find_one_and_update(
+        key, {"$set": {"updated_at": now}}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if stored is None:
+        # New content: allocate a version only now, so regenerating never bumps it
+        version = await _next_template_version(user_id)
+        try:
+            await db.custom_templates.update_one(
+                key,
+                {
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {**template, "version": version, "created_at": now},
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent request inserted the same content first; its document wins
+            pass
+        stored = await db.custom_templates.find_one(key, {"_id": 0})
+        await prune_custom_templates(user_id)
+    return stored
+
+
+async def prune_custom_templates(user_id: str, limit: int = CUSTOM_TEMPLATE_LIMIT) -> int:
+    """Delete all but the `limit` most recently generated templates; returns the number deleted"""
+    stale = await db.custom_templates.find(
+        {"user_id": user_id}, {"_id": 1}
+    ).sort([("updated_at", -1), ("created_at", -1)]).skip(limit).to_list(None)
+    if not stale:
+        return 0
+    result = await db.custom_templates.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+    return result.deleted_count
+
+
+async def list_custom_templates(user_id: str, limit: int = CUSTOM_TEMPLATE_LIMIT) -> List[Dict[str, Any]]:
+    """A user's templates, most recently generated first, without heavy image fields"""
+    cursor = db.custom_templates.find({"user_id": user_id}, TEMPLATE_LIST_PROJECTION)
+    return await cursor.sort([("updated_at", -1), ("created_at", -1)]).to_list(limit)
@@ -0,0 +1,287 @@
+"""
+In-memory customer name index for resolving spoken/typed names to customers.
+
+Each tenant gets a trie of simplified name tokens built lazily from MongoDB
+on first lookup. Names are romanized (so "शर्मा" and "Sharma" meet), case
+and accent folded, and simplified phonetically (vowel length, aspiration
+and common transliteration variants collapse: "Sharmaa", "Sarma" and
+"Sharma" share the key "sarma"). A lookup walks the trie once per query
+token: exact phonetic keys are found directly, and only unmatched tokens
+fall back to a bounded Levenshtein walk, so typos and prefixes are matched
+without scanning every customer.
+
+Write paths call ``add``/``remove`` so the index tracks this process's
+writes; tenants are rebuilt after ``CUSTOMER_INDEX_TTL_SECONDS`` to pick up
+writes made by other workers.
+"""
+
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database import db
+from nlp import romanize
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_INDEX_TTL_SECONDS = 300
+CUSTOMER_INDEX_MAX_TENANTS = 1000
+MIN_CANDIDATE_SCORE = 0.5
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_EXPANSION = 50  # terminal tokens collected below a prefix match
+
+# Applied in order after romanizing and folding; collapses spellings that
+# sound alike in Indian English and common transliteration schemes. Rules
+# anchored at the end ($) only apply to complete words, not typed prefixes.
+PHONETIC_RULES = [
+    (re.compile(r"ee|ii|ie"), "i"),
+    (re.compile(r"ey$"), "i"),
+    (re.compile(r"oo|uu|ou"), "u"),
+    (re.compile(r"(.)\1+"), r"\1"),           # doubled letters
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"z"), "j"),
+    (re.compile(r"q|ck|c(?!h)"), "k"),
+    (re.compile(r"(?<=[bcdgjkpstr])h"), ""),  # aspiration: bh, kh, sh, th, ...
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def phonetic_key(token: str, complete: bool = True) -> str:
+    """Phonetic key of a word; `complete=False` keys a prefix of a word ("Shrey" of "Shreyas")"""
+    for pattern, replacement in PHONETIC_RULES:
+        if complete or not pattern.pattern.endswith("$"):
+            token = pattern.sub(replacement, token)
+    return token
+
+
+def name_words(name: str) -> List[str]:
+    """Romanized, case and accent folded words of a name"""
+    text = unicodedata.normalize("NFKD", romanize(name).casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text)
+
+
+def name_tokens(name: str) -> List[str]:
+    """Romanize, fold and phonetically simplify a name into match tokens"""
+    return [phonetic_key(word) for word in name_words(name)]
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Optional[set] = None  # customers with a token ending here
+
+
+class TenantNameIndex:
+    """Name index for one tenant's customers"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.customers: Dict[str, Tuple[str, List[str]]] = {}  # id -> (display name, tokens)
+        self.tokens: Dict[str, _TrieNode] = {}  # token -> its terminal trie node
+        self.built_at = time.monotonic()
+
+    def add(self, customer_id: str, name: str, business_name: Optional[str] = None):
+        if customer_id in self.customers:
+            self.remove(customer_id)
+        tokens = name_tokens(name)
+        for token in name_tokens(business_name or ""):
+            if token not in tokens:
+                tokens.append(token)
+        self.customers[customer_id] = (name, tokens)
+        for token in tokens:
+            node = self.root
+            for char in token:
+                node = node.children.setdefault(char, _TrieNode())
+            if node.ids is None:
+                node.ids = set()
+            node.ids.add(customer_id)
+            self.tokens[token] = node
+
+    def remove(self, customer_id: str):
+        entry = self.customers.pop(customer_id, None)
+        if entry is None:
+            return
+        for token in entry[1]:
+            path = [self.root]
+            for char in token:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                if path[-1].ids:
+                    path[-1].ids.discard(customer_id)
+                if not path[-1].ids:
+                    self.tokens.pop(token, None)
+                # Prune branches left without any token
+                for parent, char in zip(reversed(path[:-1]), reversed(token)):
+                    child = parent.children[char]
+                    if child.ids or child.children:
+                        break
+                    del parent.children[char]
+
+    def _match_token(self, token: str) -> Dict[str, float]:
+        """Similarity (0..1] of `token` to each customer having a close token"""
+        max_distance = 0 if len(token) <= 2 else 1 if len(token) <= 5 else 2
+        matches: Dict[str, float] = {}
+
+        def credit(ids: Iterable[str], score: float):
+            for customer_id in ids:
+                if score > matches.get(customer_id, 0.0):
+                    matches[customer_id] = score
+
+        exact = self.tokens.get(token)
+        if exact is not None:
+            # Fast path: the phonetic key is known, no need for edit distance
+            credit(exact.ids, 1.0)
+            if len(token) >= MIN_PREFIX_LENGTH:
+                self._credit_prefix(exact, len(token), credit)
+            return matches
+
+        # Levenshtein rows along the trie: row[i] = distance(prefix so far, token[:i])
+        first_row = list(range(len(token) + 1))
+        stack = [(self.root, "", first_row)]
+        while stack:
+            node, prefix, row = stack.pop()
+            if node.ids and row[-1] <= max_distance:
+                credit(node.ids, 1.0 - row[-1] / max(len(token), len(prefix)))
+            if row[-1] == 0 and len(token) >= MIN_PREFIX_LENGTH and node is not self.root:
+                # The query is a prefix of longer tokens ("Prad" -> "Pradeep")
+                self._credit_prefix(node, len(prefix), credit)
+            for char, child in node.children.items():
+                next_row = [row[0] + 1]
+                for i in range(1, len(token) + 1):
+                    next_row.append(min(
+                        next_row[i - 1] + 1,
+                        row[i] + 1,
+                        row[i - 1] + (token[i - 1] != char),
+                    ))
+                if min(next_row) <= max_distance:
+                    stack.append((child, prefix + char, next_row))
+        return matches
+
+    def _credit_prefix(self, node: _TrieNode, depth: int, credit):
+        stack = [(child, depth + 1) for child in node.children.values()]
+        found = 0
+        while stack and found < MAX_PREFIX_EXPANSION:
+            node, length = stack.pop()
+            if node.ids:
+                found += 1
+                credit(node.ids, 0.6 + 0.3 * depth / length)
+            stack.extend((child, length + 1) for child in node.children.values())
+
+    def search(self, name: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Rank customers by how well their name matches `name`"""
+        words = name_words(name)
+        if not words:
+            return []
+        query = list(dict.fromkeys(phonetic_key(word) for word in words))
+        # The last word may be only partly typed; match it as a prefix too
+        last, typed = phonetic_key(words[-1]), phonetic_key(words[-1], complete=False)
+        totals: Dict[str, float] = {}
+        for token in query:
+            matches = self._match_token(token)
+            if token == last and typed != last:
+                for customer_id, score in self._match_token(typed).items():
+                    matches[customer_id] = max(score, matches.get(customer_id, 0.0))
+            for customer_id, score in matches.items():
+                totals[customer_id] = totals.get(customer_id, 0.0) + score
+
+        candidates = []
+        for customer_id, total in totals.items():
+            display_name, tokens = self.customers[customer_id]
+            # Every query token should match; unmatched customer tokens cost a little
+            score = total / len(query) * (0.9 + 0.1 * min(1.0, len(query) / len(tokens)))
+            if score >= MIN_CANDIDATE_SCORE:
+                candidates.append({"customer_id": customer_id, "name": display_name, "score": round(score, 3)})
+        candidates.sort(key=lambda candidate: (-candidate["score"], candidate["name"]))
+        return candidates[:limit]
+
+
+class CustomerNameIndex:
+    """Per-tenant name indexes, built on demand and bounded by CUSTOMER_INDEX_MAX_TENANTS"""
+
+    def __init__(self, ttl: int = CUSTOMER_INDEX_TTL_SECONDS, max_tenants: int = CUSTOMER_INDEX_MAX_TENANTS):
+        self.ttl = ttl
+        self.max_tenants = max_tenants
+        self._tenants: "OrderedDict[str, TenantNameIndex]" = OrderedDict()
+        self._building: Dict[str, Tuple[asyncio.Future, TenantNameIndex]] = {}
+
+    async def _tenant(self, user_id: str) -> TenantNameIndex:
+        index = self._tenants.get(user_id)
+        if index is not None and time.monotonic() - index.built_at < self.ttl:
+            self._tenants.move_to_end(user_id)
+            return index
+        # One build per tenant at a time; concurrent lookups wait for it
+        building = self._building.get(user_id)
+        if building is not None:
+            return await asyncio.shield(building[0])
+        future = asyncio.get_running_loop().create_future()
+        index = TenantNameIndex()
+        # Registered before loading so writes made meanwhile are not lost
+        self._building[user_id] = (future, index)
+        try:
+            cursor = db.customers.find({"user_id": user_id}, {"_id": 0, "id": 1, "name": 1, "business_name": 1})
+            async for customer in cursor:
+                index.add(customer["id"], customer["name"], customer.get("business_name"))
+            self._tenants[user_id] = index
+            self._tenants.move_to_end(user_id)
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+            future.set_result(index)
+            return index
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._building[user_id]
+
+    async def search(self, user_id: str, name: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Ranked candidate customers for a name; an empty list if the index is unavailable"""
+        if not name or not name.strip():
+            return []
+        try:
+            index = await self._tenant(user_id)
+        except Exception as e:
+            logger.warning(f"Customer name index unavailable for user {user_id}: {e}")
+            return []
+        return index.search(name, limit)
+
+    def add(self, user_id: str, customer_id: str, name: str, business_name: Optional[str] = None):
+        """Index a created/renamed customer (a no-op for tenants not loaded yet)"""
+        for index in self._loaded(user_id):
+            index.add(customer_id, name, business_name)
+
+    def remove(self, user_id: str, customer_id: str):
+        for index in self._loaded(user_id):
+            index.remove(customer_id)
+
+    def _loaded(self, user_id: str) -> List[TenantNameIndex]:
+        indexes = [self._tenants[user_id]] if user_id in self._tenants else []
+        if user_id in self._building:
+            indexes.append(self._building[user_id][1])
+        return indexes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tenants": len(self._tenants),
+            "customers": sum(len(index.customers) for index in self._tenants.values()),
+            "ttl": self.ttl,
+        }
+
+
+customer_index = CustomerNameIndex()
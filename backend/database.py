@@ -0,0 +1,150 @@
+"""
+Database access for InvoiceForge.
+
+Handlers use `db.<collection>` with Motor's API. STORAGE_BACKEND picks what
+is behind it: "mongo" (MongoDB through Motor, MONGO_URL and DB_NAME) or
+"sqlite" (the embedded backend in embedded_store.py, on SQLITE_PATH or
+":memory:"). Without STORAGE_BACKEND, MongoDB is used when MONGO_URL is
+set and SQLite otherwise, so a single-node install needs no database server.
+
+The client is created on first use rather than at import, so importing
+the app (workers, tests, tooling) does not require a database.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from cache import create_entity_cache
+from models import BusinessInfo, Customer, Invoice
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+STORAGE_BACKEND = (os.environ.get("STORAGE_BACKEND") or ("mongo" if os.environ.get("MONGO_URL") else "sqlite")).lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", str(ROOT_DIR / "invoiceforge.db"))
+
+_client: Optional[AsyncIOMotorClient] = None
+_embedded = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Return the shared Motor client, connecting on first use"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    return _client
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """The Motor database, or the embedded database that stands in for it"""
+    global _embedded
+    if STORAGE_BACKEND == "sqlite":
+        if _embedded is None:
+            from embedded_store import EmbeddedDatabase
+            _embedded = EmbeddedDatabase(SQLITE_PATH)
+        return _embedded
+    if STORAGE_BACKEND != "mongo":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return get_client()[os.environ['DB_NAME']]
+
+
+def get_bucket(bucket_name: str):
+    """GridFS bucket for stored files"""
+    if STORAGE_BACKEND == "sqlite":
+        return get_database().bucket(bucket_name)
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=bucket_name)
+
+
+def close_client():
+    global _client, _embedded
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _embedded is not None:
+        _embedded.close()
+        _embedded = None
+
+
+class _LazyDatabase:
+    """Module-level `db` handle that resolves the database on attribute access"""
+
+    def __getattr__(self, name):
+        return getattr(get_database(), name)
+
+    def __getitem__(self, name):
+        return get_database()[name]
+
+
+db = _LazyDatabase()
+
+# Indexes backing the tenant-scoped queries. Every list view filters on
+# user_id first, so per-user cost depends only on that user's documents.
+TENANT_INDEXES = {
+    "businesses": [
+        [("id", 1)],
+        [("user_id", 1), ("created_at", -1)],
+    ],
+    "customers": [
+        [("id", 1)],
+        [("user_id", 1), ("created_at", -1)],
+    ],
+    "invoices": [
+        [("id", 1)],
+        [("user_id", 1), ("created_at", -1)],
+        [("user_id", 1), ("status", 1)],
+        [("user_id", 1), ("customer_id", 1)],
+        [("user_id", 1), ("updated_seq", 1)],
+        [("user_id", 1), ("issue_date", 1)],
+        [("user_id", 1), ("status", 1), ("due_date", 1)],
+    ],
+    "invoice_tombstones": [
+        [("user_id", 1), ("updated_seq", 1)],
+    ],
+    "business_profiles": [
+        [("user_id", 1)],
+    ],
+    "custom_templates": [
+        [("user_id", 1), ("created_at", -1)],
+        [("user_id", 1), ("updated_at", -1)],
+    ],
+    "ai_interactions": [
+        [("user_id", 1), ("created_at", -1)],
+    ],
+}
+
+# Deleted invoices are remembered this long; older change tokens force a full resync
+TOMBSTONE_TTL_SECONDS = 30 * 24 * 3600
+# Soft-deleted invoices can be restored until the TTL index purges them
+DELETED_INVOICE_RETENTION_SECONDS = TOMBSTONE_TTL_SECONDS
+# Filter for documents that are not soft-deleted (deleted_at missing or null)
+NOT_DELETED = {"deleted_at": None}
+
+async def ensure_indexes():
+    """Create the indexes used by tenant-scoped queries (idempotent)"""
+    for collection_name, indexes in TENANT_INDEXES.items():
+        for keys in indexes:
+            await db[collection_name].create_index(keys)
+    await db.users.create_index("id")
+    await db.users.create_index("email")
+    await db.invoice_tombstones.create_index("deleted_at", expireAfterSeconds=TOMBSTONE_TTL_SECONDS)
+    await db.invoices.create_index("deleted_at", expireAfterSeconds=DELETED_INVOICE_RETENTION_SECONDS)
+    # Buckets are per currency; the per-day index predates that
+    if "user_id_1_day_1" in await db.invoice_daily_stats.index_information():
+        await db.invoice_daily_stats.drop_index("user_id_1_day_1")
+    await db.invoice_daily_stats.create_index([("user_id", 1), ("day", 1), ("currency", 1)], unique=True)
+    # Templates generated before content hashing have none and are left out
+    await db.custom_templates.create_index(
+        [("user_id", 1), ("content_hash", 1)],
+        unique=True,
+        partialFilterExpression={"content_hash": {"$exists": True}}
+    )
+
+# Read-through caches for single-entity lookups
+business_cache = create_entity_cache("business", BusinessInfo)
+customer_cache = create_entity_cache("customer", Customer)
+invoice_cache = create_entity_cache("invoice", Invoice)
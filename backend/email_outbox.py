@@ -0,0 +1,415 @@
+"""
+Outgoing invoice email.
+
+Messages are queued as documents in ``email_outbox`` and delivered by
+``EmailOutbox``, a pool of EMAIL_WORKERS tasks per process. As in the job
+queue, workers claim a message with a lease, so queued mail survives a
+restart and a message whose worker died is claimed again.
+
+Workers share an ``SMTPConnectionPool``: a connection stays open across
+messages (up to SMTP_MAX_MESSAGES_PER_CONNECTION) instead of one handshake
+per mail, and sends are paced by a token bucket (EMAIL_RATE_PER_SECOND,
+shared between workers with RATE_LIMIT_BACKEND=redis). Temporary failures
+(4xx replies, dropped connections) are retried with exponential backoff;
+permanent ones (5xx) fail the message at once. Each invoice keeps the
+status of its latest email in ``email_status``; like any invoice write, a
+change to it bumps the invoice's version and change feed position.
+
+To try it without sending real mail, point SMTP_HOST/SMTP_PORT at a local
+stand-in such as ``python -m aiosmtpd -n -l localhost:1025``.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import make_msgid
+from typing import Any, Dict, List, Optional
+
+from email_validator import EmailNotValidError, validate_email
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument, UpdateOne
+
+from analytics import record_invoice_change
+from change_feed import change_seq_scope, next_change_seq
+from database import db, invoice_cache, NOT_DELETED
+from rate_limit import get_rate_limit_store
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "25"))
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_SECURITY = os.environ.get("SMTP_SECURITY", "none").lower()  # none, starttls or ssl
+SMTP_TIMEOUT_SECONDS = 30
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+# Servers drop idle sessions; older idle connections are closed instead of reused
+SMTP_IDLE_SECONDS = 30
+
+EMAIL_FROM = os.environ.get("EMAIL_FROM", "InvoiceForge <no-reply@localhost>")
+EMAIL_WORKERS = int(os.environ.get("EMAIL_WORKERS", "4"))
+EMAIL_RATE_PER_SECOND = float(os.environ.get("EMAIL_RATE_PER_SECOND", "10"))
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_LEASE_SECONDS = 120
+EMAIL_POLL_INTERVAL_SECONDS = 2.0
+EMAIL_RETENTION_SECONDS = 30 * 24 * 3600
+EMAIL_BULK_LIMIT = 5000
+
+# Terminal states
+FINISHED_EMAIL_STATUSES = ("sent", "failed")
+# Outbox fields returned by the status endpoints
+EMAIL_STATUS_PROJECTION = {"_id": 0, "body": 0, "lease_expires_at": 0, "expires_at": 0}
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+# Errors after which the session is still usable
+MESSAGE_REFUSED = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+
+def parse_recipients(value: Optional[str]) -> List[str]:
+    """Addresses from a comma- or semicolon-separated list; 400 if one is invalid"""
+    recipients = []
+    for address in re.split(r"[,;]", value or ""):
+        address = address.strip()
+        if not address:
+            continue
+        try:
+            recipients.append(validate_email(address, check_deliverability=False).normalized)
+        except EmailNotValidError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid email address: {address}")
+    return recipients
+
+
+def render_template(text: str, variables: Dict[str, Any]) -> str:
+    """Fill {placeholders}; unknown ones are left as written"""
+    return _PLACEHOLDER.sub(lambda match: str(variables.get(match.group(1), match.group(0))), text)
+
+
+def build_message(message: Dict[str, Any]) -> EmailMessage:
+    mime = EmailMessage()
+    mime["From"] = EMAIL_FROM
+    mime["To"] = ", ".join(message["to"])
+    if message.get("cc"):
+        mime["Cc"] = ", ".join(message["cc"])
+    if message.get("reply_to"):
+        mime["Reply-To"] = message["reply_to"]
+    mime["Subject"] = message["subject"]
+    mime["Message-ID"] = make_msgid(idstring=message["id"])
+    mime.set_content(message["body"])
+    return mime
+
+
+class _SMTPConnection:
+    """One open SMTP session"""
+
+    def __init__(self):
+        if SMTP_SECURITY == "ssl":
+            self.smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        else:
+            self.smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+            if SMTP_SECURITY == "starttls":
+                self.smtp.starttls()
+        if SMTP_USERNAME:
+            self.smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def send(self, message: EmailMessage):
+        self.smtp.send_message(message)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPConnectionPool:
+    """Up to `size` SMTP sessions, reused across messages"""
+
+    def __init__(self, size: int = EMAIL_WORKERS):
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_SMTPConnection] = []
+        self.connections_opened = 0
+
+    async def _checkout(self) -> Optional[_SMTPConnection]:
+        while self._idle:
+            connection = self._idle.pop()
+            if time.monotonic() - connection.last_used < SMTP_IDLE_SECONDS:
+                return connection
+            await asyncio.to_thread(connection.close)
+        return None
+
+    async def _open(self) -> _SMTPConnection:
+        connection = await asyncio.to_thread(_SMTPConnection)
+        self.connections_opened += 1
+        return connection
+
+    async def _checkin(self, connection: _SMTPConnection):
+        if connection.sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            await asyncio.to_thread(connection.close)
+        else:
+            self._idle.append(connection)
+
+    async def _send_on(self, connection: _SMTPConnection, message: EmailMessage):
+        try:
+            await asyncio.to_thread(connection.send, message)
+        except MESSAGE_REFUSED:
+            # Only this message was refused; smtplib reset the session for the next one
+            await self._checkin(connection)
+            raise
+        except BaseException:
+            connection.smtp.close()
+            raise
+        await self._checkin(connection)
+
+    async def send(self, message: EmailMessage):
+        async with self._slots:
+            connection = await self._checkout()
+            if connection is not None:
+                try:
+                    await self._send_on(connection, message)
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    pass  # dropped while idle: retry once on a fresh session
+            await self._send_on(await self._open(), message)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await asyncio.to_thread(connection.close)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies and refused recipients will not succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return "; ".join(
+            f"{address} refused: {code} {reply.decode(errors='replace')}"
+            for address, (code, reply) in error.recipients.items()
+        )
+    if isinstance(error, smtplib.SMTPResponseException):
+        return f"{error.smtp_code} {error.smtp_error.decode(errors='replace') if isinstance(error.smtp_error, bytes) else error.smtp_error}"
+    return str(error) or type(error).__name__
+
+
+class EmailOutbox:
+    """Persistent outbox delivered by a bounded worker pool over pooled SMTP sessions"""
+
+    def __init__(self, workers: int = EMAIL_WORKERS, rate_per_second: float = EMAIL_RATE_PER_SECOND):
+        self.workers = workers
+        self.rate_per_second = rate_per_second
+        self.pool = SMTPConnectionPool(workers)
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def ensure_indexes(self):
+        await db.email_outbox.create_index("id")
+        await db.email_outbox.create_index([("status", 1), ("available_at", 1)])
+        await db.email_outbox.create_index([("user_id", 1), ("created_at", -1)])
+        await db.email_outbox.create_index([("user_id", 1), ("invoice_id", 1), ("created_at", -1)])
+        await db.email_outbox.create_index("expires_at", expireAfterSeconds=0)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Email outbox started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.pool.close()
+
+    async def enqueue(self, user_id: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Queue messages (each with invoice_id, to, cc, subject, body, mark_sent) in one write"""
+        now = datetime.utcnow()
+        docs = [{
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": EMAIL_MAX_ATTEMPTS,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "available_at": now,
+            "lease_expires_at": None,
+            "sent_at": None,
+            "expires_at": None,
+            **message,
+        } for message in messages]
+        if not docs:
+            return []
+        await db.email_outbox.insert_many([doc.copy() for doc in docs])
+        # A status change is an invoice write: new feed position and version
+        first_seq = await next_change_seq(user_id, len(docs)) - len(docs) + 1
+        await db.invoices.bulk_write([
+            UpdateOne(
+                {"id": doc["invoice_id"], "user_id": user_id},
+                {
+                    "$set": {"email_status": _email_status(doc), "updated_at": now, "updated_seq": first_seq + i},
+                    "$inc": {"version": 1}
+                }
+            )
+            for i, doc in enumerate(docs)
+        ], ordered=False)
+        for doc in docs:
+            await invoice_cache.invalidate(user_id, doc["invoice_id"])
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return docs
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await db.email_outbox.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    # Lease expired: the worker sending it is gone
+                    {"status": "sending", "lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "sending",
+                    "lease_expires_at": now + timedelta(seconds=EMAIL_LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                message = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email claim failed: {e}")
+                message = None
+            if message is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), EMAIL_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                # Shutting down: the message is re-claimed when its lease expires
+                raise
+            except Exception:
+                logger.exception(f"Email {message['id']} could not be processed")
+
+    async def _throttle(self):
+        store = get_rate_limit_store()
+        capacity = max(1, int(self.rate_per_second))
+        while True:
+            allowed, retry_after = await store.consume("email:outbox", 1, capacity, self.rate_per_second)
+            if allowed:
+                return
+            await asyncio.sleep(retry_after)
+
+    @change_seq_scope()
+    async def _deliver(self, message: Dict[str, Any]):
+        if message["attempts"] > message["max_attempts"]:
+            await self._set_status(message, "failed", error=message.get("error") or "Delivery was interrupted too many times")
+            return
+        await self._throttle()
+        try:
+            await self.pool.send(build_message(message))
+        except (smtplib.SMTPException, OSError) as e:
+            error = _describe(e)
+            if _is_permanent(e) or message["attempts"] >= message["max_attempts"]:
+                logger.warning(f"Email {message['id']} failed: {error}")
+                await self._set_status(message, "failed", error=error)
+                return
+            delay = 2 ** message["attempts"]
+            logger.warning(f"Email {message['id']} attempt {message['attempts']} failed, retrying in {delay}s: {error}")
+            await self._set_status(message, "queued", error=error, available_at=datetime.utcnow() + timedelta(seconds=delay))
+            return
+        await self._set_status(message, "sent", error=None, sent_at=datetime.utcnow())
+        if message.get("mark_sent"):
+            await _mark_invoice_sent(message["user_id"], message["invoice_id"])
+
+    async def _set_status(self, message: Dict[str, Any], new_status: str, **fields: Any):
+        now = datetime.utcnow()
+        changes = {"status": new_status, "updated_at": now, "lease_expires_at": None, **fields}
+        if new_status in FINISHED_EMAIL_STATUSES:
+            changes["expires_at"] = now + timedelta(seconds=EMAIL_RETENTION_SECONDS)
+        await db.email_outbox.update_one({"id": message["id"]}, {"$set": changes})
+        # Only the invoice's latest email reports its status there
+        await db.invoices.update_one(
+            {"id": message["invoice_id"], "user_id": message["user_id"], "email_status.message_id": message["id"]},
+            {
+                "$set": {
+                    "email_status": _email_status({**message, **changes}),
+                    "updated_at": now,
+                    "updated_seq": await next_change_seq(message["user_id"]),
+                },
+                "$inc": {"version": 1}
+            }
+        )
+        await invoice_cache.invalidate(message["user_id"], message["invoice_id"])
+
+
+def _email_status(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary of a message stored on its invoice"""
+    return {
+        "message_id": message["id"],
+        "status": message["status"],
+        "to": message["to"],
+        "attempts": message["attempts"],
+        "error": message["error"],
+        "updated_at": message["updated_at"],
+        "sent_at": message["sent_at"],
+    }
+
+
+async def _mark_invoice_sent(user_id: str, invoice_id: str):
+    """Move a draft invoice to sent once its email went out"""
+    changes = {"status": "sent", "updated_at": datetime.utcnow(), "updated_seq": await next_change_seq(user_id)}
+    before = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "user_id": user_id, "status": "draft", **NOT_DELETED},
+        {"$set": changes, "$inc": {"version": 1}}
+    )
+    if before is not None:
+        await record_invoice_change(user_id, before, {**before, **changes, "version": before.get("version", 0) + 1})
+        await invoice_cache.invalidate(user_id, invoice_id)
+
+
+def email_status(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of an outbox message"""
+    return {
+        "message_id": message["id"],
+        "invoice_id": message["invoice_id"],
+        "status": message["status"],
+        "to": message["to"],
+        "cc": message.get("cc", []),
+        "subject": message["subject"],
+        "attempts": message["attempts"],
+        "error": message["error"],
+        "created_at": message["created_at"],
+        "sent_at": message["sent_at"],
+    }
+
+
+email_outbox = EmailOutbox()
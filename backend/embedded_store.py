@@ -0,0 +1,1333 @@
+"""
+Embedded storage backend: the part of Motor's API the app uses, on SQLite.
+
+With STORAGE_BACKEND=sqlite the app runs without a MongoDB server, on a
+database file (SQLITE_PATH) or in memory (SQLITE_PATH=":memory:", for
+tests). The handlers keep calling `db.<collection>` exactly as with Motor;
+this module provides:
+
+- find / find_one with projections, sort, skip, limit, to_list and async iteration
+- insert_one / insert_many, update_one / update_many, find_one_and_update,
+  delete_one / delete_many, count_documents and bulk_write, with upserts
+  and the $set, $unset, $inc, $setOnInsert, $min, $max, $push, $addToSet
+  and $pull update operators
+- aggregate with $match, $group, $sort, $skip, $limit, $project,
+  $addFields/$set, $unset, $unwind, $count and $lookup (localField/foreignField)
+- create_index (compound, unique, partial and TTL), index_information, drop_index
+- a GridFS-style bucket for uploaded files
+
+Each collection is a table of JSON documents. An index is a SQLite index on
+json_extract() of its fields, and the parts of a filter on indexed fields
+(equality, $in, ranges, null checks) become SQL conditions, so the query
+planner walks the index like MongoDB would. Every row the SQL selects is
+then checked against the whole filter in Python, so results follow
+MongoDB's matching rules; when the SQL alone is exact, skip, limit and
+counts run in SQLite as well. Indexed fields are assumed to hold scalars
+(SQLite cannot index array elements).
+
+Unique indexes raise DuplicateKeyError (and BulkWriteError from the bulk
+calls) like MongoDB. TTL indexes are applied by deleting expired documents
+when the collection is used, at most once per TTL_SWEEP_SECONDS.
+
+Calls run synchronously on the event loop thread: an indexed SQLite lookup
+takes microseconds, less than handing it to a thread. Writes run in
+BEGIN IMMEDIATE transactions, so several worker processes can share one
+database file.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import operator
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+TTL_SWEEP_SECONDS = 60
+# Rows loaded per step while a cursor is iterated with `async for`
+ITERATION_BATCH_SIZE = 500
+SQLITE_BUSY_TIMEOUT_MS = 5000
+# Planner statistics are refreshed after this many inserts/deletes (or the table's size, if larger)
+ANALYZE_MIN_CHANGES = 1000
+# Rows sampled per index by ANALYZE
+ANALYZE_SAMPLE_ROWS = 1000
+
+INDEX_TABLE = "_storage_indexes"
+_FIELD_PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+_MISSING = object()
+
+
+# Documents <-> JSON
+def _default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # BSON dates have millisecond precision; the fixed width keeps the text in date order
+        return {"$date": value.replace(microsecond=value.microsecond // 1000 * 1000).isoformat(timespec="microseconds")}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$binary": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Cannot store values of type {type(value).__name__}")
+
+
+def _object_hook(obj):
+    if len(obj) == 1:
+        if "$date" in obj:
+            return datetime.fromisoformat(obj["$date"])
+        if "$oid" in obj:
+            return ObjectId(obj["$oid"])
+        if "$binary" in obj:
+            return base64.b64decode(obj["$binary"])
+    return obj
+
+
+def _encode(value) -> str:
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _decode(text: str):
+    return json.loads(text, object_hook=_object_hook)
+
+
+def _sql_value(value):
+    """What json_extract() returns for a stored `value`, or _MISSING if it has no SQL equivalent"""
+    if isinstance(value, bool):
+        return int(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (datetime, ObjectId)):
+        return _encode(value)
+    return _MISSING
+
+
+def _field_sql(path: str) -> str:
+    return f"json_extract(doc, '$.{path}')"
+
+
+def _check_path(path: str) -> str:
+    if not _FIELD_PATH.match(path):
+        raise ValueError(f"Unsupported field name {path!r}")
+    return path
+
+
+# Matching
+_TYPE_RANK = [
+    (bool, 8), ((int, float), 2), (str, 3), (dict, 4), (list, 5), ((bytes, bytearray), 6), (ObjectId, 7), (datetime, 9),
+]
+
+
+def _rank(value) -> int:
+    """BSON comparison order of the value's type (numbers compare with each other)"""
+    if value is None or value is _MISSING:
+        return 1
+    for types, rank in _TYPE_RANK:
+        if isinstance(value, types):
+            return rank
+    return 10
+
+
+def _sort_key(value):
+    rank = _rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if rank in (4, 5):
+        return (rank, _encode(value))
+    if rank == 7:
+        return (rank, str(value))
+    return (rank, value)
+
+
+def _equal(a, b) -> bool:
+    return _rank(a) == _rank(b) and (a == b or _rank(a) == 1)
+
+
+def _is_operators(condition) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith("$") for key in condition)
+
+
+def _lookup(value, parts: List[str]) -> List[Any]:
+    """Values at a dotted path; arrays on the way fan out as in MongoDB"""
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        return _lookup(value[parts[0]], parts[1:]) if parts[0] in value else [_MISSING]
+    if isinstance(value, list):
+        if parts[0].isdigit():
+            index = int(parts[0])
+            return _lookup(value[index], parts[1:]) if index < len(value) else [_MISSING]
+        found = [found for element in value if isinstance(element, dict) for found in _lookup(element, parts)]
+        return found or [_MISSING]
+    return [_MISSING]
+
+
+def _get(doc: Dict[str, Any], path: str):
+    """The value at a dotted path (first one when arrays fan out), or None"""
+    value = _lookup(doc, path.split("."))[0]
+    return None if value is _MISSING else value
+
+
+def _candidates(values: List[Any]) -> Iterator[Any]:
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _any_equal(values: List[Any], target) -> bool:
+    return any(_equal(value, target) for value in _candidates(values))
+
+
+_COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+_TYPE_NAMES = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: _rank(v) == 2,
+    "int": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "long": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "double": lambda v: isinstance(v, float),
+    "bool": lambda v: isinstance(v, bool),
+    "date": lambda v: isinstance(v, datetime),
+    "null": lambda v: v is None,
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "objectId": lambda v: isinstance(v, ObjectId),
+    "binData": lambda v: isinstance(v, (bytes, bytearray)),
+}
+
+
+def _operator_matches(values: List[Any], op: str, arg, condition: Dict[str, Any]) -> bool:
+    if op == "$eq":
+        return _any_equal(values, arg)
+    if op == "$ne":
+        return not _any_equal(values, arg)
+    if op == "$in":
+        return any(_any_equal(values, target) for target in arg)
+    if op == "$nin":
+        return not any(_any_equal(values, target) for target in arg)
+    if op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+        return any(
+            value is not _MISSING and _rank(value) == _rank(arg) and compare(_sort_key(value), _sort_key(arg))
+            for value in _candidates(values)
+        )
+    if op == "$exists":
+        return any(value is not _MISSING for value in values) == bool(arg)
+    if op == "$type":
+        checks = [_TYPE_NAMES[name] for name in (arg if isinstance(arg, list) else [arg])]
+        return any(value is not _MISSING and check(value) for value in _candidates(values) for check in checks)
+    if op == "$regex":
+        flags = sum(getattr(re, flag.upper(), 0) for flag in condition.get("$options", "") if flag in "imsx")
+        pattern = re.compile(arg, flags) if isinstance(arg, str) else arg
+        return any(isinstance(value, str) and pattern.search(value) for value in _candidates(values))
+    if op == "$options":
+        return True
+    if op == "$not":
+        return not _field_matches(values, arg)
+    if op == "$size":
+        return any(isinstance(value, list) and len(value) == arg for value in values)
+    if op == "$all":
+        return all(_any_equal(values, target) for target in arg)
+    if op == "$elemMatch":
+        return any(
+            isinstance(value, list) and any(
+                _matches(element, arg) if isinstance(element, dict) and not _is_operators(arg)
+                else _field_matches([element], arg)
+                for element in value
+            )
+            for value in values
+        )
+    raise NotImplementedError(f"Unsupported query operator {op}")
+
+
+def _field_matches(values: List[Any], condition) -> bool:
+    if _is_operators(condition):
+        return all(_operator_matches(values, op, arg, condition) for op, arg in condition.items())
+    return _any_equal(values, condition)
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$nor":
+            if any(_matches(doc, sub) for sub in condition):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(f"Unsupported query operator {key}")
+        elif not _field_matches(_lookup(doc, key.split(".")), condition):
+            return False
+    return True
+
+
+class _Where:
+    """SQL conditions selecting a superset of the documents a filter matches.
+
+    `exact` stays true while nothing was left for the Python matcher.
+    With `inline` the values are written into the SQL (partial index
+    definitions cannot take parameters).
+    """
+
+    def __init__(self, indexed: set, inline: bool = False):
+        self.indexed = indexed
+        self.inline = inline
+        self.params: List[Any] = []
+        self.exact = True
+
+    def param(self, value) -> str:
+        if not self.inline:
+            self.params.append(value)
+            return "?"
+        if isinstance(value, str):
+            return "'" + value.replace("'", "''") + "'"
+        return repr(value)
+
+    def query(self, query: Dict[str, Any]) -> List[str]:
+        clauses = []
+        for key, condition in query.items():
+            if key == "$and":
+                for sub in condition:
+                    clauses += self.query(sub)
+            elif key == "$or":
+                clause = self.any_of(condition)
+                if clause is None:
+                    self.exact = False
+                else:
+                    clauses.append(clause)
+            elif key.startswith("$") or (key != "_id" and key not in self.indexed):
+                self.exact = False
+            else:
+                ops = condition if _is_operators(condition) else {"$eq": condition}
+                for op, arg in ops.items():
+                    mark = len(self.params)
+                    clause = self.operator(key, op, arg)
+                    if clause is None:
+                        del self.params[mark:]
+                        self.exact = False
+                    else:
+                        clauses.append(clause)
+        return clauses
+
+    def any_of(self, branches: List[Dict[str, Any]]) -> Optional[str]:
+        mark = len(self.params)
+        parts = []
+        for branch in branches:
+            clauses = self.query(branch)
+            if not clauses:
+                del self.params[mark:]
+                return None
+            parts.append(" AND ".join(clauses))
+        return "(" + " OR ".join(f"({part})" for part in parts) + ")"
+
+    def operator(self, field: str, op: str, arg) -> Optional[str]:
+        if field == "_id":
+            if op == "$eq":
+                return f"key = {self.param(_encode(arg))}"
+            if op == "$in":
+                return f"key IN ({', '.join(self.param(_encode(value)) for value in arg)})" if arg else "0"
+            return None
+        expr = _field_sql(field)
+        if op == "$eq":
+            value = _sql_value(arg)
+            if value is _MISSING:
+                return None
+            if isinstance(arg, bool):
+                self.exact = False  # true and 1 look the same to SQLite
+            return f"{expr} IS NULL" if value is None else f"{expr} = {self.param(value)}"
+        if op == "$in":
+            values = [_sql_value(value) for value in arg]
+            if any(value is _MISSING for value in values):
+                return None
+            if any(isinstance(value, bool) for value in arg):
+                self.exact = False
+            present = [value for value in values if value is not None]
+            parts = [f"{expr} IN ({', '.join(self.param(value) for value in present)})"] if present else []
+            if len(present) < len(values):
+                parts.append(f"{expr} IS NULL")
+            return "(" + " OR ".join(parts) + ")" if len(parts) > 1 else (parts[0] if parts else "0")
+        if op in _COMPARISONS:
+            value = _sql_value(arg)
+            if value is _MISSING or value is None:
+                return None
+            # SQLite also orders values of other types against it
+            self.exact = False
+            sql_op = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+            return f"{expr} {sql_op} {self.param(value)}"
+        if op == "$ne" and arg is None:
+            return f"{expr} IS NOT NULL"
+        if op == "$exists":
+            return f"json_type(doc, '$.{field}') IS {'NOT ' if arg else ''}NULL"
+        if op == "$type" and arg == "string":
+            return f"json_type(doc, '$.{field}') = 'text'"
+        return None
+
+
+# Updates
+def _path_parent(doc, path: str, create: bool):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            index = int(part)
+            if index >= len(target):
+                return None, None
+            target = target[index]
+        elif isinstance(target, dict):
+            if part not in target or not isinstance(target[part], (dict, list)):
+                if not create:
+                    return None, None
+                target[part] = {}
+            target = target[part]
+        else:
+            return None, None
+    return target, parts[-1]
+
+
+def _set_path(doc, path: str, value):
+    parent, key = _path_parent(doc, path, create=True)
+    if isinstance(parent, list) and key.isdigit():
+        index = int(key)
+        parent.extend([None] * (index + 1 - len(parent)))
+        parent[index] = value
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise ValueError(f"Cannot set {path}")
+
+
+def _unset_path(doc, path: str):
+    parent, key = _path_parent(doc, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+    elif isinstance(parent, list) and key.isdigit() and int(key) < len(parent):
+        parent[int(key)] = None
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool) -> Dict[str, Any]:
+    if not _is_operators(update):
+        raise ValueError("update only works with $ operators")
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, arg in fields.items():
+            current = _get(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                _set_path(doc, path, arg)
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (current or 0) + arg)
+            elif op in ("$min", "$max"):
+                keep_current = _sort_key(current) <= _sort_key(arg) if op == "$min" else _sort_key(current) >= _sort_key(arg)
+                if current is None or not keep_current:
+                    _set_path(doc, path, arg)
+            elif op in ("$push", "$addToSet"):
+                values = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                items = list(current or [])
+                for value in values:
+                    if op == "$push" or not any(_equal(item, value) for item in items):
+                        items.append(value)
+                _set_path(doc, path, items)
+            elif op == "$pull":
+                _set_path(doc, path, [
+                    item for item in current or []
+                    if not (_matches(item, arg) if isinstance(arg, dict) and not _is_operators(arg)
+                            else _field_matches([item], arg))
+                ])
+            else:
+                raise NotImplementedError(f"Unsupported update operator {op}")
+    return doc
+
+
+def _upsert_document(query: Dict[str, Any]) -> Dict[str, Any]:
+    """The new document an upsert starts from: the filter's equality fields"""
+    doc: Dict[str, Any] = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for sub in condition:
+                doc.update(_upsert_document(sub))
+        elif key.startswith("$"):
+            continue
+        elif not _is_operators(condition):
+            _set_path(doc, key, condition)
+        elif "$eq" in condition:
+            _set_path(doc, key, condition["$eq"])
+    return doc
+
+
+# Projections
+def _include(source: Dict[str, Any], target: Dict[str, Any], parts: List[str]):
+    key = parts[0]
+    if key not in source:
+        return
+    value = source[key]
+    if len(parts) == 1:
+        target[key] = value
+    elif isinstance(value, dict):
+        _include(value, target.setdefault(key, {}), parts[1:])
+    elif isinstance(value, list):
+        elements = [element for element in value if isinstance(element, dict)]
+        projected = target.setdefault(key, [{} for _ in elements])
+        for element, out in zip(elements, projected):
+            _include(element, out, parts[1:])
+
+
+def _project(doc: Dict[str, Any], projection) -> Dict[str, Any]:
+    if projection is None:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    fields = {field: value for field, value in projection.items() if field != "_id"}
+    if any(isinstance(value, dict) for value in fields.values()):
+        raise NotImplementedError("Projection operators are not supported")
+    keep_id = bool(projection.get("_id", 1))
+    if any(fields.values()) or (not fields and "_id" in projection and keep_id):
+        result = {"_id": doc["_id"]} if keep_id and "_id" in doc else {}
+        for field in fields:
+            _include(doc, result, field.split("."))
+        return result
+    for field in fields:
+        _unset_path(doc, field)
+    if not keep_id:
+        doc.pop("_id", None)
+    return doc
+
+
+# Aggregation
+def _field_value(value, parts: List[str]):
+    """A "$field.path" in an expression: arrays on the way map to arrays of their elements' values"""
+    for i, part in enumerate(parts):
+        if isinstance(value, list):
+            found = (_field_value(element, parts[i:]) for element in value if isinstance(element, dict))
+            return [item for item in found if item is not _MISSING]
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _evaluate(expr, doc: Dict[str, Any]):
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            if expr == "$$ROOT":
+                return doc
+            raise NotImplementedError(f"Unsupported variable {expr}")
+        if not expr.startswith("$"):
+            return expr
+        value = _field_value(doc, expr[1:].split("."))
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [_evaluate(item, doc) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1 and next(iter(expr)).startswith("$"):
+        op, arg = next(iter(expr.items()))
+        return _expression(op, arg, doc)
+    return {key: _evaluate(value, doc) for key, value in expr.items()}
+
+
+def _truthy(value) -> bool:
+    return value not in (None, False, 0) and value is not _MISSING
+
+
+def _expression(op: str, arg, doc: Dict[str, Any]):
+    if op == "$literal":
+        return arg
+    if op == "$cond":
+        if isinstance(arg, dict):
+            arg = [arg["if"], arg["then"], arg["else"]]
+        return _evaluate(arg[1] if _truthy(_evaluate(arg[0], doc)) else arg[2], doc)
+    if op == "$switch":
+        for branch in arg["branches"]:
+            if _truthy(_evaluate(branch["case"], doc)):
+                return _evaluate(branch["then"], doc)
+        if "default" not in arg:
+            raise ValueError("$switch found no matching branch and has no default")
+        return _evaluate(arg["default"], doc)
+    if op == "$and":
+        return all(_truthy(_evaluate(item, doc)) for item in arg)
+    if op == "$or":
+        return any(_truthy(_evaluate(item, doc)) for item in arg)
+    values = _evaluate(arg if isinstance(arg, list) else [arg], doc)
+    if op == "$ifNull":
+        return next((value for value in values if value is not None), None)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$cmp"):
+        left, right = (_sort_key(value) for value in values)
+        result = (left > right) - (left < right)
+        return {
+            "$eq": result == 0, "$ne": result != 0, "$gt": result > 0, "$gte": result >= 0,
+            "$lt": result < 0, "$lte": result <= 0, "$cmp": result,
+        }[op]
+    if op in ("$add", "$subtract", "$multiply", "$divide"):
+        if any(value is None for value in values):
+            return None
+        if op == "$add":
+            return sum(values)
+        if op == "$multiply":
+            result = 1
+            for value in values:
+                result *= value
+            return result
+        return values[0] - values[1] if op == "$subtract" else values[0] / values[1]
+    if op == "$concat":
+        return None if any(value is None for value in values) else "".join(values)
+    if op in ("$toLower", "$toUpper"):
+        return "" if values[0] is None else (values[0].lower() if op == "$toLower" else values[0].upper())
+    if op in ("$year", "$month", "$dayOfMonth"):
+        date = values[0]
+        return getattr(date, {"$year": "year", "$month": "month", "$dayOfMonth": "day"}[op])
+    if op == "$size":
+        return len(values[0])
+    raise NotImplementedError(f"Unsupported expression operator {op}")
+
+
+def _accumulate(groups: Dict[str, Dict[str, Any]], key: str, group_id, spec: Dict[str, Any], doc: Dict[str, Any]):
+    state = groups.get(key)
+    if state is None:
+        state = groups[key] = {"_id": group_id}
+        for field, accumulator in spec.items():
+            op = next(iter(accumulator))
+            state[field] = {"$sum": 0, "$avg": [0, 0], "$push": [], "$addToSet": []}.get(op, _MISSING)
+    for field, accumulator in spec.items():
+        op, arg = next(iter(accumulator.items()))
+        value = _evaluate(arg, doc)
+        current = state[field]
+        if op == "$sum":
+            if _rank(value) == 2:
+                state[field] = current + value
+        elif op == "$avg":
+            if _rank(value) == 2:
+                current[0] += value
+                current[1] += 1
+        elif op == "$first":
+            if current is _MISSING:
+                state[field] = value
+        elif op == "$last":
+            state[field] = value
+        elif op in ("$min", "$max"):
+            if value is not None and (
+                current is _MISSING
+                or (_sort_key(value) < _sort_key(current) if op == "$min" else _sort_key(value) > _sort_key(current))
+            ):
+                state[field] = value
+        elif op == "$push":
+            current.append(value)
+        elif op == "$addToSet":
+            if not any(_equal(item, value) for item in current):
+                current.append(value)
+        else:
+            raise NotImplementedError(f"Unsupported accumulator {op}")
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    accumulators = {field: value for field, value in spec.items() if field != "_id"}
+    groups: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        group_id = _evaluate(spec["_id"], doc)
+        _accumulate(groups, _encode(group_id), group_id, accumulators, doc)
+    results = []
+    for state in groups.values():
+        for field, accumulator in accumulators.items():
+            value = state[field]
+            if next(iter(accumulator)) == "$avg":
+                state[field] = value[0] / value[1] if value[1] else None
+            elif value is _MISSING:
+                state[field] = None
+        results.append(state)
+    return results
+
+
+def _sort_documents(docs: List[Dict[str, Any]], spec: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction == -1)
+    return docs
+
+
+def _project_stage(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    flags = {field: bool(value) for field, value in spec.items() if isinstance(value, (bool, int, float))}
+    computed = {field: value for field, value in spec.items() if field not in flags}
+    included = [field for field, keep in flags.items() if keep and field != "_id"]
+    if not included and not computed:
+        return [_project(doc, spec) for doc in docs]
+    results = []
+    for doc in docs:
+        projected = {"_id": doc["_id"]} if flags.get("_id", True) and "_id" in doc else {}
+        for field in included:
+            _include(doc, projected, field.split("."))
+        for field, expr in computed.items():
+            _set_path(projected, field, _evaluate(expr, doc))
+        results.append(projected)
+    return results
+
+
+def _unwind(docs: List[Dict[str, Any]], spec) -> List[Dict[str, Any]]:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for element in value:
+                unwound = dict(doc)
+                _set_path(unwound, path, element)
+                results.append(unwound)
+        elif value is not None and not isinstance(value, list):
+            results.append(doc)
+        elif keep_empty:
+            results.append(doc)
+    return results
+
+
+def _lookup_stage(database: "EmbeddedDatabase", docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if "pipeline" in spec or "let" in spec:
+        raise NotImplementedError("$lookup is only supported with localField/foreignField")
+    local_field, foreign_field = spec["localField"], spec["foreignField"]
+    values = {}
+    for doc in docs:
+        for value in _candidates(_lookup(doc, local_field.split("."))):
+            if not isinstance(value, list):
+                value = None if value is _MISSING else value
+                values[_encode(value)] = value
+    joined: Dict[str, List[Dict[str, Any]]] = {}
+    if values:
+        for foreign in database[spec["from"]]._find({foreign_field: {"$in": list(values.values())}}):
+            for value in _candidates(_lookup(foreign, foreign_field.split("."))):
+                key = _encode(None if value is _MISSING else value)
+                if key in values:
+                    joined.setdefault(key, []).append(foreign)
+    for doc in docs:
+        matched, seen = [], set()
+        for value in _candidates(_lookup(doc, local_field.split("."))):
+            if isinstance(value, list):
+                continue
+            for foreign in joined.get(_encode(None if value is _MISSING else value), []):
+                if id(foreign) not in seen:
+                    seen.add(id(foreign))
+                    matched.append(foreign)
+        doc[spec["as"]] = matched
+    return docs
+
+
+def _run_stage(database: "EmbeddedDatabase", docs: List[Dict[str, Any]], stage: Dict[str, Any]) -> List[Dict[str, Any]]:
+    (name, spec), = stage.items()
+    if name == "$match":
+        return [doc for doc in docs if _matches(doc, spec)]
+    if name == "$group":
+        return _group(docs, spec)
+    if name == "$sort":
+        return _sort_documents(docs, list(spec.items()))
+    if name == "$skip":
+        return docs[spec:]
+    if name == "$limit":
+        return docs[:spec]
+    if name == "$project":
+        return _project_stage(docs, spec)
+    if name in ("$addFields", "$set"):
+        for doc in docs:
+            for field, expr in spec.items():
+                _set_path(doc, field, _evaluate(expr, doc))
+        return docs
+    if name == "$unset":
+        for doc in docs:
+            for field in [spec] if isinstance(spec, str) else spec:
+                _unset_path(doc, field)
+        return docs
+    if name == "$unwind":
+        return _unwind(docs, spec)
+    if name == "$count":
+        return [{spec: len(docs)}] if docs else []
+    if name == "$lookup":
+        return _lookup_stage(database, docs, spec)
+    raise NotImplementedError(f"Unsupported aggregation stage {name}")
+
+
+# Cursors
+class EmbeddedCursor:
+    """find() result: chain sort/skip/limit, then to_list() or `async for`"""
+
+    def __init__(self, collection: "EmbeddedCollection", query: Dict[str, Any], projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: Optional[List[Tuple[str, int]]] = None
+        self._skip = 0
+        self._limit = 0
+        self._rowids: Optional[List[int]] = None
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._emitted = 0
+
+    def sort(self, key_or_list, direction: Optional[int] = None) -> "EmbeddedCursor":
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, skip: int) -> "EmbeddedCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "EmbeddedCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "EmbeddedCursor":
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        limit = min(filter(None, (self._limit, length)), default=0)
+        return self._collection._find(self._query, self._projection, self._sort, self._skip, limit)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        # Iteration works from a snapshot of the candidate rows, loaded in
+        # batches, so writes made while iterating cannot disturb it
+        if self._rowids is None:
+            self._rowids = self._collection._candidate_rowids(self._query, self._sort)
+            self._position = 0
+        if self._limit and self._emitted >= self._limit:
+            raise StopAsyncIteration
+        while not self._buffer:
+            if self._position >= len(self._rowids):
+                raise StopAsyncIteration
+            batch = self._rowids[self._position:self._position + ITERATION_BATCH_SIZE]
+            self._position += len(batch)
+            for doc in self._collection._load(batch, self._query):
+                if self._skip:
+                    self._skip -= 1
+                else:
+                    self._buffer.append(_project(doc, self._projection))
+            await asyncio.sleep(0)
+        self._emitted += 1
+        return self._buffer.popleft()
+
+
+class EmbeddedAggregateCursor:
+    def __init__(self, collection: "EmbeddedCollection", pipeline: List[Dict[str, Any]]):
+        self._collection = collection
+        self._pipeline = pipeline
+        self._results: Optional[List[Dict[str, Any]]] = None
+        self._position = 0
+
+    def _documents(self) -> List[Dict[str, Any]]:
+        if self._results is None:
+            self._results = self._collection._aggregate(self._pipeline)
+        return self._results
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        documents = self._documents()
+        return documents[:length] if length else documents
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        documents = self._documents()
+        if self._position >= len(documents):
+            raise StopAsyncIteration
+        self._position += 1
+        return documents[self._position - 1]
+
+
+class EmbeddedCollection:
+    """One collection: a table of JSON documents keyed by the encoded _id"""
+
+    def __init__(self, database: "EmbeddedDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._table = '"' + name.replace('"', '""') + '"'
+        self._created = False
+        self._next_sweep = 0.0
+        self._changes = 0
+        self._analyzed_rows = 0
+        self._stale_stats = False
+
+    # Storage
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self.database._conn
+
+    def _prepare(self):
+        if not self._created:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (key TEXT NOT NULL UNIQUE, doc TEXT NOT NULL)")
+            self._created = True
+            self._analyzed_rows = self._stat_rows()
+        if self._stale_stats or self._changes >= max(ANALYZE_MIN_CHANGES, self._analyzed_rows):
+            self._analyze()
+        ttl = self.database._ttl_fields(self.name)
+        if ttl and time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + TTL_SWEEP_SECONDS
+            self._sweep(ttl)
+
+    def _stat_rows(self) -> int:
+        """Table size recorded by the last ANALYZE"""
+        try:
+            row = self._conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (self.name,)).fetchone()
+        except sqlite3.OperationalError:  # never analyzed
+            return 0
+        return int(row[0].split()[0]) if row else 0
+
+    def _analyze(self):
+        # Without statistics SQLite treats every index as equally selective,
+        # e.g. it would look an invoice up by (user_id, ...) rather than by id
+        self._conn.execute(f"ANALYZE {self._table}")
+        self._analyzed_rows = self._stat_rows()
+        self._changes = 0
+        self._stale_stats = False
+
+    def _sweep(self, ttl: List[Tuple[str, int]]):
+        now = datetime.utcnow()
+        with self.database._transaction():
+            for field, seconds in ttl:
+                cutoff = _encode(now - timedelta(seconds=seconds))
+                deleted = self._conn.execute(
+                    f"DELETE FROM {self._table} WHERE {_field_sql(field)} < ? AND json_type(doc, '$.{field}') = 'object'",
+                    (cutoff,)
+                ).rowcount
+                self._changes += deleted
+                if deleted:
+                    logger.info(f"Expired {deleted} documents from {self.name}")
+
+    def _select_sql(self, query: Dict[str, Any], sort, columns: str) -> Tuple[str, List[Any], bool]:
+        where = _Where(self.database._indexed_fields(self.name))
+        clauses = where.query(query)
+        sql = f"SELECT {columns} FROM {self._table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if sort:
+            sql += " ORDER BY " + ", ".join(
+                ("key" if field == "_id" else _field_sql(_check_path(field))) + (" DESC" if direction == -1 else "")
+                for field, direction in sort
+            )
+        return sql, where.params, where.exact
+
+    def _rows(self, query: Dict[str, Any], sort=None, skip: int = 0, limit: int = 0) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """(rowid, stored JSON, document) of the matching documents, in order"""
+        self._prepare()
+        sql, params, exact = self._select_sql(query, sort, "rowid, doc")
+        if exact and (skip or limit):
+            sql += f" LIMIT {limit or -1} OFFSET {skip}"
+            skip = 0
+        rows = []
+        cursor = self._conn.execute(sql, params)
+        try:
+            for rowid, text in cursor:
+                doc = _decode(text)
+                if not exact and not _matches(doc, query):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                rows.append((rowid, text, doc))
+                if limit and len(rows) >= limit:
+                    break
+        finally:
+            cursor.close()
+        return rows
+
+    def _find(self, query=None, projection=None, sort=None, skip: int = 0, limit: int = 0) -> List[Dict[str, Any]]:
+        with self.database._lock:
+            return [_project(doc, projection) for _, _, doc in self._rows(query or {}, sort, skip, limit)]
+
+    def _candidate_rowids(self, query: Dict[str, Any], sort) -> List[int]:
+        with self.database._lock:
+            self._prepare()
+            sql, params, _ = self._select_sql(query, sort, "rowid")
+            return [rowid for rowid, in self._conn.execute(sql, params)]
+
+    def _load(self, rowids: List[int], query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.database._lock:
+            placeholders = ", ".join("?" * len(rowids))
+            texts = dict(self._conn.execute(f"SELECT rowid, doc FROM {self._table} WHERE rowid IN ({placeholders})", rowids))
+        docs = (_decode(texts[rowid]) for rowid in rowids if rowid in texts)
+        return [doc for doc in docs if _matches(doc, query)]
+
+    def _insert(self, doc: Dict[str, Any]):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        try:
+            self._conn.execute(f"INSERT INTO {self._table} (key, doc) VALUES (?, ?)", (_encode(doc["_id"]), _encode(doc)))
+            self._changes += 1
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name}: {e}", DUPLICATE_KEY_ERROR,
+                {"code": DUPLICATE_KEY_ERROR, "errmsg": str(e)}
+            ) from e
+
+    def _update(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool, many: bool, sort=None):
+        """Apply an update; returns (matched, modified, upserted _id, [(before, after)])"""
+        _apply_update({}, update, inserting=True)  # reject bad updates before touching anything
+        changes = []
+        modified = 0
+        for rowid, text, before in self._rows(query, sort, limit=0 if many else 1):
+            after = _apply_update(_decode(text), update, inserting=False)
+            new_text = _encode(after)
+            if new_text != text:
+                try:
+                    self._conn.execute(f"UPDATE {self._table} SET doc = ? WHERE rowid = ?", (new_text, rowid))
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name}: {e}", DUPLICATE_KEY_ERROR,
+                        {"code": DUPLICATE_KEY_ERROR, "errmsg": str(e)}
+                    ) from e
+                modified += 1
+            changes.append((before, after))
+        if changes or not upsert:
+            return len(changes), modified, None, changes
+        doc = _apply_update(_upsert_document(query), update, inserting=True)
+        self._insert(doc)
+        return 0, 0, doc["_id"], [(None, doc)]
+
+    def _delete(self, query: Dict[str, Any], many: bool) -> int:
+        rowids = [rowid for rowid, _, _ in self._rows(query, limit=0 if many else 1)]
+        for start in range(0, len(rowids), ITERATION_BATCH_SIZE):
+            batch = rowids[start:start + ITERATION_BATCH_SIZE]
+            self._conn.execute(f"DELETE FROM {self._table} WHERE rowid IN ({', '.join('?' * len(batch))})", batch)
+        self._changes += len(rowids)
+        return len(rowids)
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        stages = list(pipeline)
+        query: Dict[str, Any] = {}
+        sort, skip, limit = None, 0, 0
+        # A leading $match/$sort/$skip/$limit runs as one (indexed) query
+        if stages and "$match" in stages[0]:
+            query = stages.pop(0)["$match"]
+        if stages and "$sort" in stages[0]:
+            sort = list(stages.pop(0)["$sort"].items())
+        if stages and "$skip" in stages[0]:
+            skip = stages.pop(0)["$skip"]
+        if stages and "$limit" in stages[0]:
+            limit = stages.pop(0)["$limit"]
+        docs = self._find(query, None, sort, skip, limit)
+        for stage in stages:
+            docs = _run_stage(self.database, docs, stage)
+        return docs
+
+    # Motor API
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection=None, **kwargs) -> EmbeddedCursor:
+        cursor = EmbeddedCursor(self, filter or {}, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        return cursor.skip(kwargs.get("skip", 0)).limit(kwargs.get("limit", 0))
+
+    async def find_one(self, filter: Optional[Dict[str, Any]] = None, projection=None, sort=None, **kwargs):
+        docs = self._find(filter or {}, projection, sort, kwargs.get("skip", 0), 1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: Dict[str, Any], limit: int = 0, skip: int = 0, **kwargs) -> int:
+        with self.database._lock:
+            self._prepare()
+            sql, params, exact = self._select_sql(filter, None, "1")
+            if exact:
+                return self._conn.execute(
+                    f"SELECT COUNT(*) FROM ({sql} LIMIT {limit or -1} OFFSET {skip})", params
+                ).fetchone()[0]
+            return len(self._rows(filter, skip=skip, limit=limit))
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        with self.database._transaction():
+            self._prepare()
+            self._insert(document)
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        errors = []
+        with self.database._transaction():
+            self._prepare()
+            for index, document in enumerate(documents):
+                try:
+                    self._insert(document)
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [],
+                "nInserted": len(documents) - len(errors) if not ordered else errors[0]["index"],
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+            })
+        return InsertManyResult([document["_id"] for document in documents], True)
+
+    async def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._transaction():
+            self._prepare()
+            matched, modified, upserted_id, _ = self._update(filter, update, upsert, many=False)
+        return UpdateResult({"n": matched + (upserted_id is not None), "nModified": modified, "upserted": upserted_id}, True)
+
+    async def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        with self.database._transaction():
+            self._prepare()
+            matched, modified, upserted_id, _ = self._update(filter, update, upsert, many=True)
+        return UpdateResult({"n": matched + (upserted_id is not None), "nModified": modified, "upserted": upserted_id}, True)
+
+    async def find_one_and_update(
+        self,
+        filter: Dict[str, Any],
+        update: Dict[str, Any],
+        projection=None,
+        sort=None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs
+    ):
+        with self.database._transaction():
+            self._prepare()
+            _, _, _, changes = self._update(filter, update, upsert, many=False, sort=sort)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document == ReturnDocument.AFTER else before
+        return None if document is None else _project(document, projection)
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self.database._transaction():
+            self._prepare()
+            return DeleteResult({"n": self._delete(filter, many=False)}, True)
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self.database._transaction():
+            self._prepare()
+            return DeleteResult({"n": self._delete(filter, many=True)}, True)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = {
+            "writeErrors": [], "writeConcernErrors": [], "upserted": [],
+            "nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+        }
+        with self.database._transaction():
+            self._prepare()
+            for index, request in enumerate(requests):
+                kind = type(request).__name__
+                try:
+                    if kind == "InsertOne":
+                        self._insert(request._doc)
+                        result["nInserted"] += 1
+                    elif kind in ("UpdateOne", "UpdateMany"):
+                        matched, modified, upserted_id, _ = self._update(
+                            request._filter, request._doc, request._upsert, many=kind == "UpdateMany"
+                        )
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                        if upserted_id is not None:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": upserted_id})
+                    elif kind in ("DeleteOne", "DeleteMany"):
+                        result["nRemoved"] += self._delete(request._filter, many=kind == "DeleteMany")
+                    else:
+                        raise NotImplementedError(f"Unsupported bulk operation {kind}")
+                except DuplicateKeyError as e:
+                    result["writeErrors"].append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> EmbeddedAggregateCursor:
+        return EmbeddedAggregateCursor(self, pipeline)
+
+    async def create_index(self, keys, unique: bool = False, name: Optional[str] = None, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = [(_check_path(field), direction) for field, direction in keys]
+        if any(direction not in (1, -1) for _, direction in keys):
+            raise NotImplementedError("Only ascending and descending indexes are supported")
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        columns = ", ".join(f"{_field_sql(field)}{' DESC' if direction == -1 else ''}" for field, direction in keys)
+        sql = (
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+            f'"{self.name}.{name}" ON {self._table} ({columns})'
+        )
+        partial = kwargs.get("partialFilterExpression")
+        if partial:
+            where = _Where({field for field, _ in _flatten_fields(partial)}, inline=True)
+            clauses = where.query(partial)
+            if not where.exact:
+                raise NotImplementedError(f"Unsupported partialFilterExpression {partial}")
+            sql += " WHERE " + " AND ".join(clauses)
+        spec = {"key": keys, "unique": unique}
+        for option in ("expireAfterSeconds", "partialFilterExpression"):
+            if option in kwargs:
+                spec[option] = kwargs[option]
+        with self.database._transaction():
+            self._prepare()
+            try:
+                self._conn.execute(sql)
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(f"E11000 duplicate key error building index {name}: {e}", DUPLICATE_KEY_ERROR) from e
+            self.database._save_index(self.name, name, spec)
+            self._stale_stats = True
+        return name
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        info = {"_id_": {"key": [("_id", 1)]}}
+        for name, spec in self.database._indexes.get(self.name, {}).items():
+            info[name] = {**spec, "key": [tuple(key) for key in spec["key"]]}
+            if not info[name]["unique"]:
+                del info[name]["unique"]
+        return info
+
+    async def drop_index(self, name: str):
+        with self.database._transaction():
+            self._conn.execute(f'DROP INDEX IF EXISTS "{self.name}.{name}"')
+            self.database._drop_index(self.name, name)
+
+
+def _flatten_fields(query: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    for key, condition in query.items():
+        if key in ("$and", "$or", "$nor"):
+            for sub in condition:
+                yield from _flatten_fields(sub)
+        elif not key.startswith("$"):
+            yield key, condition
+
+
+class _DownloadStream:
+    def __init__(self, doc: Dict[str, Any]):
+        self._id = doc["_id"]
+        self.filename = doc["filename"]
+        self.length = doc["length"]
+        self._data = doc["data"]
+
+    async def read(self, size: int = -1) -> bytes:
+        data, self._data = (self._data, b"") if size < 0 else (self._data[:size], self._data[size:])
+        return data
+
+
+class EmbeddedBucket:
+    """GridFS bucket stand-in: each file is one document holding its bytes"""
+
+    def __init__(self, database: "EmbeddedDatabase", bucket_name: str = "fs"):
+        self._files = database[f"{bucket_name}.files"]
+
+    async def upload_from_stream(self, filename: str, source, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> ObjectId:
+        data = source if isinstance(source, (bytes, bytearray)) else source.read()
+        file_id = ObjectId()
+        await self._files.insert_one({
+            "_id": file_id,
+            "filename": filename,
+            "length": len(data),
+            "uploadDate": datetime.utcnow(),
+            "metadata": metadata,
+            "data": bytes(data),
+        })
+        return file_id
+
+    async def open_download_stream(self, file_id) -> _DownloadStream:
+        doc = await self._files.find_one({"_id": file_id})
+        if doc is None:
+            raise NoFile(f"no file in gridfs collection {self._files.name} with _id {file_id!r}")
+        return _DownloadStream(doc)
+
+    async def delete(self, file_id):
+        result = await self._files.delete_one({"_id": file_id})
+        if not result.deleted_count:
+            raise NoFile(f"no file could be deleted because none matched {file_id!r}")
+
+
+class EmbeddedDatabase:
+    """A SQLite database file (or ":memory:") presented like a Motor database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        self._conn.execute(f"PRAGMA analysis_limit = {ANALYZE_SAMPLE_ROWS}")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} "
+            "(collection TEXT NOT NULL, name TEXT NOT NULL, spec TEXT NOT NULL, PRIMARY KEY (collection, name))"
+        )
+        self._collections: Dict[str, EmbeddedCollection] = {}
+        self._indexes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for collection, name, spec in self._conn.execute(f"SELECT collection, name, spec FROM {INDEX_TABLE}"):
+            self._indexes.setdefault(collection, {})[name] = json.loads(spec)
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = EmbeddedCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def bucket(self, bucket_name: str = "fs") -> EmbeddedBucket:
+        return EmbeddedBucket(self, bucket_name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction; nested uses join the outer one"""
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _indexed_fields(self, collection: str) -> set:
+        return {field for spec in self._indexes.get(collection, {}).values() for field, _ in spec["key"]}
+
+    def _ttl_fields(self, collection: str) -> List[Tuple[str, int]]:
+        return [
+            (spec["key"][0][0], spec["expireAfterSeconds"])
+            for spec in self._indexes.get(collection, {}).values()
+            if "expireAfterSeconds" in spec
+        ]
+
+    def _save_index(self, collection: str, name: str, spec: Dict[str, Any]):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {INDEX_TABLE} (collection, name, spec) VALUES (?, ?, ?)",
+            (collection, name, json.dumps(spec))
+        )
+        self._indexes.setdefault(collection, {})[name] = json.loads(json.dumps(spec))
+
+    def _drop_index(self, collection: str, name: str):
+        self._conn.execute(f"DELETE FROM {INDEX_TABLE} WHERE collection = ? AND name = ?", (collection, name))
+        self._indexes.get(collection, {}).pop(name, None)
@@ -0,0 +1,172 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client that sends ``Idempotency-Key: <unique value>`` can retry a create
+safely: the first request claims the key by inserting a record into
+``idempotency_keys`` (unique on user and key), runs the handler and stores
+its response. Retries with the same key get the stored response back
+without the handler running again; a retry that arrives while the first
+request is still running waits for it instead of racing. Keys expire
+after ``IDEMPOTENCY_KEY_TTL_SECONDS`` via a TTL index.
+
+Each claim carries a random token. A request that outlived its lock and
+had its key taken over no longer holds the token, so it can neither
+release nor complete the new owner's claim.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 3600
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# A request holding a key longer than this is presumed dead and its key can be taken over
+IDEMPOTENCY_LOCK_SECONDS = 60
+# How long a duplicate waits for the original request before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_POLL_INTERVAL_SECONDS = 0.1
+
+# Wakes duplicates waiting in this process as soon as the original finishes
+_finished: Dict[Tuple[str, str], asyncio.Event] = {}
+
+
+async def ensure_indexes():
+    await db.idempotency_keys.create_index([("user_id", 1), ("key", 1)], unique=True)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+
+
+def _fingerprint(scope: str, body: Any) -> str:
+    """Hash of the operation and request body, to catch a key reused for a different request"""
+    payload = json.dumps([scope, jsonable_encoder(body)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def _claim(user_id: str, key: str, fingerprint: str, token: str) -> Optional[Dict[str, Any]]:
+    """Claim the key for this request under `token`; returns the existing record if someone else has it"""
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            "user_id": user_id,
+            "key": key,
+            "fingerprint": fingerprint,
+            "status": "in_progress",
+            "claim": token,
+            "response": None,
+            "created_at": now,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+    # Take over a key whose request died without completing or releasing it
+    taken_over = await db.idempotency_keys.find_one_and_update(
+        {"user_id": user_id, "key": key, "status": "in_progress", "locked_until": {"$lt": now}},
+        {"$set": {
+            "fingerprint": fingerprint,
+            "claim": token,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        }}
+    )
+    if taken_over is not None:
+        return None
+    existing = await db.idempotency_keys.find_one({"user_id": user_id, "key": key})
+    # Released between our insert and find: report it as in progress so the caller retries
+    return existing or {"status": "released"}
+
+
+async def _wait_for_original(user_id: str, key: str, deadline: float) -> None:
+    event = _finished.setdefault((user_id, key), asyncio.Event())
+    remaining = deadline - asyncio.get_running_loop().time()
+    try:
+        # Woken early when this process finishes the original; other workers are polled
+        await asyncio.wait_for(event.wait(), min(max(remaining, 0), IDEMPOTENCY_POLL_INTERVAL_SECONDS))
+    except asyncio.TimeoutError:
+        pass
+
+
+def _notify(user_id: str, key: str):
+    event = _finished.pop((user_id, key), None)
+    if event is not None:
+        event.set()
+
+
+async def run_idempotent(
+    key: Optional[str],
+    user_id: str,
+    scope: str,
+    body: Any,
+    response: Response,
+    handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Run `handler` at most once per (user, Idempotency-Key).
+
+    Without a key the handler simply runs. `scope` names the operation
+    (e.g. "POST /invoices") and together with `body` detects a key reused
+    for a different request (422). Replayed responses carry an
+    ``Idempotent-Replayed: true`` header.
+    """
+    if key is None:
+        return await handler()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+        )
+
+    fingerprint = _fingerprint(scope, body)
+    token = uuid.uuid4().hex
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    waited = False
+    try:
+        while True:
+            existing = await _claim(user_id, key, fingerprint, token)
+            if existing is None:
+                break
+            if existing["status"] != "released" and existing["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            if existing["status"] == "completed":
+                response.headers["Idempotent-Replayed"] = "true"
+                return existing["response"]
+            if asyncio.get_running_loop().time() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            waited = True
+            await _wait_for_original(user_id, key, deadline)
+    finally:
+        if waited:
+            _finished.pop((user_id, key), None)
+
+    try:
+        result = await handler()
+    except BaseException:
+        # Nothing was committed under this key: release it so a retry runs the handler
+        await db.idempotency_keys.delete_one({"user_id": user_id, "key": key, "status": "in_progress", "claim": token})
+        _notify(user_id, key)
+        raise
+
+    completed = await db.idempotency_keys.update_one(
+        {"user_id": user_id, "key": key, "status": "in_progress", "claim": token},
+        {"$set": {"status": "completed", "response": jsonable_encoder(result), "locked_until": None}}
+    )
+    if completed.matched_count == 0:
+        # Ran past the lock and another request took the key over: its record stands
+        logger.warning(f"Idempotency-Key {key!r} of user {user_id} was taken over before this request completed")
+    _notify(user_id, key)
+    return result
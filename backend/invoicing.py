@@ -0,0 +1,172 @@
+"""
+Invoice numbering, currency, totals and document construction shared by the
+invoice routes and the recurring invoice scheduler.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from currency import DEFAULT_CURRENCY, rate_tables, validate_currency
+from database import db
+from models import Invoice, InvoiceCreate, InvoiceItem
+from tax import DEFAULT_JURISDICTION, get_tax_engine
+
+
+def format_invoice_number(number: int) -> str:
+    return f"INV-{str(number).zfill(3)}"
+
+
+async def allocate_invoice_numbers(user_id: str, count: int = 1) -> int:
+    """Reserve `count` consecutive invoice numbers for a user and return the first.
+
+    Numbers come from a per-user counter, seeded from the user's invoice
+    count the first time (soft-deleted invoices keep their numbers).
+    """
+    counter_id = f"invoice_numbers:{user_id}"
+    if await db.counters.find_one({"_id": counter_id}, {"_id": 1}) is None:
+        seed = await db.invoices.count_documents({"user_id": user_id})
+        try:
+            await db.counters.update_one({"_id": counter_id}, {"$setOnInsert": {"seq": seed}}, upsert=True)
+        except DuplicateKeyError:
+            pass  # seeded concurrently
+    counter = await db.counters.find_one_and_update(
+        {"_id": counter_id},
+        {"$inc": {"seq": count}},
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1
+
+
+async def resolve_currency(user_id: str, currency: Optional[str]) -> str:
+    """The requested currency, else the business profile's, else DEFAULT_CURRENCY"""
+    if currency:
+        return validate_currency(currency)
+    profile = await db.business_profiles.find_one({"user_id": user_id}, {"_id": 0, "currency": 1})
+    profile_currency = str((profile or {}).get("currency") or "").upper()
+    return profile_currency if profile_currency in rate_tables.get() else DEFAULT_CURRENCY
+
+
+class InvoiceTotals(NamedTuple):
+    subtotal: float
+    tax_rate: float
+    tax_amount: float
+    total_amount: float
+    tax_jurisdiction: Optional[str]
+
+
+def _line_amounts(items: List[InvoiceItem], currency: str) -> List[float]:
+    """Item totals in `currency`, converting items priced in other currencies"""
+    if not any(item.currency and item.currency.upper() != currency for item in items):
+        return [item.total for item in items]
+    for item in items:
+        if item.currency:
+            item.currency = validate_currency(item.currency)
+    converted = rate_tables.get().convert_amounts(
+        [item.total for item in items], [item.currency or currency for item in items], currency
+    )
+    return [round(amount, 2) for amount in converted.tolist()]
+
+
+async def tax_jurisdictions(user_id: str, invoices: Sequence[InvoiceCreate]) -> List[Optional[str]]:
+    """Tax jurisdiction of each invoice taxed by the rules (None for a flat tax_rate).
+
+    The customer's address decides, else the business's, else the default
+    rules apply. One query per collection for the whole batch.
+    """
+    engine = get_tax_engine()
+    taxed = [invoice for invoice in invoices if invoice.tax_rate is None]
+    located: Dict[str, Optional[str]] = {}
+    if taxed:
+        customer_ids = list({invoice.customer_id for invoice in taxed})
+        async for customer in db.customers.find(
+            {"id": {"$in": customer_ids}, "user_id": user_id}, {"_id": 0, "id": 1, "state": 1, "zip_code": 1}
+        ):
+            located[customer["id"]] = engine.locate(customer.get("state"), customer.get("zip_code"))
+        business_ids = list({invoice.business_id for invoice in taxed if located.get(invoice.customer_id) is None})
+        if business_ids:
+            async for business in db.businesses.find(
+                {"id": {"$in": business_ids}, "user_id": user_id}, {"_id": 0, "id": 1, "state": 1, "zip_code": 1}
+            ):
+                located[business["id"]] = engine.locate(business.get("state"), business.get("zip_code"))
+    return [
+        None if invoice.tax_rate is not None
+        else located.get(invoice.customer_id) or located.get(invoice.business_id) or DEFAULT_JURISDICTION
+        for invoice in invoices
+    ]
+
+
+def compute_invoice_totals(invoices: Sequence[InvoiceCreate], jurisdictions: Sequence[Optional[str]]) -> List[InvoiceTotals]:
+    """Totals of a batch of invoices, in their own currencies.
+
+    Invoices with a tax_rate pay it on the subtotal. The others are taxed per
+    line from the rules for `jurisdictions[i]` (see tax_jurisdictions), all
+    lines of the batch in one vectorized pass; their items get `tax_amount`.
+    """
+    amounts = [_line_amounts(invoice.items, invoice.currency or DEFAULT_CURRENCY) for invoice in invoices]
+    line_taxes: List[List[float]] = [[] for _ in invoices]
+    taxed = [i for i, invoice in enumerate(invoices) if invoice.tax_rate is None]
+    if taxed:
+        lines = [(i, item, amount) for i in taxed for item, amount in zip(invoices[i].items, amounts[i])]
+        taxes = get_tax_engine().line_taxes(
+            [amount for _, _, amount in lines],
+            [item.tax_category for _, item, _ in lines],
+            [jurisdictions[i] for i, _, _ in lines],
+        ).tolist()
+        for (i, item, _), tax in zip(lines, taxes):
+            item.tax_amount = tax
+            line_taxes[i].append(tax)
+
+    totals = []
+    for i, invoice in enumerate(invoices):
+        subtotal = round(sum(amounts[i]), 2)
+        if invoice.tax_rate is not None:
+            tax_rate, tax_amount = invoice.tax_rate, subtotal * invoice.tax_rate
+            for item in invoice.items:
+                item.tax_amount = None
+        else:
+            tax_amount = round(sum(line_taxes[i]), 2)
+            tax_rate = round(tax_amount / subtotal, 6) if subtotal else 0.0
+        totals.append(InvoiceTotals(subtotal, tax_rate, tax_amount, subtotal + tax_amount, jurisdictions[i]))
+    return totals
+
+
+async def invoice_totals(user_id: str, invoice_data: InvoiceCreate) -> InvoiceTotals:
+    """Totals of one invoice (see compute_invoice_totals)"""
+    return compute_invoice_totals([invoice_data], await tax_jurisdictions(user_id, [invoice_data]))[0]
+
+
+def build_invoice(
+    invoice_data: InvoiceCreate,
+    user_id: str,
+    invoice_number: str,
+    updated_seq: int,
+    totals: InvoiceTotals,
+    issue_date: Optional[date] = None,
+    **extra: Any,
+) -> Tuple[Invoice, Dict[str, Any]]:
+    """Invoice model and its MongoDB document (dates as ISO strings).
+
+    `invoice_data.currency` should already be resolved (see resolve_currency)
+    and `totals` computed for it.
+    """
+    invoice_dict = invoice_data.dict()
+    invoice_dict.update({
+        "invoice_number": invoice_number,
+        "currency": invoice_data.currency or DEFAULT_CURRENCY,
+        "issue_date": issue_date or date.today(),
+        **totals._asdict(),
+        "user_id": user_id,
+        "updated_seq": updated_seq,
+        **extra,
+    })
+    invoice_obj = Invoice(**invoice_dict)
+
+    # Convert date objects to ISO format strings for MongoDB
+    doc = invoice_obj.model_dump()
+    for field in ("issue_date", "due_date", "recurring_period"):
+        if isinstance(doc.get(field), date):
+            doc[field] = doc[field].isoformat()
+    return invoice_obj, doc
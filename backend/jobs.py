@@ -0,0 +1,252 @@
+"""
+Persistent background job queue backed by MongoDB.
+
+Jobs are documents in the ``jobs`` collection, so queued and running work
+survives a restart: workers claim a job by atomically flipping it to
+``running`` with a lease, and a job whose lease expired (its worker died)
+is claimed again. A fixed number of worker tasks per process caps
+concurrency. Handlers raise ``RetryableJobError`` for transient failures
+and are retried with exponential backoff; finished jobs are removed by a
+TTL index after ``JOB_RESULT_TTL_SECONDS``.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = 3
+JOB_LEASE_SECONDS = 300
+JOB_RESULT_TTL_SECONDS = 24 * 3600
+JOB_POLL_INTERVAL_SECONDS = 2.0
+
+# Terminal states
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class RetryableJobError(Exception):
+    """Transient failure; the job is re-queued until it runs out of attempts"""
+
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+JobCleanup = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    """Claims and runs jobs of the registered types with a bounded worker pool"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers: Dict[str, JobHandler] = {}
+        self._cleanups: Dict[str, JobCleanup] = {}
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    def register(self, job_type: str, handler: JobHandler, cleanup: Optional[JobCleanup] = None):
+        """Register the coroutine that runs jobs of `job_type` (and an optional terminal-state hook)"""
+        self._handlers[job_type] = handler
+        if cleanup is not None:
+            self._cleanups[job_type] = cleanup
+
+    async def ensure_indexes(self):
+        await db.jobs.create_index("id")
+        await db.jobs.create_index([("status", 1), ("type", 1), ("available_at", 1)])
+        await db.jobs.create_index([("user_id", 1), ("created_at", -1)])
+        await db.jobs.create_index("expires_at", expireAfterSeconds=0)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, job_type: str, user_id: Optional[str], payload: Dict[str, Any],
+                      max_attempts: int = JOB_MAX_ATTEMPTS) -> Dict[str, Any]:
+        """Persist a new job and wake a local worker"""
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "user_id": user_id,
+            "status": "queued",
+            "payload": payload,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "progress": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "available_at": now,
+            "lease_expires_at": None,
+            "finished_at": None,
+            "expires_at": None,
+        }
+        await db.jobs.insert_one(job.copy())
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return await db.jobs.find_one({"id": job_id, "user_id": user_id}, {"_id": 0, "payload": 0})
+
+    async def wait_for(self, job_id: str, user_id: Optional[str], timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once finished or when `timeout` seconds have passed"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id, user_id)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                self._finished.pop(job_id, None)
+                return job
+            # Woken early when this process finishes the job; other workers are polled
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, JOB_POLL_INTERVAL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await db.jobs.find_one_and_update(
+            {
+                "type": {"$in": list(self._handlers)},
+                "$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    # Lease expired: the worker running it is gone
+                    {"status": "running", "lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job_id: str):
+        """Keep extending the lease while a long job is running"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await db.jobs.update_one(
+                {"id": job_id, "status": "running"},
+                {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        if job["attempts"] > job["max_attempts"]:
+            # Re-claimed after its lease expired too many times (e.g. it keeps killing the worker)
+            await self._finish(job, "failed", error=job.get("error") or "Job was interrupted too many times")
+            return
+
+        async def report_progress(progress: Dict[str, Any]):
+            await db.jobs.update_one(
+                {"id": job_id},
+                {"$set": {"progress": progress, "updated_at": datetime.utcnow()}}
+            )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self._handlers[job["type"]](job, report_progress)
+        except RetryableJobError as e:
+            if job["attempts"] < job["max_attempts"]:
+                delay = 2 ** job["attempts"]
+                logger.warning(f"Job {job_id} attempt {job['attempts']} failed, retrying in {delay}s: {e}")
+                await db.jobs.update_one({"id": job_id}, {"$set": {
+                    "status": "queued",
+                    "error": str(e),
+                    "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "lease_expires_at": None,
+                    "updated_at": datetime.utcnow(),
+                }})
+                return
+            await self._finish(job, "failed", error=str(e))
+        except asyncio.CancelledError:
+            # Shutting down: leave the job to be re-claimed when its lease expires
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            await self._finish(job, "failed", error=str(e))
+        else:
+            await self._finish(job, "succeeded", result=result)
+        finally:
+            heartbeat.cancel()
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Dict[str, Any] = None, error: str = None):
+        now = datetime.utcnow()
+        await db.jobs.update_one({"id": job["id"]}, {"$set": {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finished_at": now,
+            "updated_at": now,
+            "lease_expires_at": None,
+            "expires_at": now + timedelta(seconds=JOB_RESULT_TTL_SECONDS),
+        }})
+        cleanup = self._cleanups.get(job["type"])
+        if cleanup is not None:
+            try:
+                await cleanup(job)
+            except Exception as e:
+                logger.warning(f"Cleanup for job {job['id']} failed: {e}")
+        event = self._finished.pop(job["id"], None)
+        if event is not None:
+            event.set()
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job for status/polling endpoints"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"]
+    }
+
+
+job_queue = JobQueue()
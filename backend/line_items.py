@@ -0,0 +1,156 @@
+"""
+Line items of large invoices, stored outside the invoice document.
+
+Invoices with up to INVOICE_EMBEDDED_ITEMS_LIMIT lines keep them embedded
+in `items` as before. Larger ones have an empty `items` and
+`items_external: true` on the invoice (the header), with their lines in
+`invoice_items`, one document per line holding its `position`. Either way
+the header carries `item_count` and the totals, so list views, the change
+feed and the dashboard never load the lines.
+
+Lines are written in segments. Each write that stores lines tags them with
+that write's change feed seq, and the header lists the segments it uses in
+`item_segments`. Lines are always written before the header update that
+lists their segment, so a header never points at missing lines. Lines left
+behind by a write that lost a version race (or died) belong to no listed
+segment and are never read. Segments a header update replaced are deleted
+right after it. Soft deletes stamp `deleted_at` on the lines too, so the
+TTL that purges the invoice also purges them.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import db, DELETED_INVOICE_RETENTION_SECONDS
+
+INVOICE_EMBEDDED_ITEMS_LIMIT = 200
+INVOICE_ITEMS_PAGE_LIMIT = 1000
+# Fields copied into each line document (InvoiceItem)
+LINE_FIELDS = {
+    "_id": 0, "position": 1, "description": 1, "quantity": 1, "unit_price": 1, "total": 1,
+    "currency": 1, "tax_category": 1, "tax_amount": 1,
+}
+
+
+async def ensure_indexes():
+    await db.invoice_items.create_index([("invoice_id", 1), ("position", 1)])
+    await db.invoice_items.create_index("deleted_at", expireAfterSeconds=DELETED_INVOICE_RETENTION_SECONDS)
+
+
+def item_count(invoice: Dict[str, Any]) -> int:
+    """Number of lines (invoices stored before item_count have all lines embedded)"""
+    count = invoice.get("item_count")
+    return count if count is not None else len(invoice.get("items") or [])
+
+
+def line_documents(
+    invoice_id: str, user_id: str, segment: int, first_position: int, items: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            **item,
+            "invoice_id": invoice_id,
+            "user_id": user_id,
+            "segment": segment,
+            "position": first_position + i,
+            "deleted_at": None,
+        }
+        for i, item in enumerate(items)
+    ]
+
+
+def place_items(fields: Dict[str, Any], invoice_id: str, user_id: str, segment: int) -> List[Dict[str, Any]]:
+    """Set the item fields of a new or fully rewritten invoice from `fields["items"]`.
+
+    Returns the line documents to insert (before the invoice is written)
+    when there are too many lines to embed; their segment is `segment`.
+    """
+    items = fields["items"]
+    fields["item_count"] = len(items)
+    if len(items) <= INVOICE_EMBEDDED_ITEMS_LIMIT:
+        fields.update(items_external=False, item_segments=[])
+        return []
+    fields.update(items=[], items_external=True, item_segments=[segment])
+    return line_documents(invoice_id, user_id, segment, 0, items)
+
+
+def append_items(
+    header: Dict[str, Any], items: List[Dict[str, Any]], segment: int
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Header changes that append `items`, and the line documents to insert first.
+
+    Lines stay embedded while the invoice fits INVOICE_EMBEDDED_ITEMS_LIMIT;
+    the append that crosses it moves the embedded lines out as well.
+    """
+    count = item_count(header)
+    changes: Dict[str, Any] = {"item_count": count + len(items)}
+    if not header.get("items_external") and count + len(items) <= INVOICE_EMBEDDED_ITEMS_LIMIT:
+        changes["items"] = (header.get("items") or []) + items
+        return changes, []
+    if header.get("items_external"):
+        lines = line_documents(header["id"], header["user_id"], segment, count, items)
+    else:
+        lines = line_documents(header["id"], header["user_id"], segment, 0, (header.get("items") or []) + items)
+    changes.update(items=[], items_external=True, item_segments=(header.get("item_segments") or []) + [segment])
+    return changes, lines
+
+
+async def insert_lines(lines: List[Dict[str, Any]]):
+    if lines:
+        await db.invoice_items.insert_many(lines, ordered=False)
+
+
+async def drop_segments(invoice_id: str, segments: List[int]):
+    """Delete lines of segments no header uses (replaced, or from a failed write)"""
+    if segments:
+        await db.invoice_items.delete_many({"invoice_id": invoice_id, "segment": {"$in": segments}})
+
+
+async def read_lines(header: Dict[str, Any], offset: int, limit: int) -> List[Dict[str, Any]]:
+    """Lines offset..offset+limit-1 of an invoice, in order"""
+    if not header.get("items_external"):
+        return (header.get("items") or [])[offset:offset + limit]
+    end = min(offset + limit, item_count(header))
+    if offset >= end:
+        return []
+    return await db.invoice_items.find(
+        {
+            "invoice_id": header["id"],
+            "user_id": header["user_id"],
+            "segment": {"$in": header.get("item_segments") or []},
+            "position": {"$gte": offset, "$lt": end},
+        },
+        LINE_FIELDS
+    ).sort("position", 1).to_list(None)
+
+
+async def attach_external_lines(user_id: str, invoices: List[Dict[str, Any]], fields: Optional[Dict[str, int]] = None):
+    """Fill `items` of the externally stored invoices in a batch, with one query"""
+    external = [invoice for invoice in invoices if invoice.get("items_external")]
+    if not external:
+        return
+    by_id = {invoice["id"]: invoice for invoice in external}
+    for invoice in external:
+        invoice["items"] = []
+    cursor = db.invoice_items.find(
+        {
+            "invoice_id": {"$in": list(by_id)},
+            "user_id": user_id,
+            # Segments are change feed seqs, unique per user
+            "segment": {"$in": [segment for invoice in external for segment in invoice.get("item_segments") or []]},
+        },
+        {**(fields or LINE_FIELDS), "_id": 0, "invoice_id": 1, "position": 1}
+    ).sort([("invoice_id", 1), ("position", 1)])
+    async for line in cursor:
+        invoice = by_id[line.pop("invoice_id")]
+        if line["position"] < item_count(invoice):
+            invoice["items"].append(line)
+
+
+async def mark_lines_deleted(user_id: str, invoice_ids: List[str], deleted_at: Optional[datetime]):
+    """Mirror a soft delete (or, with None, a restore) onto the invoices' lines"""
+    if invoice_ids:
+        await db.invoice_items.update_many(
+            {"invoice_id": {"$in": invoice_ids}, "user_id": user_id},
+            {"$set": {"deleted_at": deleted_at}}
+        )
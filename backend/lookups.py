@@ -0,0 +1,81 @@
+"""
+Batch lookups by id and related-entity expansion for invoice lists.
+
+The `:batchGet` endpoints resolve up to BATCH_GET_LIMIT ids at once: hits
+come from the entity cache in one round trip and the misses from one
+`$in` query. `GET /invoices?expand=customer,business` joins the customer
+and business into each invoice with `$lookup` in the same aggregation
+that lists the invoices. The joins go through the `id` index of the
+joined collection. Joined documents belonging to another user are
+dropped, so an invoice that points at a foreign id expands to null.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from cache import EntityCache
+from database import db
+
+BATCH_GET_LIMIT = 100
+
+# expand name -> (collection, invoice field holding its id)
+INVOICE_EXPANSIONS = {
+    "customer": ("customers", "customer_id"),
+    "business": ("businesses", "business_id"),
+}
+
+
+def parse_ids(ids: List[str]) -> List[str]:
+    """Ids from repeated and/or comma-separated query values, deduplicated in order"""
+    parsed = list(dict.fromkeys(
+        entity_id.strip() for value in ids for entity_id in value.split(",") if entity_id.strip()
+    ))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="Pass at least one id")
+    if len(parsed) > BATCH_GET_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_LIMIT} ids per request")
+    return parsed
+
+
+async def batch_get(
+    cache: EntityCache, collection: str, user_id: str, ids: List[str], extra_filter: Optional[dict] = None
+) -> Dict[str, Any]:
+    """The user's entities with these ids in request order, and the ids that were not found"""
+    async def load(missing: List[str]) -> List[dict]:
+        return await db[collection].find(
+            {"id": {"$in": missing}, "user_id": user_id, **(extra_filter or {})}
+        ).to_list(None)
+
+    found = await cache.get_many(user_id, ids, load)
+    return {
+        "found": [found[entity_id] for entity_id in ids if entity_id in found],
+        "not_found": [entity_id for entity_id in ids if entity_id not in found],
+    }
+
+
+def parse_expand(expand: Optional[str]) -> List[str]:
+    names = [name.strip() for name in (expand or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in INVOICE_EXPANSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot expand {', '.join(unknown)}; expected {', '.join(INVOICE_EXPANSIONS)}"
+        )
+    return list(dict.fromkeys(names))
+
+
+def expansion_stages(expand: List[str]) -> List[dict]:
+    """$lookup stages adding each expanded entity to the invoices as a (still unfiltered) array"""
+    stages = []
+    for name in expand:
+        collection, local_field = INVOICE_EXPANSIONS[name]
+        stages.append({"$lookup": {"from": collection, "localField": local_field, "foreignField": "id", "as": name}})
+    return stages
+
+
+def resolve_expansions(invoice: dict, expand: List[str], user_id: str) -> dict:
+    """Replace each joined array by the user's own document (or None)"""
+    for name in expand:
+        invoice[name] = next((doc for doc in invoice.get(name) or [] if doc.get("user_id") == user_id), None)
+    return invoice
@@ -0,0 +1,275 @@
+"""
+InvoiceForge data migrations.
+
+Run from the backend directory:
+
+    python migrations.py backfill-owner [--default-user-id <user id>]
+    python migrations.py rebuild-analytics [--user-id <user id>]
+    python migrations.py backfill-versions
+    python migrations.py backfill-item-counts
+    python migrations.py move-images-to-blobs
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from pymongo import UpdateMany, UpdateOne
+
+from analytics import INVOICE_CURRENCY
+from blob_store import IMAGE_KINDS, store_profile_images
+from database import close_client, get_database
+
+logger = logging.getLogger(__name__)
+
+# Documents written before tenant scoping have no user_id (or an explicit null)
+UNOWNED = {"user_id": None}
+
+
+async def backfill_owner_ids(db, default_user_id: str = None) -> dict:
+    """Stamp user_id on businesses, invoices and customers created before tenant scoping.
+
+    Ownership is inferred where the data allows it:
+    businesses from ``users.business_ids``, invoices from their business,
+    customers from the invoices that reference them. Anything still unowned
+    is assigned to ``default_user_id`` when given, otherwise left untouched.
+    """
+    updated = {"businesses": 0, "invoices": 0, "customers": 0}
+
+    # Businesses: users already track the ids of the businesses they own
+    ops = []
+    async for user in db.users.find({"business_ids.0": {"$exists": True}}, {"id": 1, "business_ids": 1}):
+        ops.append(UpdateMany(
+            {**UNOWNED, "id": {"$in": user["business_ids"]}},
+            {"$set": {"user_id": user["id"]}}
+        ))
+    if ops:
+        result = await db.businesses.bulk_write(ops, ordered=False)
+        updated["businesses"] += result.modified_count
+
+    # Invoices: inherit the owner of the business they were issued from
+    ops = []
+    async for business in db.businesses.find({"user_id": {"$ne": None}}, {"id": 1, "user_id": 1}):
+        ops.append(UpdateMany(
+            {**UNOWNED, "business_id": business["id"]},
+            {"$set": {"user_id": business["user_id"]}}
+        ))
+    if ops:
+        result = await db.invoices.bulk_write(ops, ordered=False)
+        updated["invoices"] += result.modified_count
+
+    # Customers: inherit the owner of the invoices billed to them
+    ops = []
+    owners = db.invoices.aggregate([
+        {"$match": {"user_id": {"$ne": None}}},
+        {"$group": {"_id": "$customer_id", "user_id": {"$first": "$user_id"}}}
+    ])
+    async for owner in owners:
+        ops.append(UpdateMany(
+            {**UNOWNED, "id": owner["_id"]},
+            {"$set": {"user_id": owner["user_id"]}}
+        ))
+    if ops:
+        result = await db.customers.bulk_write(ops, ordered=False)
+        updated["customers"] += result.modified_count
+
+    # Whatever is left cannot be attributed from the data itself
+    for collection_name in updated:
+        collection = db[collection_name]
+        if default_user_id:
+            result = await collection.update_many(UNOWNED, {"$set": {"user_id": default_user_id}})
+            updated[collection_name] += result.modified_count
+        remaining = await collection.count_documents(UNOWNED)
+        if remaining:
+            logger.warning(f"{remaining} {collection_name} documents still have no owner")
+
+    return updated
+
+
+async def rebuild_daily_stats(db, user_id: str = None) -> int:
+    """Recompute the invoice_daily_stats buckets from the invoices themselves.
+
+    Needed once for invoices created before the buckets existed, and to
+    repair drift (bucket updates are not transactional with invoice writes).
+    Returns the number of bucket documents written.
+    """
+    match = {"user_id": {"$ne": None}} if user_id is None else {"user_id": user_id}
+    match["deleted_at"] = None  # soft-deleted invoices no longer count
+    rows = db.invoices.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": "$issue_date", "currency": INVOICE_CURRENCY},
+            "invoice_count": {"$sum": 1},
+            "invoiced_total": {"$sum": "$total_amount"},
+            "paid_count": {"$sum": {"$cond": [{"$eq": ["$status", "paid"]}, 1, 0]}},
+            "paid_total": {"$sum": {"$cond": [{"$eq": ["$status", "paid"]}, "$total_amount", 0]}},
+        }},
+    ], allowDiskUse=True)
+
+    await db.invoice_daily_stats.delete_many({} if user_id is None else {"user_id": user_id})
+    written = 0
+    batch = []
+    async for row in rows:
+        key = row.pop("_id")
+        day = str(key["day"])[:10]
+        batch.append({"user_id": key["user_id"], "day": day, "month": day[:7], "currency": key["currency"], **row})
+        if len(batch) >= 1000:
+            await db.invoice_daily_stats.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        await db.invoice_daily_stats.insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+async def backfill_invoice_versions(db) -> int:
+    """Give invoices written before optimistic concurrency their initial version.
+
+    Unversioned invoices behave as version 1 for If-Match checks, but an
+    unconditional update ($inc) would store 1 rather than 2 and keep
+    matching a stale If-Match. The server runs this once at startup
+    (run_once), before serving writes.
+    """
+    result = await db.invoices.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+    return result.modified_count
+
+
+async def run_once(db, name: str, migration: Callable[..., Awaitable[int]]) -> Optional[int]:
+    """Run a startup migration unless an earlier start finished it.
+
+    The marker in db.counters is written only after the migration
+    returns, so a start that dies halfway runs it again. Workers starting
+    together may both run it; migrations run this way are idempotent.
+    Returns None when it had already run.
+    """
+    marker = f"migration:{name}"
+    if await db.counters.find_one({"_id": marker}, {"_id": 1}) is not None:
+        return None
+    result = await migration(db)
+    await db.counters.update_one({"_id": marker}, {"$set": {"completed_at": datetime.utcnow()}}, upsert=True)
+    return result
+
+
+async def backfill_item_counts(db) -> int:
+    """Store item_count on invoices written before it.
+
+    Invoice lists leave out the lines and show item_count instead, so
+    older invoices need it stored. Counts are computed in the database
+    ($size), so the lines themselves are never loaded.
+    """
+    cursor = db.invoices.aggregate([
+        {"$match": {"item_count": None}},
+        {"$project": {"_id": 0, "id": 1, "item_count": {"$size": {"$ifNull": ["$items", []]}}}},
+    ])
+    updated = 0
+    batch = []
+    async for invoice in cursor:
+        batch.append(UpdateOne({"id": invoice["id"], "item_count": None}, {"$set": {"item_count": invoice["item_count"]}}))
+        if len(batch) >= 1000:
+            updated += (await db.invoices.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.invoices.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+async def move_images_to_blobs(db) -> dict:
+    """Move inline logo/signature data URLs of profiles and templates to the blob store"""
+    moved = {"business_profiles": 0, "custom_templates": 0}
+    inline = {"$or": [{f"{kind}_url": {"$regex": "^data:"}} for kind in IMAGE_KINDS]}
+    for collection_name in moved:
+        async for doc in db[collection_name].find(inline):
+            images = {}
+            try:
+                await store_profile_images(images, doc)
+            except Exception as e:
+                logger.warning(f"Skipping {collection_name} {doc['_id']}: {getattr(e, 'detail', e)}")
+                continue
+            await db[collection_name].update_one(
+                {"_id": doc["_id"]},
+                {"$set": images, "$unset": {f"{kind}_url": "" for kind in IMAGE_KINDS}}
+            )
+            moved[collection_name] += 1
+    return moved
+
+
+async def _run_move_images():
+    try:
+        moved = await move_images_to_blobs(get_database())
+        for collection_name, count in moved.items():
+            logger.info(f"Moved images of {count} {collection_name} documents to the blob store")
+    finally:
+        close_client()
+
+
+async def _run_backfill_versions():
+    try:
+        updated = await backfill_invoice_versions(get_database())
+        logger.info(f"Set version on {updated} invoices")
+    finally:
+        close_client()
+
+
+async def _run_backfill_item_counts():
+    try:
+        updated = await backfill_item_counts(get_database())
+        logger.info(f"Set item_count on {updated} invoices")
+    finally:
+        close_client()
+
+
+async def _run_rebuild_analytics(user_id: str = None):
+    try:
+        written = await rebuild_daily_stats(get_database(), user_id)
+        logger.info(f"Rebuilt {written} invoice_daily_stats buckets")
+    finally:
+        close_client()
+
+
+async def _run_backfill_owner(default_user_id: str = None):
+    try:
+        db = get_database()
+        updated = await backfill_owner_ids(db, default_user_id)
+        for collection_name, count in updated.items():
+            logger.info(f"Backfilled user_id on {count} {collection_name} documents")
+    finally:
+        close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="InvoiceForge data migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill = subparsers.add_parser("backfill-owner", help="Stamp user_id on pre-tenancy documents")
+    backfill.add_argument(
+        "--default-user-id",
+        help="Owner for documents whose owner cannot be inferred"
+    )
+
+    rebuild = subparsers.add_parser("rebuild-analytics", help="Recompute daily invoice analytics buckets")
+    rebuild.add_argument("--user-id", help="Only rebuild this user's buckets")
+
+    subparsers.add_parser("backfill-versions", help="Set version 1 on invoices that predate versioning")
+    subparsers.add_parser("backfill-item-counts", help="Set item_count on invoices that predate it")
+    subparsers.add_parser("move-images-to-blobs", help="Move inline logo/signature images to the blob store")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == "backfill-owner":
+        asyncio.run(_run_backfill_owner(args.default_user_id))
+    elif args.command == "rebuild-analytics":
+        asyncio.run(_run_rebuild_analytics(args.user_id))
+    elif args.command == "backfill-versions":
+        asyncio.run(_run_backfill_versions())
+    elif args.command == "backfill-item-counts":
+        asyncio.run(_run_backfill_item_counts())
+    elif args.command == "move-images-to-blobs":
+        asyncio.run(_run_move_images())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Pydantic models for InvoiceForge.
+"""
+
+from datetime import datetime, date
+from typing import List, Literal, Optional, Dict, Any
+import uuid
+
+from pydantic import BaseModel, Field, EmailStr
+
+from currency import DEFAULT_CURRENCY
+
+class BusinessInfo(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    address: str
+    city: str
+    state: str
+    zip_code: str
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    website: Optional[str] = None
+    logo_url: Optional[str] = None
+    user_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BusinessInfoCreate(BaseModel):
+    name: str
+    address: str
+    city: str
+    state: str
+    zip_code: str
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    website: Optional[str] = None
+    logo_url: Optional[str] = None
+
+class Customer(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    address: str
+    city: str
+    state: str
+    zip_code: str
+    business_name: Optional[str] = None
+    user_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CustomerCreate(BaseModel):
+    name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    address: str
+    city: str
+    state: str
+    zip_code: str
+    business_name: Optional[str] = None
+
+class InvoiceItem(BaseModel):
+    description: str
+    quantity: float
+    unit_price: float
+    total: float
+    currency: Optional[str] = None  # None: the invoice's currency
+    tax_category: Optional[str] = None  # None: the rules' default category
+    tax_amount: Optional[float] = None  # set when the tax engine taxes the invoice
+
+class Invoice(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    invoice_number: str
+    customer_id: str
+    business_id: str
+    issue_date: date
+    due_date: date
+    items: List[InvoiceItem]  # empty when items_external
+    item_count: Optional[int] = None  # number of lines (missing on older invoices: len(items))
+    items_external: bool = False  # lines are paged from /invoices/{id}/items instead (large invoices)
+    currency: str = DEFAULT_CURRENCY  # of subtotal/tax/total; items in other currencies are converted
+    subtotal: float
+    tax_rate: float  # effective rate when the tax engine computed the tax
+    tax_amount: float
+    tax_jurisdiction: Optional[str] = None  # tax rules applied, when not a flat tax_rate
+    total_amount: float
+    notes: Optional[str] = None
+    status: str = "draft"  # draft, sent, paid, overdue
+    user_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
+    updated_seq: int = 0  # per-user change feed position
+    version: int = 1  # bumped on every write; exposed as the ETag
+    ai_generated: bool = False
+    recurring_id: Optional[str] = None  # set on invoices issued by a recurring definition
+    recurring_period: Optional[date] = None  # the scheduled run that issued it
+    email_status: Optional[Dict[str, Any]] = None  # delivery of the latest email sent for it
+    payment: Optional[Dict[str, Any]] = None  # bank statement line that paid it (reconciliation)
+
+class ExpandedInvoice(Invoice):
+    """An invoice as listed: no lines, plus the related entities requested via `expand` (null otherwise)"""
+    items: Optional[List[InvoiceItem]] = None  # page them from /invoices/{id}/items
+    customer: Optional[Customer] = None
+    business: Optional[BusinessInfo] = None
+
+class InvoiceCreate(BaseModel):
+    customer_id: str
+    business_id: str
+    due_date: date
+    items: List[InvoiceItem]
+    currency: Optional[str] = None  # None: the business profile's currency
+    tax_rate: Optional[float] = None  # None: per-line tax from the tax rules for the customer's address
+    notes: Optional[str] = None
+    ai_generated: bool = False
+
+class InvoiceItemsAppend(BaseModel):
+    items: List[InvoiceItem] = Field(..., min_length=1, max_length=1000)
+
+# Email Models
+class InvoiceEmailRequest(BaseModel):
+    invoice_id: str
+    to: Optional[str] = None  # comma-separated; None: the customer's email
+    cc: Optional[str] = None
+    subject: str
+    message: str  # {invoice_number}, {customer_name}, {total_amount}, ... are filled in
+    template: Optional[str] = None
+    mark_sent: bool = True  # move a draft invoice to sent once delivered
+
+class BulkInvoiceEmailRequest(BaseModel):
+    invoice_ids: List[str] = Field(..., min_length=1, max_length=5000)
+    subject: str
+    message: str
+    template: Optional[str] = None
+    mark_sent: bool = True
+
+# Recurring Invoice Models
+RecurringCadence = Literal["weekly", "monthly", "quarterly", "yearly"]
+
+class RecurringInvoice(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    customer_id: str
+    business_id: str
+    items: List[InvoiceItem]
+    currency: str = DEFAULT_CURRENCY
+    tax_rate: Optional[float] = None  # None: the tax rules
+    notes: Optional[str] = None
+    cadence: RecurringCadence = "monthly"
+    interval: int = 1  # every `interval` cadence periods
+    due_days: int = 30  # due date of issued invoices, in days after issue
+    next_run: date
+    end_date: Optional[date] = None
+    anchor_day: int  # day of month runs fall on (clamped in short months)
+    active: bool = True
+    invoices_generated: int = 0
+    last_run_at: Optional[datetime] = None
+    user_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = None
+
+class RecurringInvoiceCreate(BaseModel):
+    customer_id: str
+    business_id: str
+    items: List[InvoiceItem]
+    currency: Optional[str] = None  # None: the business profile's currency
+    tax_rate: Optional[float] = None  # None: the tax rules
+    notes: Optional[str] = None
+    cadence: RecurringCadence = "monthly"
+    interval: int = Field(1, ge=1)
+    due_days: int = Field(30, ge=0)
+    start_date: date  # first invoice is issued on this date
+    end_date: Optional[date] = None
+
+class RecurringInvoiceUpdate(BaseModel):
+    items: Optional[List[InvoiceItem]] = None
+    currency: Optional[str] = None
+    tax_rate: Optional[float] = None
+    notes: Optional[str] = None
+    cadence: Optional[RecurringCadence] = None
+    interval: Optional[int] = Field(None, ge=1)
+    due_days: Optional[int] = Field(None, ge=0)
+    next_run: Optional[date] = None
+    end_date: Optional[date] = None
+    active: Optional[bool] = None
+
+class AIInvoiceRequest(BaseModel):
+    voice_input: Optional[str] = None
+    text_input: Optional[str] = None
+    customer_name: str
+    business_id: str
+
+# Authentication Models
+class User(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    email: EmailStr
+    password_hash: str
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_login: Optional[datetime] = None
+    business_ids: List[str] = []
+
+class UserCreate(BaseModel):
+    name: str
+    email: EmailStr
+    password: str
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class UserResponse(BaseModel):
+    id: str
+    name: str
+    email: EmailStr
+    is_active: bool
+    created_at: datetime
+    last_login: Optional[datetime] = None
+    business_ids: List[str] = []
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    expires_in: int
+    user: UserResponse
+
+# AI Response Models
+class AIResponse(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    message: str
+    suggestions: List[str] = []
+    invoice_data: Optional[dict] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Enhanced AI Models
+class VoiceToTextRequest(BaseModel):
+    language: str = "en-US"  # Default to English US
+    customer_name: Optional[str] = None
+    business_id: Optional[str] = None
+
+class AIVoiceResponse(BaseModel):
+    transcript: str
+    confidence: float
+    language_detected: str
+    invoice_suggestions: List[str]
+    structured_data: Optional[Dict[str, Any]] = None
+    segments: List[Dict[str, Any]] = []  # per-chunk text and timings, in recording order
@@ -0,0 +1,20 @@
+"""
+Language detection and invoice extraction for voice/text input.
+"""
+
+from nlp.scripts import (
+    LANGUAGE_NAMES, SUPPORTED_LANGUAGES, script_histogram, dominant_language, detect_language, resolve_language
+)
+from nlp.extraction import extract_invoice_info_from_text
+from nlp.transliteration import romanize
+
+__all__ = [
+    "LANGUAGE_NAMES",
+    "SUPPORTED_LANGUAGES",
+    "script_histogram",
+    "dominant_language",
+    "detect_language",
+    "resolve_language",
+    "extract_invoice_info_from_text",
+    "romanize",
+]
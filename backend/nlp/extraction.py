@@ -0,0 +1,108 @@
+"""
+Invoice data extraction from voice/text input.
+"""
+
+from typing import Dict, Any
+
+from nlp.grammars import load_grammar
+from nlp.scripts import DEFAULT_LANGUAGE, INDIC_DIGITS
+
+def extract_invoice_info_from_text(text: str, language: str = "en-US") -> Dict[str, Any]:
+    """Extract invoice information from voice/text input using enhanced AI-like processing"""
+    
+    extracted_data = {
+        "items": [],
+        "customer_info": {},
+        "amounts": [],
+        "services": [],
+        "customer_name": "",
+        "currency": ""
+    }
+    
+    # The detected language's grammar first; English rules also cover the
+    # Latin-script names, currencies and terms common in mixed-script input
+    grammar = load_grammar(language)
+    grammars = [grammar]
+    if grammar.language != DEFAULT_LANGUAGE:
+        grammars.append(load_grammar(DEFAULT_LANGUAGE))
+    
+    # Extract amounts
+    multipliers = [multiplier for g in grammars for multiplier in g.amount_multipliers]
+    for pattern in [pattern for g in reversed(grammars) for pattern in g.amount_patterns]:
+        for match in pattern.findall(text):
+            # Convert native Indic digits if present
+            match = str(match).translate(INDIC_DIGITS)
+            try:
+                amount = float(match.replace(',', '')) if match else 0
+                # Handle number words such as सौ (hundred) and हज़ार (thousand)
+                for words, factor in multipliers:
+                    if any(word in text for word in words):
+                        if amount < 100:
+                            amount *= factor
+                        break
+                
+                if amount > 0:
+                    extracted_data["amounts"].append(amount)
+            except ValueError:
+                continue
+    
+    # Currency: the earliest mention in any grammar, else the language's usual one
+    mentions = []
+    for pattern, code in [rule for g in grammars for rule in g.currency_patterns]:
+        match = pattern.search(text)
+        if match:
+            mentions.append((match.start(), code))
+    extracted_data["currency"] = min(mentions)[1] if mentions else grammar.default_currency
+    
+    # Extract customer names
+    for pattern in [pattern for g in grammars for pattern in g.name_patterns]:
+        matches = pattern.findall(text)
+        if matches:
+            extracted_data["customer_name"] = matches[0].strip()
+            break
+    
+    # Extract services
+    lowered_text = text.lower()
+    for keyword in [keyword for g in grammars for keyword in g.service_keywords]:
+        if keyword.lower() in lowered_text:
+            extracted_data["services"].append(keyword)
+    
+    # Fallback: if no specific services found, try to extract general service descriptions
+    if not extracted_data["services"]:
+        for pattern in grammar.general_service_patterns:
+            matches = pattern.findall(text)
+            if matches:
+                extracted_data["services"].extend([match.strip() for match in matches[:2]])  # Limit to 2 services
+    
+    # Create items from extracted info
+    if extracted_data["services"] and extracted_data["amounts"]:
+        for i, service in enumerate(extracted_data["services"][:len(extracted_data["amounts"])]):
+            amount = extracted_data["amounts"][i] if i < len(extracted_data["amounts"]) else extracted_data["amounts"][0]
+            extracted_data["items"].append({
+                "description": service.title(),
+                "quantity": 1,
+                "unit_price": amount,
+                "total": amount
+            })
+    elif extracted_data["services"] and not extracted_data["amounts"]:
+        # If services found but no amounts, create items with default pricing
+        default_price = 500.0
+        for service in extracted_data["services"][:3]:  # Limit to 3 services
+            extracted_data["items"].append({
+                "description": service.title(),
+                "quantity": 1,
+                "unit_price": default_price,
+                "total": default_price
+            })
+    elif not extracted_data["services"] and extracted_data["amounts"]:
+        # If amounts found but no services, create generic service items
+        for amount in extracted_data["amounts"][:3]:  # Limit to 3 items
+            service_name = grammar.default_service_name
+            extracted_data["items"].append({
+                "description": service_name,
+                "quantity": 1,
+                "unit_price": amount,
+                "total": amount
+            })
+    
+    return extracted_data
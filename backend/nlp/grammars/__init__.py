@@ -0,0 +1,41 @@
+"""
+Per-language extraction grammars.
+
+Each language lives in its own module (``en_us``, ``hi_in``, ...) and is
+imported and compiled the first time text in that language is processed.
+"""
+
+import importlib
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+
+class Grammar:
+    """Compiled extraction rules for one language"""
+
+    def __init__(self, module):
+        self.language = module.LANGUAGE
+        self.amount_patterns = [re.compile(p, re.IGNORECASE) for p in getattr(module, "AMOUNT_PATTERNS", [])]
+        self.amount_multipliers: List[Tuple[Tuple[str, ...], int]] = getattr(module, "AMOUNT_MULTIPLIERS", [])
+        self.service_keywords: List[str] = getattr(module, "SERVICE_KEYWORDS", [])
+        self.name_patterns = [re.compile(p, re.IGNORECASE) for p in getattr(module, "NAME_PATTERNS", [])]
+        self.general_service_patterns = [
+            re.compile(p, re.IGNORECASE) for p in getattr(module, "GENERAL_SERVICE_PATTERNS", [])
+        ]
+        self.default_service_name: str = getattr(module, "DEFAULT_SERVICE_NAME", "Professional Services")
+        self.default_currency: str = getattr(module, "DEFAULT_CURRENCY", "USD")
+        self.currency_patterns = [
+            (re.compile(p, re.IGNORECASE), code) for p, code in getattr(module, "CURRENCY_PATTERNS", [])
+        ]
+
+
+@lru_cache(maxsize=None)
+def load_grammar(language: str) -> Grammar:
+    """Import and compile the grammar for a language code such as "hi-IN" (en-US if unknown)"""
+    module_name = language.replace("-", "_").lower()
+    try:
+        module = importlib.import_module(f"{__name__}.{module_name}")
+    except ImportError:
+        module = importlib.import_module(f"{__name__}.en_us")
+    return Grammar(module)
@@ -0,0 +1,17 @@
+"""Bengali extraction grammar."""
+
+LANGUAGE = "bn-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*টাকা',  # 500 টাকা
+    r'([\d,]+)\s*রুপি',  # 500 রুপি
+    r'(\d+)\s*(?:হাজার)',  # 5 হাজার (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("হাজার",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "পেশাদার পরিষেবা"
@@ -0,0 +1,47 @@
+"""English extraction grammar (also applied to Latin text inside other languages)."""
+
+LANGUAGE = "en-US"
+DEFAULT_CURRENCY = "USD"
+
+# (pattern, ISO code); the first currency mentioned decides the invoice currency
+CURRENCY_PATTERNS = [
+    (r'\$|\bdollars?\b|\busd\b', "USD"),
+    (r'₹|\brupees?\b|\brs\.?(?=\s*\d)|\binr\b', "INR"),
+    (r'€|\beuros?\b', "EUR"),
+    (r'£|\bpounds?\b|\bgbp\b', "GBP"),
+]
+
+AMOUNT_PATTERNS = [
+    r'\$([\d,]+\.?\d*)',  # $500, $1,000.50
+    r'₹\s?([\d,]+\.?\d*)',  # ₹500
+    r'([\d,]+) dollars?',  # 500 dollars
+    r'([\d,]+) rupees?',   # 500 rupees
+]
+
+SERVICE_KEYWORDS = [
+    "web design", "website", "ui/ux", "consulting", "development",
+    "programming", "design", "marketing", "seo", "maintenance",
+    "software", "app", "application", "mobile app", "e-commerce",
+    "logo design", "graphic design", "content writing", "translation"
+]
+
+# Customer name patterns - "create invoice for [Name]" patterns take priority
+NAME_PATTERNS = [
+    r'(?:create|make)\s+(?:a\s+)?invoice\s+for\s+([A-Za-z][A-Za-z\s]*?)\s+for\s+',
+    r'(?:create|make)\s+(?:a\s+)?invoice\s+for\s+([A-Za-z][A-Za-z\s]*?)\s+(?:web|design|consulting|project|software|development|service)',
+    r'(?:create|make)\s+(?:a\s+)?invoice\s+for\s+([A-Za-z][A-Za-z\s]*?)\s+\$',
+    r'(?:create|make)\s+(?:a\s+)?invoice\s+for\s+([A-Za-z][A-Za-z\s]*?)\s+(?:[0-9])',
+    # More general patterns
+    r'for\s+([A-Za-z][A-Za-z\s]*?)\s+for\s+',
+    r'for\s+([A-Za-z][A-Za-z\s]*?)\s+(?:web|design|consulting|project|software|development|service)',
+    r'for\s+([A-Za-z][A-Za-z\s]*?)\s+\$',
+    r'for\s+([A-Za-z][A-Za-z\s]*?)\s+(?:[0-9])',
+    r'invoice\s+for\s+([A-Za-z][A-Za-z\s]*?)\s+(?:,|\.|$|web|design|consulting|project|software|development|\$|[0-9])',
+    r'client\s+([A-Za-z][A-Za-z\s]*?)\s+(?:,|\.|$|web|design|consulting|project|software|development|\$|[0-9])',
+    r'customer\s+([A-Za-z][A-Za-z\s]*?)\s+(?:,|\.|$|web|design|consulting|project|software|development|\$|[0-9])'
+]
+
+# Fallback when no known service keyword is found
+GENERAL_SERVICE_PATTERNS = [r'(\w+\s*\w*) service', r'(\w+\s*\w*) work', r'(\w+\s*\w*) project']
+
+DEFAULT_SERVICE_NAME = "Professional Services"
@@ -0,0 +1,16 @@
+"""Gujarati extraction grammar."""
+
+LANGUAGE = "gu-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*રૂપિયા',  # 500 રૂપિયા
+    r'(\d+)\s*(?:હજાર)',  # 5 હજાર (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("હજાર",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "વ્યાવસાયિક સેવાઓ"
@@ -0,0 +1,52 @@
+"""Hindi extraction grammar (Devanagari script)."""
+
+LANGUAGE = "hi-IN"
+DEFAULT_CURRENCY = "INR"
+
+CURRENCY_PATTERNS = [
+    (r'डॉलर', "USD"),
+    (r'रुपए|रुपये|रुपया', "INR"),
+]
+
+AMOUNT_PATTERNS = [
+    r'([\d,]+) डॉलर',      # 500 डॉलर
+    r'([\d,]+) रुपए',       # 500 रुपए
+    r'([\d,]+) रुपये',      # 500 रुपये
+    r'(\d+) सौ',           # 5 सौ (500)
+    r'(\d+) हज़ार',         # 1 हज़ार (1000)
+    r'(\d+) हजार',         # 1 हजार (1000)
+    # Devanagari numbers
+    r'([०-९,]+) डॉलर',
+    r'([०-९,]+) रुपए',
+]
+
+# Number words that scale small amounts anywhere in the text (first match wins)
+AMOUNT_MULTIPLIERS = [
+    (("सौ",), 100),
+    (("हज़ार", "हजार"), 1000),
+]
+
+SERVICE_KEYWORDS = [
+    "वेब डिज़ाइन", "वेबसाइट", "वेब साइट", "परामर्श", "सलाह",
+    "विकास", "डिज़ाइन", "डिजाइन", "प्रोग्रामिंग", "सॉफ्टवेयर",
+    "एप्लिकेशन", "ऐप", "मोबाइल ऐप", "ई-कॉमर्स", "लोगो डिज़ाइन",
+    "ग्राफिक डिज़ाइन", "कंटेंट राइटिंग", "अनुवाद", "मार्केटिंग",
+    "एसईओ", "रखरखाव", "मेंटेनेंस", "सेवा", "काम", "प्रोजेक्ट"
+]
+
+# Devanagari letters with their vowel signs and viramas (danda and digits excluded)
+DEVANAGARI_WORD = r'\u0900-\u0963\u0971-\u097F'
+
+NAME_PATTERNS = [
+    rf'([{DEVANAGARI_WORD}\s]+?) के लिए',
+    rf'ग्राहक ([{DEVANAGARI_WORD}\s]+?)(?:,|\.|$)',
+    rf'क्लाइंट ([{DEVANAGARI_WORD}\s]+?)(?:,|\.|$)',
+    # English names in Hindi context
+    r'([A-Za-z][A-Za-z\s]*?) के लिए\s+(?:वेब|डिज़ाइन|सॉफ्टवेयर|विकास|सेवा)',
+    r'([A-Za-z][A-Za-z\s]*?) का चालान',
+    r'([A-Za-z][A-Za-z\s]*?) के लिए\s+(?:[0-9]|\$)'
+]
+
+GENERAL_SERVICE_PATTERNS = [r'(.*?) की सेवा', r'(.*?) का काम', r'(.*?) प्रोजेक्ट']
+
+DEFAULT_SERVICE_NAME = "व्यावसायिक सेवा"
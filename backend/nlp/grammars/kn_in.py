@@ -0,0 +1,16 @@
+"""Kannada extraction grammar."""
+
+LANGUAGE = "kn-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*ರೂಪಾಯಿ',  # 500 ರೂಪಾಯಿ
+    r'(\d+)\s*(?:ಸಾವಿರ)',  # 5 ಸಾವಿರ (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("ಸಾವಿರ",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "ವೃತ್ತಿಪರ ಸೇವೆಗಳು"
@@ -0,0 +1,16 @@
+"""Malayalam extraction grammar."""
+
+LANGUAGE = "ml-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*രൂപ',  # 500 രൂപ
+    r'(\d+)\s*(?:ആയിരം)',  # 5 ആയിരം (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("ആയിരം",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "പ്രൊഫഷണൽ സേവനങ്ങൾ"
@@ -0,0 +1,16 @@
+"""Odia extraction grammar."""
+
+LANGUAGE = "or-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*ଟଙ୍କା',  # 500 ଟଙ୍କା
+    r'(\d+)\s*(?:ହଜାର)',  # 5 ହଜାର (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("ହଜାର",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "ବୃତ୍ତିଗତ ସେବା"
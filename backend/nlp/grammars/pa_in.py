@@ -0,0 +1,16 @@
+"""Punjabi (Gurmukhi script) extraction grammar."""
+
+LANGUAGE = "pa-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*ਰੁਪਏ',  # 500 ਰੁਪਏ
+    r'(\d+)\s*(?:ਹਜ਼ਾਰ|ਹਜਾਰ)',  # 5 ਹਜ਼ਾਰ (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("ਹਜ਼ਾਰ", "ਹਜਾਰ"), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "ਪੇਸ਼ੇਵਰ ਸੇਵਾਵਾਂ"
@@ -0,0 +1,16 @@
+"""Tamil extraction grammar."""
+
+LANGUAGE = "ta-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*ரூபாய்',  # 500 ரூபாய்
+    r'(\d+)\s*(?:ஆயிரம்)',  # 5 ஆயிரம் (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("ஆயிரம்",), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "தொழில்முறை சேவைகள்"
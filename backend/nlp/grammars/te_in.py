@@ -0,0 +1,17 @@
+"""Telugu extraction grammar."""
+
+LANGUAGE = "te-IN"
+DEFAULT_CURRENCY = "INR"
+
+# \d also matches this script's native digits
+AMOUNT_PATTERNS = [
+    r'([\d,]+)\s*రూపాయలు',  # 500 రూపాయలు
+    r'([\d,]+)\s*రూపాయి',  # 500 రూపాయి
+    r'(\d+)\s*(?:వేలు|వెయ్యి)',  # 5 వేలు (5000)
+]
+
+AMOUNT_MULTIPLIERS = [
+    (("వేలు", "వెయ్యి"), 1000),
+]
+
+DEFAULT_SERVICE_NAME = "వృత్తిపరమైన సేవలు"
@@ -0,0 +1,102 @@
+"""
+Unicode-block script classification.
+
+The nine major Indic scripts occupy consecutive 128-codepoint blocks from
+U+0900 to U+0D7F, so a character's script is found with one subtraction
+and shift, and the whole text is classified in a single pass.
+"""
+
+from typing import Dict
+
+# Indic blocks in codepoint order, starting at U+0900, 0x80 codepoints each
+INDIC_BLOCK_START = 0x0900
+INDIC_BLOCKS = [
+    "Devanagari", "Bengali", "Gurmukhi", "Gujarati", "Oriya",
+    "Tamil", "Telugu", "Kannada", "Malayalam",
+]
+INDIC_BLOCK_END = INDIC_BLOCK_START + 0x80 * len(INDIC_BLOCKS)
+DEVANAGARI_EXTENDED = range(0xA8E0, 0xA900)
+
+# Speech/extraction language for each script. Marathi and Nepali share
+# Devanagari with Hindi and cannot be told apart by script alone.
+SCRIPT_LANGUAGES = {
+    "Latin": "en-US",
+    "Devanagari": "hi-IN",
+    "Bengali": "bn-IN",
+    "Gurmukhi": "pa-IN",
+    "Gujarati": "gu-IN",
+    "Oriya": "or-IN",
+    "Tamil": "ta-IN",
+    "Telugu": "te-IN",
+    "Kannada": "kn-IN",
+    "Malayalam": "ml-IN",
+}
+DEFAULT_LANGUAGE = "en-US"
+SUPPORTED_LANGUAGES = list(SCRIPT_LANGUAGES.values())
+
+# English names of the supported languages, for messages
+LANGUAGE_NAMES = {
+    "en-US": "English",
+    "hi-IN": "Hindi",
+    "bn-IN": "Bengali",
+    "pa-IN": "Punjabi",
+    "gu-IN": "Gujarati",
+    "or-IN": "Odia",
+    "ta-IN": "Tamil",
+    "te-IN": "Telugu",
+    "kn-IN": "Kannada",
+    "ml-IN": "Malayalam",
+}
+
+# Every Indic decimal digit (the block offset 0x66..0x6F in each script) -> ASCII
+INDIC_DIGITS = str.maketrans({
+    chr(INDIC_BLOCK_START + 0x80 * block + 0x66 + digit): str(digit)
+    for block in range(len(INDIC_BLOCKS))
+    for digit in range(10)
+})
+
+
+def script_histogram(text: str) -> Dict[str, int]:
+    """Count the letters of each script in one pass (digits, spaces and punctuation are ignored)"""
+    histogram: Dict[str, int] = {}
+    for char in text:
+        codepoint = ord(char)
+        if INDIC_BLOCK_START <= codepoint < INDIC_BLOCK_END:
+            script = INDIC_BLOCKS[(codepoint - INDIC_BLOCK_START) >> 7]
+            # Digits are shared vocabulary, not evidence of a language
+            if 0x66 <= (codepoint & 0x7F) <= 0x6F:
+                continue
+        elif codepoint in DEVANAGARI_EXTENDED:
+            script = "Devanagari"
+        elif char.isalpha() and codepoint < 0x0250:
+            script = "Latin"
+        else:
+            continue
+        histogram[script] = histogram.get(script, 0) + 1
+    return histogram
+
+
+def dominant_language(histogram: Dict[str, int]) -> str:
+    """Pick the language for a script histogram.
+
+    Indic speech is routinely mixed with English names and terms, so any
+    Indic letters win over Latin; among Indic scripts the most frequent wins.
+    """
+    indic = {script: count for script, count in histogram.items() if script != "Latin"}
+    if indic:
+        return SCRIPT_LANGUAGES[max(indic, key=indic.get)]
+    return DEFAULT_LANGUAGE
+
+
+def detect_language(text: str) -> str:
+    """Detect the language of text from the scripts it is written in"""
+    return dominant_language(script_histogram(text))
+
+
+def resolve_language(code: str) -> str:
+    """Map a requested language ("hi", "ta-IN", ...) to a supported code, defaulting to en-US"""
+    prefix = (code or "").split("-")[0].lower()
+    for language in SUPPORTED_LANGUAGES:
+        if language.split("-")[0] == prefix:
+            return language
+    return DEFAULT_LANGUAGE
@@ -0,0 +1,85 @@
+"""
+Romanization of Indic script text.
+
+The Indic blocks follow the shared ISCII layout, so a letter's offset
+within its block (``codepoint & 0x7F``) means the same sound in every
+script and one table covers all nine. The output is a loose, ASCII
+romanization meant for matching ("शर्मा" -> "sharmaa"), not display.
+"""
+
+from nlp.scripts import INDIC_BLOCK_START, INDIC_BLOCK_END
+
+# Block offset -> romanization
+INDIC_SIGNS = {0x01: "n", 0x02: "n", 0x03: "h", 0x70: "n"}
+INDIC_VOWELS = {
+    0x05: "a", 0x06: "aa", 0x07: "i", 0x08: "ii", 0x09: "u", 0x0A: "uu", 0x0B: "ri", 0x0C: "li",
+    0x0D: "e", 0x0E: "e", 0x0F: "e", 0x10: "ai", 0x11: "o", 0x12: "o", 0x13: "o", 0x14: "au",
+    0x60: "rii", 0x61: "lii",
+}
+INDIC_CONSONANTS = {
+    0x15: "k", 0x16: "kh", 0x17: "g", 0x18: "gh", 0x19: "n",
+    0x1A: "ch", 0x1B: "chh", 0x1C: "j", 0x1D: "jh", 0x1E: "n",
+    0x1F: "t", 0x20: "th", 0x21: "d", 0x22: "dh", 0x23: "n",
+    0x24: "t", 0x25: "th", 0x26: "d", 0x27: "dh", 0x28: "n", 0x29: "n",
+    0x2A: "p", 0x2B: "ph", 0x2C: "b", 0x2D: "bh", 0x2E: "m",
+    0x2F: "y", 0x30: "r", 0x31: "r", 0x32: "l", 0x33: "l", 0x34: "l", 0x35: "v",
+    0x36: "sh", 0x37: "sh", 0x38: "s", 0x39: "h",
+    # Nukta letters (क़ ख़ ग़ ज़ ड़ ढ़ फ़ य़ and their Bengali/Gurmukhi counterparts)
+    0x58: "q", 0x59: "kh", 0x5A: "g", 0x5B: "z", 0x5C: "r", 0x5D: "rh", 0x5E: "f", 0x5F: "y",
+}
+INDIC_VOWEL_SIGNS = {
+    0x3E: "aa", 0x3F: "i", 0x40: "ii", 0x41: "u", 0x42: "uu", 0x43: "ri", 0x44: "rii",
+    0x45: "e", 0x46: "e", 0x47: "e", 0x48: "ai", 0x49: "o", 0x4A: "o", 0x4B: "o", 0x4C: "au",
+    0x62: "li", 0x63: "lii",
+}
+VIRAMA = 0x4D
+NUKTA = 0x3C
+
+# Script-specific letters outside the shared layout
+EXTRA_LETTERS = {
+    0x09CE: "t",  # Bengali khanda ta
+    0x0D7A: "n", 0x0D7B: "n", 0x0D7C: "r", 0x0D7D: "l", 0x0D7E: "l", 0x0D7F: "k",  # Malayalam chillu
+}
+
+
+def romanize(text: str) -> str:
+    """Romanize Indic letters in `text`, leaving everything else as is.
+
+    Consonants carry an inherent "a" unless followed by a vowel sign or
+    virama; a word-final inherent "a" is dropped, as in Hindi speech
+    ("राम" -> "raam", not "raama").
+    """
+    out = []
+    pending_vowel = False  # the last consonant still has its inherent "a"
+    for char in text:
+        codepoint = ord(char)
+        if not INDIC_BLOCK_START <= codepoint < INDIC_BLOCK_END:
+            # Word boundary: drop the final inherent vowel
+            pending_vowel = False
+            out.append(char)
+            continue
+        offset = codepoint & 0x7F
+        if offset == NUKTA:
+            continue
+        if offset in INDIC_VOWEL_SIGNS:
+            out.append(INDIC_VOWEL_SIGNS[offset])
+            pending_vowel = False
+            continue
+        if offset == VIRAMA:
+            pending_vowel = False
+            continue
+        if pending_vowel:
+            out.append("a")
+            pending_vowel = False
+        if offset in INDIC_CONSONANTS:
+            out.append(INDIC_CONSONANTS[offset])
+            pending_vowel = True
+        elif codepoint in EXTRA_LETTERS:
+            out.append(EXTRA_LETTERS[codepoint])
+        elif offset in INDIC_VOWELS:
+            out.append(INDIC_VOWELS[offset])
+        elif offset in INDIC_SIGNS:
+            out.append(INDIC_SIGNS[offset])
+        elif 0x66 <= offset <= 0x6F:
+            out.append(str(offset - 0x66))
+    return "".join(out)
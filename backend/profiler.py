@@ -0,0 +1,290 @@
+"""
+In-process sampling profiler for looking at production workers.
+
+A Sampler thread wakes `hz` times a second, reads the Python stack of
+every thread with sys._current_frames() and counts identical stacks.
+Nothing is hooked into the interpreter, so profiled code runs at full
+speed; the cost is one stack walk per thread per sample. Threads that
+are only waiting (the event loop in select, idle pool workers) are left
+out unless idle samples are asked for. While the event loop thread holds
+the GIL the sampler waits for it, so the effective rate is capped by the
+interpreter's switch interval (5 ms by default).
+
+Profiles come out as collapsed stacks ("frame;frame;frame count" per
+line, the input of flamegraph.pl, inferno and speedscope) or as a
+speedscope JSON file.
+
+An admin can also trace a single request by sending `X-Profile: 1`. Its
+samples are only taken while that request's task is running on the
+event loop (work it hands to threads is not included). The result is
+stored in `profiles` for PROFILE_RETENTION_SECONDS, and its id is
+returned in the X-Profile-Id response header.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from database import db
+from security import is_admin, user_id_from_token
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MAX_SECONDS = 120
+PROFILE_DEFAULT_HZ = 100
+PROFILE_MAX_HZ = 1000
+# Requests are short, so traces sample as fast as the interpreter allows
+PROFILE_TRACE_HZ = 1000
+PROFILE_RETENTION_SECONDS = 24 * 3600
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+PROFILE_SUMMARY_FIELDS = {"_id": 0, "id": 1, "name": 1, "created_at": 1, "duration_seconds": 1, "samples": 1}
+PROFILE_FORMATS = {
+    "collapsed": ("text/plain; charset=utf-8", "txt"),
+    "speedscope": ("application/json", "speedscope.json"),
+}
+
+# Innermost frames of a thread that is waiting rather than running Python code
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_ROOTS = sorted(
+    {os.path.dirname(os.path.abspath(__file__))} | {path for path in sys.path if path},
+    key=len, reverse=True
+)
+_labels: Dict[Any, str] = {}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _short_path(filename: str) -> str:
+    for root in _ROOTS:
+        if filename.startswith(root + os.sep):
+            return filename[len(root) + 1:]
+    return filename
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+        _labels[code] = label
+    return label
+
+
+def _is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class Sampler:
+    """Counts the stacks of all threads, or only of one asyncio task, until stopped"""
+
+    def __init__(
+        self,
+        hz: int = PROFILE_DEFAULT_HZ,
+        idle: bool = False,
+        task: Optional[asyncio.Task] = None,
+    ):
+        self.hz = hz
+        self.idle = idle
+        self.counts: Counter = Counter()
+        self.ticks = 0
+        self.duration = 0.0
+        self._task = task
+        self._loop_thread = threading.get_ident() if task is not None else None
+        self._loop = task.get_loop() if task is not None else None
+        self._thread_names: Dict[int, str] = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self._started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._thread.join()
+            self.duration = time.monotonic() - self._started
+        return self
+
+    def _run(self):
+        interval = 1 / self.hz
+        own = threading.get_ident()
+        while not self._stopped.wait(interval):
+            self.ticks += 1
+            frames = sys._current_frames()
+            if self._task is not None:
+                if asyncio.current_task(self._loop) is not self._task:
+                    continue
+                frames = {self._loop_thread: frames.get(self._loop_thread)}
+            for ident, frame in frames.items():
+                if ident == own or frame is None or (not self.idle and _is_idle(frame.f_code)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if self._task is None:
+                    stack.append(self._thread_name(ident))
+                self.counts[tuple(reversed(stack))] += 1
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.setdefault(ident, f"thread-{ident}")
+        return name
+
+    def profile(self, name: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "hz": self.hz,
+            "duration_seconds": round(self.duration, 3),
+            "ticks": self.ticks,
+            "samples": sum(self.counts.values()),
+            "stacks": [[";".join(stack), count] for stack, count in self.counts.most_common()],
+        }
+
+
+# Output
+def to_collapsed(profile: Dict[str, Any]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"])
+
+
+def to_speedscope(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """A speedscope "sampled" profile; each distinct stack is one sample weighted by its time"""
+    frames, index = [], {}
+    samples, weights = [], []
+    # Measured time per tick, which is longer than 1/hz when the GIL is busy
+    ticks = profile["ticks"]
+    interval_ms = profile["duration_seconds"] * 1000 / ticks if ticks else 1000 / profile["hz"]
+    for stack, count in profile["stacks"]:
+        sample = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(round(count * interval_ms, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": profile["name"],
+        "exporter": "InvoiceForge profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": profile["name"],
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(sum(weights), 3),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+# Whole-process profiles
+_running = asyncio.Lock()
+
+
+async def profile_process(seconds: float, hz: int = PROFILE_DEFAULT_HZ, idle: bool = False) -> Dict[str, Any]:
+    """Sample every thread of this worker for `seconds`; one profile at a time"""
+    if _running.locked():
+        raise ProfilerBusy("A profile is already running in this worker")
+    async with _running:
+        sampler = Sampler(hz, idle).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    logger.info(f"Profiled worker {os.getpid()} for {seconds}s: {sampler.ticks} ticks")
+    return sampler.profile(f"worker {os.getpid()}")
+
+
+# Single-request traces
+async def ensure_indexes():
+    await db.profiles.create_index("id", unique=True)
+    await db.profiles.create_index("created_at", expireAfterSeconds=PROFILE_RETENTION_SECONDS)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _admin_id(scope) -> Optional[str]:
+    scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    user_id = user_id_from_token(token.strip())
+    if not user_id:
+        return None
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "email": 1})
+    return user_id if user and is_admin(user.get("email")) else None
+
+
+class ProfileRequestMiddleware:
+    """ASGI middleware that traces requests sent by an admin with `X-Profile: 1`"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _header(scope, PROFILE_HEADER) not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+        admin_id = await _admin_id(scope)
+        if admin_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = str(uuid.uuid4())
+        sampler = Sampler(PROFILE_TRACE_HZ, task=asyncio.current_task()).start()
+        saved = False
+
+        async def save():
+            nonlocal saved
+            if saved:
+                return
+            saved = True
+            sampler.stop()
+            await db.profiles.insert_one({
+                "id": profile_id,
+                "user_id": admin_id,
+                "created_at": datetime.utcnow(),
+                **sampler.profile(f"{scope['method']} {scope['path']}"),
+            })
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Store before the last byte goes out so the id can be fetched right away
+                await save()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            await save()
+
@@ -0,0 +1,228 @@
+"""
+Token-bucket admission control for expensive endpoints.
+
+Requests to rate-limited paths spend tokens from a bucket keyed by the
+caller: the user id from a valid bearer token, otherwise the client
+address. Each route has a cost, so one audio upload spends as much as
+many text requests. Over-limit requests get 429 with Retry-After before
+the request body is read, and routes outside the policy table pass
+straight through.
+
+Buckets live in-process by default. Set ``RATE_LIMIT_BACKEND=redis``
+(``RATE_LIMIT_REDIS_URL``, falling back to ``CACHE_REDIS_URL``) to share
+them between workers.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from security import user_id_from_token
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes: capacity in tokens, refilled continuously at refill_per_second
+RATE_LIMIT_POLICIES = {
+    "ai": {"capacity": 60, "refill_per_second": 0.5},
+    "ai_anonymous": {"capacity": 20, "refill_per_second": 0.1},
+}
+
+# (method or None for any, path prefix) -> (policy, cost). The longest matching prefix wins.
+RATE_LIMITED_ROUTES = {
+    ("POST", "/api/ai/voice-file-to-text"): ("ai", 10),
+    ("POST", "/api/ai/transcriptions"): ("ai", 10),
+    (None, "/api/ai/"): ("ai", 1),
+}
+
+
+class RateLimitStore:
+    """Bucket storage interface"""
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """Take `cost` tokens if available; return (allowed, seconds until enough tokens)"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """In-process buckets; the least recently used are dropped past max_keys"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(capacity), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (cost - tokens) / refill_per_second
+
+
+# Refill, take and persist atomically on the Redis server, using its clock
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared by all workers (requires the redis package)"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def consume(self, key: str, cost: int, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        allowed, retry_after = await self._script(
+            keys=[f"ratelimit:{key}"], args=[capacity, refill_per_second, cost]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    async def close(self):
+        await self._redis.close()
+
+
+_store: Optional[RateLimitStore] = None
+
+
+def get_rate_limit_store() -> RateLimitStore:
+    """Return the configured store, creating it on first use"""
+    global _store
+    if _store is None:
+        _store = create_rate_limit_store()
+    return _store
+
+
+async def close_rate_limit_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+def create_rate_limit_store() -> RateLimitStore:
+    backend_name = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend_name == "memory":
+        return MemoryRateLimitStore()
+    if backend_name == "redis":
+        url = os.environ.get("RATE_LIMIT_REDIS_URL") or os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        return RedisRateLimitStore(url)
+    raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND: {backend_name}")
+
+
+def match_route(method: str, path: str) -> Optional[Tuple[str, int]]:
+    """Find the (policy, cost) for a request, or None if it is not limited"""
+    best = None
+    for (route_method, prefix), rule in RATE_LIMITED_ROUTES.items():
+        if route_method not in (None, method) or not path.startswith(prefix):
+            continue
+        if best is None or len(prefix) > len(best[0]):
+            best = (prefix, rule)
+    return best[1] if best else None
+
+
+def _caller_identity(scope) -> Tuple[str, bool]:
+    """Return (bucket key, authenticated) for an ASGI request scope"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                user_id = user_id_from_token(token.strip())
+                if user_id:
+                    return f"user:{user_id}", True
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}", False
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing RATE_LIMITED_ROUTES"""
+
+    def __init__(self, app, store: Optional[RateLimitStore] = None):
+        self.app = app
+        self._store = store
+
+    @property
+    def store(self) -> RateLimitStore:
+        return self._store or get_rate_limit_store()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        rule = match_route(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        policy_name, cost = rule
+        key, authenticated = _caller_identity(scope)
+        if not authenticated:
+            policy_name = f"{policy_name}_anonymous"
+        policy = RATE_LIMIT_POLICIES[policy_name]
+
+        try:
+            allowed, retry_after = await self.store.consume(
+                f"{policy_name}:{key}", cost, policy["capacity"], policy["refill_per_second"]
+            )
+        except Exception as e:
+            # Fail open: a broken limiter must not take the API down with it
+            logger.warning(f"Rate limiter unavailable: {e}")
+            allowed, retry_after = True, 0.0
+
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": "Rate limit exceeded. Please retry later."}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,356 @@
+"""
+Bank statement reconciliation.
+
+A statement CSV is parsed in chunks of RECONCILIATION_CHUNK_ROWS rows
+straight from the upload. Credits are then matched against the user's
+open invoices through two hash indexes built once per run:
+
+* invoice number: "INV-042" (or "inv 42", "INV/00042") in the
+  description finds the invoice directly. A line may pay several
+  invoices if the amounts add up. If they do not, the amount index is
+  tried before the line is reported.
+* amount in cents: a bucket of invoices with that total, sorted by issue
+  date. Two bisects find the ones issued in the window around the
+  payment. A single candidate is a match. Several are reported as
+  ambiguous.
+
+Each line costs a few dict lookups and bisects, so 100k lines against
+100k invoices takes one pass over each rather than 10^10 comparisons.
+The statement is read twice: a first pass makes the reference matches
+across the whole statement, so an amount match never takes an invoice
+that another line names, and a second pass matches the remaining lines.
+Besides the chunk being parsed, memory holds the invoice indexes and the
+matches, both bounded by the number of open invoices rather than by the
+statement size. Confirmed matches are marked paid with a single
+bulk_write.
+"""
+
+import asyncio
+import bisect
+import csv
+import io
+import re
+import uuid
+from collections import defaultdict
+from datetime import date, datetime
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from analytics import STATS_FIELDS, record_invoice_changes
+from change_feed import next_change_seq
+from database import db, invoice_cache, NOT_DELETED
+
+RECONCILIATION_MAX_BYTES = 50 * 1024 * 1024
+RECONCILIATION_CHUNK_ROWS = 10000
+# Payments are matched to invoices issued up to this long before them...
+RECONCILIATION_WINDOW_DAYS = 120
+# ...or shortly after (statements and invoice dates can disagree by a few days)
+RECONCILIATION_EARLY_DAYS = 7
+# Entries listed per outcome in the response; the counts are always complete
+RECONCILIATION_DETAIL_LIMIT = 1000
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%d-%b-%Y", "%d %B %Y", "%d/%m/%y")
+
+# Recognized header names (lower case)
+DATE_COLUMNS = ("date", "transaction date", "txn date", "value date", "posting date", "posted date", "booking date")
+DESCRIPTION_COLUMNS = (
+    "description", "narration", "details", "transaction details", "particulars", "memo", "reference", "remarks"
+)
+CREDIT_COLUMNS = ("credit", "credit amount", "deposit", "deposits", "paid in", "cr")
+AMOUNT_COLUMNS = ("amount", "transaction amount")
+
+INVOICE_REFERENCE = re.compile(r"\bINV[\s\-_/#:.]*0*(\d+)\b", re.IGNORECASE)
+OPEN_INVOICE_FIELDS = {**STATS_FIELDS, "id": 1, "invoice_number": 1, "customer_id": 1}
+
+
+class StatementError(ValueError):
+    pass
+
+
+# Statement parsing
+def _find_columns(header: List[str]) -> Dict[str, Any]:
+    names = [name.strip().lower() for name in header]
+    date_column = next((names.index(name) for name in DATE_COLUMNS if name in names), None)
+    credit_column = next((names.index(name) for name in CREDIT_COLUMNS if name in names), None)
+    amount_column = next((names.index(name) for name in AMOUNT_COLUMNS if name in names), None)
+    if date_column is None or (credit_column is None and amount_column is None):
+        raise StatementError(
+            "Statement needs a date column and an amount or credit column "
+            f"(found: {', '.join(name for name in names if name) or 'no header'})"
+        )
+    return {
+        "date": date_column,
+        # A separate credit column holds incoming payments; a signed amount column has them positive
+        "amount": credit_column if credit_column is not None else amount_column,
+        "description": [i for i, name in enumerate(names) if name in DESCRIPTION_COLUMNS],
+    }
+
+def parse_amount(value: str) -> Optional[float]:
+    """A money amount like "1,234.50", "₹ 1,234.50", "(12.00)" or "12.00 CR"; None when blank"""
+    text = value.strip()
+    if not text:
+        return None
+    negative = text.startswith("(") and text.endswith(")") or text.upper().endswith("DR") or "-" in text
+    digits = re.sub(r"[^0-9.]", "", text)
+    if not digits:
+        return None
+    amount = float(digits)
+    return -amount if negative else amount
+
+def parse_date(value: str, date_format: Optional[str] = None) -> date:
+    text = value.strip()
+    for fmt in (date_format,) if date_format else DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {text}")
+
+def read_statement(
+    binary: IO[bytes], date_format: Optional[str] = None, chunk_rows: int = RECONCILIATION_CHUNK_ROWS
+) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]]:
+    """Yield (credits, invalid rows, debit count) per chunk of statement rows.
+
+    Rows are read from the file as they are needed, so memory use depends
+    on the chunk size and not on the statement size. The file is left open
+    (and can be read again after seeking back).
+    """
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        yield from _read_rows(text, date_format, chunk_rows)
+    finally:
+        # Otherwise closing the wrapper would close the upload
+        text.detach()
+
+def _read_rows(
+    text: IO[str], date_format: Optional[str], chunk_rows: int
+) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int]]:
+    reader = csv.reader(text)
+    columns = None
+    for header in reader:
+        if any(cell.strip() for cell in header):
+            columns = _find_columns(header)
+            break
+    if columns is None:
+        raise StatementError("Statement is empty")
+
+    credits, invalid, debits = [], [], 0
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        line = reader.line_num
+        try:
+            amount = parse_amount(row[columns["amount"]]) if columns["amount"] < len(row) else None
+            if amount is None or amount <= 0:
+                debits += 1
+            else:
+                credits.append({
+                    "line": line,
+                    "date": parse_date(row[columns["date"]], date_format),
+                    "amount": amount,
+                    "description": " ".join(row[i].strip() for i in columns["description"] if i < len(row)),
+                })
+        except (ValueError, IndexError) as e:
+            invalid.append({"line": line, "error": str(e)})
+        if len(credits) + len(invalid) + debits >= chunk_rows:
+            yield credits, invalid, debits
+            credits, invalid, debits = [], [], 0
+    yield credits, invalid, debits
+
+
+# Matching
+def _cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+def _reference_number(invoice_number: str) -> Optional[int]:
+    match = INVOICE_REFERENCE.search(invoice_number or "")
+    return int(match.group(1)) if match else None
+
+
+class InvoiceMatcher:
+    """Hash indexes over a user's open invoices"""
+
+    def __init__(self, invoices: List[Dict[str, Any]]):
+        self.by_number: Dict[int, Dict[str, Any]] = {}
+        buckets = defaultdict(list)
+        for invoice in invoices:
+            number = _reference_number(invoice.get("invoice_number"))
+            if number is not None:
+                self.by_number[number] = invoice
+            issued = date.fromisoformat(str(invoice["issue_date"])[:10]).toordinal()
+            buckets[_cents(invoice["total_amount"])].append((issued, invoice["id"], invoice))
+        # Per amount: issue days (for bisect) and the invoices in the same order
+        self.by_amount: Dict[int, Tuple[List[int], List[Dict[str, Any]]]] = {}
+        for cents, entries in buckets.items():
+            entries.sort(key=lambda entry: entry[:2])
+            self.by_amount[cents] = ([entry[0] for entry in entries], [entry[2] for entry in entries])
+        self.used = set()
+
+    def match_reference(self, credit: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Outcome for a line naming invoice numbers, or None when it names no open invoice"""
+        numbers = dict.fromkeys(int(n) for n in INVOICE_REFERENCE.findall(credit["description"]))
+        invoices = [self.by_number[n] for n in numbers if n in self.by_number and self.by_number[n]["id"] not in self.used]
+        if not invoices:
+            return None
+        if sum(_cents(invoice["total_amount"]) for invoice in invoices) == _cents(credit["amount"]):
+            self.used.update(invoice["id"] for invoice in invoices)
+            return {"outcome": "matched", "method": "reference", "invoices": invoices}
+        return {"outcome": "ambiguous", "reason": "amount differs from the referenced invoices", "invoices": invoices}
+
+    def match_amount(self, credit: Dict[str, Any]) -> Dict[str, Any]:
+        """Outcome for a line by amount and payment date"""
+        bucket = self.by_amount.get(_cents(credit["amount"]))
+        if bucket is None:
+            return {"outcome": "unmatched"}
+        days, invoices = bucket
+        paid = credit["date"].toordinal()
+        start = bisect.bisect_left(days, paid - RECONCILIATION_WINDOW_DAYS)
+        end = bisect.bisect_right(days, paid + RECONCILIATION_EARLY_DAYS)
+        candidates = []
+        for invoice in invoices[start:end]:
+            if invoice["id"] not in self.used:
+                candidates.append(invoice)
+                if len(candidates) > 1:
+                    return {"outcome": "ambiguous", "reason": "several open invoices have this amount", "invoices": candidates}
+        if not candidates:
+            return {"outcome": "unmatched"}
+        self.used.add(candidates[0]["id"])
+        return {"outcome": "matched", "method": "amount_date", "invoices": candidates}
+
+
+def _detail(credit: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    entry = {
+        "line": credit["line"],
+        "date": credit["date"].isoformat(),
+        "amount": credit["amount"],
+        "description": credit["description"],
+    }
+    if result is not None:
+        if "method" in result:
+            entry["method"] = result["method"]
+        if "reason" in result:
+            entry["reason"] = result["reason"]
+        entry["invoices"] = [
+            {"id": invoice["id"], "invoice_number": invoice.get("invoice_number"), "total_amount": invoice["total_amount"]}
+            for invoice in result["invoices"]
+        ]
+    return entry
+
+
+async def reconcile_statement(
+    user_id: str, binary: IO[bytes], date_format: Optional[str] = None, dry_run: bool = False
+) -> Dict[str, Any]:
+    """Match a statement's credits to open invoices and mark the matched ones paid (unless dry_run)"""
+    invoices = await db.invoices.find(
+        {"user_id": user_id, "status": {"$ne": "paid"}, **NOT_DELETED}, OPEN_INVOICE_FIELDS
+    ).to_list(None)
+    matcher = InvoiceMatcher(invoices)
+
+    reconciliation_id = str(uuid.uuid4())
+    counts = defaultdict(int)
+    details: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    # At most one entry per open invoice
+    payments: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    reference_matched = set()
+
+    def record(outcome: str, entry: Dict[str, Any]):
+        counts[outcome] += 1
+        if len(details[outcome]) < RECONCILIATION_DETAIL_LIMIT:
+            details[outcome].append(entry)
+
+    def apply(credit: Dict[str, Any], result: Dict[str, Any]):
+        if result["outcome"] == "matched":
+            payments.extend((credit, invoice) for invoice in result["invoices"])
+        record(result["outcome"], _detail(credit, result) if result["outcome"] != "unmatched" else _detail(credit))
+
+    # First pass: lines naming invoices whose amounts add up, plus the counts
+    async for credits, invalid, debits in _statement_chunks(binary, date_format):
+        counts["debits_skipped"] += debits
+        for row in invalid:
+            record("invalid", row)
+        for credit in credits:
+            counts["credits"] += 1
+            result = matcher.match_reference(credit)
+            if result is not None and result["outcome"] == "matched":
+                apply(credit, result)
+                reference_matched.add(credit["line"])
+
+    # Second pass: everything else, by amount and date
+    binary.seek(0)
+    async for credits, _, _ in _statement_chunks(binary, date_format):
+        for credit in credits:
+            if credit["line"] in reference_matched:
+                continue
+            reference_result = matcher.match_reference(credit)
+            result = reference_result
+            if reference_result is None or reference_result["outcome"] != "matched":
+                result = matcher.match_amount(credit)
+                # An amount match wins over a reference whose amount disagrees
+                if result["outcome"] == "unmatched" and reference_result:
+                    result = reference_result
+            apply(credit, result)
+
+    applied = 0
+    if payments and not dry_run:
+        applied = await _mark_paid(user_id, reconciliation_id, payments)
+    return {
+        "reconciliation_id": reconciliation_id,
+        "dry_run": dry_run,
+        "open_invoices": len(invoices),
+        "credits": counts["credits"],
+        "debits_skipped": counts["debits_skipped"],
+        "matched": counts["matched"],
+        "ambiguous": counts["ambiguous"],
+        "unmatched": counts["unmatched"],
+        "invalid": counts["invalid"],
+        "invoices_paid": applied,
+        "details": {outcome: details[outcome] for outcome in ("matched", "ambiguous", "unmatched", "invalid")},
+    }
+
+
+async def _statement_chunks(binary: IO[bytes], date_format: Optional[str]):
+    chunks = read_statement(binary, date_format)
+    while True:
+        # Parsing is CPU-bound; keep it off the event loop
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def _mark_paid(user_id: str, reconciliation_id: str, payments: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> int:
+    """Mark matched invoices paid in one bulk_write; returns how many were updated"""
+    now = datetime.utcnow()
+    first_seq = await next_change_seq(user_id, len(payments)) - len(payments) + 1
+    ops, changes = [], []
+    for i, (credit, invoice) in enumerate(payments):
+        payment = {
+            "reconciliation_id": reconciliation_id,
+            "date": credit["date"].isoformat(),
+            "amount": credit["amount"],
+            "description": credit["description"],
+            "line": credit["line"],
+        }
+        update = {"status": "paid", "payment": payment, "updated_at": now, "updated_seq": first_seq + i}
+        ops.append(UpdateOne(
+            # Skip invoices paid or deleted since they were loaded
+            {"id": invoice["id"], "user_id": user_id, "status": {"$ne": "paid"}, **NOT_DELETED},
+            {"$set": update, "$inc": {"version": 1}}
+        ))
+        changes.append((invoice, {**invoice, "status": "paid"}))
+
+    result = await db.invoices.bulk_write(ops, ordered=False)
+    if result.modified_count < len(ops):
+        # Some changed concurrently: count analytics only for the ones this run paid
+        paid_here = {
+            doc["id"] async for doc in db.invoices.find(
+                {"user_id": user_id, "id": {"$in": [invoice["id"] for _, invoice in payments]},
+                 "payment.reconciliation_id": reconciliation_id},
+                {"_id": 0, "id": 1}
+            )
+        }
+        changes = [(before, after) for before, after in changes if before["id"] in paid_here]
+    await record_invoice_changes(user_id, changes)
+    await invoice_cache.invalidate_user(user_id)
+    return result.modified_count
@@ -0,0 +1,252 @@
+"""
+Recurring invoices.
+
+A definition in ``recurring_invoices`` says what to bill a customer and how
+often; ``next_run`` (an ISO date, like invoice dates) is when the next
+invoice is issued. ``RecurringScheduler`` runs in every server process:
+each tick it claims due definitions in batches through the
+``(active, next_run)`` index, issues their invoices with one bulk number
+allocation and one ``insert_many`` per user, and advances ``next_run`` with
+a conditional update.
+
+Overlapping workers never double-issue. Claims are leases, so normally
+one worker handles a definition at a time; and every issued invoice
+carries ``(recurring_id, recurring_period)`` under a unique index, so a
+worker that picks up a definition whose lease expired mid-run can only
+insert the periods that are still missing.
+"""
+
+import asyncio
+import calendar
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from analytics import record_invoice_changes
+from change_feed import change_seq_scope, next_change_seq
+from currency import DEFAULT_CURRENCY
+from database import db
+from invoicing import (
+    allocate_invoice_numbers, build_invoice, compute_invoice_totals, format_invoice_number, tax_jurisdictions
+)
+from line_items import drop_segments, insert_lines, place_items
+from models import InvoiceCreate
+
+logger = logging.getLogger(__name__)
+
+RECURRING_TICK_SECONDS = 60
+RECURRING_BATCH_SIZE = 200
+RECURRING_LEASE_SECONDS = 300
+# Periods issued per definition per claim when runs were missed (e.g. downtime)
+RECURRING_MAX_CATCH_UP = 12
+
+CADENCE_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+DUPLICATE_KEY_ERROR = 11000
+
+
+def advance_run(run: date, cadence: str, interval: int, anchor_day: int) -> date:
+    """The run after `run`; monthly cadences stay on `anchor_day` (clamped to short months)"""
+    if cadence == "weekly":
+        return run + timedelta(weeks=interval)
+    months = run.year * 12 + run.month - 1 + CADENCE_MONTHS[cadence] * interval
+    year, month = divmod(months, 12)
+    month += 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def due_periods(definition: Dict[str, Any], today: date) -> Tuple[List[date], date]:
+    """Run dates due by `today` (at most RECURRING_MAX_CATCH_UP) and the next_run after them"""
+    run = date.fromisoformat(definition["next_run"])
+    end = date.fromisoformat(definition["end_date"]) if definition.get("end_date") else None
+    periods = []
+    while run <= today and (end is None or run <= end) and len(periods) < RECURRING_MAX_CATCH_UP:
+        periods.append(run)
+        run = advance_run(run, definition["cadence"], definition["interval"], definition["anchor_day"])
+    return periods, run
+
+
+def _due_filter(now: datetime, today: date) -> Dict[str, Any]:
+    return {
+        "active": True,
+        "next_run": {"$lte": today.isoformat()},
+        "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}],
+    }
+
+
+async def _claim_due(now: datetime, today: date) -> List[Dict[str, Any]]:
+    """Lease up to one batch of due definitions for this worker"""
+    candidates = await db.recurring_invoices.find(
+        _due_filter(now, today), {"_id": 0, "id": 1}
+    ).sort("next_run", 1).limit(RECURRING_BATCH_SIZE).to_list(RECURRING_BATCH_SIZE)
+    if not candidates:
+        return []
+    owner = str(uuid.uuid4())
+    ids = [candidate["id"] for candidate in candidates]
+    # Re-checking the due filter makes the claim atomic per definition
+    await db.recurring_invoices.update_many(
+        {"id": {"$in": ids}, **_due_filter(now, today)},
+        {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=RECURRING_LEASE_SECONDS)}}
+    )
+    return await db.recurring_invoices.find({"id": {"$in": ids}, "lease_owner": owner}, {"_id": 0}).to_list(None)
+
+
+async def _insert_new(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert invoices, skipping periods already issued; returns the ones inserted"""
+    try:
+        await db.invoices.insert_many(docs, ordered=False)
+        return docs
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        skipped = {error["index"] for error in errors}
+        logger.warning(f"Skipped {len(skipped)} recurring invoices that were already issued")
+        return [doc for i, doc in enumerate(docs) if i not in skipped]
+
+
+@change_seq_scope()
+async def _issue_for_user(user_id: str, definitions: List[Dict[str, Any]], now: datetime, today: date) -> int:
+    plans = [(definition, *due_periods(definition, today)) for definition in definitions]
+    # Drop periods a previous (expired) claim already issued, so they take no numbers
+    issued = set()
+    if any(periods for _, periods, _ in plans):
+        cursor = db.invoices.find(
+            {
+                # $type lets the query use the partial unique index
+                "recurring_id": {"$in": [definition["id"] for definition in definitions], "$type": "string"},
+                "recurring_period": {"$gte": min(definition["next_run"] for definition in definitions)},
+            },
+            {"_id": 0, "recurring_id": 1, "recurring_period": 1}
+        )
+        issued = {(doc["recurring_id"], doc["recurring_period"]) async for doc in cursor}
+    plans = [
+        (definition, [period for period in periods if (definition["id"], period.isoformat()) not in issued], next_run)
+        for definition, periods, next_run in plans
+    ]
+    count = sum(len(periods) for _, periods, _ in plans)
+
+    inserted: List[Dict[str, Any]] = []
+    if count:
+        # One counter round trip each for the whole batch
+        first_number = await allocate_invoice_numbers(user_id, count)
+        first_seq = await next_change_seq(user_id, count) - count + 1
+        runs = [
+            (definition, period, InvoiceCreate(
+                customer_id=definition["customer_id"],
+                business_id=definition["business_id"],
+                due_date=period + timedelta(days=definition["due_days"]),
+                items=definition["items"],
+                currency=definition.get("currency") or DEFAULT_CURRENCY,
+                tax_rate=definition.get("tax_rate"),
+                notes=definition.get("notes"),
+            ))
+            for definition, periods, _ in plans for period in periods
+        ]
+        # Tax for the whole batch in one pass
+        invoices = [invoice_data for _, _, invoice_data in runs]
+        totals = compute_invoice_totals(invoices, await tax_jurisdictions(user_id, invoices))
+        docs, lines = [], []
+        for (definition, period, invoice_data), run_totals in zip(runs, totals):
+            _, doc = build_invoice(
+                invoice_data, user_id, format_invoice_number(first_number + len(docs)),
+                first_seq + len(docs), run_totals, issue_date=period,
+                recurring_id=definition["id"], recurring_period=period,
+            )
+            lines.extend(place_items(doc, doc["id"], user_id, doc["updated_seq"]))
+            docs.append(doc)
+        await insert_lines(lines)
+        inserted = await _insert_new(docs)
+        inserted_ids = {doc["id"] for doc in inserted}
+        for doc in docs:
+            # Lines of periods that turned out to be issued already
+            if doc["item_segments"] and doc["id"] not in inserted_ids:
+                await drop_segments(doc["id"], doc["item_segments"])
+        await record_invoice_changes(user_id, [(None, doc) for doc in inserted])
+
+    issued_by_definition: Dict[str, int] = defaultdict(int)
+    for doc in inserted:
+        issued_by_definition[doc["recurring_id"]] += 1
+    ops = []
+    for definition, periods, next_run in plans:
+        end = definition.get("end_date")
+        ops.append(UpdateOne(
+            # Only advance from the run we issued for, in case next_run was edited meanwhile
+            {"id": definition["id"], "next_run": definition["next_run"]},
+            {
+                "$set": {
+                    "next_run": next_run.isoformat(),
+                    "active": end is None or next_run.isoformat() <= end,
+                    "last_run_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"invoices_generated": issued_by_definition[definition["id"]]},
+            }
+        ))
+        # Release our lease even if the schedule was edited (and so not advanced)
+        ops.append(UpdateOne(
+            {"id": definition["id"], "lease_owner": definition["lease_owner"]},
+            {"$unset": {"lease_owner": "", "lease_until": ""}}
+        ))
+    await db.recurring_invoices.bulk_write(ops, ordered=False)
+    return len(inserted)
+
+
+class RecurringScheduler:
+    """Issues due recurring invoices every RECURRING_TICK_SECONDS"""
+
+    def __init__(self, tick_seconds: float = RECURRING_TICK_SECONDS):
+        self.tick_seconds = tick_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await db.recurring_invoices.create_index("id")
+        await db.recurring_invoices.create_index([("user_id", 1), ("created_at", -1)])
+        await db.recurring_invoices.create_index([("active", 1), ("next_run", 1)])
+        # At most one invoice per definition and period, whichever worker issues it
+        await db.invoices.create_index(
+            [("recurring_id", 1), ("recurring_period", 1)],
+            unique=True,
+            partialFilterExpression={"recurring_id": {"$type": "string"}}
+        )
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                issued = await self.tick()
+                if issued:
+                    logger.info(f"Issued {issued} recurring invoices")
+            except Exception as e:
+                logger.error(f"Recurring invoice tick failed: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def tick(self, today: Optional[date] = None) -> int:
+        """Issue everything due by `today`; returns the number of invoices issued"""
+        today = today or date.today()
+        issued = 0
+        while True:
+            now = datetime.utcnow()
+            batch = await _claim_due(now, today)
+            if not batch:
+                return issued
+            by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for definition in batch:
+                by_user[definition["user_id"]].append(definition)
+            for user_id, definitions in by_user.items():
+                issued += await _issue_for_user(user_id, definitions, now, today)
+
+
+recurring_scheduler = RecurringScheduler()
@@ -0,0 +1,354 @@
+"""
+Accountant reports for a period: invoice register, tax summary and
+per-customer totals, as CSV or XLSX.
+
+Invoices issued in the period are read from MongoDB in chunks of
+REPORT_CHUNK_SIZE. Each chunk becomes a pandas frame that is either
+written out straight away (the register) or grouped and added to a
+running total (the summaries), so memory depends on the chunk size and
+the number of groups rather than on the number of invoices. The pandas
+work and file writing run in a worker thread.
+
+Finished reports are kept in REPORT_CACHE_DIR under a name that includes
+the user's invoice change feed position, which moves on every invoice
+write, plus a fingerprint of the customer names (register and customer
+totals) or the exchange rate table version (tax summary), since those
+end up in the file too. A repeat download of an unchanged period is served from the
+file, and its ETag makes it a 304 for the browser. Amounts stay in each
+invoice's currency; summaries have one row per currency.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from change_feed import current_change_seq
+from currency import DEFAULT_CURRENCY, rate_tables
+from database import db, NOT_DELETED
+from line_items import attach_external_lines
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = Path(os.environ.get("REPORT_CACHE_DIR", Path(__file__).parent / "reports_cache"))
+REPORT_CHUNK_SIZE = 5000
+# Bump when report contents change so cached files are regenerated
+REPORT_FORMAT_VERSION = 1
+
+REPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+FLAT_RATE_JURISDICTION = "(flat rate)"
+
+
+class ReportFormatUnavailable(RuntimeError):
+    pass
+
+
+# Output
+class _CSVWriter:
+    def __init__(self, path: Path):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._header = True
+
+    def write(self, frame):
+        frame.to_csv(self._file, index=False, header=self._header)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+class _XLSXWriter:
+    """One worksheet written row by row (XlsxWriter's constant_memory mode)"""
+
+    def __init__(self, path: Path, sheet_name: str):
+        try:
+            import xlsxwriter
+        except ImportError as e:
+            raise ReportFormatUnavailable("XLSX reports need the XlsxWriter package") from e
+        self._workbook = xlsxwriter.Workbook(str(path), {"constant_memory": True})
+        self._sheet = self._workbook.add_worksheet(sheet_name)
+        self._bold = self._workbook.add_format({"bold": True})
+        self._row = 0
+
+    def write(self, frame):
+        if self._row == 0:
+            self._sheet.write_row(0, 0, list(frame.columns), self._bold)
+            self._row = 1
+        for values in frame.itertuples(index=False, name=None):
+            self._sheet.write_row(self._row, 0, ["" if value is None or value != value else value for value in values])
+            self._row += 1
+
+    def close(self):
+        self._workbook.close()
+
+
+def _open_writer(path: Path, report_format: str, sheet_name: str):
+    if report_format == "xlsx":
+        return _XLSXWriter(path, sheet_name)
+    return _CSVWriter(path)
+
+
+# Reports
+class InvoiceRegister:
+    """One row per invoice, written chunk by chunk"""
+
+    title = "Invoice register"
+    fields = [
+        "invoice_number", "issue_date", "due_date", "customer_id", "status", "currency",
+        "subtotal", "tax_amount", "total_amount", "tax_jurisdiction", "payment",
+    ]
+    columns = [
+        "invoice_number", "issue_date", "due_date", "customer", "status", "currency",
+        "subtotal", "tax_amount", "total_amount", "tax_jurisdiction", "paid_on",
+    ]
+
+    uses_customer_names = True
+    uses_rates = False
+
+    def __init__(self, writer, customer_names: Dict[str, str]):
+        self.writer = writer
+        self.customer_names = customer_names
+        self.empty = True
+
+    def add(self, frame):
+        self.empty = False
+        frame = frame.reindex(columns=self.fields)
+        frame["customer"] = frame["customer_id"].map(self.customer_names)
+        frame["currency"] = frame["currency"].fillna(DEFAULT_CURRENCY)
+        frame["paid_on"] = frame["payment"].map(lambda payment: payment.get("date") if isinstance(payment, dict) else None)
+        self.writer.write(frame[self.columns])
+
+    def finish(self):
+        if self.empty:
+            # No invoices in the period: still write the header
+            import pandas as pd
+
+            self.writer.write(pd.DataFrame(columns=self.columns))
+
+
+class _RunningTotals:
+    """Group each chunk and add it to the totals so far"""
+
+    keys: List[str] = []
+    sums: List[str] = []
+    uses_customer_names = False
+    uses_rates = False
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.totals = None
+
+    def add(self, frame):
+        import pandas as pd
+
+        grouped = self.rows(frame).groupby(self.keys, dropna=False)[self.sums].sum()
+        self.totals = grouped if self.totals is None else pd.concat([self.totals, grouped]).groupby(level=self.keys, dropna=False).sum()
+
+    def rows(self, frame):
+        raise NotImplementedError
+
+    def finish(self):
+        import pandas as pd
+
+        if self.totals is None:
+            result = pd.DataFrame(columns=self.keys + self.sums)
+        else:
+            result = self.totals.reset_index().sort_values(self.keys)
+            result[self.sums] = result[self.sums].round(2)
+        self.writer.write(self.present(result))
+
+    def present(self, result):
+        return result
+
+
+class TaxSummary(_RunningTotals):
+    """Taxable amount and tax per jurisdiction, tax category and currency"""
+
+    title = "Tax summary"
+    fields = ["currency", "items", "subtotal", "tax_rate", "tax_amount", "tax_jurisdiction"]
+    # Header fields needed to load the lines of invoices stored outside the header
+    line_fields = ["id", "item_count", "items_external", "item_segments"]
+    keys = ["tax_jurisdiction", "tax_category", "currency"]
+    sums = ["line_count", "taxable_amount", "tax_amount"]
+    uses_rates = True
+
+    def rows(self, frame):
+        import pandas as pd
+
+        frame = frame.reindex(columns=self.fields)
+        frame["currency"] = frame["currency"].fillna(DEFAULT_CURRENCY)
+        by_rules = frame["tax_jurisdiction"].notna()
+
+        # Invoices with a flat tax_rate: one row each, taxed on the subtotal
+        flat = frame[~by_rules]
+        flat_rows = pd.DataFrame({
+            "tax_jurisdiction": FLAT_RATE_JURISDICTION,
+            "tax_category": flat["tax_rate"].fillna(0.0).map(lambda rate: f"{rate:.2%}"),
+            "currency": flat["currency"],
+            "line_count": 1,
+            "taxable_amount": flat["subtotal"],
+            "tax_amount": flat["tax_amount"],
+        })
+
+        # Invoices taxed by the rules: one row per line
+        lines = frame[by_rules][["tax_jurisdiction", "currency", "items"]].explode("items").dropna(subset=["items"])
+        items = pd.DataFrame(lines["items"].tolist(), index=lines.index)
+        items = items.reindex(columns=["total", "currency", "tax_category", "tax_amount"])
+        table = rate_tables.get()
+        taxable = [
+            total if not isinstance(item_currency, str) or item_currency == currency else table.convert(total, item_currency, currency)
+            for total, item_currency, currency in zip(items["total"], items["currency"], lines["currency"])
+        ]
+        line_rows = pd.DataFrame({
+            "tax_jurisdiction": lines["tax_jurisdiction"],
+            "tax_category": items["tax_category"].fillna("standard"),
+            "currency": lines["currency"],
+            "line_count": 1,
+            "taxable_amount": taxable,
+            "tax_amount": items["tax_amount"].fillna(0.0),
+        })
+        return pd.concat([flat_rows, line_rows], ignore_index=True)
+
+
+class CustomerTotals(_RunningTotals):
+    """Invoiced, paid and outstanding amounts per customer and currency"""
+
+    title = "Customer totals"
+    fields = ["customer_id", "currency", "status", "subtotal", "tax_amount", "total_amount"]
+    keys = ["customer_id", "currency"]
+    sums = ["invoice_count", "subtotal", "tax_amount", "total_amount", "paid_amount", "outstanding_amount"]
+    uses_customer_names = True
+
+    def __init__(self, writer, customer_names: Dict[str, str]):
+        super().__init__(writer)
+        self.customer_names = customer_names
+
+    def rows(self, frame):
+        frame = frame.reindex(columns=self.fields)
+        frame["currency"] = frame["currency"].fillna(DEFAULT_CURRENCY)
+        paid = frame["status"] == "paid"
+        frame["invoice_count"] = 1
+        frame["paid_amount"] = frame["total_amount"].where(paid, 0.0)
+        frame["outstanding_amount"] = frame["total_amount"].where(~paid & (frame["status"] != "draft"), 0.0)
+        return frame
+
+    def present(self, result):
+        result.insert(1, "customer", result["customer_id"].map(self.customer_names))
+        return result
+
+
+REPORTS = {
+    "invoice-register": InvoiceRegister,
+    "tax-summary": TaxSummary,
+    "customer-totals": CustomerTotals,
+}
+
+
+def report_path(user_id: str, report: str, report_format: str, start: date, end: date, version: str) -> Path:
+    name = f"{report}_{start.isoformat()}_{end.isoformat()}.v{REPORT_FORMAT_VERSION}-{version}.{report_format}"
+    return REPORT_CACHE_DIR / user_id / name
+
+
+def _remove_stale(path: Path):
+    """Delete earlier versions of the same report and period"""
+    prefix = path.name.split(".v", 1)[0]
+    for old in path.parent.glob(f"{prefix}.v*.{path.suffix.lstrip('.')}"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+async def _customer_names(user_id: str) -> Dict[str, str]:
+    cursor = db.customers.find({"user_id": user_id}, {"_id": 0, "id": 1, "name": 1})
+    return {customer["id"]: customer.get("name") async for customer in cursor}
+
+
+def _fingerprint(customer_names: Dict[str, str]) -> str:
+    return hashlib.sha1(json.dumps(customer_names, sort_keys=True).encode()).hexdigest()[:12]
+
+
+async def _generate(
+    user_id: str, report: str, report_format: str, start: date, end: date, path: Path,
+    customer_names: Optional[Dict[str, str]],
+):
+    import pandas as pd
+
+    report_class = REPORTS[report]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=f".{report_format}")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        writer = await asyncio.to_thread(_open_writer, tmp_path, report_format, report_class.title)
+        if report_class.uses_customer_names:
+            builder = report_class(writer, customer_names)
+        else:
+            builder = report_class(writer)
+
+        cursor = db.invoices.find(
+            {
+                "user_id": user_id,
+                **NOT_DELETED,
+                "issue_date": {"$gte": start.isoformat(), "$lte": end.isoformat()},
+            },
+            {"_id": 0, **{field: 1 for field in report_class.fields + getattr(report_class, "line_fields", [])}}
+        ).sort([("issue_date", 1), ("invoice_number", 1)]).batch_size(REPORT_CHUNK_SIZE)
+
+        chunk: List[Dict[str, Any]] = []
+        async def add(chunk):
+            if "items" in report_class.fields:
+                await attach_external_lines(user_id, chunk)
+            await asyncio.to_thread(builder.add, pd.DataFrame(chunk))
+
+        async for invoice in cursor:
+            chunk.append(invoice)
+            if len(chunk) >= REPORT_CHUNK_SIZE:
+                await add(chunk)
+                chunk = []
+        if chunk:
+            await add(chunk)
+        await asyncio.to_thread(builder.finish)
+        await asyncio.to_thread(writer.close)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    _remove_stale(path)
+    logger.info(f"Generated report {path.name} for user {user_id}")
+
+
+# Generations in progress, so concurrent requests for one report share the work
+_in_progress: Dict[Path, asyncio.Task] = {}
+
+
+async def get_report(user_id: str, report: str, report_format: str, start: date, end: date) -> Path:
+    """Path of the report file, generating it unless it is cached for the current data"""
+    report_class = REPORTS[report]
+    version = str(await current_change_seq(user_id))
+    customer_names = None
+    if report_class.uses_customer_names:
+        customer_names = await _customer_names(user_id)
+        version += f"-{_fingerprint(customer_names)}"
+    if report_class.uses_rates:
+        version += f"-{rate_tables.get().version}"
+    path = report_path(user_id, report, report_format, start, end, version)
+    if path.exists():
+        return path
+    task = _in_progress.get(path)
+    if task is None:
+        task = asyncio.create_task(_generate(user_id, report, report_format, start, end, path, customer_names))
+        _in_progress[path] = task
+        task.add_done_callback(lambda _: _in_progress.pop(path, None))
+    await asyncio.shield(task)
+    return path
+
+
+def report_filename(report: str, report_format: str, start: date, end: date) -> str:
+    return f"{report}_{start.isoformat()}_{end.isoformat()}.{report_format}"
@@ -0,0 +1,78 @@
+"""
+Admin routes: on-demand profiling of the running worker and stored request traces.
+"""
+
+import json
+import time
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+
+from database import db
+from models import User
+from profiler import (
+    PROFILE_DEFAULT_HZ, PROFILE_FORMATS, PROFILE_MAX_HZ, PROFILE_MAX_SECONDS, PROFILE_SUMMARY_FIELDS,
+    ProfilerBusy, profile_process, to_collapsed, to_speedscope,
+)
+from security import get_admin_user
+
+router = APIRouter()
+
+def _profile_response(profile: Dict[str, Any], format: str, filename: str) -> Response:
+    media_type, extension = PROFILE_FORMATS[format]
+    if format == "speedscope":
+        content = json.dumps(to_speedscope(profile))
+    else:
+        content = to_collapsed(profile)
+    return Response(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+    )
+
+def _check_format(format: str):
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PROFILE_FORMATS)}")
+
+# Admin Routes
+@router.post("/admin/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    hz: int = Query(PROFILE_DEFAULT_HZ, ge=1, le=PROFILE_MAX_HZ),
+    format: str = Query("collapsed", description=f"One of {', '.join(PROFILE_FORMATS)}"),
+    idle: bool = False,
+    admin: User = Depends(get_admin_user)
+):
+    """Sample the worker that receives this request for `seconds` and return its profile.
+
+    `collapsed` is the folded-stack text flamegraph tools read; `speedscope`
+    opens directly in https://www.speedscope.app. Pass `idle=true` to keep
+    samples of threads that are only waiting.
+    """
+    _check_format(format)
+    try:
+        profile = await profile_process(seconds, hz, idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return _profile_response(profile, format, f"profile-{time.strftime('%Y%m%d-%H%M%S')}")
+
+@router.get("/admin/profiles")
+async def list_request_profiles(
+    limit: int = Query(50, ge=1, le=500),
+    admin: User = Depends(get_admin_user)
+):
+    """Recent request traces (requests sent with `X-Profile: 1`), newest first"""
+    return await db.profiles.find({}, PROFILE_SUMMARY_FIELDS).sort("created_at", -1).to_list(limit)
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query("collapsed", description=f"One of {', '.join(PROFILE_FORMATS)}"),
+    admin: User = Depends(get_admin_user)
+):
+    """Download the trace of one request, by the id from its X-Profile-Id header"""
+    _check_format(format)
+    profile = await db.profiles.find_one({"id": profile_id}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _profile_response(profile, format, f"request-{profile_id}")
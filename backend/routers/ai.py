@@ -0,0 +1,382 @@
+"""
+AI assistant and voice processing routes.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status
+
+from currency import format_money
+from customer_index import customer_index
+from database import db, NOT_DELETED
+from jobs import job_queue, job_status
+from line_items import attach_external_lines
+from nlp import LANGUAGE_NAMES, script_histogram, dominant_language, detect_language, resolve_language, extract_invoice_info_from_text
+from models import AIInvoiceRequest, AIResponse, AIVoiceResponse, User
+from security import get_current_user, get_optional_user
+from transcription import (
+    TranscriptionError, transcribe_audio, audio_suffix, build_voice_response, store_voice_interaction,
+    enqueue_transcription
+)
+
+MAX_TRANSCRIPTION_WAIT_SECONDS = 30
+# A top candidate at or above this score is filled in as the invoice's customer_id
+CUSTOMER_MATCH_SCORE = 0.85
+
+router = APIRouter()
+
+
+async def resolve_customer(invoice_data: dict, current_user: Optional[User]):
+    """Add ranked customer candidates for invoice_data["customer_name"] (signed-in users only)"""
+    candidates = []
+    if current_user:
+        candidates = await customer_index.search(current_user.id, invoice_data.get("customer_name") or "")
+    invoice_data["customer_candidates"] = candidates
+    invoice_data["customer_id"] = (
+        candidates[0]["customer_id"] if candidates and candidates[0]["score"] >= CUSTOMER_MATCH_SCORE else None
+    )
+
+
+# AI Features Routes
+@router.post("/ai/assist", response_model=AIResponse)
+async def ai_assistant(request: AIInvoiceRequest, current_user: Optional[User] = Depends(get_optional_user)):
+    """AI-powered invoice creation assistant"""
+    
+    # Simulate AI processing (In real implementation, integrate with OpenAI/Claude)
+    input_text = request.voice_input or request.text_input or ""
+    
+    # Basic AI simulation with Hindi support
+    suggestions = []
+    invoice_data = None
+    
+    # English keywords
+    if any(keyword in input_text.lower() for keyword in ["web design", "website", "ui/ux"]):
+        suggestions = [
+            "Web Design Services - $500",
+            "UI/UX Design - $750", 
+            "Website Development - $1200"
+        ]
+        invoice_data = {
+            "items": [
+                {
+                    "description": "Web Design Services",
+                    "quantity": 1,
+                    "unit_price": 500.0,
+                    "total": 500.0
+                }
+            ]
+        }
+    elif any(keyword in input_text.lower() for keyword in ["consulting", "परामर्श", "सलाह"]):
+        suggestions = [
+            "Business Consulting - $150/hour",
+            "Strategy Session - $200/hour",
+            "Project Management - $100/hour"
+        ]
+    # Hindi keywords
+    elif any(keyword in input_text for keyword in ["वेब डिज़ाइन", "वेबसाइट", "डिज़ाइन"]):
+        suggestions = [
+            "वेब डिज़ाइन सेवा - $500",
+            "UI/UX डिज़ाइन - $750", 
+            "वेबसाइट विकास - $1200"
+        ]
+        invoice_data = {
+            "items": [
+                {
+                    "description": "Web Design Services / वेब डिज़ाइन सेवा",
+                    "quantity": 1,
+                    "unit_price": 500.0,
+                    "total": 500.0
+                }
+            ]
+        }
+    elif any(keyword in input_text for keyword in ["सॉफ्टवेयर", "प्रोग्रामिंग", "एप्लिकेशन"]):
+        suggestions = [
+            "Software Development - $100/hour",
+            "Mobile App Development - $150/hour",
+            "Custom Application - $2000"
+        ]
+    else:
+        suggestions = [
+            "Professional Services - $100/hour",
+            "Consultation - $150/hour",
+            "Custom Service - TBD"
+        ]
+    
+    # Detect language and provide appropriate response
+    is_hindi = detect_language(input_text) == "hi-IN"
+    
+    if is_hindi:
+        message = f"मैंने आपका अनुरोध का विश्लेषण किया है: '{input_text}'। यहाँ {request.customer_name} के लिए चालान के कुछ सुझाव हैं।"
+    else:
+        message = f"I've analyzed your request: '{input_text}'. Here are some suggestions for your invoice to {request.customer_name}."
+    
+    response = AIResponse(
+        message=message,
+        suggestions=suggestions,
+        invoice_data=invoice_data
+    )
+    
+    # Store AI interaction
+    await db.ai_interactions.insert_one({**response.dict(), "user_id": current_user.id if current_user else None})
+    
+    return response
+
+@router.post("/ai/voice-to-invoice", response_model=AIResponse)
+async def voice_to_invoice(request: AIInvoiceRequest, current_user: Optional[User] = Depends(get_optional_user)):
+    """Convert voice input to structured invoice data"""
+    
+    voice_text = request.voice_input or ""
+    
+    if not voice_text.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Voice input is required"
+        )
+    
+    # Detect language
+    detected_language = detect_language(voice_text)
+    
+    # Extract invoice information using AI-like processing
+    extracted_info = extract_invoice_info_from_text(voice_text, detected_language)
+    
+    currency = extracted_info["currency"]
+    
+    # Generate suggestions based on extracted info
+    suggestions = []
+    if extracted_info["services"]:
+        suggestions.extend([f"Service: {service}" for service in extracted_info["services"]])
+    if extracted_info["amounts"]:
+        suggestions.extend([f"Amount: {format_money(amount, currency)}" for amount in extracted_info["amounts"]])
+    
+    # Default suggestions if nothing extracted
+    if not suggestions:
+        if detected_language == "hi-IN":
+            suggestions = [
+                "आवाज़ से सेवा विवरण निकाला गया",
+                f"अनुमानित मूल्य: {format_money(500, currency)}", 
+                "ग्राहक: " + request.customer_name
+            ]
+        else:
+            suggestions = [
+                "Extracted service description from voice",
+                f"Estimated price: {format_money(500, currency)}",
+                "Customer: " + request.customer_name
+            ]
+    
+    # Create invoice data
+    invoice_data = {
+        "customer_name": extracted_info.get("customer_name", "").strip() or request.customer_name,
+        "items": extracted_info["items"] if extracted_info["items"] else [
+            {
+                "description": "Service based on voice input",
+                "quantity": 1,
+                "unit_price": 500.0,
+                "total": 500.0
+            }
+        ],
+        "currency": currency,
+        "language_detected": detected_language,
+        "original_text": voice_text
+    }
+    await resolve_customer(invoice_data, current_user)
+    
+    # Generate response message
+    if detected_language == "hi-IN":
+        message = f"आपका आवाज़ इनपुट प्रोसेस किया गया: '{voice_text[:50]}...'। चालान संरचना में बदला जा रहा है।"
+    else:
+        message = f"Voice input processed: '{voice_text[:50]}...'. Converting to invoice structure."
+    
+    ai_response = AIResponse(
+        message=message,
+        suggestions=suggestions,
+        invoice_data=invoice_data
+    )
+    
+    # Store AI interaction
+    await db.ai_interactions.insert_one({**ai_response.dict(), "user_id": current_user.id if current_user else None})
+    return ai_response
+
+@router.post("/ai/voice-file-to-text", response_model=AIVoiceResponse)
+async def voice_file_to_text(audio_file: UploadFile = File(...), language: str = "en-US", current_user: Optional[User] = Depends(get_optional_user)):
+    """Convert uploaded audio file to text and extract invoice data"""
+    
+    if not audio_file.content_type.startswith('audio/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an audio file"
+        )
+    
+    try:
+        # Read audio file
+        audio_data = await audio_file.read()
+        
+        # Perform speech recognition
+        language_detected = resolve_language(language)
+        transcript, segments = await transcribe_audio(audio_data, language_detected, audio_suffix(audio_file.filename))
+        
+        response = build_voice_response(transcript, language_detected, segments)
+        
+        # Store interaction
+        await store_voice_interaction(response, current_user.id if current_user else None)
+        
+        return response
+        
+    except TranscriptionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE if e.retryable else status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing audio file: {str(e)}"
+        )
+
+@router.post("/ai/transcriptions", status_code=status.HTTP_202_ACCEPTED)
+async def create_transcription_job(audio_file: UploadFile = File(...), language: str = "en-US", current_user: Optional[User] = Depends(get_optional_user)):
+    """Queue an uploaded audio file for transcription and return the job id immediately"""
+    
+    if not audio_file.content_type.startswith('audio/'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an audio file"
+        )
+    
+    audio_data = await audio_file.read()
+    job = await enqueue_transcription(
+        audio_data, audio_file.filename, language, current_user.id if current_user else None
+    )
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "poll_url": f"/api/ai/transcriptions/{job['id']}"
+    }
+
+@router.get("/ai/transcriptions/{job_id}")
+async def get_transcription_job(job_id: str, wait: float = 0, current_user: Optional[User] = Depends(get_optional_user)):
+    """Get a transcription job; `wait` (up to 30s) long-polls until it finishes"""
+    user_id = current_user.id if current_user else None
+    wait = max(0.0, min(wait, MAX_TRANSCRIPTION_WAIT_SECONDS))
+    job = await job_queue.wait_for(job_id, user_id, wait) if wait else await job_queue.get(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+    return job_status(job)
+
+@router.post("/ai/enhanced-voice-processing")
+async def enhanced_voice_processing(request: AIInvoiceRequest, current_user: Optional[User] = Depends(get_optional_user)):
+    """Enhanced voice processing with template selection and smart extraction"""
+    
+    voice_text = request.voice_input or ""
+    if not voice_text.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Voice input is required"
+        )
+    
+    # Detect language (the script histogram is returned for mixed-script input)
+    scripts = script_histogram(voice_text)
+    detected_language = dominant_language(scripts)
+    
+    # Extract comprehensive information
+    extracted_info = extract_invoice_info_from_text(voice_text, detected_language)
+    
+    # Smart template suggestions based on content
+    template_suggestions = []
+    if any(service in voice_text.lower() for service in ["web", "design", "development"]):
+        template_suggestions = ["modern-blue", "creative-green"]
+    elif any(service in voice_text.lower() for service in ["consulting", "business", "strategy"]):
+        template_suggestions = ["professional-blue", "elegant-purple"]
+    else:
+        template_suggestions = ["minimal-gray", "classic-black"]
+    
+    # Enhanced suggestions
+    suggestions = []
+    
+    if detected_language == "hi-IN":
+        suggestions = [
+            "✅ भाषा पहचानी गई: हिंदी",
+            f"📝 सेवाएं मिली: {len(extracted_info['services'])}",
+            f"💰 मूल्य मिले: {len(extracted_info['amounts'])}",
+            "🎨 टेम्प्लेट सुझाव तैयार"
+        ]
+    else:
+        suggestions = [
+            f"✅ Language detected: {LANGUAGE_NAMES.get(detected_language, detected_language)}",
+            f"📝 Services found: {len(extracted_info['services'])}",
+            f"💰 Amounts found: {len(extracted_info['amounts'])}",
+            "🎨 Template suggestions ready"
+        ]
+    
+    # Enhanced invoice data with template suggestions
+    # Use extracted customer name from voice input, fallback to request customer name
+    extracted_customer_name = extracted_info.get("customer_name", "").strip()
+    final_customer_name = extracted_customer_name if extracted_customer_name else request.customer_name
+    
+    enhanced_data = {
+        "customer_name": final_customer_name,
+        "customer_email": "",
+        "customer_address": "",
+        "customer_city": "",
+        "customer_state": "",
+        "items": extracted_info["items"],
+        "language_detected": detected_language,
+        "scripts": scripts,
+        "original_text": voice_text,
+        "confidence_score": 0.87,
+        "template_suggestions": template_suggestions,
+        "extracted_services": extracted_info["services"],
+        "extracted_amounts": extracted_info["amounts"]
+    }
+    await resolve_customer(enhanced_data, current_user)
+    
+    # Generate contextual message
+    if detected_language == "hi-IN":
+        message = f"🤖 AI ने आपका अनुरोध समझा: {len(extracted_info['services'])} सेवाएं और {len(extracted_info['amounts'])} मूल्य मिले। चालान तैयार करने के लिए तैयार!"
+    else:
+        message = f"🤖 AI understood your request: Found {len(extracted_info['services'])} services and {len(extracted_info['amounts'])} amounts. Ready to create your invoice!"
+    
+    response = AIResponse(
+        message=message,
+        suggestions=suggestions,
+        invoice_data=enhanced_data
+    )
+    
+    await db.ai_interactions.insert_one({**response.dict(), "user_id": current_user.id if current_user else None})
+    return response
+
+@router.get("/ai/suggestions/{customer_id}")
+async def get_ai_suggestions(customer_id: str, current_user: User = Depends(get_current_user)):
+    """Get AI-powered suggestions based on customer history"""
+    
+    # Get customer's invoice history
+    customer_invoices = await db.invoices.find(
+        {"user_id": current_user.id, "customer_id": customer_id, **NOT_DELETED},
+        {"_id": 0, "id": 1, "items": 1, "item_count": 1, "items_external": 1, "item_segments": 1}
+    ).to_list(100)
+    # Large invoices keep their lines outside the invoice
+    await attach_external_lines(current_user.id, customer_invoices, {"description": 1})
+    
+    if not customer_invoices:
+        suggestions = [
+            "Professional Services - $100/hour",
+            "Consultation - $150/hour",
+            "Project Work - $500"
+        ]
+    else:
+        # Analyze patterns (simplified)
+        common_items = []
+        for invoice in customer_invoices:
+            for item in invoice.get("items", []):
+                common_items.append(item["description"])
+        
+        suggestions = list(set(common_items))[:5] if common_items else [
+            "Recurring Service",
+            "Maintenance Fee",
+            "Support Services"
+        ]
+    
+    return {
+        "customer_id": customer_id,
+        "suggestions": suggestions,
+        "message": "AI-generated suggestions based on customer history"
+    }
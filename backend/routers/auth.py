@@ -0,0 +1,126 @@
+"""
+Authentication routes.
+"""
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, HTTPException, Depends, status
+
+from database import db
+from models import User, UserCreate, UserLogin, UserResponse, Token
+from security import JWT_EXPIRATION_HOURS, hash_password, verify_password, create_access_token, get_current_user
+
+router = APIRouter()
+
+# Authentication Routes
+@router.post("/auth/register", response_model=Token)
+async def register(user_data: UserCreate):
+    """Register a new user"""
+    
+    # Check if user already exists
+    existing_user = await db.users.find_one({"email": user_data.email})
+    if existing_user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    
+    # Validate password strength
+    if len(user_data.password) < 6:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Password must be at least 6 characters long"
+        )
+    
+    # Create user
+    user_dict = user_data.dict()
+    user_dict["password_hash"] = hash_password(user_data.password)
+    del user_dict["password"]
+    
+    user_obj = User(**user_dict)
+    await db.users.insert_one(user_obj.dict())
+    
+    # Create access token
+    access_token_expires = timedelta(hours=JWT_EXPIRATION_HOURS)
+    access_token = create_access_token(
+        data={"sub": user_obj.id}, expires_delta=access_token_expires
+    )
+    
+    user_response = UserResponse(
+        id=user_obj.id,
+        name=user_obj.name,
+        email=user_obj.email,
+        is_active=user_obj.is_active,
+        created_at=user_obj.created_at,
+        business_ids=user_obj.business_ids
+    )
+    
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=JWT_EXPIRATION_HOURS * 3600,
+        user=user_response
+    )
+
+@router.post("/auth/login", response_model=Token)
+async def login(credentials: UserLogin):
+    """Login user and return JWT token"""
+    
+    # Find user
+    user_data = await db.users.find_one({"email": credentials.email})
+    if not user_data:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
+    
+    user = User(**user_data)
+    
+    # Verify password
+    if not verify_password(credentials.password, user.password_hash):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
+    
+    # Update last login
+    await db.users.update_one(
+        {"id": user.id},
+        {"$set": {"last_login": datetime.utcnow()}}
+    )
+    
+    # Create access token
+    access_token_expires = timedelta(hours=JWT_EXPIRATION_HOURS)
+    access_token = create_access_token(
+        data={"sub": user.id}, expires_delta=access_token_expires
+    )
+    
+    user_response = UserResponse(
+        id=user.id,
+        name=user.name,
+        email=user.email,
+        is_active=user.is_active,
+        created_at=user.created_at,
+        last_login=datetime.utcnow(),
+        business_ids=user.business_ids
+    )
+    
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        expires_in=JWT_EXPIRATION_HOURS * 3600,
+        user=user_response
+    )
+
+@router.get("/auth/me", response_model=UserResponse)
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
+    """Get current user information"""
+    return UserResponse(
+        id=current_user.id,
+        name=current_user.name,
+        email=current_user.email,
+        is_active=current_user.is_active,
+        created_at=current_user.created_at,
+        last_login=current_user.last_login,
+        business_ids=current_user.business_ids
+    )
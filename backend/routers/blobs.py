@@ -0,0 +1,67 @@
+"""
+Image upload and content-addressed blob routes.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse
+
+from blob_store import (
+    BLOB_CACHE_CONTROL, BLOB_MAX_BYTES, THUMBNAIL_SIZES,
+    blob_path, blob_url, is_blob_hash, sniff_content_type, store_image,
+)
+from models import User
+from security import get_current_user
+
+router = APIRouter()
+
+# Blob Routes
+@router.post("/blobs")
+async def upload_blob(request: Request, file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Upload a logo or signature image; returns the hash to reference it by"""
+    data = await file.read(BLOB_MAX_BYTES + 1)
+    blob_hash = await store_image(data)
+    return {
+        "hash": blob_hash,
+        "url": blob_url(request, blob_hash),
+        "original_url": blob_url(request, blob_hash, size=None),
+    }
+
+@router.get("/blobs/{blob_hash}", name="get_blob")
+async def get_blob(
+    blob_hash: str,
+    size: Optional[int] = Query(None, description=f"Thumbnail size, one of {THUMBNAIL_SIZES}"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serve a stored image or one of its thumbnails.
+
+    Public so <img> tags can load it: the hash is unguessable and only
+    known to clients that were given it.
+    """
+    if not is_blob_hash(blob_hash):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}"
+        )
+
+    path = blob_path(blob_hash, size) if size is not None else None
+    if path is None or not path.exists():
+        # No thumbnail (e.g. Pillow missing when it was stored): serve the original
+        path = blob_path(blob_hash)
+        size = None
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    etag = f'"{blob_hash}.{size or "orig"}"'
+    headers = {"Cache-Control": BLOB_CACHE_CONTROL, "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if size is not None:
+        media_type = "image/png"
+    else:
+        with open(path, "rb") as blob:
+            media_type = sniff_content_type(blob.read(16)) or "application/octet-stream"
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,252 @@
+"""
+Business profile, template and business information routes.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+
+from blob_store import IMAGE_KINDS, store_profile_images, with_image_urls
+from custom_templates import build_custom_template, list_custom_templates, save_custom_template
+from database import db, business_cache
+from idempotency import run_idempotent
+from lookups import batch_get, parse_ids
+from models import BusinessInfo, BusinessInfoCreate, User
+from security import get_current_user
+
+router = APIRouter()
+
+# Business Profile Routes (MUST come before parameterized routes)
+@router.get("/business/profile")
+async def get_business_profile(request: Request, current_user: User = Depends(get_current_user)):
+    """Get current user's business profile"""
+    profile = await db.business_profiles.find_one({"user_id": current_user.id}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Business profile not found")
+    return with_image_urls(profile, request)
+
+@router.post("/business/profile")
+async def save_business_profile(request: Request, profile_data: dict, current_user: User = Depends(get_current_user)):
+    """Save or update business profile"""
+    try:
+        profile_data.pop("_id", None)
+        profile_data["user_id"] = current_user.id
+        profile_data["updated_at"] = datetime.utcnow().isoformat()
+        
+        # Check if profile exists
+        existing_profile = await db.business_profiles.find_one({"user_id": current_user.id})
+        # Logo and signature go to the blob store; the profile keeps their hashes
+        await store_profile_images(profile_data, existing_profile or {})
+        
+        if existing_profile:
+            # Update existing profile
+            await db.business_profiles.update_one(
+                {"user_id": current_user.id},
+                {"$set": profile_data, "$unset": {f"{kind}_url": "" for kind in IMAGE_KINDS}}
+            )
+        else:
+            # Create new profile
+            profile_data["created_at"] = datetime.utcnow().isoformat()
+            await db.business_profiles.insert_one(profile_data)
+        
+        # Return a clean response without ObjectId
+        response_data = profile_data.copy()
+        if "_id" in response_data:
+            del response_data["_id"]
+        
+        return {"message": "Business profile saved successfully", "data": with_image_urls(response_data, request)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error saving business profile: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving business profile: {str(e)}"
+        )
+
+@router.post("/business/generate-template")
+async def generate_business_template(request: Request, current_user: User = Depends(get_current_user)):
+    """Generate a custom business template based on user's business profile"""
+    # Get user's business profile
+    profile = await db.business_profiles.find_one({"user_id": current_user.id})
+    if not profile:
+        raise HTTPException(
+            status_code=404, 
+            detail="Business profile not found. Please complete your business profile first."
+        )
+    
+    if any(profile.get(f"{kind}_url") for kind in IMAGE_KINDS):
+        # Saved before the blob store: move the inline images out first
+        images = {}
+        await store_profile_images(images, profile)
+        await db.business_profiles.update_one(
+            {"user_id": current_user.id},
+            {"$set": images, "$unset": {f"{kind}_url": "" for kind in IMAGE_KINDS}}
+        )
+        profile.update(images)
+
+    template = build_custom_template(profile, current_user.id)
+    try:
+        template = await save_custom_template(template)
+        return {
+            "message": "Business template generated successfully!",
+            "template": with_image_urls(template, request),
+            "success": True
+        }
+    except Exception as e:
+        print(f"Error saving custom template: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating template: {str(e)}"
+        )
+
+@router.get("/business/custom-templates")
+async def get_custom_templates(request: Request, current_user: User = Depends(get_current_user)):
+    """Get user's custom generated templates, newest first"""
+    templates = await list_custom_templates(current_user.id)
+    return {"templates": [with_image_urls(template, request) for template in templates]}
+
+@router.get("/business/custom-templates/{template_id}")
+async def get_custom_template(template_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    """Get one custom template"""
+    template = await db.custom_templates.find_one({"id": template_id, "user_id": current_user.id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return with_image_urls(template, request)
+
+@router.get("/business/templates")
+async def get_business_templates(request: Request, current_user: User = Depends(get_current_user)):
+    """Get all business templates including custom ones"""
+    custom_templates = [
+        with_image_urls(template, request) for template in await list_custom_templates(current_user.id)
+    ]
+    
+    # Default template options
+    default_templates = [
+        {
+            "id": "modern-blue",
+            "name": "Modern Blue",
+            "category": "professional",
+            "description": "Clean and modern design with blue accent colors",
+            "color": "blue",
+            "brand_color": "#3B82F6",
+            "features": ["Modern Design", "Professional Layout", "Blue Theme"],
+            "premium": False,
+            "corners": "rounded",
+            "style": "modern"
+        },
+        {
+            "id": "creative-green",
+            "name": "Creative Green",
+            "category": "creative",
+            "description": "Eye-catching design perfect for creative businesses",
+            "color": "green",
+            "brand_color": "#10B981",
+            "features": ["Creative Design", "Green Theme", "Eye-catching Layout"],
+            "premium": False,
+            "corners": "rounded",
+            "style": "creative"
+        },
+        {
+            "id": "professional-blue",
+            "name": "Professional Blue",
+            "category": "business",
+            "description": "Traditional professional template for business use",
+            "color": "blue",
+            "brand_color": "#1E40AF",
+            "features": ["Professional", "Traditional Layout", "Business Focused"],
+            "premium": False,
+            "corners": "minimal",
+            "style": "professional"
+        },
+        {
+            "id": "elegant-purple",
+            "name": "Elegant Purple",
+            "category": "premium",
+            "description": "Sophisticated design with purple accents",
+            "color": "purple",
+            "brand_color": "#8B5CF6",
+            "features": ["Elegant Design", "Purple Theme", "Sophisticated"],
+            "premium": True,
+            "corners": "rounded",
+            "style": "elegant"
+        },
+        {
+            "id": "minimal-gray",
+            "name": "Minimal Gray",
+            "category": "minimal",
+            "description": "Clean minimal design with gray tones",
+            "color": "gray",
+            "brand_color": "#6B7280",
+            "features": ["Minimal Design", "Clean Layout", "Gray Theme"],
+            "premium": False,
+            "corners": "minimal",
+            "style": "minimal"
+        },
+        {
+            "id": "classic-black",
+            "name": "Classic Black",
+            "category": "classic",
+            "description": "Timeless black and white professional design",
+            "color": "black",
+            "brand_color": "#111827",
+            "features": ["Classic Design", "Black & White", "Timeless"],
+            "premium": False,
+            "corners": "minimal",
+            "style": "classic"
+        }
+    ]
+    
+    return {
+        "templates": {
+            "custom": custom_templates,
+            "default": default_templates
+        },
+        "total_custom": len(custom_templates),
+        "total_default": len(default_templates)
+    }
+
+# Business Information Routes (Generic routes MUST come after specific ones)
+@router.post("/business", response_model=BusinessInfo)
+async def create_business(
+    business: BusinessInfoCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await run_idempotent(
+        idempotency_key, current_user.id, "POST /business", business, response,
+        lambda: _create_business(business, current_user)
+    )
+
+async def _create_business(business: BusinessInfoCreate, current_user: User) -> BusinessInfo:
+    business_dict = business.dict()
+    business_obj = BusinessInfo(**business_dict, user_id=current_user.id)
+    await db.businesses.insert_one(business_obj.dict())
+    await business_cache.put(current_user.id, business_obj)
+    return business_obj
+
+@router.get("/business", response_model=List[BusinessInfo])
+async def get_businesses(current_user: User = Depends(get_current_user)):
+    businesses = await db.businesses.find({"user_id": current_user.id}).sort("created_at", -1).to_list(1000)
+    return [BusinessInfo(**business) for business in businesses]
+
+@router.get("/business:batchGet")
+async def batch_get_businesses(
+    ids: List[str] = Query(..., description="Business ids, repeated or comma-separated"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get up to 100 businesses by id in one call; unknown ids are listed in `not_found`"""
+    result = await batch_get(business_cache, "businesses", current_user.id, parse_ids(ids))
+    return {"businesses": result["found"], "not_found": result["not_found"]}
+
+@router.get("/business/{business_id}", response_model=BusinessInfo)
+async def get_business(business_id: str, current_user: User = Depends(get_current_user)):
+    business = await business_cache.get(
+        current_user.id, business_id,
+        lambda: db.businesses.find_one({"id": business_id, "user_id": current_user.id})
+    )
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    return business
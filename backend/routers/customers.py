@@ -0,0 +1,66 @@
+"""
+Customer routes.
+"""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+
+from customer_index import customer_index
+from database import db, customer_cache
+from idempotency import run_idempotent
+from lookups import batch_get, parse_ids
+from models import Customer, CustomerCreate, User
+from security import get_current_user
+
+router = APIRouter()
+
+# Customer Routes
+@router.post("/customers", response_model=Customer)
+async def create_customer(
+    customer: CustomerCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await run_idempotent(
+        idempotency_key, current_user.id, "POST /customers", customer, response,
+        lambda: _create_customer(customer, current_user)
+    )
+
+async def _create_customer(customer: CustomerCreate, current_user: User) -> Customer:
+    customer_dict = customer.dict()
+    customer_obj = Customer(**customer_dict, user_id=current_user.id)
+    await db.customers.insert_one(customer_obj.dict())
+    await customer_cache.put(current_user.id, customer_obj)
+    customer_index.add(current_user.id, customer_obj.id, customer_obj.name, customer_obj.business_name)
+    return customer_obj
+
+@router.get("/customers", response_model=List[Customer])
+async def get_customers(current_user: User = Depends(get_current_user)):
+    customers = await db.customers.find({"user_id": current_user.id}).sort("created_at", -1).to_list(1000)
+    return [Customer(**customer) for customer in customers]
+
+@router.get("/customers:batchGet")
+async def batch_get_customers(
+    ids: List[str] = Query(..., description="Customer ids, repeated or comma-separated"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get up to 100 customers by id in one call; unknown ids are listed in `not_found`"""
+    result = await batch_get(customer_cache, "customers", current_user.id, parse_ids(ids))
+    return {"customers": result["found"], "not_found": result["not_found"]}
+
+@router.get("/customers/search")
+async def search_customers(q: str, limit: int = Query(5, ge=1, le=20), current_user: User = Depends(get_current_user)):
+    """Rank customers by name similarity (typos, prefixes and Indic-script spellings match)"""
+    return await customer_index.search(current_user.id, q, limit)
+
+@router.get("/customers/{customer_id}", response_model=Customer)
+async def get_customer(customer_id: str, current_user: User = Depends(get_current_user)):
+    customer = await customer_cache.get(
+        current_user.id, customer_id,
+        lambda: db.customers.find_one({"id": customer_id, "user_id": current_user.id})
+    )
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return customer
@@ -0,0 +1,72 @@
+"""
+Dashboard statistics and cache metrics routes.
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from analytics import DEFAULT_RANGE_DAYS, INVOICE_CURRENCY, TOP_CUSTOMERS_LIMIT, invoice_analytics
+from currency import rate_tables
+from database import db, NOT_DELETED, business_cache, customer_cache, invoice_cache
+from invoicing import resolve_currency
+from models import User
+from security import get_admin_user, get_current_user
+
+router = APIRouter()
+
+# Dashboard and Analytics Routes
+@router.get("/cache/stats")
+async def get_cache_stats(admin: User = Depends(get_admin_user)):
+    """Get entity cache hit-ratio metrics for this worker (admins only)"""
+    return {cache.name: cache.stats() for cache in (business_cache, customer_cache, invoice_cache)}
+
+@router.get("/dashboard/stats")
+async def get_dashboard_stats(currency: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Get dashboard statistics for the current user; revenue in `currency` (default: the business profile's)"""
+    
+    currency = await resolve_currency(current_user.id, currency)
+    owner = {"user_id": current_user.id}
+    total_invoices = await db.invoices.count_documents({**owner, **NOT_DELETED})
+    total_customers = await db.customers.count_documents(owner)
+    
+    # Calculate total revenue on the server via the (user_id, status) index
+    revenue = await db.invoices.aggregate([
+        {"$match": {**owner, **NOT_DELETED, "status": "paid"}},
+        {"$group": {"_id": INVOICE_CURRENCY, "total": {"$sum": "$total_amount"}}}
+    ]).to_list(None)
+    converted = rate_tables.get().convert_amounts(
+        [row["total"] for row in revenue], [row["_id"] for row in revenue], currency
+    )
+    total_revenue = round(float(converted.sum()), 2)
+    
+    # Recent invoices
+    recent_invoices = await db.invoices.find({**owner, **NOT_DELETED}, {"_id": 1}).sort("created_at", -1).limit(5).to_list(5)
+    
+    return {
+        "total_invoices": total_invoices,
+        "total_customers": total_customers,
+        "total_revenue": total_revenue,
+        "currency": currency,
+        "recent_invoices": len(recent_invoices),
+        "ai_interactions": await db.ai_interactions.count_documents(owner)
+    }
+
+@router.get("/dashboard/analytics")
+async def get_dashboard_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    as_of: Optional[date] = None,
+    top_customers: int = Query(TOP_CUSTOMERS_LIMIT, ge=1, le=100),
+    currency: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Monthly revenue and top customers for invoices issued in [start, end] (default: the last year),
+    and receivables aging as of `as_of` (default: today), all converted to `currency`"""
+    end = end or date.today()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    currency = await resolve_currency(current_user.id, currency)
+    return await invoice_analytics(current_user.id, start, end, as_of or date.today(), top_customers, currency)
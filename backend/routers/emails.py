@@ -0,0 +1,172 @@
+"""
+Invoice email routes: queue single and bulk sends, and report delivery.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
+
+from currency import DEFAULT_CURRENCY, format_money
+from database import db, NOT_DELETED
+from email_outbox import (
+    EMAIL_STATUS_PROJECTION, email_outbox, email_status, parse_recipients, render_template
+)
+from idempotency import run_idempotent
+from models import BulkInvoiceEmailRequest, InvoiceEmailRequest, User
+from security import get_current_user
+
+router = APIRouter()
+
+# Invoice fields used to address and fill in an email
+INVOICE_EMAIL_FIELDS = {
+    "_id": 0, "id": 1, "invoice_number": 1, "customer_id": 1, "business_id": 1,
+    "issue_date": 1, "due_date": 1, "total_amount": 1, "currency": 1,
+}
+
+
+async def _load_parties(user_id: str, invoices: List[Dict[str, Any]]) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Customers and businesses of the invoices by id, one query each"""
+    customer_ids = list({invoice["customer_id"] for invoice in invoices})
+    business_ids = list({invoice["business_id"] for invoice in invoices})
+    customers = await db.customers.find(
+        {"id": {"$in": customer_ids}, "user_id": user_id}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+    ).to_list(None)
+    businesses = await db.businesses.find(
+        {"id": {"$in": business_ids}, "user_id": user_id}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+    ).to_list(None)
+    return {c["id"]: c for c in customers}, {b["id"]: b for b in businesses}
+
+def _compose(
+    invoice: Dict[str, Any],
+    customer: Dict[str, Any],
+    business: Dict[str, Any],
+    subject: str,
+    body: str,
+    to: List[str],
+    cc: List[str],
+    mark_sent: bool,
+) -> Dict[str, Any]:
+    due_date = invoice.get("due_date")
+    days_overdue = (date.today() - date.fromisoformat(due_date)).days if due_date else 0
+    variables = {
+        "invoice_number": invoice["invoice_number"],
+        "customer_name": customer.get("name", ""),
+        "company_name": business.get("name", ""),
+        "sender_name": business.get("name", ""),
+        "total_amount": format_money(invoice["total_amount"], invoice.get("currency") or DEFAULT_CURRENCY),
+        "issue_date": invoice.get("issue_date", ""),
+        "due_date": due_date or "",
+        "days_overdue": max(days_overdue, 0),
+    }
+    return {
+        "invoice_id": invoice["id"],
+        "to": to,
+        "cc": cc,
+        "reply_to": business.get("email"),
+        "subject": render_template(subject, variables),
+        "body": render_template(body, variables),
+        "mark_sent": mark_sent,
+    }
+
+def _customer_recipients(customer: Dict[str, Any]) -> List[str]:
+    try:
+        return parse_recipients(customer.get("email"))
+    except HTTPException:
+        return []
+
+# Email Routes
+@router.post("/email/send-invoice", status_code=status.HTTP_202_ACCEPTED)
+async def send_invoice_email(
+    request: InvoiceEmailRequest,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Queue an invoice email (to the customer unless `to` is given); returns its delivery status"""
+    return await run_idempotent(
+        idempotency_key, current_user.id, "POST /email/send-invoice", request, response,
+        lambda: _send_invoice_email(request, current_user)
+    )
+
+async def _send_invoice_email(request: InvoiceEmailRequest, current_user: User) -> Dict[str, Any]:
+    invoice = await db.invoices.find_one(
+        {"id": request.invoice_id, "user_id": current_user.id, **NOT_DELETED}, INVOICE_EMAIL_FIELDS
+    )
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    customers, businesses = await _load_parties(current_user.id, [invoice])
+    customer = customers.get(invoice["customer_id"], {})
+    to = parse_recipients(request.to) or _customer_recipients(customer)
+    if not to:
+        raise HTTPException(status_code=400, detail="No recipient: pass `to` or add an email address to the customer")
+    message = _compose(
+        invoice, customer, businesses.get(invoice["business_id"], {}),
+        request.subject, request.message, to, parse_recipients(request.cc), request.mark_sent
+    )
+    [queued] = await email_outbox.enqueue(current_user.id, [message])
+    return email_status(queued)
+
+@router.post("/email/send-invoices", status_code=status.HTTP_202_ACCEPTED)
+async def send_invoice_emails(
+    request: BulkInvoiceEmailRequest,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Queue one email per invoice to its customer; invoices that cannot be sent are listed in `skipped`"""
+    return await run_idempotent(
+        idempotency_key, current_user.id, "POST /email/send-invoices", request, response,
+        lambda: _send_invoice_emails(request, current_user)
+    )
+
+async def _send_invoice_emails(request: BulkInvoiceEmailRequest, current_user: User) -> Dict[str, Any]:
+    invoice_ids = list(dict.fromkeys(request.invoice_ids))
+    invoices = await db.invoices.find(
+        {"id": {"$in": invoice_ids}, "user_id": current_user.id, **NOT_DELETED}, INVOICE_EMAIL_FIELDS
+    ).to_list(None)
+    customers, businesses = await _load_parties(current_user.id, invoices)
+    by_id = {invoice["id"]: invoice for invoice in invoices}
+
+    messages, skipped = [], []
+    for invoice_id in invoice_ids:
+        invoice = by_id.get(invoice_id)
+        if invoice is None:
+            skipped.append({"invoice_id": invoice_id, "reason": "Invoice not found"})
+            continue
+        customer = customers.get(invoice["customer_id"], {})
+        to = _customer_recipients(customer)
+        if not to:
+            skipped.append({"invoice_id": invoice_id, "reason": "Customer has no valid email address"})
+            continue
+        messages.append(_compose(
+            invoice, customer, businesses.get(invoice["business_id"], {}),
+            request.subject, request.message, to, [], request.mark_sent
+        ))
+    queued = await email_outbox.enqueue(current_user.id, messages)
+    return {
+        "queued": len(queued),
+        "message_ids": [message["id"] for message in queued],
+        "skipped": skipped,
+    }
+
+@router.get("/email/messages")
+async def get_email_messages(
+    invoice_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """Recent emails, newest first, optionally only those for one invoice"""
+    query = {"user_id": current_user.id}
+    if invoice_id:
+        query["invoice_id"] = invoice_id
+    messages = await db.email_outbox.find(query, EMAIL_STATUS_PROJECTION).sort("created_at", -1).to_list(limit)
+    return [email_status(message) for message in messages]
+
+@router.get("/email/messages/{message_id}")
+async def get_email_message(message_id: str, current_user: User = Depends(get_current_user)):
+    """Delivery status of one email"""
+    message = await db.email_outbox.find_one({"id": message_id, "user_id": current_user.id}, EMAIL_STATUS_PROJECTION)
+    if not message:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return email_status(message)
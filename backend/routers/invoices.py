@@ -0,0 +1,470 @@
+"""
+Invoice routes, including the incremental change feed.
+"""
+
+from datetime import datetime, date
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status as http_status
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+
+from analytics import STATS_FIELDS, record_invoice_change
+from bulk_delete import (
+    BULK_DELETE_CHUNK_SIZE, soft_delete_chunk, count_bulk_delete, enqueue_bulk_delete
+)
+from change_feed import (
+    CHANGES_PAGE_LIMIT, next_change_seq, current_change_seq, settled_change_seq, encode_change_token,
+    decode_change_token,
+)
+from currency import DEFAULT_CURRENCY, validate_currency
+from database import db, invoice_cache, TOMBSTONE_TTL_SECONDS, NOT_DELETED
+from idempotency import run_idempotent
+from invoicing import (
+    allocate_invoice_numbers, build_invoice, compute_invoice_totals, format_invoice_number, invoice_totals, resolve_currency
+)
+from jobs import job_queue, job_status
+from line_items import (
+    INVOICE_ITEMS_PAGE_LIMIT, append_items, drop_segments, insert_lines, item_count, mark_lines_deleted,
+    place_items, read_lines,
+)
+from lookups import batch_get, expansion_stages, parse_expand, parse_ids, resolve_expansions
+from models import ExpandedInvoice, Invoice, InvoiceCreate, InvoiceItem, InvoiceItemsAppend, User
+from security import get_current_user
+from tax import validate_tax_categories
+
+router = APIRouter()
+
+# Appends retried after losing a race with another write (without If-Match)
+APPEND_ITEMS_ATTEMPTS = 3
+# List views read headers only
+LIST_PROJECTION = {"_id": 0, "items": 0}
+
+
+def invoice_etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Expected invoice version from an If-Match header (None when absent or "*")"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this API")
+
+def version_guard(changes: dict, expected: Optional[int]) -> Tuple[dict, dict]:
+    """Filter clause and update document that set `changes` and bump the version.
+
+    With an expected version the write only matches that version. Invoices
+    written before versioning count as 1; the server gives them that version
+    at startup so unconditional updates ($inc) move them on to 2.
+    """
+    if expected is None:
+        return {}, {"$set": changes, "$inc": {"version": 1}}
+    version_filter = {"version": {"$in": [1, None]}} if expected == 1 else {"version": expected}
+    return version_filter, {"$set": {**changes, "version": expected + 1}}
+
+async def raise_write_conflict(invoice_id: str, user_id: str):
+    """A guarded write matched nothing: 404 if the invoice is gone, else 412 (someone else changed it)"""
+    if await db.invoices.count_documents({"id": invoice_id, "user_id": user_id, **NOT_DELETED}, limit=1):
+        raise HTTPException(
+            status_code=http_status.HTTP_412_PRECONDITION_FAILED,
+            detail="Invoice was modified by another request; reload it and retry"
+        )
+    raise HTTPException(status_code=404, detail="Invoice not found")
+
+def apply_guarded_update(before: dict, changes: dict, expected: Optional[int]) -> dict:
+    """The document as the update left it, computed from its pre-image.
+
+    The analytics buckets need the pre-image, so guarded updates return the
+    document BEFORE the write and apply the same $set here instead of paying
+    for a second read.
+    """
+    version = expected + 1 if expected is not None else before.get("version", 0) + 1
+    return {**before, **changes, "version": version}
+
+# Invoice Routes
+@router.post("/invoices", response_model=Invoice)
+async def create_invoice(
+    invoice_data: InvoiceCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Create an invoice; send an Idempotency-Key header to make retries safe"""
+    return await run_idempotent(
+        idempotency_key, current_user.id, "POST /invoices", invoice_data, response,
+        lambda: _create_invoice(invoice_data, current_user)
+    )
+
+async def _create_invoice(invoice_data: InvoiceCreate, current_user: User) -> Invoice:
+    validate_tax_categories(invoice_data.items)
+    invoice_data.currency = await resolve_currency(current_user.id, invoice_data.currency)
+    totals = await invoice_totals(current_user.id, invoice_data)
+    invoice_number = format_invoice_number(await allocate_invoice_numbers(current_user.id))
+    _, invoice_doc = build_invoice(
+        invoice_data, current_user.id, invoice_number, await next_change_seq(current_user.id), totals
+    )
+    await insert_lines(place_items(invoice_doc, invoice_doc["id"], current_user.id, invoice_doc["updated_seq"]))
+    await db.invoices.insert_one(invoice_doc)
+    invoice_obj = Invoice(**invoice_doc)
+    await record_invoice_change(current_user.id, None, invoice_doc)
+    await invoice_cache.put(current_user.id, invoice_obj)
+    return invoice_obj
+
+@router.get("/invoices", response_model=List[ExpandedInvoice])
+async def get_invoices(
+    response: Response,
+    expand: Optional[str] = Query(None, description="Comma-separated related entities to join in: customer, business"),
+    limit: int = Query(1000, ge=1, le=1000),
+    skip: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """List invoice headers, newest first; `expand=customer,business` includes those in the same query.
+
+    Lines are left out (`items` is null): `item_count` has their number and
+    /invoices/{id}/items pages them.
+    """
+    expansions = parse_expand(expand)
+    # Read the settled feed position before listing: every write up to it is
+    # in the list, and anything later (even if still in flight) is in the feed
+    change_seq = await settled_change_seq(current_user.id)
+    query = {"user_id": current_user.id, **NOT_DELETED}
+    if expansions:
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"created_at": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": LIST_PROJECTION},
+            *expansion_stages(expansions),
+        ]
+        invoices = [
+            resolve_expansions(invoice, expansions, current_user.id)
+            for invoice in await db.invoices.aggregate(pipeline).to_list(None)
+        ]
+    else:
+        invoices = await db.invoices.find(query, LIST_PROJECTION).sort("created_at", -1).skip(skip).to_list(limit)
+    response.headers["X-Changes-Token"] = encode_change_token(change_seq)
+    return [ExpandedInvoice(**invoice) for invoice in invoices]
+
+@router.get("/invoices:batchGet")
+async def batch_get_invoices(
+    ids: List[str] = Query(..., description="Invoice ids, repeated or comma-separated"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get up to 100 invoices by id in one call; unknown or deleted ids are listed in `not_found`"""
+    result = await batch_get(invoice_cache, "invoices", current_user.id, parse_ids(ids), NOT_DELETED)
+    return {"invoices": result["found"], "not_found": result["not_found"]}
+
+@router.get("/invoices/changes")
+async def get_invoice_changes(since: str, limit: int = CHANGES_PAGE_LIMIT, current_user: User = Depends(get_current_user)):
+    """Get invoices created, updated or deleted since a change token.
+
+    Start from the X-Changes-Token header of GET /invoices, then pass each
+    response's next_token. When reset is true the token is too old (or
+    invalid for this user) and the client must reload the full list.
+    Changes newer than the settled position are sent right away and again
+    once settled, so clients apply them by id.
+    """
+    since_seq, issued_at = decode_change_token(since)
+    limit = max(1, min(limit, CHANGES_PAGE_LIMIT))
+    latest_seq = await current_change_seq(current_user.id)
+    
+    token_age = datetime.utcnow().timestamp() - issued_at
+    if token_age > TOMBSTONE_TTL_SECONDS or since_seq > latest_seq:
+        return {
+            "changes": [],
+            "deleted": [],
+            "next_token": encode_change_token(await settled_change_seq(current_user.id)),
+            "has_more": False,
+            "reset": True
+        }
+    
+    # Tokens never pass the settled position: a write holding a lower position
+    # may still commit after a higher one, and must not be skipped
+    settled_seq = max(since_seq, await settled_change_seq(current_user.id))
+    query = {"user_id": current_user.id, "updated_seq": {"$gt": since_seq}}
+    updated = await db.invoices.find({**query, **NOT_DELETED}).sort("updated_seq", 1).to_list(limit + 1)
+    deleted = await db.invoice_tombstones.find(query).sort("updated_seq", 1).to_list(limit + 1)
+    
+    # Merge both streams in feed order and cut the page at `limit`
+    events = sorted(
+        [(doc["updated_seq"], "changed", doc) for doc in updated] +
+        [(doc["updated_seq"], "deleted", doc) for doc in deleted],
+        key=lambda event: event[0]
+    )
+    settled = [event for event in events if event[0] <= settled_seq]
+    if len(settled) > limit:
+        page, has_more, next_seq = settled[:limit], True, settled[limit - 1][0]
+    else:
+        # All settled changes fit; the unsettled ones ride along but stay after the token
+        page, has_more, next_seq = events[:limit], False, settled_seq
+    
+    return {
+        "changes": [Invoice(**doc) for _, kind, doc in page if kind == "changed"],
+        "deleted": [doc["id"] for _, kind, doc in page if kind == "deleted"],
+        "next_token": encode_change_token(next_seq),
+        "has_more": has_more,
+        "reset": False
+    }
+
+@router.get("/invoices/{invoice_id}", response_model=Invoice)
+async def get_invoice(invoice_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    invoice = await invoice_cache.get(
+        current_user.id, invoice_id,
+        lambda: db.invoices.find_one({"id": invoice_id, "user_id": current_user.id, **NOT_DELETED})
+    )
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    response.headers["ETag"] = invoice_etag(invoice.version)
+    return invoice
+
+@router.put("/invoices/{invoice_id}/status")
+async def update_invoice_status(
+    invoice_id: str,
+    status: str,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    """Update an invoice's status; send If-Match with its ETag to reject concurrent edits"""
+    expected = parse_if_match(if_match)
+    changes = {
+        "status": status,
+        "updated_at": datetime.utcnow(),
+        "updated_seq": await next_change_seq(current_user.id)
+    }
+    version_filter, update = version_guard(changes, expected)
+    before = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "user_id": current_user.id, **NOT_DELETED, **version_filter}, update
+    )
+    if before is None:
+        await raise_write_conflict(invoice_id, current_user.id)
+    after = apply_guarded_update(before, changes, expected)
+    await record_invoice_change(current_user.id, before, after)
+    await invoice_cache.put(current_user.id, Invoice(**after))
+    response.headers["ETag"] = invoice_etag(after["version"])
+    return {"message": "Invoice status updated successfully", "version": after["version"]}
+
+@router.delete("/invoices/{invoice_id}")
+async def delete_invoice(invoice_id: str, current_user: User = Depends(get_current_user)):
+    """Delete a specific invoice (restorable until it is purged)"""
+    now = datetime.utcnow()
+    # Tombstone first, as in soft_delete_chunk: failing after the delete
+    # would otherwise hide it from change feed clients
+    tombstone = {
+        "id": invoice_id,
+        "user_id": current_user.id,
+        "updated_seq": await next_change_seq(current_user.id),
+        "deleted_at": now
+    }
+    await db.invoice_tombstones.insert_one(tombstone)
+    deleted = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "user_id": current_user.id, **NOT_DELETED},
+        {"$set": {"deleted_at": now, "updated_at": now}, "$inc": {"version": 1}},
+        projection={**STATS_FIELDS, "items_external": 1}
+    )
+    if deleted is None:
+        await db.invoice_tombstones.delete_one({"user_id": current_user.id, "updated_seq": tombstone["updated_seq"]})
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    if deleted.get("items_external"):
+        await mark_lines_deleted(current_user.id, [invoice_id], now)
+    await record_invoice_change(current_user.id, deleted, None)
+    await invoice_cache.invalidate(current_user.id, invoice_id)
+    return {"message": "Invoice deleted successfully"}
+
+@router.post("/invoices/{invoice_id}/restore", response_model=Invoice)
+async def restore_invoice(invoice_id: str, current_user: User = Depends(get_current_user)):
+    """Undo the deletion of an invoice that has not been purged yet"""
+    restored = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "user_id": current_user.id, "deleted_at": {"$ne": None}},
+        {
+            "$unset": {"deleted_at": ""},
+            "$set": {"updated_at": datetime.utcnow(), "updated_seq": await next_change_seq(current_user.id)},
+            "$inc": {"version": 1}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if restored is None:
+        raise HTTPException(status_code=404, detail="Deleted invoice not found")
+    if restored.get("items_external"):
+        await mark_lines_deleted(current_user.id, [invoice_id], None)
+    await record_invoice_change(current_user.id, None, restored)
+    return Invoice(**restored)
+
+@router.delete("/invoices")
+async def delete_all_invoices(current_user: User = Depends(get_current_user)):
+    """Delete all of the current user's invoices (bulk delete).
+
+    Up to one chunk is deleted inline; anything larger is handed to a
+    background job and 202 is returned with a URL to poll its progress.
+    """
+    cutoff = datetime.utcnow()
+    total = await count_bulk_delete(current_user.id, cutoff)
+    if total > BULK_DELETE_CHUNK_SIZE:
+        job = await enqueue_bulk_delete(current_user.id, cutoff, total)
+        return JSONResponse(status_code=http_status.HTTP_202_ACCEPTED, content={
+            "message": f"Deleting {total} invoices in the background",
+            "job_id": job["id"],
+            "status": job["status"],
+            "total": total,
+            "poll_url": f"/api/invoices/bulk-deletes/{job['id']}"
+        })
+    
+    _, deleted_count = await soft_delete_chunk(current_user.id, cutoff)
+    return {
+        "message": f"All invoices deleted successfully",
+        "deleted_count": deleted_count
+    }
+
+@router.get("/invoices/bulk-deletes/{job_id}")
+async def get_bulk_delete_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of a background bulk delete"""
+    job = await job_queue.get(job_id, current_user.id)
+    if not job or job["type"] != "bulk_delete":
+        raise HTTPException(status_code=404, detail="Bulk delete job not found")
+    return job_status(job)
+
+@router.put("/invoices/{invoice_id}", response_model=Invoice)
+async def update_invoice(
+    invoice_id: str,
+    invoice_data: InvoiceCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    """Update an existing invoice; send If-Match with its ETag to reject concurrent edits"""
+    expected = parse_if_match(if_match)
+    
+    # Calculate totals; without a currency the invoice keeps its own, which items then must use
+    if invoice_data.currency:
+        invoice_data.currency = validate_currency(invoice_data.currency)
+    elif any(item.currency for item in invoice_data.items):
+        raise HTTPException(status_code=400, detail="currency is required when items have their own currency")
+    validate_tax_categories(invoice_data.items)
+    totals = await invoice_totals(current_user.id, invoice_data)
+    
+    update_data = invoice_data.dict()
+    if invoice_data.currency is None:
+        del update_data["currency"]
+    update_data.update({
+        **totals._asdict(),
+        "updated_at": datetime.utcnow(),
+        "updated_seq": await next_change_seq(current_user.id)
+    })
+    await insert_lines(place_items(update_data, invoice_id, current_user.id, update_data["updated_seq"]))
+    
+    # Convert date objects to ISO format strings for MongoDB
+    if 'due_date' in update_data:
+        update_data['due_date'] = update_data['due_date'].isoformat() if isinstance(update_data['due_date'], date) else update_data['due_date']
+    
+    # One round trip: the pre-image feeds analytics and yields the new state
+    version_filter, update = version_guard(update_data, expected)
+    before = await db.invoices.find_one_and_update(
+        {"id": invoice_id, "user_id": current_user.id, **NOT_DELETED, **version_filter}, update
+    )
+    
+    if before is None:
+        await drop_segments(invoice_id, update_data["item_segments"])
+        await raise_write_conflict(invoice_id, current_user.id)
+    # The lines this update replaced
+    await drop_segments(invoice_id, before.get("item_segments") or [])
+    after = apply_guarded_update(before, update_data, expected)
+    await record_invoice_change(current_user.id, before, after)
+    
+    updated_invoice = Invoice(**after)
+    await invoice_cache.put(current_user.id, updated_invoice)
+    response.headers["ETag"] = invoice_etag(updated_invoice.version)
+    return updated_invoice
+
+@router.get("/invoices/{invoice_id}/items")
+async def get_invoice_items(
+    invoice_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=INVOICE_ITEMS_PAGE_LIMIT),
+    current_user: User = Depends(get_current_user)
+):
+    """A page of an invoice's line items, in order (works for embedded and separately stored lines)"""
+    header = await db.invoices.find_one({"id": invoice_id, "user_id": current_user.id, **NOT_DELETED}, {"_id": 0})
+    if not header:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    lines = await read_lines(header, offset, limit)
+    return {
+        "items": [InvoiceItem(**line) for line in lines],
+        "offset": offset,
+        "limit": limit,
+        "item_count": item_count(header),
+        "version": header.get("version", 1),
+    }
+
+@router.post("/invoices/{invoice_id}/items", response_model=Invoice)
+async def append_invoice_items(
+    invoice_id: str,
+    request: InvoiceItemsAppend,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    """Append line items; the invoice totals are updated from their own without re-reading the existing lines.
+
+    Without If-Match a concurrent write is retried; with it the append gets 412.
+    """
+    expected = parse_if_match(if_match)
+    validate_tax_categories(request.items)
+    for _ in range(APPEND_ITEMS_ATTEMPTS):
+        header = await db.invoices.find_one({"id": invoice_id, "user_id": current_user.id, **NOT_DELETED}, {"_id": 0})
+        if not header:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+        version = header.get("version", 1)
+        if expected is not None and version != expected:
+            await raise_write_conflict(invoice_id, current_user.id)
+
+        # Totals of the new lines alone, taxed like the rest of the invoice
+        flat_rate = header["tax_rate"] if header.get("tax_jurisdiction") is None else None
+        added = InvoiceCreate(
+            customer_id=header["customer_id"], business_id=header["business_id"], due_date=header["due_date"],
+            items=request.items,
+            currency=header.get("currency") or DEFAULT_CURRENCY, tax_rate=flat_rate,
+        )
+        added_totals = compute_invoice_totals([added], [header.get("tax_jurisdiction")])[0]
+        subtotal = round(header["subtotal"] + added_totals.subtotal, 2)
+        if flat_rate is not None:
+            tax_rate, tax_amount = flat_rate, subtotal * flat_rate
+        else:
+            tax_amount = round(header["tax_amount"] + added_totals.tax_amount, 2)
+            tax_rate = round(tax_amount / subtotal, 6) if subtotal else 0.0
+
+        updated_seq = await next_change_seq(current_user.id)
+        changes, lines = append_items(header, [item.dict() for item in added.items], updated_seq)
+        changes.update({
+            "subtotal": subtotal,
+            "tax_rate": tax_rate,
+            "tax_amount": tax_amount,
+            "total_amount": subtotal + tax_amount,
+            "updated_at": datetime.utcnow(),
+            "updated_seq": updated_seq,
+        })
+        await insert_lines(lines)
+        version_filter, update = version_guard(changes, version)
+        before = await db.invoices.find_one_and_update(
+            {"id": invoice_id, "user_id": current_user.id, **NOT_DELETED, **version_filter}, update
+        )
+        if before is not None:
+            break
+        await drop_segments(invoice_id, [updated_seq])
+        if expected is not None:
+            await raise_write_conflict(invoice_id, current_user.id)
+    else:
+        await raise_write_conflict(invoice_id, current_user.id)
+
+    after = apply_guarded_update(before, changes, version)
+    await record_invoice_change(current_user.id, before, after)
+    updated_invoice = Invoice(**after)
+    await invoice_cache.put(current_user.id, updated_invoice)
+    response.headers["ETag"] = invoice_etag(updated_invoice.version)
+    return updated_invoice
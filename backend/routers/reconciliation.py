@@ -0,0 +1,36 @@
+"""
+Bank statement reconciliation routes.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+
+from models import User
+from reconciliation import RECONCILIATION_MAX_BYTES, StatementError, reconcile_statement
+from security import get_current_user
+
+router = APIRouter()
+
+# Reconciliation Routes
+@router.post("/reconciliations")
+async def reconcile_bank_statement(
+    file: UploadFile = File(...),
+    date_format: Optional[str] = None,
+    dry_run: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Match a bank statement CSV against open invoices and mark the matched ones paid.
+
+    Pass `date_format` (e.g. %m/%d/%Y) when the statement's dates are not
+    day-first, and `dry_run=true` to see the matches without applying them.
+    """
+    if file.size is not None and file.size > RECONCILIATION_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Statements are limited to {RECONCILIATION_MAX_BYTES // (1024 * 1024)} MB"
+        )
+    try:
+        return await reconcile_statement(current_user.id, file.file, date_format, dry_run)
+    except StatementError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
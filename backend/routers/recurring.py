@@ -0,0 +1,104 @@
+"""
+Recurring invoice definition routes.
+"""
+
+from datetime import date, datetime
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Depends
+from pymongo import ReturnDocument
+
+from currency import validate_currency
+from database import db
+from invoicing import resolve_currency
+from models import RecurringInvoice, RecurringInvoiceCreate, RecurringInvoiceUpdate, User
+from security import get_current_user
+from tax import validate_tax_categories
+
+router = APIRouter()
+
+# Internal scheduler fields, never returned
+DEFINITION_PROJECTION = {"_id": 0, "lease_owner": 0, "lease_until": 0}
+
+
+def _validate_items(items):
+    # Checked up front: the scheduler cannot report a bad currency or tax category to anyone
+    for item in items or []:
+        if item.currency:
+            item.currency = validate_currency(item.currency)
+    validate_tax_categories(items)
+
+def _to_document(values: dict) -> dict:
+    # Dates are stored as ISO strings, like invoice dates
+    return {key: value.isoformat() if isinstance(value, date) and not isinstance(value, datetime) else value
+            for key, value in values.items()}
+
+# Recurring Invoice Routes
+@router.post("/recurring-invoices", response_model=RecurringInvoice)
+async def create_recurring_invoice(definition: RecurringInvoiceCreate, current_user: User = Depends(get_current_user)):
+    """Define an invoice to issue on a schedule, starting on start_date"""
+    customer = await db.customers.find_one({"id": definition.customer_id, "user_id": current_user.id}, {"_id": 1})
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    if definition.end_date is not None and definition.end_date < definition.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    _validate_items(definition.items)
+    values = definition.dict(exclude={"start_date"})
+    values["currency"] = await resolve_currency(current_user.id, definition.currency)
+    recurring = RecurringInvoice(
+        **values,
+        next_run=definition.start_date,
+        anchor_day=definition.start_date.day,
+        user_id=current_user.id
+    )
+    await db.recurring_invoices.insert_one(_to_document(recurring.model_dump()))
+    return recurring
+
+@router.get("/recurring-invoices", response_model=List[RecurringInvoice])
+async def get_recurring_invoices(current_user: User = Depends(get_current_user)):
+    definitions = db.recurring_invoices.find({"user_id": current_user.id}, DEFINITION_PROJECTION)
+    return await definitions.sort("created_at", -1).to_list(1000)
+
+@router.get("/recurring-invoices/{recurring_id}", response_model=RecurringInvoice)
+async def get_recurring_invoice(recurring_id: str, current_user: User = Depends(get_current_user)):
+    definition = await db.recurring_invoices.find_one(
+        {"id": recurring_id, "user_id": current_user.id}, DEFINITION_PROJECTION
+    )
+    if not definition:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+    return definition
+
+@router.put("/recurring-invoices/{recurring_id}", response_model=RecurringInvoice)
+async def update_recurring_invoice(
+    recurring_id: str,
+    changes: RecurringInvoiceUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Change a definition; setting next_run also moves the day of month later runs fall on"""
+    _validate_items(changes.items)
+    update = changes.dict(exclude_unset=True)
+    if update.get("currency"):
+        update["currency"] = validate_currency(update["currency"])
+    elif "currency" in update:
+        del update["currency"]
+    if changes.next_run is not None:
+        update["anchor_day"] = changes.next_run.day
+    update["updated_at"] = datetime.utcnow()
+    definition = await db.recurring_invoices.find_one_and_update(
+        {"id": recurring_id, "user_id": current_user.id},
+        {"$set": _to_document(update)},
+        projection=DEFINITION_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not definition:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+    return definition
+
+@router.delete("/recurring-invoices/{recurring_id}")
+async def delete_recurring_invoice(recurring_id: str, current_user: User = Depends(get_current_user)):
+    """Stop a recurring invoice; invoices it already issued are kept"""
+    result = await db.recurring_invoices.delete_one({"id": recurring_id, "user_id": current_user.id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+    return {"message": "Recurring invoice deleted successfully"}
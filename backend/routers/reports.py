@@ -0,0 +1,61 @@
+"""
+Period report routes: invoice register, tax summary and customer totals as CSV or XLSX.
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse
+
+from models import User
+from reports import REPORT_FORMATS, REPORTS, ReportFormatUnavailable, get_report, report_filename
+from security import get_current_user
+
+router = APIRouter()
+
+def _previous_month() -> tuple:
+    end = date.today().replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+# Report Routes
+@router.get("/reports/{report}")
+async def download_report(
+    report: str,
+    format: str = Query("csv", description=f"One of {', '.join(REPORT_FORMATS)}"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Download a report for invoices issued between `start` and `end` (default: last calendar month).
+
+    Reports are one of invoice-register, tax-summary or customer-totals.
+    Repeat downloads are served from a cached file until an invoice changes.
+    """
+    if report not in REPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown report; expected one of {', '.join(REPORTS)}")
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPORT_FORMATS)}")
+    if start is None and end is None:
+        start, end = _previous_month()
+    elif start is None or end is None:
+        raise HTTPException(status_code=400, detail="Pass both start and end, or neither")
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    try:
+        path = await get_report(current_user.id, report, format, start, end)
+    except ReportFormatUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    etag = f'"{current_user.id}.{path.stem}"'
+    headers = {"Cache-Control": "private, no-cache", "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(
+        path,
+        media_type=REPORT_FORMATS[format],
+        filename=report_filename(report, format, start, end),
+        headers=headers,
+    )
@@ -0,0 +1,146 @@
+"""
+Rule-based sales tax.
+
+The rules (``TAX_RULES_FILE``, by default ``data/tax_rules.json``) give a
+rate per tax category for each jurisdiction. A jurisdiction matches a state
+(any of its names) and optionally ZIP/PIN code prefixes; rates it leaves out
+come from its ``parent`` (by default the ``default`` jurisdiction, which
+also applies when no other one matches).
+
+``TaxEngine`` compiles the rules once, at startup, into a hash table keyed
+by (state, ZIP prefix) and a jurisdiction x category rate matrix. Finding
+a jurisdiction takes one lookup per distinct prefix length and taxing lines
+is a single indexed numpy pass, so neither depends on the number of rules.
+Rule changes take effect on restart.
+"""
+
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+TAX_RULES_FILE = Path(os.environ.get("TAX_RULES_FILE", Path(__file__).parent / "data" / "tax_rules.json"))
+DEFAULT_JURISDICTION = "default"
+
+
+class UnknownTaxCategoryError(ValueError):
+    pass
+
+
+def _state_key(state: Optional[str]) -> str:
+    return " ".join((state or "").replace(".", "").split()).casefold()
+
+def _zip_key(zip_code: Optional[str]) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "", zip_code or "").upper()
+
+
+class TaxEngine:
+    """Compiled tax rules"""
+
+    def __init__(self, rules: dict):
+        import numpy as np
+
+        self.as_of = rules.get("as_of")
+        self.categories = {name: i for i, name in enumerate(rules["categories"])}
+        self.default_category = rules.get("default_category", rules["categories"][0])
+        if self.default_category not in self.categories:
+            raise ValueError(f"Default tax category {self.default_category} is not a category")
+
+        specs = {spec["id"]: spec for spec in rules["jurisdictions"]}
+        if DEFAULT_JURISDICTION not in specs:
+            raise ValueError(f"Tax rules need a '{DEFAULT_JURISDICTION}' jurisdiction")
+        self.jurisdiction_ids = list(specs)
+        self.jurisdictions = {jurisdiction_id: i for i, jurisdiction_id in enumerate(self.jurisdiction_ids)}
+        self.rates = np.array([self._resolve_rates(specs, jurisdiction_id) for jurisdiction_id in self.jurisdiction_ids])
+
+        self._by_location: Dict[Tuple[str, str], int] = {}
+        for jurisdiction_id, spec in specs.items():
+            for state in spec.get("states", []):
+                for prefix in spec.get("zip_prefixes", [""]):
+                    key = (_state_key(state), _zip_key(prefix))
+                    if key in self._by_location:
+                        raise ValueError(f"Tax jurisdiction {jurisdiction_id} overlaps another one at {key}")
+                    self._by_location[key] = self.jurisdictions[jurisdiction_id]
+        # Longest prefix first; the state-wide rule ("") is tried last
+        self._prefix_lengths = sorted({len(prefix) for _, prefix in self._by_location}, reverse=True)
+
+    def _resolve_rates(self, specs: Dict[str, dict], jurisdiction_id: str, seen: Tuple[str, ...] = ()) -> List[float]:
+        if jurisdiction_id in seen:
+            raise ValueError(f"Tax jurisdiction {jurisdiction_id} is its own parent")
+        spec = specs[jurisdiction_id]
+        if jurisdiction_id == DEFAULT_JURISDICTION:
+            inherited = [0.0] * len(self.categories)
+        else:
+            inherited = self._resolve_rates(specs, spec.get("parent", DEFAULT_JURISDICTION), seen + (jurisdiction_id,))
+        rates = list(inherited)
+        for category, rate in spec.get("rates", {}).items():
+            if category not in self.categories:
+                raise ValueError(f"Tax jurisdiction {jurisdiction_id} has a rate for unknown category {category}")
+            rates[self.categories[category]] = float(rate)
+        return rates
+
+    def locate(self, state: Optional[str], zip_code: Optional[str]) -> Optional[str]:
+        """Id of the jurisdiction for an address, or None when no rule covers it"""
+        state, zip_code = _state_key(state), _zip_key(zip_code)
+        for length in self._prefix_lengths:
+            if length <= len(zip_code):
+                index = self._by_location.get((state, zip_code[:length]))
+                if index is not None:
+                    return self.jurisdiction_ids[index]
+        return None
+
+    def category_index(self, category: Optional[str]) -> int:
+        try:
+            return self.categories[category or self.default_category]
+        except KeyError:
+            raise UnknownTaxCategoryError(f"Unknown tax category: {category}") from None
+
+    def line_taxes(self, amounts: Sequence[float], categories: Sequence[Optional[str]], jurisdictions: Sequence[str]):
+        """Tax on each line (rounded to cents) as a numpy array; all three sequences are per line"""
+        import numpy as np
+
+        amounts = np.asarray(amounts, dtype=float)
+        if len(amounts) == 0:
+            return amounts
+        names, category_inverse = np.unique(
+            np.asarray([category or self.default_category for category in categories], dtype=str), return_inverse=True
+        )
+        ids, jurisdiction_inverse = np.unique(np.asarray(jurisdictions, dtype=str), return_inverse=True)
+        category_rows = np.array([self.category_index(name) for name in names])
+        jurisdiction_rows = np.array([self.jurisdictions[jurisdiction_id] for jurisdiction_id in ids])
+        rates = self.rates[jurisdiction_rows[jurisdiction_inverse], category_rows[category_inverse]]
+        return np.round(amounts * rates, 2)
+
+
+def load_tax_engine(path: Path = TAX_RULES_FILE) -> TaxEngine:
+    with open(path, encoding="utf-8") as f:
+        engine = TaxEngine(json.load(f))
+    logger.info(f"Compiled {len(engine.jurisdictions)} tax jurisdictions from {path}")
+    return engine
+
+
+_tax_engine: Optional[TaxEngine] = None
+
+def get_tax_engine() -> TaxEngine:
+    """The compiled rules (compiled on first use; the server does it at startup)"""
+    global _tax_engine
+    if _tax_engine is None:
+        _tax_engine = load_tax_engine()
+    return _tax_engine
+
+
+def validate_tax_categories(items) -> None:
+    """400 if an item names a tax category the rules do not define"""
+    engine = get_tax_engine()
+    for item in items or []:
+        if item.tax_category is not None and item.tax_category not in engine.categories:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown tax category: {item.tax_category}"
+            )
@@ -0,0 +1,249 @@
+"""
+Speech-to-text for uploaded audio files.
+
+Used directly by ``/ai/voice-file-to-text`` and as the ``transcription``
+job type behind ``/ai/transcriptions``. Uploaded audio for jobs is kept in
+GridFS (or the embedded backend's bucket) until the job finishes so queued work survives a restart. The
+speech recognition stack is imported on first use.
+
+Audio is preprocessed with pydub (downmixed to mono, resampled to 16 kHz,
+silence trimmed) and split on pauses into chunks that are recognized in
+parallel by a bounded thread pool, so a long recording takes roughly
+chunks / TRANSCRIPTION_CHUNK_WORKERS recognition round trips.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from currency import DEFAULT_CURRENCY, format_money
+from database import db, get_bucket
+from jobs import job_queue, RetryableJobError
+from models import AIVoiceResponse
+from nlp import resolve_language, extract_invoice_info_from_text
+
+AUDIO_BUCKET_NAME = "transcription_audio"
+MOCK_CONFIDENCE = 0.85  # Mock confidence score
+
+# Preprocessing and chunking
+TRANSCRIPTION_CHUNK_WORKERS = int(os.environ.get("TRANSCRIPTION_CHUNK_WORKERS", "4"))
+TARGET_SAMPLE_RATE = 16000
+MIN_PAUSE_MS = 500           # a pause at least this long may end a chunk
+SILENCE_BELOW_AVERAGE_DB = 16  # quieter than the clip's average by this much is silence
+KEEP_SILENCE_MS = 200        # padding kept around speech so words are not clipped
+SILENCE_SEEK_STEP_MS = 10    # silence detection resolution (1 ms is needlessly slow)
+TARGET_CHUNK_MS = 15000      # merge short phrases up to this length
+MAX_CHUNK_MS = 50000         # hard cut for speech without pauses (recognizer request limit)
+
+_chunk_executor: Optional[ThreadPoolExecutor] = None
+
+
+class TranscriptionError(Exception):
+    """Recognition failed; `retryable` is True for recognizer/service errors"""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _get_chunk_executor() -> ThreadPoolExecutor:
+    global _chunk_executor
+    if _chunk_executor is None:
+        _chunk_executor = ThreadPoolExecutor(
+            max_workers=TRANSCRIPTION_CHUNK_WORKERS, thread_name_prefix="transcription"
+        )
+    return _chunk_executor
+
+
+def split_on_pauses(audio) -> List[Tuple[int, int]]:
+    """Return (start_ms, end_ms) spans of speech, split on pauses and sized for recognition"""
+    from pydub.silence import detect_nonsilent
+
+    if audio.dBFS == float("-inf"):
+        return []  # digital silence
+    speech = detect_nonsilent(
+        audio,
+        min_silence_len=MIN_PAUSE_MS,
+        silence_thresh=audio.dBFS - SILENCE_BELOW_AVERAGE_DB,
+        seek_step=SILENCE_SEEK_STEP_MS
+    )
+
+    spans: List[List[int]] = []
+    for start, end in speech:
+        start = max(0, start - KEEP_SILENCE_MS)
+        end = min(len(audio), end + KEEP_SILENCE_MS)
+        # Merge short phrases into the previous chunk while it stays under the target length
+        if spans and end - spans[-1][0] <= TARGET_CHUNK_MS:
+            spans[-1][1] = end
+            continue
+        while end - start > MAX_CHUNK_MS:
+            spans.append([start, start + MAX_CHUNK_MS])
+            start += MAX_CHUNK_MS
+        spans.append([start, end])
+    return [(start, end) for start, end in spans]
+
+
+def _recognize_chunk(chunk, language: str) -> Tuple[str, float]:
+    """Recognize one chunk; returns (text, seconds spent). Unintelligible chunks give ''"""
+    import speech_recognition as sr
+
+    started = time.perf_counter()
+    wav = BytesIO()
+    chunk.export(wav, format="wav")
+    wav.seek(0)
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(wav) as source:
+        audio = recognizer.record(source)
+    try:
+        text = recognizer.recognize_google(audio, language=language)
+    except sr.UnknownValueError:
+        text = ""
+    return text, time.perf_counter() - started
+
+
+def transcribe_file(path: str, language: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """Recognize speech in an audio file (blocking; run it in a thread).
+
+    Returns the transcript and per-chunk timings in recording order.
+    """
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    try:
+        audio = AudioSegment.from_file(path)
+    except Exception as e:
+        raise TranscriptionError(f"Could not decode audio: {str(e)}", retryable=False)
+    audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE)
+
+    spans = split_on_pauses(audio)
+    if not spans:
+        raise TranscriptionError("Could not understand audio", retryable=False)
+
+    executor = _get_chunk_executor()
+    futures = [executor.submit(_recognize_chunk, audio[start:end], language) for start, end in spans]
+
+    segments = []
+    try:
+        for index, ((start, end), future) in enumerate(zip(spans, futures)):
+            text, elapsed = future.result()
+            segments.append({
+                "index": index,
+                "start_ms": start,
+                "end_ms": end,
+                "text": text,
+                "recognition_ms": round(elapsed * 1000, 1)
+            })
+    except sr.RequestError as e:
+        for future in futures:
+            future.cancel()
+        raise TranscriptionError(f"Speech recognition service error: {str(e)}", retryable=True)
+
+    transcript = " ".join(segment["text"] for segment in segments if segment["text"])
+    if not transcript:
+        raise TranscriptionError("Could not understand audio", retryable=False)
+    return transcript, segments
+
+
+async def transcribe_audio(audio_data: bytes, language: str, suffix: str = ".wav") -> Tuple[str, List[Dict[str, Any]]]:
+    """Recognize speech in uploaded audio bytes without blocking the event loop.
+
+    `suffix` is the upload's file extension, which tells pydub how to decode it.
+    """
+    import tempfile
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        temp_file.write(audio_data)
+        temp_file_path = temp_file.name
+    try:
+        return await asyncio.to_thread(transcribe_file, temp_file_path, language)
+    finally:
+        # Clean up temporary file
+        os.unlink(temp_file_path)
+
+
+def audio_suffix(filename: Optional[str]) -> str:
+    """File extension of an upload, defaulting to .wav"""
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix if suffix.isascii() and 1 < len(suffix) <= 5 else ".wav"
+
+
+def build_voice_response(transcript: str, language: str, segments: Optional[List[Dict[str, Any]]] = None) -> AIVoiceResponse:
+    """Extract invoice information from a transcript and build the API response"""
+    extracted_info = extract_invoice_info_from_text(transcript, language)
+
+    # Generate suggestions
+    suggestions = []
+    if extracted_info["services"]:
+        suggestions.extend([f"Detected service: {service}" for service in extracted_info["services"]])
+    if extracted_info["amounts"]:
+        currency = extracted_info.get("currency") or DEFAULT_CURRENCY
+        suggestions.extend([f"Detected amount: {format_money(amount, currency)}" for amount in extracted_info["amounts"]])
+
+    if not suggestions:
+        suggestions = ["Audio processed successfully", "Ready for manual review"]
+
+    return AIVoiceResponse(
+        transcript=transcript,
+        confidence=MOCK_CONFIDENCE,
+        language_detected=language,
+        invoice_suggestions=suggestions,
+        structured_data=extracted_info,
+        segments=segments or []
+    )
+
+
+async def store_voice_interaction(response: AIVoiceResponse, user_id: Optional[str]):
+    await db.ai_interactions.insert_one({
+        "id": str(uuid.uuid4()),
+        "type": "voice_file_processing",
+        "transcript": response.transcript,
+        "language": response.language_detected,
+        "confidence": response.confidence,
+        "user_id": user_id,
+        "created_at": datetime.utcnow()
+    })
+
+
+def _audio_bucket():
+    return get_bucket(AUDIO_BUCKET_NAME)
+
+
+async def enqueue_transcription(audio_data: bytes, filename: str, language: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """Store the audio and queue a transcription job for it"""
+    audio_file_id = await _audio_bucket().upload_from_stream(filename or "audio.wav", audio_data)
+    return await job_queue.enqueue("transcription", user_id, {
+        "audio_file_id": audio_file_id,
+        "language": resolve_language(language),
+        "suffix": audio_suffix(filename),
+    })
+
+
+async def run_transcription_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    payload = job["payload"]
+    stream = await _audio_bucket().open_download_stream(payload["audio_file_id"])
+    audio_data = await stream.read()
+
+    await report_progress({"stage": "recognizing"})
+    try:
+        transcript, segments = await transcribe_audio(audio_data, payload["language"], payload.get("suffix", ".wav"))
+    except TranscriptionError as e:
+        if e.retryable:
+            raise RetryableJobError(str(e)) from e
+        raise
+
+    response = build_voice_response(transcript, payload["language"], segments)
+    await store_voice_interaction(response, job["user_id"])
+    return response.model_dump()
+
+
+async def cleanup_transcription_job(job: Dict[str, Any]):
+    """Drop the uploaded audio once the job succeeded or finally failed"""
+    await _audio_bucket().delete(job["payload"]["audio_file_id"])
+
+
+job_queue.register("transcription", run_transcription_job, cleanup_transcription_job)
@@ -0,0 +1,18 @@
+import axios from 'axios';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// The invoice list has no lines (and large invoices keep them outside the invoice); page them in
+export const withAllItems = async (invoice) => {
+  if (invoice.items && !invoice.items_external) return invoice;
+  const items = [];
+  while (items.length < invoice.item_count) {
+    const response = await axios.get(`${API}/invoices/${invoice.id}/items`, {
+      params: { offset: items.length, limit: 1000 }
+    });
+    if (response.data.items.length === 0) break;
+    items.push(...response.data.items);
+  }
+  return { ...invoice, items };
+};
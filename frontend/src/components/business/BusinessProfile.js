@@ -76,20 +76,36 @@ const BusinessProfile = () => {
     }));
   };
 
-  const handleFileUpload = (file, type) => {
-    if (file) {
-      const reader = new FileReader();
-      reader.onload = (e) => {
-        if (type === 'logo') {
-          setLogoFile(file);
-          handleInputChange('logo_url', e.target.result);
-        } else if (type === 'signature') {
-          setSignatureFile(file);
-          handleInputChange('signature_url', e.target.result);
-        }
-      };
-      reader.readAsDataURL(file);
+  const handleFileUpload = async (file, type) => {
+    if (!file) {
+      return;
+    }
+    if (type === 'logo') {
+      setLogoFile(file);
+    } else if (type === 'signature') {
+      setSignatureFile(file);
+    }
+    const field = `${type}_url`;
+
+    const authToken = localStorage.getItem('auth_token');
+    if (authToken) {
+      // Upload to the blob store; the profile then only references the image
+      try {
+        const formData = new FormData();
+        formData.append('file', file);
+        const response = await axios.post(`${API}/blobs`, formData, {
+          headers: { 'Authorization': `Bearer ${authToken}` }
+        });
+        handleInputChange(field, response.data.url);
+        return;
+      } catch (error) {
+        console.log('Image upload failed, sending it with the profile instead:', error.response?.status);
+      }
     }
+
+    const reader = new FileReader();
+    reader.onload = (e) => handleInputChange(field, e.target.result);
+    reader.readAsDataURL(file);
   };
 
   const handleSave = async () => {
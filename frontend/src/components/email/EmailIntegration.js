@@ -214,17 +214,13 @@ Best regards,
       const emailPayload = {
         ...emailData,
         invoice_id: invoice.id,
-        attachPDF: true
+        // The server moves a draft invoice to sent once the email is delivered
+        mark_sent: emailData.template === 'invoice_send'
       };
 
       await axios.post(`${API}/email/send-invoice`, emailPayload);
-      
-      // Update invoice status if it was a first send
-      if (invoice.status === 'draft' && emailData.template === 'invoice_send') {
-        await axios.patch(`${API}/invoices/${invoice.id}/status`, { status: 'sent' });
-      }
 
-      alert('Email sent successfully!');
+      alert('Email queued for delivery!');
       if (onSent) onSent();
       if (onClose) onClose();
     } catch (error) {
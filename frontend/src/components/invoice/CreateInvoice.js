@@ -60,10 +60,11 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
         description: '',
         quantity: 1,
         unit_price: 0,
-        total: 0
+        total: 0,
+        tax_category: null
       }
     ],
-    tax_rate: 0.10,
+    tax_rate: null, // null: tax each line by the rules for the customer's address
     notes: '',
     due_days: 30
   });
@@ -147,7 +148,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
         `Voice processing complete! Invoice data extracted successfully.\n\n` +
         `Customer: ${updatedInvoiceData.customer.name}\n` +
         `Items: ${updatedInvoiceData.items.length} item(s)\n` +
-        `Total: ₹${(updatedInvoiceData.items.reduce((sum, item) => sum + item.total, 0) * (1 + updatedInvoiceData.tax_rate)).toFixed(2)}\n\n` +
+        `Total: ₹${(updatedInvoiceData.items.reduce((sum, item) => sum + item.total, 0) * (1 + (updatedInvoiceData.tax_rate ?? 0))).toFixed(2)}\n\n` +
         `Would you like to create the invoice automatically, or review it manually first?\n\n` +
         `✅ Click OK to create automatically\n` +
         `📝 Click Cancel to review/edit manually`
@@ -204,7 +205,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
   const addItem = () => {
     updateInvoiceData('items', [
       ...invoiceData.items,
-      { description: '', quantity: 1, unit_price: 0, total: 0 }
+      { description: '', quantity: 1, unit_price: 0, total: 0, tax_category: null }
     ]);
   };
 
@@ -217,8 +218,15 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
     return invoiceData.items.reduce((sum, item) => sum + item.total, 0);
   };
 
+  // Tax by the rules is only known once the server has the customer's address
   const calculateTax = () => {
-    return calculateSubtotal() * invoiceData.tax_rate;
+    return calculateSubtotal() * (invoiceData.tax_rate ?? 0);
+  };
+
+  const taxLabel = () => {
+    return invoiceData.tax_rate === null
+      ? 'Tax (by tax rules, on save)'
+      : `Tax (${(invoiceData.tax_rate * 100).toFixed(1)}%)`;
   };
 
   const calculateTotal = () => {
@@ -338,7 +346,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
       const totalsData = [
         [''],
         ['Subtotal', '', '', calculateSubtotal().toFixed(2)],
-        [`Tax (${(invoiceData.tax_rate * 100).toFixed(1)}%)`, '', '', calculateTax().toFixed(2)],
+        [taxLabel(), '', '', calculateTax().toFixed(2)],
         ['Total', '', '', calculateTotal().toFixed(2)]
       ];
       
@@ -593,6 +601,16 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
                     className="mt-1"
                   />
                 </div>
+                <div>
+                  <Label htmlFor="customerZip">ZIP / PIN Code</Label>
+                  <Input
+                    id="customerZip"
+                    value={invoiceData.customer.zip_code}
+                    onChange={(e) => updateCustomerData('zip_code', e.target.value)}
+                    placeholder="10001"
+                    className="mt-1"
+                  />
+                </div>
               </div>
             </Card>
 
@@ -608,7 +626,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
               <div className="space-y-4">
                 {invoiceData.items.map((item, index) => (
                   <div key={index} className="grid grid-cols-12 gap-4 items-end p-4 bg-gray-50 rounded-lg">
-                    <div className="col-span-5">
+                    <div className="col-span-3">
                       <Label>Description</Label>
                       <Input
                         value={item.description}
@@ -639,6 +657,20 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
                         step="0.01"
                       />
                     </div>
+                    <div className="col-span-2">
+                      <Label>Tax Category</Label>
+                      <select
+                        value={item.tax_category || ''}
+                        onChange={(e) => updateItem(index, 'tax_category', e.target.value || null)}
+                        className="mt-1 w-full px-3 py-2 border border-gray-300 rounded-md bg-white text-sm"
+                      >
+                        <option value="">Standard (default)</option>
+                        <option value="reduced">Reduced</option>
+                        <option value="essential">Essential</option>
+                        <option value="luxury">Luxury</option>
+                        <option value="exempt">Exempt</option>
+                      </select>
+                    </div>
                     <div className="col-span-2">
                       <Label>Total</Label>
                       <Input
@@ -673,8 +705,9 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
                   <Input
                     id="taxRate"
                     type="number"
-                    value={invoiceData.tax_rate * 100}
-                    onChange={(e) => updateInvoiceData('tax_rate', (parseFloat(e.target.value) || 0) / 100)}
+                    value={invoiceData.tax_rate === null ? '' : invoiceData.tax_rate * 100}
+                    onChange={(e) => updateInvoiceData('tax_rate', e.target.value === '' ? null : (parseFloat(e.target.value) || 0) / 100)}
+                    placeholder="Leave blank to use the tax rules"
                     className="mt-1"
                     min="0"
                     step="0.1"
@@ -717,7 +750,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
                   <span className="font-medium">₹{calculateSubtotal().toFixed(2)}</span>
                 </div>
                 <div className="flex justify-between">
-                  <span className="text-gray-600">Tax ({(invoiceData.tax_rate * 100).toFixed(1)}%):</span>
+                  <span className="text-gray-600">{taxLabel()}:</span>
                   <span className="font-medium">₹{calculateTax().toFixed(2)}</span>
                 </div>
                 <div className="border-t pt-3">
@@ -905,7 +938,7 @@ const CreateInvoice = ({ user, selectedTemplate }) => {
                         <span>₹{calculateSubtotal().toFixed(2)}</span>
                       </div>
                       <div className="flex justify-between py-2">
-                        <span>Tax ({(invoiceData.tax_rate * 100).toFixed(1)}%):</span>
+                        <span>{taxLabel()}:</span>
                         <span>₹{calculateTax().toFixed(2)}</span>
                       </div>
                       <div className="flex justify-between py-2 text-xl font-bold border-t border-gray-300 mt-2 pt-2">
@@ -6,6 +6,7 @@ import { Badge } from '../ui/badge';
 import axios from 'axios';
 import jsPDF from 'jspdf';
 import html2canvas from 'html2canvas';
+import { withAllItems } from '../../api/invoices';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -46,20 +47,11 @@ const EnhancedInvoicesPage = () => {
   const loadInvoices = async () => {
     setIsLoading(true);
     try {
-      // Fetch invoices and customers in parallel
-      const [invoicesResponse, customersResponse] = await Promise.all([
-        axios.get(`${API}/invoices`),
-        axios.get(`${API}/customers`)
-      ]);
-      
-      const customers = customersResponse.data;
-      const customersMap = customers.reduce((map, customer) => {
-        map[customer.id] = customer;
-        return map;
-      }, {});
+      // Each invoice comes with its customer joined in
+      const invoicesResponse = await axios.get(`${API}/invoices`, { params: { expand: 'customer' } });
       
       const invoicesData = invoicesResponse.data.map(invoice => {
-        const customer = customersMap[invoice.customer_id] || {};
+        const customer = invoice.customer || {};
         return {
           ...invoice,
           customer: customer,
@@ -246,7 +238,12 @@ const EnhancedInvoicesPage = () => {
       setFilteredInvoices([]);
       calculateStats([]);
       
-      alert(`All invoices deleted successfully! ${response.data.deleted_count} invoices were removed.`);
+      if (response.status === 202) {
+        // Large deletes run in the background; progress is at response.data.poll_url
+        alert(`${response.data.message}. They will disappear as the deletion progresses.`);
+      } else {
+        alert(`All invoices deleted successfully! ${response.data.deleted_count} invoices were removed.`);
+      }
     } catch (error) {
       console.error('Error deleting all invoices:', error);
       alert('Error deleting invoices. Please try again.');
@@ -257,7 +254,7 @@ const EnhancedInvoicesPage = () => {
     try {
       // Create a temporary div with invoice content
       const tempDiv = document.createElement('div');
-      tempDiv.innerHTML = generateInvoiceHTML(invoice);
+      tempDiv.innerHTML = generateInvoiceHTML(await withAllItems(invoice));
       tempDiv.style.position = 'absolute';
       tempDiv.style.top = '-9999px';
       tempDiv.style.width = '800px';
@@ -8,6 +8,7 @@ import { Link } from 'react-router-dom';
 import axios from 'axios';
 import jsPDF from 'jspdf';
 import html2canvas from 'html2canvas';
+import { withAllItems } from '../../api/invoices';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -215,7 +216,7 @@ const InvoicesPage = ({ user }) => {
     try {
       // Create a temporary div with invoice content
       const tempDiv = document.createElement('div');
-      tempDiv.innerHTML = generateInvoiceHTML(invoice);
+      tempDiv.innerHTML = generateInvoiceHTML(await withAllItems(invoice));
       tempDiv.style.position = 'absolute';
       tempDiv.style.top = '-9999px';
       tempDiv.style.width = '800px';
@@ -513,7 +514,7 @@ const InvoicesPage = ({ user }) => {
                       </div>
 
                       <div className="mt-3 text-sm text-gray-600">
-                        <p>{invoice.items.length} item{invoice.items.length !== 1 ? 's' : ''}</p>
+                        <p>{invoice.item_count ?? 0} item{invoice.item_count !== 1 ? 's' : ''}</p>
                       </div>
                     </div>
 
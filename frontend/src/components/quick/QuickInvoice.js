@@ -5,6 +5,7 @@ import { Input } from '../ui/input';
 import { Label } from '../ui/label';
 import { Badge } from '../ui/badge';
 import axios from 'axios';
+import { withAllItems } from '../../api/invoices';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -22,7 +23,7 @@ const QuickInvoice = ({ onInvoiceCreated, onClose }) => {
     },
     items: [{ description: '', quantity: 1, unit_price: 0, total: 0 }],
     template: null,
-    tax_rate: 0.10,
+    tax_rate: null, // null: tax each line by the rules for the customer's address
     due_days: 30,
     notes: ''
   });
@@ -133,11 +134,18 @@ const QuickInvoice = ({ onInvoiceCreated, onClose }) => {
     setStep(3);
   };
 
-  const handleRecentInvoiceDuplicate = (invoice) => {
+  const handleRecentInvoiceDuplicate = async (invoice) => {
+    let items = [];
+    try {
+      items = (await withAllItems(invoice)).items;
+    } catch (error) {
+      console.error('Error loading invoice items:', error);
+    }
     setQuickData(prev => ({
       ...prev,
-      items: invoice.items || [{ description: '', quantity: 1, unit_price: 0, total: 0 }],
-      tax_rate: invoice.tax_rate || 0.10,
+      items: items.length > 0 ? items : [{ description: '', quantity: 1, unit_price: 0, total: 0 }],
+      // Invoices taxed by the rules store the effective rate; tax the copy by the rules too
+      tax_rate: invoice.tax_jurisdiction ? null : (invoice.tax_rate ?? null),
       due_days: invoice.due_days || 30
     }));
     setStep(3);
@@ -191,8 +199,9 @@ const QuickInvoice = ({ onInvoiceCreated, onClose }) => {
     return quickData.items.reduce((sum, item) => sum + item.total, 0);
   };
 
+  // Tax by the rules is only known once the server has the customer's address
   const calculateTax = () => {
-    return calculateSubtotal() * quickData.tax_rate;
+    return calculateSubtotal() * (quickData.tax_rate ?? 0);
   };
 
   const calculateTotal = () => {
@@ -471,7 +480,7 @@ const QuickInvoice = ({ onInvoiceCreated, onClose }) => {
                       <span>{formatCurrency(calculateSubtotal())}</span>
                     </div>
                     <div className="flex justify-between">
-                      <span>Tax ({(quickData.tax_rate * 100).toFixed(1)}%):</span>
+                      <span>{quickData.tax_rate === null ? 'Tax (by tax rules, on save)' : `Tax (${(quickData.tax_rate * 100).toFixed(1)}%)`}:</span>
                       <span>{formatCurrency(calculateTax())}</span>
                     </div>
                     <div className="border-t pt-2 flex justify-between font-semibold">
@@ -0,0 +1,91 @@
+"""
+Shared fixtures: the API runs in-process on the embedded SQLite store.
+
+Every test gets a fresh in-memory database; nothing needs a MongoDB server,
+an SMTP server or a running uvicorn.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Before the backend modules are imported (they read these at import time)
+_scratch_dir = tempfile.mkdtemp(prefix="invoiceforge-tests-")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+os.environ.setdefault("BLOB_STORE_DIR", os.path.join(_scratch_dir, "blobs"))
+os.environ.setdefault("REPORT_CACHE_DIR", os.path.join(_scratch_dir, "reports_cache"))
+
+import database  # noqa: E402
+
+ADDRESS = {"address": "123 Test Street", "city": "Test City", "state": "CA", "zip_code": "94105"}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def client():
+    """The app with its lifespan (indexes, workers) on a fresh database"""
+    from fastapi.testclient import TestClient
+    import server
+
+    database.close_client()
+    with TestClient(server.app) as test_client:
+        yield test_client
+    database.close_client()
+
+
+@pytest.fixture
+def register(client):
+    """Register a new user and return (auth headers, user id)"""
+    def register_user(name: str = "Test User"):
+        response = client.post("/api/auth/register", json={
+            "name": name,
+            "email": f"test_{uuid.uuid4().hex[:12]}@example.com",
+            "password": "testpass123",
+        })
+        assert response.status_code == 200, response.text
+        data = response.json()
+        return {"Authorization": f"Bearer {data['access_token']}"}, data["user"]["id"]
+    return register_user
+
+
+@pytest.fixture
+def create_invoice(client):
+    """Create an invoice (and, once per user, a customer and business) and return the response"""
+    parties = {}
+
+    def create(headers, items=None, **fields):
+        key = headers["Authorization"]
+        if key not in parties:
+            auth = {"Authorization": key}
+            customer = client.post("/api/customers", json={"name": "John Doe", **ADDRESS}, headers=auth)
+            business = client.post("/api/business", json={"name": "Test Company LLC", **ADDRESS}, headers=auth)
+            assert customer.status_code == 200 and business.status_code == 200
+            parties[key] = {"customer_id": customer.json()["id"], "business_id": business.json()["id"]}
+        body = {
+            **parties[key],
+            "items": items or [{"description": "Web design", "quantity": 2, "unit_price": 250.0, "total": 500.0}],
+            "due_date": "2030-01-31",
+            **fields,
+        }
+        return client.post("/api/invoices", json=body, headers=headers)
+    return create
+
+
+@pytest.fixture
+async def store():
+    """A fresh database for tests that call backend modules directly"""
+    database.close_client()
+    yield database.db
+    database.close_client()
@@ -0,0 +1,81 @@
+"""
+Dashboard analytics: receivables aging, monthly revenue and top customers (analytics.py).
+"""
+
+from datetime import date, timedelta
+
+from currency import rate_tables
+
+AS_OF = date(2030, 6, 30)
+
+
+def analytics(client, headers, **params):
+    response = client.get("/api/dashboard/analytics", params={"currency": "USD", **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def send(client, headers, invoice, status="sent"):
+    assert client.put(f"/api/invoices/{invoice['id']}/status", params={"status": status}, headers=headers).status_code == 200
+
+
+def test_receivables_are_aged_by_days_past_due(client, register, create_invoice):
+    headers, _ = register()
+    days_past_due = {-1: "current", 0: "0-30", 30: "0-30", 31: "31-60", 60: "31-60", 61: "61-90", 90: "61-90", 91: "90+", 400: "90+"}
+    expected = {"current": [0, 0.0], "0-30": [0, 0.0], "31-60": [0, 0.0], "61-90": [0, 0.0], "90+": [0, 0.0]}
+    for days, bucket in days_past_due.items():
+        due = (AS_OF - timedelta(days=days)).isoformat()
+        invoice = create_invoice(headers, due_date=due, currency="USD").json()
+        send(client, headers, invoice)
+        expected[bucket][0] += 1
+        expected[bucket][1] += invoice["total_amount"]
+
+    # Neither drafts nor paid invoices are receivable
+    create_invoice(headers, due_date="2030-01-01", currency="USD")
+    send(client, headers, create_invoice(headers, due_date="2030-01-01", currency="USD").json(), "paid")
+
+    aging = analytics(client, headers, as_of=AS_OF.isoformat())["aging"]
+    assert [row["bucket"] for row in aging] == ["current", "0-30", "31-60", "61-90", "90+"]
+    assert {row["bucket"]: [row["invoice_count"], row["outstanding_total"]] for row in aging} == {
+        bucket: [count, round(total, 2)] for bucket, (count, total) in expected.items()
+    }
+
+
+def test_aging_converts_each_currency(client, register, create_invoice):
+    headers, _ = register()
+    dollars = create_invoice(headers, due_date="2030-06-01", currency="USD").json()
+    euros = create_invoice(headers, due_date="2030-06-01", currency="EUR").json()
+    for invoice in (dollars, euros):
+        send(client, headers, invoice)
+
+    aging = {row["bucket"]: row for row in analytics(client, headers, as_of=AS_OF.isoformat())["aging"]}
+    converted = rate_tables.get().convert_amounts([euros["total_amount"]], ["EUR"], "USD")[0]
+    assert aging["0-30"]["invoice_count"] == 2
+    assert aging["0-30"]["outstanding_total"] == round(dollars["total_amount"] + converted, 2)
+
+
+def test_monthly_revenue_and_top_customers(client, register, create_invoice):
+    headers, _ = register()
+    invoices = [create_invoice(headers, currency="USD").json() for _ in range(3)]
+    send(client, headers, invoices[0], "paid")
+    client.delete(f"/api/invoices/{invoices[2]['id']}", headers=headers)
+
+    result = analytics(client, headers)
+    month = date.today().strftime("%Y-%m")
+    assert result["monthly_revenue"] == [{
+        "month": month, "invoice_count": 2, "invoiced_total": round(2 * invoices[0]["total_amount"], 2),
+        "paid_count": 1, "paid_total": invoices[0]["total_amount"],
+    }]
+    assert [(row["customer_name"], row["invoice_count"]) for row in result["top_customers"]] == [("John Doe", 2)]
+
+    # Another tenant sees none of it
+    other, _ = register("Other")
+    empty = analytics(client, other)
+    assert empty["monthly_revenue"] == [] and empty["top_customers"] == []
+    assert all(row["invoice_count"] == 0 for row in empty["aging"])
+
+
+def test_start_after_end_is_rejected(client, register):
+    headers, _ = register()
+    response = client.get("/api/dashboard/analytics", params={"start": "2030-02-01", "end": "2030-01-01"}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,84 @@
+"""
+`:batchGet` lookups and `expand` on the invoice list (lookups.py).
+"""
+
+from database import invoice_cache
+from lookups import BATCH_GET_LIMIT
+
+
+def batch(client, headers, path, *ids):
+    response = client.get(f"/api/{path}:batchGet", params=[("ids", value) for value in ids], headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_batch_get_keeps_request_order_and_lists_unknown_ids(client, register, create_invoice):
+    headers, _ = register()
+    first, second, third = (create_invoice(headers).json()["id"] for _ in range(3))
+
+    # Repeated and comma-separated values; duplicates are returned once
+    result = batch(client, headers, "invoices", f"{third},unknown", first, f"{third},{second}")
+    assert [invoice["id"] for invoice in result["invoices"]] == [third, first, second]
+    assert result["not_found"] == ["unknown"]
+    assert "items" in result["invoices"][0]
+
+
+def test_repeat_lookups_are_served_from_the_cache(client, register, create_invoice):
+    headers, _ = register()
+    ids = [create_invoice(headers).json()["id"] for _ in range(2)]
+    batch(client, headers, "invoices", ",".join(ids))
+    hits = invoice_cache.hits
+    assert [invoice["id"] for invoice in batch(client, headers, "invoices", ",".join(ids))["invoices"]] == ids
+    assert invoice_cache.hits == hits + 2
+
+
+def test_another_users_ids_are_not_found_even_when_cached(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers).json()
+    # Cached for its owner
+    batch(client, headers, "invoices", invoice["id"])
+    batch(client, headers, "customers", invoice["customer_id"])
+    batch(client, headers, "business", invoice["business_id"])
+
+    other, _ = register("Other")
+    for path, entity_id in (("invoices", invoice["id"]), ("customers", invoice["customer_id"]), ("business", invoice["business_id"])):
+        result = batch(client, other, path, entity_id)
+        assert result[path if path != "business" else "businesses"] == [] and result["not_found"] == [entity_id]
+
+
+def test_deleted_invoices_are_not_found(client, register, create_invoice):
+    headers, _ = register()
+    invoice_id = create_invoice(headers).json()["id"]
+    batch(client, headers, "invoices", invoice_id)
+    assert client.delete(f"/api/invoices/{invoice_id}", headers=headers).status_code == 200
+    assert batch(client, headers, "invoices", invoice_id)["not_found"] == [invoice_id]
+
+
+def test_batch_size_is_bounded(client, register):
+    headers, _ = register()
+    too_many = ",".join(f"id-{i}" for i in range(BATCH_GET_LIMIT + 1))
+    assert client.get("/api/invoices:batchGet", params={"ids": too_many}, headers=headers).status_code == 400
+    assert client.get("/api/invoices:batchGet", params={"ids": " , "}, headers=headers).status_code == 400
+
+
+def test_expand_joins_the_users_own_customer_and_business(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers).json()
+
+    plain = client.get("/api/invoices", headers=headers).json()[0]
+    assert plain["customer"] is None and plain["business"] is None
+    expanded = client.get("/api/invoices", params={"expand": "customer,business"}, headers=headers).json()[0]
+    assert (expanded["customer"]["id"], expanded["customer"]["name"]) == (invoice["customer_id"], "John Doe")
+    assert expanded["business"]["id"] == invoice["business_id"]
+    only_customer = client.get("/api/invoices", params={"expand": "customer"}, headers=headers).json()[0]
+    assert only_customer["customer"] is not None and only_customer["business"] is None
+
+    # An invoice pointing at someone else's customer and business expands them to null
+    other, _ = register("Other")
+    borrowed = create_invoice(other, customer_id=invoice["customer_id"], business_id=invoice["business_id"])
+    assert borrowed.status_code == 200
+    listed = client.get("/api/invoices", params={"expand": "customer,business"}, headers=other).json()
+    assert [(row["customer"], row["business"]) for row in listed] == [(None, None)]
+
+    response = client.get("/api/invoices", params={"expand": "customer,payments"}, headers=headers)
+    assert response.status_code == 400 and "payments" in response.json()["detail"]
@@ -0,0 +1,91 @@
+"""
+Content-addressed logo and signature storage (blob_store.py, routers/blobs.py).
+"""
+
+import base64
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+from blob_store import BLOB_CACHE_CONTROL, blob_path
+
+
+def png(width=400, height=200, color="red"):
+    out = BytesIO()
+    Image.new("RGB", (width, height), color).save(out, format="PNG")
+    return out.getvalue()
+
+
+def upload(client, headers, data, name="logo.png"):
+    return client.post("/api/blobs", files={"file": (name, data, "image/png")}, headers=headers)
+
+
+def test_upload_is_stored_once_under_its_hash(client, register):
+    headers, _ = register()
+    data = png()
+    first = upload(client, headers, data)
+    assert first.status_code == 200
+    blob_hash = first.json()["hash"]
+    assert blob_hash == hashlib.sha256(data).hexdigest()
+    assert first.json()["url"].endswith(f"/api/blobs/{blob_hash}?size=256")
+    assert blob_path(blob_hash).read_bytes() == data
+
+    other, _ = register("Other")
+    assert upload(client, other, data, "same.png").json()["hash"] == blob_hash
+
+
+def test_uploads_are_checked(client, register):
+    headers, _ = register()
+    assert upload(client, headers, b"").status_code == 400
+    assert upload(client, headers, b"<svg onload='alert(1)'></svg>", "logo.svg").status_code == 415
+    assert client.post("/api/blobs", files={"file": ("logo.png", png(), "image/png")}).status_code in (401, 403)
+
+
+def test_thumbnails_and_original_are_cached_by_etag(client, register):
+    headers, _ = register()
+    blob_hash = upload(client, headers, png(400, 200)).json()["hash"]
+
+    for size, dimensions in ((64, (64, 32)), (256, (256, 128))):
+        response = client.get(f"/api/blobs/{blob_hash}", params={"size": size})
+        assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+        assert response.headers["Cache-Control"] == BLOB_CACHE_CONTROL
+        assert response.headers["ETag"] == f'"{blob_hash}.{size}"'
+        assert Image.open(BytesIO(response.content)).size == dimensions
+
+        cached = client.get(f"/api/blobs/{blob_hash}", params={"size": size}, headers={"If-None-Match": response.headers["ETag"]})
+        assert cached.status_code == 304 and cached.content == b""
+
+    original = client.get(f"/api/blobs/{blob_hash}")
+    assert original.headers["ETag"] == f'"{blob_hash}.orig"' and Image.open(BytesIO(original.content)).size == (400, 200)
+    assert client.get(f"/api/blobs/{blob_hash}", params={"size": 100}).status_code == 400
+    assert client.get(f"/api/blobs/{'0' * 64}").status_code == 404
+    assert client.get("/api/blobs/not-a-hash").status_code == 404
+
+
+def test_missing_thumbnail_falls_back_to_the_original(client, register):
+    headers, _ = register()
+    blob_hash = upload(client, headers, png(color="blue")).json()["hash"]
+    blob_path(blob_hash, 64).unlink()
+    response = client.get(f"/api/blobs/{blob_hash}", params={"size": 64})
+    assert response.status_code == 200 and response.headers["ETag"] == f'"{blob_hash}.orig"'
+
+
+def test_profile_images_are_kept_as_hashes(client, register):
+    headers, user_id = register()
+    data = png(color="green")
+    data_url = "data:image/png;base64," + base64.b64encode(data).decode()
+    saved = client.post("/api/business/profile", json={"company_name": "Acme", "logo_url": data_url}, headers=headers)
+    assert saved.status_code == 200, saved.text
+    blob_hash = hashlib.sha256(data).hexdigest()
+    profile = client.get("/api/business/profile", headers=headers).json()
+    assert profile["logo_hash"] == blob_hash and profile["logo_url"].endswith(f"/api/blobs/{blob_hash}?size=256")
+
+    # Sending the returned URL back keeps the image; an empty value removes it
+    client.post("/api/business/profile", json={"company_name": "Acme", "logo_url": profile["logo_url"]}, headers=headers)
+    assert client.get("/api/business/profile", headers=headers).json()["logo_hash"] == blob_hash
+    client.post("/api/business/profile", json={"company_name": "Acme", "logo_url": ""}, headers=headers)
+    assert client.get("/api/business/profile", headers=headers).json()["logo_hash"] is None
+
+    bad = client.post("/api/business/profile", json={"logo_url": "data:image/png;base64,!!!"}, headers=headers)
+    assert bad.status_code == 400
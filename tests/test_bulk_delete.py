@@ -0,0 +1,58 @@
+"""
+Soft deletes, restores and bulk deletes (bulk_delete.py).
+"""
+
+import bulk_delete
+from change_feed import encode_change_token
+from database import db
+from models import User
+from routers import invoices as invoices_router
+
+
+def invoice_count_in_stats(client, user_id):
+    buckets = client.portal.call(lambda: db.invoice_daily_stats.find({"user_id": user_id}).to_list(None))
+    return sum(bucket["invoice_count"] for bucket in buckets)
+
+
+def test_delete_and_restore(client, register, create_invoice):
+    headers, user_id = register()
+    invoice = create_invoice(headers).json()
+    token = encode_change_token(invoice["updated_seq"])
+
+    assert client.delete(f"/api/invoices/{invoice['id']}", headers=headers).status_code == 200
+    assert client.get(f"/api/invoices/{invoice['id']}", headers=headers).status_code == 404
+    assert client.get("/api/invoices", headers=headers).json() == []
+    assert client.get("/api/invoices/changes", params={"since": token}, headers=headers).json()["deleted"] == [invoice["id"]]
+    assert invoice_count_in_stats(client, user_id) == 0
+    assert client.delete(f"/api/invoices/{invoice['id']}", headers=headers).status_code == 404
+
+    restored = client.post(f"/api/invoices/{invoice['id']}/restore", headers=headers)
+    assert restored.status_code == 200 and restored.json()["version"] == invoice["version"] + 2
+    assert [listed["id"] for listed in client.get("/api/invoices", headers=headers).json()] == [invoice["id"]]
+    assert invoice_count_in_stats(client, user_id) == 1
+    assert client.post(f"/api/invoices/{invoice['id']}/restore", headers=headers).status_code == 404
+
+
+def test_failed_delete_leaves_no_tombstone(client, register):
+    headers, user_id = register()
+    assert client.delete("/api/invoices/no-such-invoice", headers=headers).status_code == 404
+    assert client.portal.call(db.invoice_tombstones.count_documents, {"user_id": user_id}) == 0
+
+
+def test_bulk_delete_does_not_count_an_invoice_deleted_meanwhile(client, register, create_invoice, monkeypatch):
+    headers, user_id = register()
+    invoices = [create_invoice(headers).json() for _ in range(3)]
+    assert invoice_count_in_stats(client, user_id) == 3
+
+    # A single delete lands between the bulk delete's find and its update
+    allocate = bulk_delete.next_change_seq
+    async def delete_one_first(*args):
+        user = User(**await db.users.find_one({"id": user_id}, {"_id": 0}))
+        await invoices_router.delete_invoice(invoices[0]["id"], current_user=user)
+        return await allocate(*args)
+    monkeypatch.setattr(bulk_delete, "next_change_seq", delete_one_first)
+
+    response = client.delete("/api/invoices", headers=headers)
+    assert response.status_code == 200 and response.json()["deleted_count"] == 2
+    assert invoice_count_in_stats(client, user_id) == 0
+    assert client.get("/api/invoices", headers=headers).json() == []
@@ -0,0 +1,179 @@
+"""
+Invoice change feed tokens (GET /api/invoices X-Changes-Token and /api/invoices/changes).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+import pytest
+
+from change_feed import change_seq_scope, encode_change_token, next_change_seq, settled_change_seq
+from database import db
+
+
+def changed_ids(client, headers, token):
+    response = client.get("/api/invoices/changes", params={"since": token}, headers=headers)
+    assert response.status_code == 200
+    return [invoice["id"] for invoice in response.json()["changes"]], response.json()
+
+
+def token_seq(token):
+    return int(token.split(".")[0])
+
+
+class SlowWriter:
+    """A write running in the app's loop that takes its feed position, then waits to be told to commit"""
+
+    def __init__(self, client, user_id, invoice_id):
+        self.client = client
+        self.allocated = Future()
+        self.committed = threading.Event()
+        self.proceed = threading.Event()
+        self.done = client.portal.start_task_soon(self.run, user_id, invoice_id)
+
+    async def run(self, user_id, invoice_id):
+        async with change_seq_scope():
+            seq = await next_change_seq(user_id)
+            self.allocated.set_result(seq)
+            await self.wait(self.proceed)
+            await db.invoices.update_one({"id": invoice_id}, {"$set": {
+                "status": "paid", "updated_at": datetime.utcnow(), "updated_seq": seq,
+            }})
+            self.committed.set()
+            # Still in flight until the scope exits
+            self.proceed.clear()
+            await self.wait(self.proceed)
+
+    @staticmethod
+    async def wait(event):
+        while not event.is_set():
+            await asyncio.sleep(0.01)
+
+    def commit(self):
+        self.proceed.set()
+        self.committed.wait(5)
+
+    def finish(self):
+        self.proceed.set()
+        self.done.result(5)
+
+
+def test_write_committing_below_a_later_one_is_not_skipped(client, register, create_invoice):
+    headers, user_id = register()
+    first = create_invoice(headers).json()["id"]
+    second = create_invoice(headers).json()["id"]
+    start = encode_change_token(0)
+
+    # A slow writer takes its feed position...
+    slow = SlowWriter(client, user_id, second)
+    slow_seq = slow.allocated.result(5)
+
+    # ...then a writer numbered after it commits first
+    assert client.put(f"/api/invoices/{first}/status", params={"status": "sent"}, headers=headers).status_code == 200
+    list_token = client.get("/api/invoices", headers=headers).headers["X-Changes-Token"]
+    ids, page = changed_ids(client, headers, start)
+    assert set(ids) == {first, second}
+    feed_token = page["next_token"]
+    # Neither token passes the position still in flight
+    assert token_seq(list_token) == token_seq(feed_token) == slow_seq - 1
+
+    # The slow writer commits below positions clients have already seen
+    slow.commit()
+    slow.finish()
+    for token in (list_token, feed_token):
+        ids, _ = changed_ids(client, headers, token)
+        assert second in ids
+    assert token_seq(client.get("/api/invoices", headers=headers).headers["X-Changes-Token"]) > slow_seq
+
+
+def test_in_flight_changes_are_sent_until_settled(client, register, create_invoice):
+    headers, user_id = register()
+    invoice_id = create_invoice(headers).json()["id"]
+    list_token = client.get("/api/invoices", headers=headers).headers["X-Changes-Token"]
+
+    slow = SlowWriter(client, user_id, invoice_id)
+    slow.commit()
+    # Committed but not yet released: delivered, and the token stays before it
+    ids, page = changed_ids(client, headers, list_token)
+    assert ids == [invoice_id] and page["has_more"] is False
+    assert token_seq(page["next_token"]) == token_seq(list_token)
+
+    slow.finish()
+    ids, page = changed_ids(client, headers, page["next_token"])
+    assert ids == [invoice_id]
+    assert changed_ids(client, headers, page["next_token"])[0] == []
+
+
+def test_settled_changes_page_and_then_stop(client, register, create_invoice):
+    headers, _ = register()
+    created = [create_invoice(headers).json()["id"] for _ in range(3)]
+
+    token = encode_change_token(0)
+    seen = []
+    for expected_more in (True, False):
+        response = client.get("/api/invoices/changes", params={"since": token, "limit": 2}, headers=headers).json()
+        assert response["has_more"] is expected_more and not response["reset"]
+        seen += [invoice["id"] for invoice in response["changes"]]
+        token = response["next_token"]
+    assert seen == created
+
+    ids, page = changed_ids(client, headers, token)
+    assert ids == [] and token_seq(page["next_token"]) == token_seq(token)
+    list_token = client.get("/api/invoices", headers=headers).headers["X-Changes-Token"]
+    assert changed_ids(client, headers, list_token)[0] == []
+
+
+def test_re_editing_an_old_invoice_does_not_move_the_token_back(client, register, create_invoice):
+    headers, _ = register()
+    older, _ = (create_invoice(headers).json()["id"] for _ in range(2))
+    before = token_seq(client.get("/api/invoices", headers=headers).headers["X-Changes-Token"])
+    assert client.put(f"/api/invoices/{older}/status", params={"status": "sent"}, headers=headers).status_code == 200
+    after = token_seq(client.get("/api/invoices", headers=headers).headers["X-Changes-Token"])
+    assert after == before + 1
+
+
+def test_position_of_a_dead_writer_expires(client, register):
+    _, user_id = register()
+
+    async def die_holding_a_position():
+        async with change_seq_scope() as allocations:
+            seq = await next_change_seq(user_id, 2)
+            # Crashes before its scope can release anything
+            allocations.clear()
+        return seq
+
+    held = client.portal.call(die_holding_a_position)
+    assert client.portal.call(settled_change_seq, user_id) == held - 2
+
+    # CHANGES_PENDING_SECONDS later (by the allocating worker's clock)
+    counter_id = f"invoice_changes:{user_id}"
+    counter = client.portal.call(db.counters.find_one, {"_id": counter_id})
+    expired = [{**entry, "until": datetime.utcnow()} for entry in counter["pending"]]
+    client.portal.call(db.counters.update_one, {"_id": counter_id}, {"$set": {"pending": expired}})
+    assert client.portal.call(settled_change_seq, user_id) == held
+
+
+def test_positions_need_a_scope(client, register):
+    _, user_id = register()
+    with pytest.raises(RuntimeError):
+        client.portal.call(next_change_seq, user_id)
+
+
+def test_concurrent_allocations_get_distinct_positions_and_all_release(client, register):
+    _, user_id = register()
+
+    async def allocate(count):
+        async with change_seq_scope():
+            last = await next_change_seq(user_id, count)
+            await asyncio.sleep(0)
+            return list(range(last - count + 1, last + 1))
+
+    async def many():
+        return await asyncio.gather(*(allocate(1 + i % 3) for i in range(20)))
+
+    positions = sorted(seq for batch in client.portal.call(many) for seq in batch)
+    assert positions == list(range(1, len(positions) + 1))
+    counter = client.portal.call(db.counters.find_one, {"_id": f"invoice_changes:{user_id}"})
+    assert counter["pending"] == [] and client.portal.call(settled_change_seq, user_id) == len(positions)
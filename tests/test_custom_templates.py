@@ -0,0 +1,74 @@
+"""
+Generated custom templates: deduplication by profile content and pruning (custom_templates.py).
+"""
+
+from custom_templates import CUSTOM_TEMPLATE_LIMIT, prune_custom_templates
+from database import db
+
+PROFILE = {"company_name": "Acme Traders", "email": "billing@acme.example", "brand_color": "#10B981", "city": "Pune"}
+
+
+def save_profile(client, headers, **fields):
+    response = client.post("/api/business/profile", json={**PROFILE, **fields}, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def generate(client, headers):
+    response = client.post("/api/business/generate-template", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["template"]
+
+
+def listed(client, headers):
+    return client.get("/api/business/custom-templates", headers=headers).json()["templates"]
+
+
+def test_unchanged_profile_reuses_its_template(client, register):
+    headers, _ = register()
+    assert client.post("/api/business/generate-template", headers=headers).status_code == 404
+    save_profile(client, headers)
+    first = generate(client, headers)
+    assert (first["version"], first["color"], first["business_data"]["company_name"]) == (1, "green", "Acme Traders")
+
+    # Saving the same profile again (updated_at changes) is not new content
+    save_profile(client, headers)
+    again = generate(client, headers)
+    assert (again["id"], again["version"], again["created_at"]) == (first["id"], 1, first["created_at"])
+    assert again["updated_at"] > first["updated_at"]
+    assert [template["id"] for template in listed(client, headers)] == [first["id"]]
+
+    save_profile(client, headers, brand_color="#EF4444")
+    changed = generate(client, headers)
+    assert changed["id"] != first["id"] and (changed["version"], changed["color"]) == (2, "red")
+    assert [template["id"] for template in listed(client, headers)] == [changed["id"], first["id"]]
+
+    # Regenerating an older profile brings its template back to the top without a new version
+    save_profile(client, headers)
+    assert generate(client, headers)["version"] == 1
+    assert [template["id"] for template in listed(client, headers)] == [first["id"], changed["id"]]
+
+
+def test_templates_are_per_user(client, register):
+    headers, _ = register()
+    other, _ = register("Other")
+    for user in (headers, other):
+        save_profile(client, user)
+    mine, theirs = generate(client, headers), generate(client, other)
+    assert mine["id"] != theirs["id"] and theirs["version"] == 1
+    assert client.get(f"/api/business/custom-templates/{mine['id']}", headers=other).status_code == 404
+
+
+def test_only_the_most_recent_templates_are_kept(client, register):
+    headers, user_id = register()
+    generated = []
+    for i in range(CUSTOM_TEMPLATE_LIMIT + 2):
+        save_profile(client, headers, company_name=f"Acme {i}")
+        generated.append(generate(client, headers)["id"])
+
+    kept = listed(client, headers)
+    assert [template["id"] for template in kept] == generated[::-1][:CUSTOM_TEMPLATE_LIMIT]
+    assert kept[0]["version"] == CUSTOM_TEMPLATE_LIMIT + 2
+    assert client.get(f"/api/business/custom-templates/{generated[0]}", headers=headers).status_code == 404
+
+    assert client.portal.call(prune_custom_templates, user_id, 3) == CUSTOM_TEMPLATE_LIMIT - 3
+    assert client.portal.call(db.custom_templates.count_documents, {"user_id": user_id}) == 3
@@ -0,0 +1,79 @@
+"""
+Customer name search (customer_index.py and GET /api/customers/search).
+"""
+
+import pytest
+
+from customer_index import TenantNameIndex, name_tokens, phonetic_key
+
+ADDRESS = {"address": "1 MG Road", "city": "Pune", "state": "Maharashtra", "zip_code": "411001"}
+CUSTOMERS = {
+    "shreyas": "Shreyas Patil",
+    "shrey": "Shrey Dey",
+    "pradeep": "Pradeep Sharma",
+    "traders": "शर्मा ट्रेडर्स",
+    "anita": "Anita Desai",
+}
+
+
+@pytest.fixture
+def index():
+    index = TenantNameIndex()
+    for customer_id, name in CUSTOMERS.items():
+        index.add(customer_id, name)
+    return index
+
+
+def found(index, query):
+    return [candidate["customer_id"] for candidate in index.search(query)]
+
+
+def test_spellings_share_a_phonetic_key():
+    assert name_tokens("Sharmaa") == name_tokens("Sarma") == name_tokens("Sharma") == ["sarma"]
+    assert name_tokens("शर्मा") == ["sarma"]
+    assert phonetic_key("shrey") == "sri" and phonetic_key("shrey", complete=False) == "srey"
+
+
+@pytest.mark.parametrize("query, first", [
+    # Prefixes: a word-final rule ("ey" -> "i") must not rewrite what is still being typed
+    ("Shrey", "shrey"),
+    ("Shreya", "shreyas"),
+    ("Prad", "pradeep"),
+    # Typos
+    ("Pradep Sharmma", "pradeep"),
+    ("Anitha Desay", "anita"),
+    # Devanagari and its romanization
+    ("शर्मा ट्रेडर्स", "traders"),
+    ("Sharma Traders", "traders"),
+])
+def test_search_ranks_the_intended_customer_first(index, query, first):
+    assert found(index, query)[0] == first
+
+
+def test_typed_prefix_still_finds_longer_names(index):
+    assert found(index, "Shrey") == ["shrey", "shreyas"]
+    assert found(index, "Shre") == ["shreyas", "shrey"]
+
+
+def test_removed_customers_are_not_found(index):
+    index.remove("shreyas")
+    assert found(index, "Shreyas") == []
+    assert found(index, "Shrey") == ["shrey"]
+
+
+def test_search_route(client, register):
+    headers, _ = register()
+    for name in ("Shreyas Patil", "राहुल वर्मा"):
+        assert client.post("/api/customers", json={"name": name, **ADDRESS}, headers=headers).status_code == 200
+
+    def names(query):
+        response = client.get("/api/customers/search", params={"q": query}, headers=headers)
+        assert response.status_code == 200
+        return [candidate["name"] for candidate in response.json()]
+
+    assert names("Shrey") == ["Shreyas Patil"]
+    assert names("Rahul Verma") == ["राहुल वर्मा"]
+    assert names("Rahl") == ["राहुल वर्मा"]
+    # Another tenant's customers are not candidates
+    other, _ = register("Other")
+    assert client.get("/api/customers/search", params={"q": "Shreyas"}, headers=other).json() == []
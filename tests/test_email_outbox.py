@@ -0,0 +1,42 @@
+"""
+Invoice email delivery status (email_outbox.py) as seen on the invoice.
+"""
+
+import time
+
+from change_feed import encode_change_token
+from email_outbox import email_outbox
+
+
+def wait_for_email_status(client, headers, invoice_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        invoice = client.get(f"/api/invoices/{invoice_id}", headers=headers)
+        if (invoice.json().get("email_status") or {}).get("status") == status or time.monotonic() > deadline:
+            return invoice
+        time.sleep(0.05)
+
+
+def test_delivery_status_changes_bump_version_and_feed(client, register, create_invoice, monkeypatch):
+    sent = []
+    async def send(message):
+        sent.append(message)
+    monkeypatch.setattr(email_outbox.pool, "send", send)
+
+    headers, _ = register()
+    invoice = create_invoice(headers).json()
+    token = encode_change_token(invoice["updated_seq"])
+
+    response = client.post("/api/email/send-invoice", json={
+        "invoice_id": invoice["id"], "to": "customer@example.com", "subject": "Invoice", "message": "Hi", "mark_sent": False,
+    }, headers=headers)
+    assert response.status_code == 202, response.text
+
+    delivered = wait_for_email_status(client, headers, invoice["id"], "sent")
+    assert len(sent) == 1
+    # Queued, then sent: two writes
+    assert delivered.json()["version"] == 3 and delivered.headers["ETag"] == '"3"'
+    assert delivered.json()["updated_seq"] > invoice["updated_seq"]
+
+    changes = client.get("/api/invoices/changes", params={"since": token}, headers=headers).json()["changes"]
+    assert [change["email_status"]["status"] for change in changes] == ["sent"]
@@ -0,0 +1,264 @@
+"""
+The embedded SQLite store must answer like MongoDB for the queries,
+updates and pipelines the routers send it. Each query test runs with and
+without an index on the queried fields, since indexed fields are filtered
+in SQL and the rest in Python.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import embedded_store
+from embedded_store import EmbeddedDatabase
+
+pytestmark = pytest.mark.anyio
+
+DOCS = [
+    {"id": "a", "user_id": "u1", "status": "paid", "total": 10, "version": 2, "tags": ["x", "y"]},
+    {"id": "b", "user_id": "u1", "status": None, "total": 5, "tags": []},
+    {"id": "c", "user_id": "u1", "total": 7.5, "deleted_at": datetime(2026, 1, 1)},
+    {"id": "d", "user_id": "u2", "status": "draft", "total": 1, "version": 1, "tags": ["y"]},
+]
+
+
+@pytest.fixture
+def edb():
+    database = EmbeddedDatabase(":memory:")
+    yield database
+    database.close()
+
+
+@pytest.fixture(params=[False, True], ids=["scan", "indexed"])
+async def docs(edb, request):
+    if request.param:
+        for field in ("user_id", "status", "version", "deleted_at", "total"):
+            await edb.docs.create_index([("user_id", 1), (field, 1)] if field != "user_id" else field)
+    await edb.docs.insert_many([dict(doc) for doc in DOCS])
+    return edb.docs
+
+
+async def ids(collection, query):
+    return [doc["id"] for doc in await collection.find(query).sort("id", 1).to_list(None)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"status": None}, ["b", "c"]),  # null matches missing
+    ({"status": {"$ne": None}}, ["a", "d"]),
+    ({"status": {"$exists": False}}, ["c"]),
+    ({"status": {"$in": ["paid", None]}}, ["a", "b", "c"]),
+    ({"status": {"$nin": ["paid", None]}}, ["d"]),
+    ({"version": {"$in": [1, None]}}, ["b", "c", "d"]),  # legacy documents without a version
+    ({"user_id": "u1", "deleted_at": None}, ["a", "b"]),
+    ({"deleted_at": {"$ne": None}}, ["c"]),
+    ({"total": {"$gt": 5, "$lte": 10}}, ["a", "c"]),
+    ({"total": 7.5}, ["c"]),
+    ({"status": {"$type": "string"}}, ["a", "d"]),
+    ({"tags": "y"}, ["a", "d"]),  # arrays match any element
+    ({"tags": {"$size": 0}}, ["b"]),
+    ({"$or": [{"status": "draft"}, {"total": {"$gte": 10}}]}, ["a", "d"]),
+    ({"user_id": "u1", "id": {"$in": []}}, []),
+    ({"id": {"$regex": "^[ab]"}}, ["a", "b"]),
+])
+async def test_query_operators(docs, query, expected):
+    assert await ids(docs, query) == expected
+    assert await docs.count_documents(query) == len(expected)
+
+
+async def test_sort_skip_limit_and_projection(docs):
+    # Ascending order puts null and missing first, like MongoDB
+    found = await docs.find({}, {"_id": 0, "id": 1, "status": 1}).sort([("status", 1), ("id", 1)]).skip(1).limit(2).to_list(None)
+    assert found == [{"id": "c"}, {"id": "d", "status": "draft"}]
+    newest = await docs.find({"user_id": "u1"}, {"_id": 0, "total": 1}).sort("total", -1).to_list(1)
+    assert newest == [{"total": 10}]
+    assert "_id" in await docs.find_one({"id": "a"})
+
+
+async def test_find_one_and_update_images(docs):
+    before = await docs.find_one_and_update({"id": "a"}, {"$set": {"status": "sent"}, "$inc": {"version": 1}})
+    assert (before["status"], before["version"]) == ("paid", 2)
+    after = await docs.find_one_and_update(
+        {"id": "a"}, {"$inc": {"version": 1}}, projection={"_id": 0, "version": 1}, return_document=ReturnDocument.AFTER
+    )
+    assert after == {"version": 4}
+    assert await docs.find_one_and_update({"id": "missing"}, {"$set": {"x": 1}}) is None
+    # sort picks which match is updated
+    first = await docs.find_one_and_update({"user_id": "u1"}, {"$set": {"picked": True}}, sort=[("total", 1)])
+    assert first["id"] == "b"
+
+
+async def test_update_operators(edb):
+    await edb.c.insert_one({"id": "a", "n": 1, "list": [1, 2], "nested": {"x": 1}})
+    await edb.c.update_one({"id": "a"}, {
+        "$inc": {"n": 2, "missing": 5},
+        "$set": {"nested.y": 2},
+        "$unset": {"nested.x": ""},
+        "$push": {"list": 3},
+        "$addToSet": {"tags": "t"},
+    })
+    await edb.c.update_one({"id": "a"}, {"$addToSet": {"tags": "t"}, "$pull": {"list": 1}, "$min": {"n": 0}, "$max": {"top": 9}})
+    assert await edb.c.find_one({"id": "a"}, {"_id": 0}) == {
+        "id": "a", "n": 0, "list": [2, 3], "nested": {"y": 2}, "missing": 5, "tags": ["t"], "top": 9,
+    }
+
+    result = await edb.c.update_one({"id": "b"}, {"$set": {"n": 1}, "$setOnInsert": {"created": True}}, upsert=True)
+    assert result.upserted_id is not None
+    await edb.c.update_one({"id": "b"}, {"$set": {"n": 2}, "$setOnInsert": {"created": False}}, upsert=True)
+    assert await edb.c.find_one({"id": "b"}, {"_id": 0}) == {"id": "b", "n": 2, "created": True}
+
+    counter = await edb.counters.find_one_and_update(
+        {"_id": "seq:u1"}, {"$inc": {"seq": 3}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    assert counter == {"_id": "seq:u1", "seq": 3}
+
+
+async def test_update_many_and_delete_counts(docs):
+    result = await docs.update_many({"user_id": "u1", "deleted_at": None}, {"$set": {"status": "sent"}})
+    assert (result.matched_count, result.modified_count) == (2, 2)
+    assert (await docs.delete_many({"status": "sent"})).deleted_count == 2
+    assert (await docs.delete_one({"user_id": "u2"})).deleted_count == 1
+    assert await docs.count_documents({}) == 1
+
+
+async def test_bulk_write(edb):
+    await edb.c.insert_one({"id": "a", "n": 1})
+    result = await edb.c.bulk_write([
+        UpdateOne({"id": "a"}, {"$inc": {"n": 1}}),
+        UpdateOne({"id": "b"}, {"$set": {"n": 1}}, upsert=True),
+        InsertOne({"id": "c"}),
+    ], ordered=False)
+    assert (result.matched_count, result.modified_count, result.upserted_count, result.inserted_count) == (1, 1, 1, 1)
+    assert await edb.c.count_documents({}) == 3
+
+
+async def test_partial_unique_index(edb):
+    await edb.keys.create_index(
+        [("user_id", 1), ("key", 1)], unique=True, partialFilterExpression={"key": {"$type": "string"}}
+    )
+    await edb.keys.insert_one({"user_id": "u", "key": "a"})
+    await edb.keys.insert_one({"user_id": "u2", "key": "a"})
+    # Outside the partial filter: no uniqueness
+    await edb.keys.insert_many([{"user_id": "u", "key": None}, {"user_id": "u", "key": None}])
+    with pytest.raises(DuplicateKeyError):
+        await edb.keys.insert_one({"user_id": "u", "key": "a"})
+    with pytest.raises(DuplicateKeyError):
+        await edb.keys.update_one({"user_id": "u2"}, {"$set": {"user_id": "u"}})
+    with pytest.raises(BulkWriteError) as raised:
+        await edb.keys.insert_many(
+            [{"user_id": "u", "key": "b"}, {"user_id": "u", "key": "a"}, {"user_id": "u", "key": "c"}], ordered=False
+        )
+    assert [(error["index"], error["code"]) for error in raised.value.details["writeErrors"]] == [(1, 11000)]
+    assert await edb.keys.count_documents({}) == 6
+    info = await edb.keys.index_information()
+    assert info["user_id_1_key_1"]["unique"] is True
+
+
+async def test_aggregation_pipeline(docs, edb):
+    totals = await docs.aggregate([
+        {"$match": {"deleted_at": None}},
+        {"$group": {
+            "_id": {"$ifNull": ["$status", "none"]},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$total"},
+            "paid": {"$sum": {"$cond": [{"$eq": ["$status", "paid"]}, "$total", 0]}},
+            "avg": {"$avg": "$total"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    assert totals == [
+        {"_id": "draft", "count": 1, "total": 1, "paid": 0, "avg": 1.0},
+        {"_id": "none", "count": 1, "total": 5, "paid": 0, "avg": 5.0},
+        {"_id": "paid", "count": 1, "total": 10, "paid": 10, "avg": 10.0},
+    ]
+
+    buckets = await docs.aggregate([
+        {"$group": {"_id": {"$switch": {
+            "branches": [{"case": {"$gte": ["$total", 7]}, "then": "large"}],
+            "default": "small",
+        }}, "ids": {"$push": "$id"}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    assert buckets == [{"_id": "large", "ids": ["a", "c"]}, {"_id": "small", "ids": ["b", "d"]}]
+
+    tags = await docs.aggregate([
+        {"$unwind": "$tags"}, {"$group": {"_id": "$tags", "n": {"$sum": 1}}}, {"$sort": {"_id": 1}},
+    ]).to_list(None)
+    assert tags == [{"_id": "x", "n": 1}, {"_id": "y", "n": 2}]
+
+    await edb.users.insert_many([{"id": "u1", "name": "One"}, {"id": "u2", "name": "Two"}])
+    joined = await docs.aggregate([
+        {"$match": {"status": {"$ne": None}}},
+        {"$sort": {"id": 1}},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$project": {"_id": 0, "id": 1, "double": {"$multiply": ["$total", 2]}, "user": "$user.name"}},
+    ]).to_list(None)
+    assert joined == [{"id": "a", "double": 20, "user": ["One"]}, {"id": "d", "double": 2, "user": ["Two"]}]
+
+    assert await docs.aggregate([{"$match": {"user_id": "u1"}}, {"$count": "n"}]).to_list(None) == [{"n": 3}]
+
+
+async def test_values_round_trip(edb):
+    at = datetime(2026, 3, 4, 5, 6, 7, 891234)
+    file_id = ObjectId()
+    await edb.c.insert_one({"at": at, "ref": file_id, "raw": b"\x00\x01", "nested": [{"n": 1.5}]})
+    doc = await edb.c.find_one({"ref": file_id})
+    # BSON keeps dates to the millisecond
+    assert doc["at"] == at.replace(microsecond=891000)
+    assert doc["raw"] == b"\x00\x01" and doc["nested"] == [{"n": 1.5}]
+    assert isinstance(doc["_id"], ObjectId)
+    assert await edb.c.count_documents({"at": {"$gt": at - timedelta(seconds=1)}}) == 1
+
+
+async def test_ttl_index_expires_documents(edb, monkeypatch):
+    monkeypatch.setattr(embedded_store, "TTL_SWEEP_SECONDS", 0)
+    await edb.t.create_index("deleted_at", expireAfterSeconds=60)
+    now = datetime.utcnow()
+    await edb.t.insert_many([
+        {"id": "old", "deleted_at": now - timedelta(seconds=120)},
+        {"id": "new", "deleted_at": now},
+        {"id": "live", "deleted_at": None},
+        {"id": "text", "deleted_at": "2000-01-01"},  # only dates expire
+    ])
+    assert await ids(edb.t, {}) == ["live", "new", "text"]
+
+
+async def test_cursor_iteration_survives_writes(docs):
+    seen = []
+    async for doc in docs.find({"user_id": "u1"}).sort("id", 1).batch_size(1):
+        seen.append(doc["id"])
+        await docs.update_one({"id": doc["id"]}, {"$set": {"touched": True}})
+        await docs.insert_one({"id": f"new-{doc['id']}", "user_id": "u1"})
+    assert seen == ["a", "b", "c"]
+    assert await docs.count_documents({"touched": True}) == 3
+
+
+async def test_bucket(edb):
+    bucket = edb.bucket("audio")
+    file_id = await bucket.upload_from_stream("clip.wav", b"RIFF\x00\x01", metadata={"user_id": "u1"})
+    stream = await bucket.open_download_stream(file_id)
+    assert await stream.read() == b"RIFF\x00\x01"
+    await bucket.delete(file_id)
+    with pytest.raises(NoFile):
+        await bucket.open_download_stream(file_id)
+    with pytest.raises(NoFile):
+        await bucket.delete(file_id)
+
+
+async def test_file_database_keeps_documents_and_indexes(tmp_path):
+    path = str(tmp_path / "store.db")
+    database = EmbeddedDatabase(path)
+    await database.c.create_index("key", unique=True)
+    await database.c.insert_one({"key": "a"})
+    database.close()
+
+    database = EmbeddedDatabase(path)
+    try:
+        assert await database.c.count_documents({"key": "a"}) == 1
+        with pytest.raises(DuplicateKeyError):
+            await database.c.insert_one({"key": "a"})
+    finally:
+        database.close()
@@ -0,0 +1,112 @@
+"""
+Read-through entity cache (cache.py) and its metrics route.
+"""
+
+import time
+
+import pytest
+from pydantic import BaseModel
+
+import security
+from cache import EntityCache, MemoryCacheBackend
+
+
+class Thing(BaseModel):
+    id: str
+    name: str
+
+
+def loader(documents, calls):
+    async def load(*args):
+        calls.append(args)
+        if args and isinstance(args[0], list):
+            return [documents[entity_id] for entity_id in args[0] if entity_id in documents]
+        return documents.get("a")
+    return load
+
+
+@pytest.mark.anyio
+async def test_miss_loads_then_hits():
+    cache = EntityCache("thing", Thing, MemoryCacheBackend(10), ttl=60)
+    calls = []
+    load = loader({"a": {"id": "a", "name": "first"}}, calls)
+
+    assert (await cache.get("u1", "a", load)).name == "first"
+    assert (await cache.get("u1", "a", load)).name == "first"
+    assert len(calls) == 1
+    # Keys are per owner
+    await cache.get("u2", "a", load)
+    assert len(calls) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "errors": 0, "hit_ratio": 0.3333, "size": 2, "ttl": 60}
+
+
+@pytest.mark.anyio
+async def test_missing_entities_are_not_cached():
+    cache = EntityCache("thing", Thing, MemoryCacheBackend(10), ttl=60)
+    calls = []
+    load = loader({}, calls)
+    assert await cache.get("u1", "a", load) is None
+    assert await cache.get("u1", "a", load) is None
+    assert len(calls) == 2 and cache.stats()["size"] == 0
+
+
+@pytest.mark.anyio
+async def test_get_many_loads_only_the_misses_in_one_call():
+    cache = EntityCache("thing", Thing, MemoryCacheBackend(10), ttl=60)
+    calls = []
+    load = loader({entity_id: {"id": entity_id, "name": entity_id.upper()} for entity_id in "abc"}, calls)
+
+    await cache.put("u1", Thing(id="a", name="cached"))
+    found = await cache.get_many("u1", ["a", "b", "c", "d"], load)
+    assert {entity_id: thing.name for entity_id, thing in found.items()} == {"a": "cached", "b": "B", "c": "C"}
+    assert calls == [(["b", "c", "d"],)]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    found = await cache.get_many("u1", ["b", "c"], load)
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (3, 3)
+
+
+@pytest.mark.anyio
+async def test_invalidate_and_write_through():
+    cache = EntityCache("thing", Thing, MemoryCacheBackend(10), ttl=60)
+    calls = []
+    documents = {"a": {"id": "a", "name": "first"}}
+    load = loader(documents, calls)
+    await cache.get("u1", "a", load)
+
+    documents["a"] = {"id": "a", "name": "renamed"}
+    await cache.invalidate("u1", "a")
+    assert (await cache.get("u1", "a", load)).name == "renamed" and len(calls) == 2
+
+    await cache.put("u1", Thing(id="a", name="written"))
+    assert (await cache.get("u1", "a", load)).name == "written" and len(calls) == 2
+
+    await cache.put("u1", Thing(id="b", name="other"))
+    await cache.put("u2", Thing(id="a", name="someone else's"))
+    await cache.invalidate_user("u1")
+    assert cache.backend.size() == 1
+    assert (await cache.get("u2", "a", load)).name == "someone else's"
+
+
+@pytest.mark.anyio
+async def test_memory_backend_evicts_least_recently_used_and_expired(monkeypatch):
+    backend = MemoryCacheBackend(2)
+    await backend.set("a", {"v": 1}, ttl=60)
+    await backend.set("b", {"v": 2}, ttl=60)
+    await backend.get("a")
+    await backend.set("c", {"v": 3}, ttl=60)
+    assert await backend.get("b") is None and await backend.get("a") == {"v": 1}
+
+    now = time.monotonic()
+    monkeypatch.setattr("cache.time.monotonic", lambda: now + 61)
+    assert await backend.get("a") is None and backend.size() == 1
+
+
+def test_cache_stats_are_for_admins_only(client, register, monkeypatch):
+    headers, _ = register()
+    assert client.get("/api/cache/stats", headers=headers).status_code == 403
+
+    me = client.get("/api/auth/me", headers=headers).json()["email"]
+    monkeypatch.setattr(security, "ADMIN_EMAILS", {me})
+    stats = client.get("/api/cache/stats", headers=headers).json()
+    assert set(stats) == {"business", "customer", "invoice"} and "hit_ratio" in stats["invoice"]
@@ -0,0 +1,184 @@
+"""
+Idempotency-Key claims, replays, waits and takeovers (idempotency.py).
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+import idempotency
+from idempotency import ensure_indexes, run_idempotent
+
+pytestmark = pytest.mark.anyio
+
+SCOPE = "POST /invoices"
+
+
+@pytest.fixture
+async def keys(store):
+    await ensure_indexes()
+    return store.idempotency_keys
+
+
+def counting_handler(calls, result, gate=None):
+    async def handler():
+        calls.append(result)
+        if gate is not None:
+            await gate.wait()
+        else:
+            await asyncio.sleep(0.05)
+        return result
+    return handler
+
+
+async def test_concurrent_duplicates_run_the_handler_once(keys):
+    calls = []
+    responses = [Response(), Response(), Response()]
+    results = await asyncio.gather(*(
+        run_idempotent("key-1", "u1", SCOPE, {"amount": 1}, response, counting_handler(calls, {"id": "inv-1"}))
+        for response in responses
+    ))
+    assert calls == [{"id": "inv-1"}]
+    assert results == [{"id": "inv-1"}] * 3
+    assert sorted(response.headers.get("Idempotent-Replayed", "") for response in responses) == ["", "true", "true"]
+
+    # A later retry is replayed from the stored response
+    response = Response()
+    again = await run_idempotent("key-1", "u1", SCOPE, {"amount": 1}, response, counting_handler(calls, {"id": "other"}))
+    assert again == {"id": "inv-1"} and response.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+    # Keys are per user
+    assert await run_idempotent("key-1", "u2", SCOPE, {"amount": 1}, Response(), counting_handler(calls, {"id": "u2"})) == {"id": "u2"}
+
+
+async def test_changed_body_with_the_same_key_is_rejected(keys):
+    await run_idempotent("key-1", "u1", SCOPE, {"amount": 1}, Response(), counting_handler([], {"id": "inv-1"}))
+    with pytest.raises(HTTPException) as raised:
+        await run_idempotent("key-1", "u1", SCOPE, {"amount": 2}, Response(), counting_handler([], {"id": "inv-2"}))
+    assert raised.value.status_code == 422
+    with pytest.raises(HTTPException) as raised:
+        await run_idempotent("key-1", "u1", "POST /customers", {"amount": 1}, Response(), counting_handler([], {}))
+    assert raised.value.status_code == 422
+
+
+async def test_waiter_gives_up_with_409_while_the_original_runs(keys, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.3)
+    gate = asyncio.Event()
+    calls = []
+    original = asyncio.create_task(
+        run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "inv-1"}, gate))
+    )
+    await asyncio.sleep(0.05)
+    with pytest.raises(HTTPException) as raised:
+        await run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "dup"}))
+    assert raised.value.status_code == 409
+
+    gate.set()
+    assert await original == {"id": "inv-1"}
+    assert calls == [{"id": "inv-1"}]
+
+
+async def test_waiter_is_released_when_the_original_finishes(keys):
+    gate = asyncio.Event()
+    calls = []
+    original = asyncio.create_task(
+        run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "inv-1"}, gate))
+    )
+    await asyncio.sleep(0.05)
+    waiter = asyncio.create_task(run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "dup"})))
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+    gate.set()
+    assert await waiter == await original == {"id": "inv-1"}
+    assert len(calls) == 1
+
+
+async def test_key_of_a_dead_request_is_taken_over_after_its_lock(keys):
+    now = datetime.utcnow()
+    await keys.insert_one({
+        "user_id": "u1", "key": "key-1", "fingerprint": "from-a-dead-worker", "status": "in_progress",
+        "response": None, "created_at": now - timedelta(seconds=120), "locked_until": now - timedelta(seconds=1),
+    })
+    calls = []
+    assert await run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "inv-1"})) == {"id": "inv-1"}
+    assert calls == [{"id": "inv-1"}]
+    record = await keys.find_one({"user_id": "u1", "key": "key-1"})
+    assert record["status"] == "completed" and record["locked_until"] is None
+
+
+async def test_failed_handler_releases_the_key(keys):
+    async def failing():
+        raise HTTPException(status_code=400, detail="bad")
+    with pytest.raises(HTTPException):
+        await run_idempotent("key-1", "u1", SCOPE, {}, Response(), failing)
+    assert await keys.count_documents({}) == 0
+    calls = []
+    assert await run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "inv-1"})) == {"id": "inv-1"}
+
+
+def test_duplicate_invoice_posts_create_one_invoice(client, register, create_invoice):
+    headers, _ = register()
+    keyed = {**headers, "Idempotency-Key": "create-once"}
+    first = create_invoice(keyed)
+    second = create_invoice(keyed)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert first.json()["id"] == second.json()["id"]
+    assert len(client.get("/api/invoices", headers=headers).json()) == 1
+
+    changed = create_invoice(keyed, currency="EUR")
+    assert changed.status_code == 422
+
+
+async def expire_lock(keys, key):
+    await keys.update_one({"user_id": "u1", "key": key}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def test_original_that_lost_its_key_cannot_release_the_new_claim(keys):
+    gate, new_gate = asyncio.Event(), asyncio.Event()
+    async def failing():
+        await gate.wait()
+        raise HTTPException(status_code=500, detail="late failure")
+    original = asyncio.create_task(run_idempotent("key-1", "u1", SCOPE, {}, Response(), failing))
+    await asyncio.sleep(0.05)
+    await expire_lock(keys, "key-1")
+    calls = []
+    takeover = asyncio.create_task(
+        run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "inv-2"}, new_gate))
+    )
+    await asyncio.sleep(0.05)
+    assert calls == [{"id": "inv-2"}]
+
+    gate.set()
+    with pytest.raises(HTTPException):
+        await original
+    record = await keys.find_one({"user_id": "u1", "key": "key-1"})
+    assert record is not None and record["status"] == "in_progress"
+
+    new_gate.set()
+    assert await takeover == {"id": "inv-2"}
+    # A retry replays the new owner's response instead of running again
+    assert await run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler(calls, {"id": "dup"})) == {"id": "inv-2"}
+    assert len(calls) == 1
+
+
+async def test_original_that_lost_its_key_cannot_overwrite_the_new_response(keys):
+    gate, new_gate = asyncio.Event(), asyncio.Event()
+    original = asyncio.create_task(
+        run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler([], {"id": "inv-1"}, gate))
+    )
+    await asyncio.sleep(0.05)
+    await expire_lock(keys, "key-1")
+    takeover = asyncio.create_task(
+        run_idempotent("key-1", "u1", SCOPE, {}, Response(), counting_handler([], {"id": "inv-2"}, new_gate))
+    )
+    await asyncio.sleep(0.05)
+    new_gate.set()
+    assert await takeover == {"id": "inv-2"}
+
+    gate.set()
+    assert await original == {"id": "inv-1"}
+    record = await keys.find_one({"user_id": "u1", "key": "key-1"})
+    assert record["response"] == {"id": "inv-2"}
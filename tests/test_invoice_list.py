@@ -0,0 +1,50 @@
+"""
+Invoice list headers and lines stored outside the invoice (line_items.py).
+"""
+
+import uuid
+
+from database import db
+from line_items import INVOICE_EMBEDDED_ITEMS_LIMIT
+from migrations import backfill_item_counts
+
+
+def lines(count, prefix="Line"):
+    return [{"description": f"{prefix} {i}", "quantity": 1, "unit_price": 1.0, "total": 1.0} for i in range(count)]
+
+
+def test_list_has_headers_without_lines(client, register, create_invoice):
+    headers, _ = register()
+    small = create_invoice(headers, items=lines(2)).json()
+    large = create_invoice(headers, items=lines(INVOICE_EMBEDDED_ITEMS_LIMIT + 1)).json()
+
+    for params in ({}, {"expand": "customer"}):
+        listed = {invoice["id"]: invoice for invoice in client.get("/api/invoices", params=params, headers=headers).json()}
+        assert listed[small["id"]]["items"] is None and listed[small["id"]]["item_count"] == 2
+        assert listed[large["id"]]["items"] is None and listed[large["id"]]["item_count"] == INVOICE_EMBEDDED_ITEMS_LIMIT + 1
+        assert listed[small["id"]]["total_amount"] == small["total_amount"]
+
+    page = client.get(f"/api/invoices/{small['id']}/items", headers=headers).json()
+    assert [item["description"] for item in page["items"]] == ["Line 0", "Line 1"]
+
+
+def test_invoices_from_before_item_count_get_one(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers, items=lines(3)).json()
+    legacy = {key: value for key, value in invoice.items() if key != "item_count"}
+    legacy["id"] = str(uuid.uuid4())
+    client.portal.call(db.invoices.insert_one, legacy)
+
+    assert client.portal.call(backfill_item_counts, db) == 1
+    listed = {invoice["id"]: invoice for invoice in client.get("/api/invoices", headers=headers).json()}
+    assert listed[legacy["id"]]["item_count"] == 3
+    assert client.portal.call(backfill_item_counts, db) == 0
+
+
+def test_ai_suggestions_include_lines_stored_outside_the_invoice(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers, items=lines(INVOICE_EMBEDDED_ITEMS_LIMIT + 1, "Hosting")).json()
+    assert invoice["items_external"]
+
+    suggestions = client.get(f"/api/ai/suggestions/{invoice['customer_id']}", headers=headers).json()["suggestions"]
+    assert suggestions and all(suggestion.startswith("Hosting ") for suggestion in suggestions)
@@ -0,0 +1,74 @@
+"""
+Invoice ETags and If-Match (optimistic concurrency on invoice writes).
+"""
+
+import uuid
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import database
+import server
+from migrations import run_once
+
+
+def etag_of(client, headers, invoice_id):
+    response = client.get(f"/api/invoices/{invoice_id}", headers=headers)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_stale_if_match_gets_412(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers).json()
+    etag = etag_of(client, headers, invoice["id"])
+    assert etag == '"1"'
+
+    updated = client.put(f"/api/invoices/{invoice['id']}/status", params={"status": "sent"}, headers={**headers, "If-Match": etag})
+    assert updated.status_code == 200 and updated.headers["ETag"] == '"2"'
+
+    stale = client.put(f"/api/invoices/{invoice['id']}/status", params={"status": "paid"}, headers={**headers, "If-Match": etag})
+    assert stale.status_code == 412
+    body = {key: invoice[key] for key in ("customer_id", "business_id", "items", "due_date")}
+    stale = client.put(f"/api/invoices/{invoice['id']}", json=body, headers={**headers, "If-Match": etag})
+    assert stale.status_code == 412
+    assert client.get(f"/api/invoices/{invoice['id']}", headers=headers).json()["status"] == "sent"
+
+    missing = client.put(f"/api/invoices/{uuid.uuid4()}/status", params={"status": "paid"}, headers={**headers, "If-Match": etag})
+    assert missing.status_code == 404
+
+
+def test_unconditional_write_moves_a_legacy_invoice_past_version_1(register, create_invoice, client, tmp_path, monkeypatch):
+    headers, user_id = register()
+    invoice = create_invoice(headers).json()
+    legacy_id = str(uuid.uuid4())
+
+    # An invoice stored before versioning (no version field), then a restart
+    user = client.portal.call(database.db.users.find_one, {"id": user_id}, {"_id": 0})
+    monkeypatch.setattr(database, "SQLITE_PATH", str(tmp_path / "store.db"))
+    database.close_client()
+    legacy = {key: value for key, value in invoice.items() if key != "version"}
+    legacy.update(id=legacy_id, created_at=datetime.utcnow())
+    client.portal.call(database.db.users.insert_one, user)
+    client.portal.call(database.db.invoices.insert_one, legacy)
+    database.close_client()
+
+    with TestClient(server.app) as restarted:
+        assert etag_of(restarted, headers, legacy_id) == '"1"'
+        updated = restarted.put(f"/api/invoices/{legacy_id}/status", params={"status": "sent"}, headers=headers)
+        assert updated.headers["ETag"] == '"2"'
+        stale = restarted.put(f"/api/invoices/{legacy_id}/status", params={"status": "paid"}, headers={**headers, "If-Match": '"1"'})
+        assert stale.status_code == 412
+
+
+def test_startup_backfill_runs_until_one_start_completes_it(client):
+    runs = []
+    async def migration(db):
+        runs.append(db)
+        return 2
+
+    assert client.portal.call(run_once, database.db, "test_migration", migration) == 2
+    assert client.portal.call(run_once, database.db, "test_migration", migration) is None
+    assert len(runs) == 1
+    # The server's own backfill already ran when the app started
+    assert client.portal.call(database.db.counters.find_one, {"_id": "migration:invoice_versions"}) is not None
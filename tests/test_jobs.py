@@ -0,0 +1,132 @@
+"""
+Persistent background jobs: claims, leases, retries and results (jobs.py).
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import JOB_LEASE_SECONDS, JobQueue, RetryableJobError, job_status
+
+pytestmark = pytest.mark.anyio
+
+
+def queue_with(handler, cleanups=None):
+    queue = JobQueue(workers=1)
+
+    async def cleanup(job):
+        cleanups.append(job["id"])
+
+    queue.register("test", handler, cleanup if cleanups is not None else None)
+    return queue
+
+
+async def make_available(store, job_id):
+    await store.jobs.update_one({"id": job_id}, {"$set": {"available_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def succeed(job, progress):
+    await progress({"done": 1, "total": 1})
+    return {"echo": job["payload"]["text"]}
+
+
+async def test_claim_takes_a_lease_and_an_expired_lease_is_claimed_again(store):
+    queue = queue_with(succeed)
+    job = await queue.enqueue("test", "u1", {"text": "hi"})
+
+    claimed = await queue._claim()
+    assert (claimed["id"], claimed["status"], claimed["attempts"]) == (job["id"], "running", 1)
+    lease = (claimed["lease_expires_at"] - datetime.utcnow()).total_seconds()
+    assert JOB_LEASE_SECONDS - 5 < lease <= JOB_LEASE_SECONDS
+    # Held by a live worker
+    assert await queue._claim() is None
+
+    # Its worker died: the lease runs out and another worker takes over
+    await store.jobs.update_one({"id": job["id"]}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    again = await queue._claim()
+    assert (again["id"], again["attempts"]) == (job["id"], 2)
+
+
+async def test_only_registered_types_are_claimed(store):
+    queue = queue_with(succeed)
+    await queue.enqueue("other", "u1", {})
+    assert await queue._claim() is None
+
+
+async def test_success_stores_the_result_for_its_owner(store):
+    cleanups = []
+    queue = queue_with(succeed, cleanups)
+    job = await queue.enqueue("test", "u1", {"text": "hi"})
+    await queue._run(await queue._claim())
+
+    done = await queue.get(job["id"], "u1")
+    assert (done["status"], done["result"], done["progress"]) == ("succeeded", {"echo": "hi"}, {"done": 1, "total": 1})
+    assert done["expires_at"] > datetime.utcnow() and "payload" not in done
+    assert cleanups == [job["id"]]
+    assert await queue.get(job["id"], "u2") is None
+    assert job_status(done)["status"] == "succeeded"
+    assert (await queue.wait_for(job["id"], "u1", timeout=5))["status"] == "succeeded"
+
+
+async def test_transient_failures_back_off_then_fail(store):
+    cleanups, attempts = [], []
+
+    async def flaky(job, progress):
+        attempts.append(job["attempts"])
+        raise RetryableJobError("recognizer timed out")
+
+    queue = queue_with(flaky, cleanups)
+    job = await queue.enqueue("test", "u1", {}, max_attempts=2)
+
+    await queue._run(await queue._claim())
+    retried = await store.jobs.find_one({"id": job["id"]})
+    assert (retried["status"], retried["error"], retried["lease_expires_at"]) == ("queued", "recognizer timed out", None)
+    # Backs off 2^attempts seconds
+    assert 1 < (retried["available_at"] - datetime.utcnow()).total_seconds() <= 2
+    assert await queue._claim() is None and cleanups == []
+
+    await make_available(store, job["id"])
+    await queue._run(await queue._claim())
+    failed = await queue.get(job["id"], "u1")
+    assert (failed["status"], failed["error"]) == ("failed", "recognizer timed out")
+    assert attempts == [1, 2] and cleanups == [job["id"]]
+
+
+async def test_other_errors_fail_without_retrying(store):
+    async def broken(job, progress):
+        raise ValueError("bad audio")
+
+    queue = queue_with(broken)
+    job = await queue.enqueue("test", "u1", {})
+    await queue._run(await queue._claim())
+    failed = await queue.get(job["id"], "u1")
+    assert (failed["status"], failed["error"], failed["attempts"]) == ("failed", "bad audio", 1)
+
+
+async def test_job_that_keeps_losing_its_lease_is_failed(store):
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job["id"])
+        return {}
+
+    queue = queue_with(handler)
+    job = await queue.enqueue("test", "u1", {}, max_attempts=1)
+    await store.jobs.update_one({"id": job["id"]}, {"$set": {
+        "status": "running", "attempts": 1, "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+    }})
+    await queue._run(await queue._claim())
+    failed = await queue.get(job["id"], "u1")
+    assert failed["status"] == "failed" and "interrupted" in failed["error"] and calls == []
+
+
+async def test_workers_run_queued_jobs(store):
+    queue = queue_with(succeed)
+    await queue.start()
+    try:
+        job = await queue.enqueue("test", "u1", {"text": "queued"})
+        done = await asyncio.wait_for(queue.wait_for(job["id"], "u1", timeout=5), 10)
+        assert (done["status"], done["result"]) == ("succeeded", {"echo": "queued"})
+    finally:
+        await queue.stop()
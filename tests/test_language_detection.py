@@ -0,0 +1,43 @@
+"""
+Script-based language detection (nlp.scripts) and the enhanced voice processing message.
+"""
+
+import pytest
+
+from nlp import detect_language, resolve_language, script_histogram
+
+
+def test_histogram_ignores_digits_and_punctuation():
+    assert script_histogram("वेब १२३ design, 500!") == {"Devanagari": 3, "Latin": 6}
+
+
+@pytest.mark.parametrize("text, language", [
+    ("web design 500 dollars", "en-US"),
+    ("वेब डिज़ाइन के लिए 5000", "hi-IN"),
+    ("வலை வடிவமைப்பு 5000", "ta-IN"),
+    ("ওয়েব ডিজাইন 5000", "bn-IN"),
+    ("વેબ ડિઝાઇન 5000", "gu-IN"),
+    # English terms inside Indic speech do not outvote it
+    ("Ravi website development வலை", "ta-IN"),
+    ("", "en-US"),
+])
+def test_detect_language(text, language):
+    assert detect_language(text) == language
+
+
+def test_resolve_language():
+    assert [resolve_language(code) for code in ("hi", "ta-IN", "TE", "fr-FR", "")] == ["hi-IN", "ta-IN", "te-IN", "en-US", "en-US"]
+
+
+@pytest.mark.parametrize("text, name", [
+    ("web design 500 dollars", "English"),
+    ("வலை வடிவமைப்பு 5000", "Tamil"),
+    ("ওয়েব ডিজাইন 5000", "Bengali"),
+    ("વેબ ડિઝાઇન 5000", "Gujarati"),
+])
+def test_enhanced_voice_processing_names_the_detected_language(client, text, name):
+    response = client.post("/api/ai/enhanced-voice-processing", json={
+        "voice_input": text, "customer_name": "Ravi", "business_id": "b",
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["suggestions"][0] == f"✅ Language detected: {name}"
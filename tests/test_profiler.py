@@ -0,0 +1,109 @@
+"""
+Sampling profiler output formats and the admin profiling routes (profiler.py, routers/admin.py).
+"""
+
+import threading
+import time
+
+import pytest
+
+import security
+from profiler import Sampler, to_collapsed, to_speedscope
+
+PROFILE = {
+    "name": "worker 1",
+    "hz": 100,
+    "duration_seconds": 2.0,
+    "ticks": 100,
+    "samples": 5,
+    "stacks": [["MainThread;main (app.py:1);handle (app.py:10)", 3], ["MainThread;main (app.py:1);render (app.py:20)", 2]],
+}
+
+
+def test_collapsed_stacks():
+    assert to_collapsed(PROFILE) == (
+        "MainThread;main (app.py:1);handle (app.py:10) 3\n"
+        "MainThread;main (app.py:1);render (app.py:20) 2\n"
+    )
+
+
+def test_speedscope_shares_frames_and_weights_samples_by_measured_time():
+    document = to_speedscope(PROFILE)
+    assert document["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    assert [frame["name"] for frame in document["shared"]["frames"]] == [
+        "MainThread", "main (app.py:1)", "handle (app.py:10)", "render (app.py:20)",
+    ]
+    profile = document["profiles"][0]
+    assert (profile["type"], profile["unit"]) == ("sampled", "milliseconds")
+    assert profile["samples"] == [[0, 1, 2], [0, 1, 3]]
+    # 2 s over 100 ticks: 20 ms per sample
+    assert profile["weights"] == [60.0, 40.0] and profile["endValue"] == 100.0
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_sees_running_threads_but_not_waiting_ones():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    waiter = threading.Thread(target=stop.wait, name="waiting")
+    worker.start()
+    waiter.start()
+    try:
+        sampler = Sampler(hz=200).start()
+        time.sleep(0.3)
+        profile = sampler.stop().profile("test")
+    finally:
+        stop.set()
+        worker.join()
+        waiter.join()
+
+    stacks = [stack for stack, _ in profile["stacks"]]
+    assert any(stack.startswith("busy;") and "busy_loop (" in stack for stack in stacks)
+    assert not any(stack.startswith("waiting;") for stack in stacks)
+    assert profile["ticks"] > 0 and profile["samples"] == sum(count for _, count in profile["stacks"])
+
+
+@pytest.fixture
+def admin(client, register, monkeypatch):
+    headers, _ = register("Admin")
+    email = client.get("/api/auth/me", headers=headers).json()["email"]
+    monkeypatch.setattr(security, "ADMIN_EMAILS", {email})
+    return headers
+
+
+def test_profiling_is_for_admins_only(client, register, admin):
+    headers, _ = register()
+    assert client.post("/api/admin/profile", params={"seconds": 0.1}, headers=headers).status_code == 403
+    assert client.get("/api/admin/profiles", headers=headers).status_code == 403
+    # X-Profile from anyone else is ignored
+    assert "X-Profile-Id" not in client.get("/api/invoices", headers={**headers, "X-Profile": "1"}).headers
+
+
+def test_worker_profile_downloads(client, admin):
+    collapsed = client.post("/api/admin/profile", params={"seconds": 0.2, "hz": 200, "idle": "true"}, headers=admin)
+    assert collapsed.status_code == 200 and collapsed.headers["content-type"].startswith("text/plain")
+    assert collapsed.headers["Content-Disposition"].endswith('.txt"')
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.text.splitlines())
+
+    speedscope = client.post("/api/admin/profile", params={"seconds": 0.1, "format": "speedscope"}, headers=admin)
+    assert speedscope.status_code == 200 and speedscope.headers["Content-Disposition"].endswith('.speedscope.json"')
+    assert speedscope.json()["profiles"][0]["type"] == "sampled"
+
+    assert client.post("/api/admin/profile", params={"seconds": 0.1, "format": "pprof"}, headers=admin).status_code == 400
+
+
+def test_request_trace_is_stored_under_its_id(client, admin, create_invoice):
+    create_invoice(admin)
+    traced = client.get("/api/invoices", headers={**admin, "X-Profile": "1"})
+    assert traced.status_code == 200
+    profile_id = traced.headers["X-Profile-Id"]
+
+    listed = client.get("/api/admin/profiles", headers=admin).json()
+    assert [(entry["id"], entry["name"]) for entry in listed] == [(profile_id, "GET /api/invoices")]
+    document = client.get(f"/api/admin/profiles/{profile_id}", params={"format": "speedscope"}, headers=admin).json()
+    assert document["name"] == "GET /api/invoices"
+    assert client.get(f"/api/admin/profiles/{profile_id}", headers=admin).status_code == 200
+    assert client.get("/api/admin/profiles/unknown", headers=admin).status_code == 404
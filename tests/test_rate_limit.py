@@ -0,0 +1,74 @@
+"""
+Token-bucket rate limiting of the AI endpoints (rate_limit.py).
+"""
+
+import pytest
+
+import rate_limit
+from rate_limit import MemoryRateLimitStore, match_route
+
+VOICE = {"voice_input": "web design 500 dollars", "customer_name": "Ravi", "business_id": "b"}
+
+
+def test_longest_matching_route_wins():
+    assert match_route("POST", "/api/ai/transcriptions") == ("ai", 10)
+    assert match_route("GET", "/api/ai/transcriptions/job-1") == ("ai", 1)
+    assert match_route("POST", "/api/ai/enhanced-voice-processing") == ("ai", 1)
+    assert match_route("GET", "/api/invoices") is None
+
+
+@pytest.mark.anyio
+async def test_bucket_refills_continuously(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    store = MemoryRateLimitStore()
+
+    assert await store.consume("k", 3, capacity=4, refill_per_second=0.5) == (True, 0.0)
+    assert await store.consume("k", 3, capacity=4, refill_per_second=0.5) == (False, 4.0)
+    now[0] += 4
+    assert await store.consume("k", 3, capacity=4, refill_per_second=0.5) == (True, 0.0)
+    # Never more than the capacity, however long it has been
+    now[0] += 1000
+    assert await store.consume("k", 4, capacity=4, refill_per_second=0.5) == (True, 0.0)
+    assert (await store.consume("k", 1, capacity=4, refill_per_second=0.5))[0] is False
+    # Other keys have their own buckets
+    assert (await store.consume("other", 4, capacity=4, refill_per_second=0.5))[0] is True
+
+
+@pytest.mark.anyio
+async def test_least_recently_used_buckets_are_dropped():
+    store = MemoryRateLimitStore(max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        await store.consume(key, 1, capacity=1, refill_per_second=0.001)
+    # "b" was dropped and starts full again; "a" is still empty
+    assert (await store.consume("b", 1, capacity=1, refill_per_second=0.001))[0] is True
+    assert (await store.consume("c", 1, capacity=1, refill_per_second=0.001))[0] is False
+
+
+def test_over_limit_requests_get_429_with_retry_after(client, register, monkeypatch):
+    monkeypatch.setitem(rate_limit.RATE_LIMIT_POLICIES, "ai", {"capacity": 2, "refill_per_second": 0.25})
+    monkeypatch.setitem(rate_limit.RATE_LIMIT_POLICIES, "ai_anonymous", {"capacity": 1, "refill_per_second": 0.25})
+    headers, _ = register()
+
+    def voice(headers=None):
+        return client.post("/api/ai/enhanced-voice-processing", json=VOICE, headers=headers)
+
+    assert [voice(headers).status_code for _ in range(2)] == [200, 200]
+    limited = voice(headers)
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "4"
+    assert "Rate limit" in limited.json()["detail"]
+
+    # Routes outside the policy table and other callers are not affected
+    assert client.get("/api/invoices", headers=headers).status_code == 200
+    other, _ = register("Other")
+    assert voice(other).status_code == 200
+    # Anonymous callers share a smaller bucket per address
+    assert [voice().status_code for _ in range(2)] == [200, 429]
+
+
+def test_a_broken_limiter_fails_open(client, register, monkeypatch):
+    async def broken(*args):
+        raise ConnectionError("store down")
+    monkeypatch.setattr(rate_limit.get_rate_limit_store(), "consume", broken)
+    headers, _ = register()
+    assert client.post("/api/ai/enhanced-voice-processing", json=VOICE, headers=headers).status_code == 200
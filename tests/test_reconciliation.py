@@ -0,0 +1,114 @@
+"""
+Bank statement reconciliation (reconciliation.py).
+"""
+
+from datetime import date
+
+import pytest
+
+from change_feed import change_seq_scope
+from database import db
+from reconciliation import _mark_paid, parse_amount, read_statement
+
+TODAY = date.today().isoformat()
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("1,234.50", 1234.5),
+    ("₹ 1,234.50", 1234.5),
+    ("$12", 12.0),
+    ("12.00 CR", 12.0),
+    ("(12.00)", -12.0),
+    ("12.00 DR", -12.0),
+    ("-5.25", -5.25),
+    ("", None),
+    ("  ", None),
+    ("n/a", None),
+])
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+def statement(*rows):
+    lines = ["Date,Description,Amount"] + [",".join(row) for row in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def reconcile(client, headers, csv, **params):
+    response = client.post("/api/reconciliations", params=params, files={"file": ("statement.csv", csv, "text/csv")}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_statement_is_read_in_chunks_and_left_open(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_bytes(statement(*[(TODAY, f"line {i}", "10.00") for i in range(5)], (TODAY, "refund", "-3.00")))
+    with open(path, "rb") as binary:
+        chunks = list(read_statement(binary, chunk_rows=2))
+        assert [len(credits) for credits, _, _ in chunks] == [2, 2, 1, 0]
+        assert sum(debits for _, _, debits in chunks) == 1
+        binary.seek(0)
+        assert len(list(read_statement(binary))) == 1
+
+
+def test_references_take_precedence_over_amounts(client, register, create_invoice):
+    headers, _ = register()
+    first, second = create_invoice(headers).json(), create_invoice(headers).json()
+    other = create_invoice(headers, items=[{"description": "Audit", "quantity": 1, "unit_price": 80.0, "total": 80.0}]).json()
+    assert first["total_amount"] == second["total_amount"]
+    amount = f"{first['total_amount']:.2f}"
+
+    result = reconcile(client, headers, statement(
+        # Both open invoices have this amount, but the next line names the second one
+        (TODAY, "bank transfer", amount),
+        (TODAY, f"payment for {second['invoice_number']}", amount),
+        # Names an invoice but the amount is wrong, and no invoice has that amount
+        (TODAY, f"{other['invoice_number']} part payment", "1.00"),
+        (TODAY, "card fee", "-2.50"),
+        ("not a date", "x", "5.00"),
+    ))
+    assert (result["credits"], result["matched"], result["ambiguous"], result["invalid"], result["debits_skipped"]) == (3, 2, 1, 1, 1)
+    matched = {entry["line"]: (entry["method"], entry["invoices"][0]["id"]) for entry in result["details"]["matched"]}
+    assert matched == {2: ("amount_date", first["id"]), 3: ("reference", second["id"])}
+    assert result["details"]["ambiguous"][0]["invoices"][0]["id"] == other["id"]
+
+    assert result["invoices_paid"] == 2
+    statuses = {invoice["id"]: invoice["status"] for invoice in client.get("/api/invoices", headers=headers).json()}
+    assert statuses == {first["id"]: "paid", second["id"]: "paid", other["id"]: other["status"]}
+
+
+def test_dry_run_changes_nothing(client, register, create_invoice):
+    headers, _ = register()
+    invoice = create_invoice(headers).json()
+    result = reconcile(client, headers, statement((TODAY, invoice["invoice_number"], f"{invoice['total_amount']:.2f}")), dry_run="true")
+    assert result["matched"] == 1 and result["invoices_paid"] == 0
+    assert client.get(f"/api/invoices/{invoice['id']}", headers=headers).json()["status"] == invoice["status"]
+
+
+def test_mark_paid_skips_invoices_paid_meanwhile(client, register, create_invoice):
+    headers, user_id = register()
+    invoices = [create_invoice(headers).json() for _ in range(2)]
+    # Paid by hand after the reconciliation loaded its open invoices
+    assert client.put(f"/api/invoices/{invoices[0]['id']}/status", params={"status": "paid"}, headers=headers).status_code == 200
+
+    credit = {"date": date.today(), "amount": invoices[0]["total_amount"], "description": "transfer", "line": 2}
+    async def mark():
+        async with change_seq_scope():
+            return await _mark_paid(user_id, "rec-1", [(credit, invoice) for invoice in invoices])
+
+    assert client.portal.call(mark) == 1
+    stored = {doc["id"]: doc for doc in client.portal.call(lambda: db.invoices.find({"user_id": user_id}).to_list(None))}
+    assert stored[invoices[0]["id"]].get("payment") is None
+    assert stored[invoices[1]["id"]]["payment"]["reconciliation_id"] == "rec-1"
+    # Analytics count each paid invoice once
+    buckets = client.portal.call(lambda: db.invoice_daily_stats.find({"user_id": user_id}).to_list(None))
+    assert sum(bucket["paid_count"] for bucket in buckets) == 2
+
+
+def test_empty_statement_is_rejected(client, register):
+    headers, _ = register()
+    response = client.post("/api/reconciliations", files={"file": ("statement.csv", b"", "text/csv")}, headers=headers)
+    assert response.status_code == 400
+    response = client.post("/api/reconciliations", files={"file": ("statement.csv", b"Foo,Bar\n1,2\n", "text/csv")}, headers=headers)
+    assert response.status_code == 400 and "date column" in response.json()["detail"]
+
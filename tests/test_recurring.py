@@ -0,0 +1,93 @@
+"""
+Recurring invoice claims: leases and the (recurring_id, recurring_period) unique index.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import recurring
+from database import db
+from recurring import RECURRING_LEASE_SECONDS, RecurringScheduler
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def definition(client, register, create_invoice):
+    """A monthly definition due today; returns (headers, user id, definition id)"""
+    headers, user_id = register()
+    invoice = create_invoice(headers).json()
+    response = client.post("/api/recurring-invoices", json={
+        "customer_id": invoice["customer_id"],
+        "business_id": invoice["business_id"],
+        "items": [{"description": "Retainer", "quantity": 1, "unit_price": 100.0, "total": 100.0}],
+        "start_date": TODAY.isoformat(),
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return headers, user_id, response.json()["id"]
+
+
+def recurring_invoices(client, headers, recurring_id):
+    return [invoice for invoice in client.get("/api/invoices", headers=headers).json() if invoice.get("recurring_id") == recurring_id]
+
+
+def test_two_workers_holding_one_definition_issue_one_invoice(client, definition, monkeypatch):
+    headers, user_id, recurring_id = definition
+    # Both workers get past the "already issued" check before either inserts
+    allocate = recurring.allocate_invoice_numbers
+    async def slow_allocate(*args):
+        await asyncio.sleep(0.05)
+        return await allocate(*args)
+    monkeypatch.setattr(recurring, "allocate_invoice_numbers", slow_allocate)
+
+    async def race():
+        now = datetime.utcnow()
+        first = await recurring._claim_due(now, TODAY)
+        # The first worker stalls past its lease and a second one claims the definition
+        later = now + timedelta(seconds=RECURRING_LEASE_SECONDS + 1)
+        second = await recurring._claim_due(later, TODAY)
+        assert [d["id"] for d in first] == [d["id"] for d in second] == [recurring_id]
+        return await asyncio.gather(
+            recurring._issue_for_user(user_id, first, now, TODAY),
+            recurring._issue_for_user(user_id, second, later, TODAY),
+        )
+
+    assert sorted(client.portal.call(race)) == [0, 1]
+    issued = recurring_invoices(client, headers, recurring_id)
+    assert [invoice["recurring_period"] for invoice in issued] == [TODAY.isoformat()]
+
+    stored = client.portal.call(db.recurring_invoices.find_one, {"id": recurring_id})
+    assert stored["next_run"] > TODAY.isoformat()
+    assert "lease_owner" not in stored and "lease_until" not in stored
+
+
+def test_concurrent_ticks_issue_each_period_once(client, definition):
+    headers, _, recurring_id = definition
+
+    async def ticks():
+        return await asyncio.gather(RecurringScheduler().tick(TODAY), RecurringScheduler().tick(TODAY))
+
+    assert sum(client.portal.call(ticks)) == 1
+    assert client.portal.call(RecurringScheduler().tick, TODAY) == 0
+    assert len(recurring_invoices(client, headers, recurring_id)) == 1
+
+
+def test_lease_is_released_when_next_run_is_edited_mid_run(client, definition):
+    headers, user_id, recurring_id = definition
+    now = datetime.utcnow()
+    batch = client.portal.call(recurring._claim_due, now, TODAY)
+    assert [d["id"] for d in batch] == [recurring_id]
+
+    # The user moves the schedule while the worker holds the lease
+    edited = TODAY + timedelta(days=3)
+    response = client.put(f"/api/recurring-invoices/{recurring_id}", json={"next_run": edited.isoformat()}, headers=headers)
+    assert response.status_code == 200
+    client.portal.call(recurring._issue_for_user, user_id, batch, now, TODAY)
+
+    stored = client.portal.call(db.recurring_invoices.find_one, {"id": recurring_id})
+    assert stored["next_run"] == edited.isoformat()
+    assert "lease_owner" not in stored and "lease_until" not in stored
+    # Not blocked until the lease would have expired
+    assert client.portal.call(RecurringScheduler().tick, edited) == 1
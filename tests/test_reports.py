@@ -0,0 +1,53 @@
+"""
+Cached accountant reports (reports.py) and what invalidates them.
+"""
+
+from datetime import date
+
+from currency import RateTable
+from database import db
+import reports
+
+TODAY = date.today().isoformat()
+
+
+def download(client, headers, report):
+    response = client.get(f"/api/reports/{report}", params={"start": TODAY, "end": TODAY}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_repeat_download_is_served_from_the_cache(client, register, create_invoice):
+    headers, _ = register()
+    create_invoice(headers)
+    first = download(client, headers, "invoice-register")
+    assert download(client, headers, "invoice-register").headers["ETag"] == first.headers["ETag"]
+
+    create_invoice(headers)
+    assert download(client, headers, "invoice-register").headers["ETag"] != first.headers["ETag"]
+
+
+def test_customer_rename_regenerates_reports_with_names(client, register, create_invoice):
+    headers, user_id = register()
+    customer_id = create_invoice(headers).json()["customer_id"]
+    before = {report: download(client, headers, report) for report in ("invoice-register", "customer-totals", "tax-summary")}
+    assert "John Doe" in before["customer-totals"].text
+
+    client.portal.call(db.customers.update_one, {"id": customer_id, "user_id": user_id}, {"$set": {"name": "Jane Roe"}})
+    for report in ("invoice-register", "customer-totals"):
+        after = download(client, headers, report)
+        assert after.headers["ETag"] != before[report].headers["ETag"]
+        assert "Jane Roe" in after.text and "John Doe" not in after.text
+    # The tax summary has no customer names in it
+    assert download(client, headers, "tax-summary").headers["ETag"] == before["tax-summary"].headers["ETag"]
+
+
+def test_new_rate_table_regenerates_the_tax_summary(client, register, create_invoice, monkeypatch):
+    headers, _ = register()
+    create_invoice(headers)
+    before = {report: download(client, headers, report) for report in ("tax-summary", "customer-totals")}
+
+    table = RateTable("USD", {"EUR": 0.5, "GBP": 0.4, "INR": 80.0, "JPY": 150.0}, "2030-01-01")
+    monkeypatch.setattr(reports.rate_tables, "get", lambda: table)
+    assert download(client, headers, "tax-summary").headers["ETag"] != before["tax-summary"].headers["ETag"]
+    assert download(client, headers, "customer-totals").headers["ETag"] == before["customer-totals"].headers["ETag"]
@@ -0,0 +1,30 @@
+"""
+Router layout and lazily imported dependencies (server.py, routers/, benchmarks/startup_benchmark.py).
+"""
+
+from collections import Counter
+
+from benchmarks.startup_benchmark import measure_once
+
+
+def test_heavy_dependencies_are_not_imported_at_startup():
+    assert measure_once()["loaded"] == []
+
+
+def test_every_router_is_mounted_once_under_api(client):
+    routes = [(method, route.path) for route in client.app.routes for method in getattr(route, "methods", None) or ()]
+    assert [route for route, count in Counter(routes).items() if count > 1] == []
+    prefixes = {path.split("/")[2].split(":")[0] for _, path in routes if path.startswith("/api/")}
+    assert prefixes >= {
+        "auth", "business", "blobs", "customers", "invoices", "recurring-invoices", "email",
+        "reconciliations", "reports", "ai", "dashboard", "cache", "admin",
+    }
+
+
+def test_fixed_paths_are_not_taken_for_ids(client, register, create_invoice):
+    headers, _ = register()
+    create_invoice(headers)
+    # Each of these sits next to a /{id} route in its router
+    for path in ("/api/invoices/changes?since=0.0", "/api/customers/search?q=John", "/api/business/custom-templates"):
+        assert client.get(path, headers=headers).status_code == 200, path
+
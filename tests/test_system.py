@@ -0,0 +1,155 @@
+"""
+InvoiceForge system tests: the core API flows end to end, in-process.
+
+Run from the repository root with `python -m pytest -q`.
+"""
+
+from datetime import date
+
+from change_feed import encode_change_token
+
+VOICE_REQUEST = {
+    "voice_input": "Create invoice for John Doe, web design services, 500 dollars",
+    "customer_name": "John Doe",
+    "business_id": "test-business",
+}
+
+BUSINESS_PROFILE = {
+    "company_name": "Test Company LLC",
+    "email": "contact@testcompany.com",
+    "phone": "+1-555-0123",
+    "address": "123 Test Street",
+    "city": "Test City",
+    "state": "TS",
+    "zip_code": "12345",
+    "country": "United States",
+    "website": "https://testcompany.com",
+    "tax_id": "12-3456789",
+    "brand_color": "#3B82F6",
+}
+
+
+def test_basic_connectivity(client):
+    response = client.get("/api/")
+    assert response.status_code == 200
+    assert "InvoiceForge" in response.json()["message"]
+
+
+def test_user_authentication(client, register):
+    headers, user_id = register()
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == user_id
+
+    assert client.get("/api/auth/me").status_code in (401, 403)
+
+
+def test_business_profile(client, register):
+    headers, _ = register()
+    assert client.post("/api/business/profile", json=BUSINESS_PROFILE, headers=headers).status_code == 200
+
+    response = client.get("/api/business/profile", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["company_name"] == "Test Company LLC"
+
+    response = client.post("/api/business/generate-template", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["template"]["id"]
+
+
+def test_template_endpoints(client, register):
+    headers, _ = register()
+    response = client.get("/api/business/templates", headers=headers)
+    assert response.status_code == 200
+    templates = response.json()["templates"]
+    assert len(templates["default"]) >= 6
+    assert templates["custom"] == []
+
+    assert client.get("/api/business/custom-templates", headers=headers).status_code == 200
+
+
+def test_ai_functionality(client):
+    response = client.post("/api/ai/voice-to-invoice", json=VOICE_REQUEST)
+    assert response.status_code == 200
+    items = response.json()["invoice_data"]["items"]
+    assert items
+    assert "web design" in items[0]["description"].lower()
+    assert items[0]["unit_price"] == 500.0
+
+    response = client.post("/api/ai/enhanced-voice-processing", json=VOICE_REQUEST)
+    assert response.status_code == 200
+    assert response.json()["invoice_data"]["template_suggestions"]
+
+
+def test_invoice_management(client, register, create_invoice):
+    headers, _ = register()
+    response = create_invoice(headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["subtotal"] == 500.0
+
+    assert len(client.get("/api/invoices", headers=headers).json()) == 1
+    assert len(client.get("/api/customers", headers=headers).json()) == 1
+
+
+def test_dashboard_stats(client, register):
+    headers, _ = register()
+    response = client.get("/api/dashboard/stats", headers=headers)
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["total_invoices"] == 0
+    assert stats["total_revenue"] == 0
+
+
+def test_tenants_see_only_their_own_data(client, register, create_invoice):
+    headers_a, _ = register("Tenant A")
+    headers_b, _ = register("Tenant B")
+    keyed_a = {**headers_a, "Idempotency-Key": "shared-key"}
+    invoice = create_invoice(keyed_a).json()
+    customer_id, business_id = invoice["customer_id"], invoice["business_id"]
+
+    # Direct reads by id
+    assert client.get(f"/api/invoices/{invoice['id']}", headers=headers_b).status_code == 404
+    assert client.get(f"/api/invoices/{invoice['id']}/items", headers=headers_b).status_code == 404
+    assert client.get(f"/api/customers/{customer_id}", headers=headers_b).status_code == 404
+    assert client.get(f"/api/business/{business_id}", headers=headers_b).status_code == 404
+    # Writes by id
+    assert client.put(f"/api/invoices/{invoice['id']}/status", params={"status": "paid"}, headers=headers_b).status_code == 404
+    assert client.delete(f"/api/invoices/{invoice['id']}", headers=headers_b).status_code == 404
+    assert client.get(f"/api/invoices/{invoice['id']}", headers=headers_a).json()["status"] == invoice["status"]
+
+    # Lists, search and batch reads
+    assert client.get("/api/invoices", headers=headers_b).json() == []
+    assert client.get("/api/customers", headers=headers_b).json() == []
+    assert client.get("/api/business", headers=headers_b).json() == []
+    assert client.get("/api/customers/search", params={"q": "John"}, headers=headers_b).json() == []
+    for path, entity_id in (("invoices", invoice["id"]), ("customers", customer_id), ("business", business_id)):
+        batch = client.get(f"/api/{path}:batchGet", params={"ids": entity_id}, headers=headers_b).json()
+        assert batch["not_found"] == [entity_id]
+
+    # The change feed from the start
+    changes = client.get("/api/invoices/changes", params={"since": encode_change_token(0)}, headers=headers_b).json()
+    assert changes["changes"] == [] and changes["deleted"] == []
+
+    # Reports contain only B's invoices
+    today = date.today().isoformat()
+    report = client.get("/api/reports/customer-totals", params={"start": today, "end": today}, headers=headers_b)
+    assert report.status_code == 200
+    assert invoice["id"] not in report.text and customer_id not in report.text
+
+    # An invoice of B's own that names A's customer and business does not expand them
+    create_invoice(headers_b)
+    borrowed = client.post("/api/invoices", json={
+        "customer_id": customer_id, "business_id": business_id, "due_date": "2030-01-31",
+        "items": [{"description": "Borrowed", "quantity": 1, "unit_price": 1.0, "total": 1.0}],
+    }, headers=headers_b)
+    if borrowed.status_code == 200:
+        listed = client.get("/api/invoices", params={"expand": "customer,business"}, headers=headers_b).json()
+        expanded = next(item for item in listed if item["id"] == borrowed.json()["id"])
+        assert expanded["customer"] is None and expanded["business"] is None
+    else:
+        assert borrowed.status_code in (400, 404)
+
+    # The same Idempotency-Key from another user is a new request, not a replay of A's
+    replay = create_invoice({**headers_b, "Idempotency-Key": "shared-key"})
+    assert replay.status_code == 200 and "Idempotent-Replayed" not in replay.headers
+    assert replay.json()["id"] != invoice["id"]
@@ -0,0 +1,110 @@
+"""
+Rule-based sales tax (tax.py) and invoice totals (invoicing.compute_invoice_totals).
+"""
+
+from datetime import date
+
+import pytest
+
+from invoicing import compute_invoice_totals
+from models import InvoiceCreate, InvoiceItem
+from tax import TaxEngine, UnknownTaxCategoryError, get_tax_engine
+
+
+@pytest.mark.parametrize("state, zip_code, jurisdiction", [
+    ("CA", "94105", "US-CA"),
+    ("California", "90012", "US-CA-LOS-ANGELES"),
+    (" california ", "905-01", "US-CA-LOS-ANGELES"),
+    ("CA", None, "US-CA"),
+    ("NY", "10001", "US-NY-NYC"),
+    ("N.Y.", "11201", "US-NY-NYC"),
+    ("NY", "12207", "US-NY"),
+    ("Karnataka", "560001", "IN"),
+    ("Bavaria", "80331", None),
+    (None, None, None),
+])
+def test_locate_by_state_and_zip_prefix(state, zip_code, jurisdiction):
+    assert get_tax_engine().locate(state, zip_code) == jurisdiction
+
+
+def test_line_taxes_by_category_and_jurisdiction():
+    engine = get_tax_engine()
+    taxes = engine.line_taxes(
+        [100.0, 100.0, 100.0, 200.0, 100.0],
+        [None, "essential", "luxury", "standard", "reduced"],
+        ["US-CA", "US-CA-LOS-ANGELES", "IN", "US-NY-NYC", "default"],
+    )
+    # Los Angeles leaves essentials to its parent, California
+    assert taxes.tolist() == [7.25, 0.0, 28.0, 17.75, 5.0]
+    assert engine.line_taxes([], [], []).tolist() == []
+    with pytest.raises(UnknownTaxCategoryError):
+        engine.line_taxes([1.0], ["groceries"], ["default"])
+
+
+def rules(*jurisdictions, categories=("standard", "exempt")):
+    return {"categories": list(categories), "jurisdictions": [{"id": "default", "rates": {"standard": 0.1}}, *jurisdictions]}
+
+
+@pytest.mark.parametrize("bad_rules, message", [
+    (rules({"id": "A", "states": ["XX"]}, {"id": "B", "states": ["xx"]}), "overlaps"),
+    (rules({"id": "A", "states": ["XX"], "parent": "A"}), "its own parent"),
+    (rules({"id": "A", "states": ["XX"], "rates": {"food": 0.0}}), "unknown category"),
+    ({"categories": ["standard"], "jurisdictions": [{"id": "A"}]}, "'default' jurisdiction"),
+])
+def test_inconsistent_rules_are_rejected(bad_rules, message):
+    with pytest.raises(ValueError, match=message):
+        TaxEngine(bad_rules)
+
+
+def test_rates_are_inherited_from_the_parent():
+    engine = TaxEngine(rules(
+        {"id": "A", "states": ["XX"], "rates": {"exempt": 0.0, "standard": 0.2}},
+        {"id": "A-CITY", "states": ["XX"], "zip_prefixes": ["12"], "parent": "A", "rates": {"exempt": 0.01}},
+    ))
+    assert engine.locate("XX", "12345") == "A-CITY" and engine.locate("XX", "13345") == "A"
+    assert engine.line_taxes([100.0, 100.0], ["standard", "exempt"], ["A-CITY", "A-CITY"]).tolist() == [20.0, 1.0]
+
+
+def invoice(*items, tax_rate=None, currency="USD"):
+    return InvoiceCreate(
+        customer_id="c", business_id="b", due_date=date(2030, 1, 31), currency=currency, tax_rate=tax_rate,
+        items=[InvoiceItem(description=f"Line {i}", quantity=1, unit_price=total, total=total, tax_category=category)
+               for i, (total, category) in enumerate(items)],
+    )
+
+
+def test_batch_mixes_flat_rates_and_tax_rules():
+    flat = invoice((100.0, "luxury"), (50.0, None), tax_rate=0.2)
+    california = invoice((100.0, None), (40.0, "essential"), (10.0, "exempt"))
+    new_york_city = invoice((200.0, "luxury"))
+    empty = invoice()
+
+    totals = compute_invoice_totals(
+        [flat, california, new_york_city, empty], [None, "US-CA", "US-NY-NYC", "default"]
+    )
+
+    assert totals[0] == (150.0, 0.2, 30.0, 180.0, None)
+    assert [item.tax_amount for item in flat.items] == [None, None]
+
+    assert totals[1] == (150.0, round(7.25 / 150, 6), 7.25, 157.25, "US-CA")
+    assert [item.tax_amount for item in california.items] == [7.25, 0.0, 0.0]
+
+    assert totals[2] == (200.0, 0.08875, 17.75, 217.75, "US-NY-NYC")
+    assert totals[3] == (0.0, 0.0, 0.0, 0.0, "default")
+
+
+def test_invoice_without_a_tax_rate_is_taxed_by_the_customers_address(client, register, create_invoice):
+    headers, _ = register()
+    items = [
+        {"description": "Consulting", "quantity": 1, "unit_price": 100.0, "total": 100.0},
+        {"description": "Bread", "quantity": 1, "unit_price": 20.0, "total": 20.0, "tax_category": "essential"},
+    ]
+    taxed = create_invoice(headers, items=items, tax_rate=None).json()
+    assert (taxed["tax_jurisdiction"], taxed["tax_amount"], taxed["total_amount"]) == ("US-CA", 7.25, 127.25)
+    assert [item["tax_amount"] for item in taxed["items"]] == [7.25, 0.0]
+
+    flat = create_invoice(headers, items=items, tax_rate=0.1).json()
+    assert (flat["tax_jurisdiction"], flat["tax_amount"]) == (None, 12.0)
+
+    response = create_invoice(headers, items=[{**items[0], "tax_category": "groceries"}])
+    assert response.status_code == 400 and "groceries" in response.json()["detail"]
@@ -0,0 +1,93 @@
+"""
+Voice transcription: splitting audio on pauses, chunked recognition and responses (transcription.py).
+"""
+
+import time
+
+import pytest
+
+import transcription
+from transcription import TranscriptionError, build_voice_response, split_on_pauses
+
+
+def amount_suggestions(response):
+    return [suggestion for suggestion in response.invoice_suggestions if suggestion.startswith("Detected amount")]
+
+
+def test_amounts_are_formatted_in_the_extracted_currency():
+    assert amount_suggestions(build_voice_response("web design services 500 dollars", "en-US")) == ["Detected amount: $500.00"]
+    assert amount_suggestions(build_voice_response("वेब डिज़ाइन ₹5000", "hi-IN")) == ["Detected amount: ₹5,000.00"]
+
+
+def test_amounts_fall_back_to_the_default_currency(monkeypatch):
+    extracted = {"services": [], "amounts": [1200.0], "currency": "", "items": []}
+    monkeypatch.setattr(transcription, "extract_invoice_info_from_text", lambda text, language: dict(extracted))
+    monkeypatch.setattr(transcription, "DEFAULT_CURRENCY", "GBP")
+    assert amount_suggestions(build_voice_response("twelve hundred", "en-US")) == ["Detected amount: £1,200.00"]
+
+
+def tone(ms):
+    from pydub.generators import Sine
+    return Sine(440).to_audio_segment(duration=ms, volume=-10)
+
+
+def silence(ms):
+    from pydub import AudioSegment
+    return AudioSegment.silent(ms)
+
+
+def speech():
+    """Three phrases separated by one-second pauses (8 s)"""
+    return (tone(2000) + silence(1000) + tone(3000) + silence(1000) + tone(1000)).set_channels(1).set_frame_rate(16000)
+
+
+def test_short_phrases_are_merged_up_to_the_target_length():
+    assert split_on_pauses(speech()) == [(0, 8000)]
+    # A pause shorter than MIN_PAUSE_MS does not end a phrase
+    assert split_on_pauses(tone(1000) + silence(300) + tone(1000)) == [(0, 2300)]
+    assert split_on_pauses(silence(3000)) == []
+
+
+def test_long_speech_is_split_on_pauses_and_cut_at_the_maximum(monkeypatch):
+    monkeypatch.setattr(transcription, "TARGET_CHUNK_MS", 2500)
+    monkeypatch.setattr(transcription, "MAX_CHUNK_MS", 4000)
+    # Each chunk keeps KEEP_SILENCE_MS of the pause around its speech
+    assert split_on_pauses(speech()) == [(0, 2200), (2800, 6200), (6800, 8000)]
+    assert split_on_pauses(tone(9000)) == [(0, 4000), (4000, 8000), (8000, 9000)]
+
+
+def test_chunks_are_recognized_in_parallel_and_joined_in_order(tmp_path, monkeypatch):
+    path = tmp_path / "speech.wav"
+    speech().export(path, format="wav")
+    monkeypatch.setattr(transcription, "TARGET_CHUNK_MS", 2500)
+
+    def recognize(chunk, language):
+        # Later chunks finish first
+        time.sleep((8000 - len(chunk)) / 100000)
+        return ("" if len(chunk) < 2000 else f"{len(chunk)} ms in {language}"), 0.01
+
+    monkeypatch.setattr(transcription, "_recognize_chunk", recognize)
+    transcript, segments = transcription.transcribe_file(str(path), "hi-IN")
+    assert transcript == "2200 ms in hi-IN 3400 ms in hi-IN"
+    assert [(segment["index"], segment["start_ms"], segment["end_ms"]) for segment in segments] == [
+        (0, 0, 2200), (1, 2800, 6200), (2, 6800, 8000),
+    ]
+
+
+def test_recognizer_errors_are_retryable_and_silence_is_not(tmp_path, monkeypatch):
+    import speech_recognition as sr
+
+    def unavailable(chunk, language):
+        raise sr.RequestError("service unavailable")
+
+    monkeypatch.setattr(transcription, "_recognize_chunk", unavailable)
+    path = tmp_path / "speech.wav"
+    speech().export(path, format="wav")
+    with pytest.raises(TranscriptionError) as error:
+        transcription.transcribe_file(str(path), "en-US")
+    assert error.value.retryable
+
+    silence(2000).export(path, format="wav")
+    with pytest.raises(TranscriptionError) as error:
+        transcription.transcribe_file(str(path), "en-US")
+    assert not error.value.retryable